@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+# Ensure src is in path
+root_dir = Path(__file__).resolve().parent
+if str(root_dir) not in sys.path:
+    sys.path.append(str(root_dir))
+
+from src.rag.pipeline import RAGPipeline
+from src.rag.retriever import SEARCH_MODES, ComplaintRetriever
+from src.rag.scheduler import SchedulerBusy, SchedulerClosed
+from src.rag.telemetry import REGISTRY, get_logger, trace
+
+logger = get_logger('api')
+
+HTTP_REQUESTS = REGISTRY.counter('rag_http_requests_total', 'HTTP requests served', ('path', 'status'))
+HTTP_SECONDS = REGISTRY.histogram('rag_http_request_seconds', 'HTTP request latency (until headers are sent)',
+                                  ('path',))
+SCHEDULER_GAUGES = {
+    name: REGISTRY.gauge(f'rag_scheduler_{name}', help_text)
+    for name, help_text in [('queue_depth', 'Answers waiting for a batch slot'),
+                            ('active', 'Answers currently decoding'),
+                            ('mean_batch_size', 'Mean sequences per decode step since start')]
+}
+
+# Config (overridable through the environment)
+VECTOR_STORE_DIR = Path(os.environ.get("RAG_VECTOR_STORE", root_dir / "vector_store"))
+SEARCH_WORKERS = int(os.environ.get("RAG_SEARCH_WORKERS", 4))
+GENERATE_WORKERS = int(os.environ.get("RAG_GENERATE_WORKERS", 8))
+# Serve the index from `<prefix>_shards/` with one worker process per shard
+SHARDED_INDEX = os.environ.get("RAG_SHARDED_INDEX", "0") == "1"
+THREADS_PER_SHARD = int(os.environ.get("RAG_THREADS_PER_SHARD", 1))
+MAX_TOP_K = 100
+MAX_BATCH_QUERIES = 256
+MAX_UPDATE_CHUNKS = 1000
+
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=MAX_TOP_K)
+    product_filter: Optional[str] = None
+    filters: Optional[dict] = None
+    mode: str = 'dense'
+
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str] = Field(..., max_length=MAX_BATCH_QUERIES)
+    top_k: int = Field(5, ge=1, le=MAX_TOP_K)
+    product_filter: Optional[str] = None
+    # One filter dict for every query, or one (or null) per query
+    filters: Union[dict, List[Optional[dict]], None] = None
+    mode: str = 'dense'
+
+
+class Chunk(BaseModel):
+    chunk_id: str
+    text: str
+    product: Optional[str] = None
+    company: Optional[str] = None
+    state: Optional[str] = None
+    date: Optional[str] = None
+
+
+class AddChunksRequest(BaseModel):
+    chunks: List[Chunk] = Field(..., max_length=MAX_UPDATE_CHUNKS)
+
+
+class DeleteRequest(BaseModel):
+    chunk_ids: List[str] = []
+    complaint_ids: List[str] = []
+
+
+class AnswerRequest(BaseModel):
+    question: str
+    product_filter: Optional[str] = None
+    mode: str = 'dense'
+
+
+def create_app(pipeline: RAGPipeline = None, search_workers: int = SEARCH_WORKERS,
+               generate_workers: int = GENERATE_WORKERS) -> FastAPI:
+    """
+    Build the HTTP query service.
+
+    One RAGPipeline is shared by every request the process serves: the index,
+    metadata and models are loaded once (in the background, as in the Gradio
+    app) and answers from concurrent requests are batched by its generation
+    scheduler. Run a single server process per machine; scale with the worker
+    pools rather than with extra processes, each of which would load its own
+    copy of the index and LLM.
+
+    FAISS searches and model calls block, so they run on two bounded thread
+    pools — one for retrieval, one for generation — keeping the event loop free,
+    and long generations can't starve quick searches.
+
+    Args:
+        pipeline (RAGPipeline): Pipeline to serve; by default one is created over
+            VECTOR_STORE_DIR with batched generation when the app starts.
+        search_workers (int): Threads running searches.
+        generate_workers (int): Threads driving answers (at most this many are
+            in flight; the scheduler batches them).
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if app.state.rag is None:
+            logger.info("🚀 [API] Initializing CrediTrust RAG Pipeline...")
+            retriever = ComplaintRetriever(VECTOR_STORE_DIR, defer_loading=True, sharded=True,
+                                           threads_per_shard=THREADS_PER_SHARD) if SHARDED_INDEX else None
+            app.state.rag = RAGPipeline(vector_store_dir=str(VECTOR_STORE_DIR), batch_generation=True,
+                                        max_batch_size=generate_workers, retriever=retriever)
+        app.state.search_pool = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix='search')
+        app.state.generate_pool = ThreadPoolExecutor(max_workers=generate_workers, thread_name_prefix='generate')
+        try:
+            yield
+        finally:
+            app.state.search_pool.shutdown(wait=False, cancel_futures=True)
+            app.state.generate_pool.shutdown(wait=False, cancel_futures=True)
+            if getattr(app.state.rag, 'scheduler', None) is not None:
+                app.state.rag.scheduler.close()
+            app.state.rag.retriever.close()
+
+    app = FastAPI(title="CrediTrust Complaint RAG API", lifespan=lifespan)
+    app.state.rag = pipeline
+
+    @app.middleware("http")
+    async def instrument(request: Request, call_next):
+        """Give every request a trace id (the caller's X-Request-ID if sent) and record its latency."""
+        start = time.perf_counter()
+        with trace(request.headers.get('x-request-id')) as trace_id:
+            response = await call_next(request)
+        # Label by route template so path parameters don't explode the series
+        route = request.scope.get('route')
+        path = route.path if route is not None else 'unmatched'
+        HTTP_SECONDS.observe(time.perf_counter() - start, path=path)
+        HTTP_REQUESTS.inc(path=path, status=response.status_code)
+        response.headers['X-Trace-Id'] = trace_id
+        return response
+
+    async def run(pool_name: str, fn, *args, **kwargs):
+        """Run a blocking pipeline call on one of the worker pools, mapping errors to HTTP ones."""
+        loop = asyncio.get_running_loop()
+        # Carry the request's trace id over to the worker thread
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        try:
+            return await loop.run_in_executor(getattr(app.state, pool_name), call)
+        except SchedulerBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '5'})
+        except SchedulerClosed as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except (ValueError, FileNotFoundError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def require_generator(rag: RAGPipeline):
+        state = rag.status()['generator']['state']
+        if state == 'failed':
+            raise HTTPException(status_code=503, detail="The language model failed to load")
+        if state != 'ready':
+            raise HTTPException(status_code=503, detail="The language model is still loading",
+                                headers={'Retry-After': '10'})
+
+    @app.get("/healthz")
+    async def healthz():
+        """200 once retrieval works (the LLM may still be loading), 503 before."""
+        rag = app.state.rag
+        body = {
+            'ready': rag.retrieval_ready,
+            'generator_ready': rag.is_ready('generator'),
+            'stages': rag.status(),
+        }
+        if getattr(rag, 'scheduler', None) is not None:
+            body['scheduler'] = rag.scheduler.metrics()
+        return JSONResponse(body, status_code=200 if body['ready'] else 503)
+
+    @app.get("/metrics")
+    async def metrics():
+        """Prometheus text exposition of every counter, gauge and latency histogram."""
+        scheduler = getattr(app.state.rag, 'scheduler', None)
+        if scheduler is not None:
+            current = scheduler.metrics()
+            for name, gauge in SCHEDULER_GAUGES.items():
+                gauge.set(current[name])
+        return PlainTextResponse(REGISTRY.render_prometheus(), media_type='text/plain; version=0.0.4')
+
+    @app.get("/metrics/summary")
+    async def metrics_summary():
+        """The same metrics as JSON, with p50/p95/p99 per latency histogram."""
+        return REGISTRY.snapshot()
+
+    @app.post("/search")
+    async def search(request: SearchRequest):
+        results = await run('search_pool', app.state.rag.retriever.search, request.query, top_k=request.top_k,
+                            product_filter=request.product_filter, filters=request.filters, mode=request.mode)
+        return {'results': results}
+
+    @app.post("/search_batch")
+    async def search_batch(request: SearchBatchRequest):
+        results = await run('search_pool', app.state.rag.retriever.search_batch, request.queries,
+                            top_k=request.top_k, filters=request.filters,
+                            product_filter=request.product_filter, mode=request.mode)
+        return {'results': results}
+
+    @app.post("/index/chunks")
+    async def add_chunks(request: AddChunksRequest):
+        """Index new or changed chunks right away, for every search mode (they go to the delta index)."""
+        added = await run('search_pool', app.state.rag.retriever.add_chunks,
+                          [chunk.model_dump() for chunk in request.chunks])
+        return {'added': added}
+
+    @app.post("/index/delete")
+    async def delete_chunks(request: DeleteRequest):
+        """Drop chunks (by chunk id) or whole withdrawn complaints from search results."""
+        retriever = app.state.rag.retriever
+        deleted = await run('search_pool', retriever.delete_chunks, request.chunk_ids)
+        if request.complaint_ids:
+            deleted += await run('search_pool', retriever.delete_complaints, request.complaint_ids)
+        return {'deleted': deleted}
+
+    @app.post("/index/compact", status_code=202)
+    async def compact():
+        """Start folding the delta index into the main index in the background."""
+        running = getattr(app.state, 'compaction', None)
+        if running is not None and running.is_alive():
+            return {'started': False}
+        try:
+            app.state.compaction = app.state.rag.retriever.compact(background=True)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {'started': True}
+
+    @app.post("/answer")
+    async def answer(request: AnswerRequest):
+        rag = app.state.rag
+        require_generator(rag)
+        return await run('generate_pool', rag.query, request.question,
+                         product_filter=request.product_filter, mode=request.mode)
+
+    @app.post("/answer/stream")
+    async def answer_stream(request: AnswerRequest):
+        """
+        Server-sent events: one 'sources' event, a 'token' event per decoded
+        fragment and a final 'done' event (or an 'error' event), each with the
+        pipeline's event dict as JSON data.
+        """
+        rag = app.state.rag
+        require_generator(rag)
+        if request.mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown search mode {request.mode!r}")
+        events = rag.query_stream(request.question, product_filter=request.product_filter, mode=request.mode)
+        pool = app.state.generate_pool
+        loop = asyncio.get_running_loop()
+        # Every step of the stream runs in this request's context (for its trace id)
+        context = contextvars.copy_context()
+
+        async def sse():
+            try:
+                while True:
+                    event = await loop.run_in_executor(pool, context.run, next, events, None)
+                    if event is None:
+                        break
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            except (SchedulerBusy, ValueError, FileNotFoundError) as e:
+                yield f"event: error\ndata: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+            finally:
+                # Stops generation (and frees the batch slot) when the client goes away;
+                # if a step is still running on the pool, the generator is closed when collected
+                try:
+                    await loop.run_in_executor(pool, events.close)
+                except ValueError:
+                    pass
+
+        return StreamingResponse(sse(), media_type="text/event-stream",
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return app
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # A single process: every request shares its one loaded pipeline
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)), workers=1)
@@ -1,7 +1,6 @@
 import gradio as gr
 import sys
 from pathlib import Path
-import time
 import os
 
 # Ensure src is in path
@@ -9,16 +8,24 @@ root_dir = Path(__file__).resolve().parent
 if str(root_dir) not in sys.path:
     sys.path.append(str(root_dir))
 
-from src.rag.pipeline import RAGPipeline
+from src.rag.pipeline import RETRIEVAL_STAGES, RAGPipeline
+from src.rag.scheduler import SchedulerBusy
+from src.rag.telemetry import get_logger
+
+logger = get_logger('app')
 
 # Initialize Pipeline
-# This will load the local LLM and the 1.3M FAISS index
-print("🚀 Initializing CrediTrust RAG Pipeline...")
+# The local LLM, query encoder and 1.3M FAISS index load concurrently in the
+# background, so the UI comes up immediately and retrieval works before the LLM does.
+# Concurrent analysts share the LLM through the continuous-batching scheduler.
+MAX_CONCURRENT_ANSWERS = 8
+logger.info("🚀 Initializing CrediTrust RAG Pipeline...")
 try:
-    rag = RAGPipeline(vector_store_dir=str(root_dir / "vector_store"))
-    print("✅ Pipeline Ready!")
+    rag = RAGPipeline(vector_store_dir=str(root_dir / "vector_store"), batch_generation=True,
+                      max_batch_size=MAX_CONCURRENT_ANSWERS)
+    logger.info("⏳ Pipeline loading in the background...")
 except Exception as e:
-    print(f"❌ Failed to load pipeline: {e}")
+    logger.error(f"❌ Failed to load pipeline: {e}")
     rag = None
 
 # Product options for filtering
@@ -42,33 +49,61 @@ THEME = gr.themes.Soft(
     font=[gr.themes.GoogleFont("Inter"), "ui-sans-serif", "system-ui", "sans-serif"],
 )
 
-def respond(message, chat_history, product_filter):
-    if not rag:
-        return "", chat_history + [[message, "⚠️ System Error: RAG Pipeline failed to initialize."]], ""
-
-    filter_val = None if product_filter == "All Products" else product_filter
-    
-    # 1. Run Query
-    # Note: We aren't doing true streaming from the model yet as it requires 
-    # specific yield logic in the generator. We'll simulate word-by-word for UX.
-    response_data = rag.query(message, product_filter=filter_val)
-    answer = response_data['answer']
-    sources = response_data['source_documents']
-
-    # 2. Format Sources for the accordion
+def format_sources(sources):
     source_display = ""
     for i, doc in enumerate(sources):
         source_display += f"### Source {i+1}\n"
         source_display += f"**Product:** {doc['product']} | **Score:** {doc['score']:.4f}\n\n"
         source_display += f"{doc['text']}\n\n---\n\n"
+    return source_display
 
-    # 3. Simulated Streaming for UX
+def respond(message, chat_history, product_filter):
+    if not rag:
+        yield "", chat_history + [[message, "⚠️ System Error: RAG Pipeline failed to initialize."]], ""
+        return
+
+    filter_val = None if product_filter == "All Products" else product_filter
+
+    # While the LLM is still loading, answer with the evidence only
+    if not rag.is_ready('generator'):
+        if not rag.retrieval_ready:
+            status = rag.status()
+            failed = [(name, status[name]['error']) for name in RETRIEVAL_STAGES if status[name]['state'] == 'failed']
+            if failed:
+                name, error = failed[0]
+                note = f"⚠️ System Error: the {name} failed to load ({error}). Complaint search is unavailable."
+            else:
+                note = "⏳ The complaint index is still loading. Please ask again in a moment."
+            yield "", chat_history + [(message, note)], ""
+            return
+        sources = rag.search(message, top_k=5, product_filter=filter_val)
+        if rag.status()['generator']['state'] == 'failed':
+            note = "⚠️ The language model failed to load. Showing the most relevant complaints instead — see the Evidence section below."
+        else:
+            note = "⏳ The language model is still loading. Here are the most relevant complaints in the meantime — see the Evidence section below."
+        yield "", chat_history + [(message, note)], format_sources(sources)
+        return
+    
+    # 1. Run Query, streaming tokens straight from the model as they are decoded
     chat_history.append((message, ""))
-    temp_answer = ""
-    for word in answer.split():
-        temp_answer += word + " "
-        chat_history[-1] = (message, temp_answer.strip())
-        time.sleep(0.05) # Adjust speed for "thinking" effect
+    source_display = ""
+    answer = ""
+    try:
+        for event in rag.query_stream(message, product_filter=filter_val):
+            if event['type'] == 'sources':
+                # 2. Format Sources for the accordion (shown while the answer generates)
+                source_display = format_sources(event['source_documents'])
+                yield "", chat_history, source_display
+            elif event['type'] == 'token':
+                answer += event['text']
+                chat_history[-1] = (message, answer.strip())
+                yield "", chat_history, source_display
+            elif event['type'] == 'done':
+                chat_history[-1] = (message, event['answer'])
+                yield "", chat_history, source_display
+    except SchedulerBusy:
+        chat_history[-1] = (message, "⏳ Too many questions are being answered right now. "
+                                     "The relevant complaints are in the Evidence section below — please ask again shortly.")
         yield "", chat_history, source_display
 
 with gr.Blocks(theme=THEME, title="CrediTrust AI - Complaint Analyst") as demo:
@@ -129,6 +164,8 @@ with gr.Blocks(theme=THEME, title="CrediTrust AI - Complaint Analyst") as demo:
     msg.submit(respond, [msg, chatbot, product_dropdown], [msg, chatbot, sources_output])
 
 if __name__ == "__main__":
+    # Let several analysts' questions run at once so the scheduler can batch them
+    demo.queue(default_concurrency_limit=MAX_CONCURRENT_ANSWERS)
     demo.launch(
         server_name="0.0.0.0", 
         server_port=7860,
@@ -0,0 +1,154 @@
+"""
+Chunking benchmark: the legacy character-window TextChunker vs SentenceChunker.
+
+    python -m benchmarks.chunking --narratives 200000 --workers 4 --output chunking.json
+
+Narratives are synthetic (sentences from the corpus vocabularies, with money
+amounts and CFPB-style XXXX masking, and a long-tailed length distribution).
+For each chunker it reports throughput and chunk quality: token counts against
+MiniLM's 256-token limit, the share of chunks over it (truncated at encode
+time) and under 64 tokens (undersized), and the share that start or end inside
+a word or end inside a sentence. Token counts use the chunker's estimate unless
+`--tokenizer` names a Hugging Face tokenizer.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from benchmarks.corpus import COMMON_WORDS, PRODUCTS
+from benchmarks.run import DEFAULT_OUTPUT_DIR, environment
+from src.chunking import MAX_MODEL_TOKENS, SentenceChunker, TextChunker, split_series_parallel
+
+UNDERSIZED_TOKENS = 64
+SENTENCE_ENDINGS = ('.', '!', '?', '"', "'", ')')
+
+
+def make_narratives(n: int, seed: int = 42) -> pd.Series:
+    """Lower-cased narratives of 1 to ~80 sentences, like the cleaned CFPB text."""
+    rng = np.random.default_rng(seed)
+    words = np.array(COMMON_WORDS + ' '.join(PRODUCTS.values()).split() + ['xxxx', 'xx/xx/xxxx'])
+    narratives = []
+    for n_sentences in np.minimum(rng.lognormal(2.2, 0.8, size=n).astype(int) + 1, 80):
+        sentences = []
+        for length in rng.integers(4, 30, size=n_sentences):
+            sentence = list(words[rng.integers(0, len(words), size=length)])
+            if rng.random() < 0.2:
+                sentence.insert(int(rng.integers(0, length)), f"${rng.integers(1, 5000)}.{rng.integers(0, 100):02d}")
+            sentences.append(' '.join(sentence) + rng.choice(['.', '.', '.', '!', '?']))
+        narratives.append(' '.join(sentences))
+    return pd.Series(narratives, dtype=object)
+
+
+def chunk_quality(texts: pd.Series, chunks: pd.DataFrame, counter: SentenceChunker) -> dict:
+    """Token and boundary statistics of `chunks` (with 'doc' and 'text' columns)."""
+    tokens = counter.count_tokens(chunks['text']) + 2  # [CLS] and [SEP]
+    sources = texts.tolist()
+    cut_word = cut_sentence = 0
+    vocab_cache = {}
+    for doc, text in zip(chunks['doc'].tolist(), chunks['text'].tolist()):
+        if doc not in vocab_cache:
+            vocab_cache = {doc: set(sources[doc].split())}
+        words = text.split()
+        cut_word += bool(words) and (words[0] not in vocab_cache[doc] or words[-1] not in vocab_cache[doc])
+        cut_sentence += not text.rstrip().endswith(SENTENCE_ENDINGS)
+    n = max(len(chunks), 1)
+    return {
+        'chunks': int(len(chunks)),
+        'chunks_per_narrative': len(chunks) / max(len(texts), 1),
+        'tokens_p50': float(np.percentile(tokens, 50)),
+        'tokens_p95': float(np.percentile(tokens, 95)),
+        'tokens_max': int(tokens.max()),
+        'over_limit_pct': 100 * float(np.mean(tokens > MAX_MODEL_TOKENS)),
+        'undersized_pct': 100 * float(np.mean(tokens < UNDERSIZED_TOKENS)),
+        'cut_mid_word_pct': 100 * cut_word / n,
+        'cut_mid_sentence_pct': 100 * cut_sentence / n,
+    }
+
+
+def legacy_chunks(chunker: TextChunker, texts: pd.Series) -> pd.DataFrame:
+    """The ingest pipeline's old path: `split_documents` over record dicts."""
+    records = [{'Complaint ID': str(i), 'text': text} for i, text in enumerate(texts)]
+    chunks = chunker.split_documents(records, text_key='text')
+    return pd.DataFrame({'doc': [int(c['Complaint ID']) for c in chunks], 'text': [c['text'] for c in chunks]})
+
+
+def timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(args) -> dict:
+    texts = make_narratives(args.narratives, args.seed)
+    counter = SentenceChunker(tokenizer=args.tokenizer)
+    chunker = SentenceChunker(chunk_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens,
+                              tokenizer=args.tokenizer)
+    report = {'meta': environment(), 'config': {
+        'narratives': args.narratives, 'seed': args.seed, 'workers': args.workers, 'tokenizer': args.tokenizer,
+        'chunk_tokens': args.chunk_tokens, 'overlap_tokens': args.overlap_tokens,
+        'legacy_chunk_size': args.chunk_size, 'legacy_chunk_overlap': args.chunk_overlap,
+    }}
+    results = report['results'] = {}
+
+    print(f"✂️ Chunking {len(texts):,} narratives ({texts.str.len().sum() / 2**20:.0f} MB)...")
+    chunks, seconds = timed(legacy_chunks, TextChunker(args.chunk_size, args.chunk_overlap), texts)
+    results['legacy'] = {'seconds_s': seconds, 'narratives_per_s': len(texts) / seconds,
+                         **chunk_quality(texts, chunks, counter)}
+
+    chunks, seconds = timed(chunker.split_series, texts)
+    results['sentences'] = {'seconds_s': seconds, 'narratives_per_s': len(texts) / seconds,
+                            **chunk_quality(texts, chunks, counter)}
+
+    if args.workers > 1:
+        parallel, seconds = timed(split_series_parallel, chunker, texts, args.workers)
+        if not parallel.equals(chunks):
+            raise AssertionError("Parallel chunking produced different chunks")
+        results['sentences_parallel'] = {'seconds_s': seconds, 'narratives_per_s': len(texts) / seconds,
+                                         'narratives_per_min': 60 * len(texts) / seconds}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--narratives', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=4, help="Processes for the parallel run (1 = skip it)")
+    parser.add_argument('--tokenizer', default=None, help="Hugging Face tokenizer for exact token counts")
+    parser.add_argument('--chunk-tokens', type=int, default=SentenceChunker().chunk_tokens)
+    parser.add_argument('--overlap-tokens', type=int, default=SentenceChunker().overlap_tokens)
+    parser.add_argument('--chunk-size', type=int, default=500, help="Legacy chunk size in characters")
+    parser.add_argument('--chunk-overlap', type=int, default=50, help="Legacy overlap in characters")
+    parser.add_argument('--output', help="JSON report path (default: benchmarks/results/<commit>-chunking.json)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    output = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / f"{report['meta']['commit']}-chunking.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    print(f"\n| Chunker | Narratives/s | Chunks | p95 tokens | > {MAX_MODEL_TOKENS} tokens | "
+          f"< {UNDERSIZED_TOKENS} tokens | Mid-word cuts | Mid-sentence cuts |")
+    print("| :--- | ---: | ---: | ---: | ---: | ---: | ---: | ---: |")
+    for name in ('legacy', 'sentences'):
+        r = report['results'][name]
+        print(f"| {name} | {r['narratives_per_s']:,.0f} | {r['chunks']:,} | {r['tokens_p95']:.0f} | "
+              f"{r['over_limit_pct']:.1f}% | {r['undersized_pct']:.1f}% | {r['cut_mid_word_pct']:.1f}% | "
+              f"{r['cut_mid_sentence_pct']:.1f}% |")
+    if 'sentences_parallel' in report['results']:
+        r = report['results']['sentences_parallel']
+        print(f"\n⚡ {args.workers} processes: {r['narratives_per_min']:,.0f} narratives/min")
+    print(f"💾 Report written to {output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare two `benchmarks.run` reports and flag regressions.
+
+    python -m benchmarks.compare base.json candidate.json --threshold 0.10
+
+Every numeric result present in both reports is listed with its relative change.
+A metric regresses when it moves in the wrong direction by more than
+`--threshold` (lower is better for `_ms` / `_s` / `_mb`, higher for `_qps` /
+`_per_s`; other numbers such as counts are shown but never flagged). Exits with
+status 1 when anything regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+LOWER_IS_BETTER = ('_ms', '_s', '_mb')
+HIGHER_IS_BETTER = ('_qps', '_per_s')
+
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    """{'single': {'p50_ms': 1.0}} -> {'single.p50_ms': 1.0}, numbers only."""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def direction(metric: str) -> int:
+    """+1 when an increase is a regression, -1 when a decrease is, 0 when neither."""
+    leaf = metric.rsplit('.', 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return -1
+    if leaf.endswith(LOWER_IS_BETTER):
+        return 1
+    return 0
+
+
+def compare(base: dict, candidate: dict, threshold: float = 0.10) -> list:
+    """
+    Rows of (metric, base value, candidate value, relative change, regressed) for
+    every metric in both reports' 'results'.
+    """
+    old, new = flatten(base['results']), flatten(candidate['results'])
+    rows = []
+    for metric in sorted(old.keys() & new.keys()):
+        change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+        regressed = direction(metric) * change > threshold
+        rows.append((metric, old[metric], new[metric], change, regressed))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', type=Path)
+    parser.add_argument('candidate', type=Path)
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    base, candidate = (json.loads(path.read_text()) for path in (args.base, args.candidate))
+    if base['config'] != candidate['config']:
+        print(f"⚠️ Configs differ: {base['config']} vs {candidate['config']}")
+    print(f"{base['meta']['commit']} -> {candidate['meta']['commit']}")
+
+    rows = compare(base, candidate, args.threshold)
+    width = max((len(r[0]) for r in rows), default=0)
+    for metric, old, new, change, regressed in rows:
+        flag = "  ❌ REGRESSION" if regressed else ""
+        print(f"{metric:<{width}}  {old:>12.3f}  {new:>12.3f}  {change:>+8.1%}{flag}")
+
+    regressions = [r[0] for r in rows if r[4]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ No regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
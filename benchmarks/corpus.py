@@ -0,0 +1,204 @@
+"""
+Synthetic complaint corpus for benchmarks.
+
+Everything is generated offline from a seed: chunk texts drawn from per-product
+vocabularies, CFPB-style metadata (product, company, state, date) and
+embeddings from `HashingEncoder`, a deterministic stand-in for the MiniLM
+encoder that needs no model download. Queries encoded with the same encoder
+land near the chunks that share their words, so searches behave like real ones
+without any network access.
+"""
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+DIMENSION = 384  # all-MiniLM-L6-v2
+WORDS_PER_CHUNK = 48
+CORPUS_VERSION = 1
+
+PRODUCTS = {
+    'Credit card': 'card charge statement interest apr limit fee late dispute merchant reward balance annual',
+    'Mortgage': 'mortgage escrow servicer foreclosure modification payment principal appraisal closing refinance',
+    'Debt collection': 'collector debt calls harassment validation owe agency lawsuit garnishment letter',
+    'Checking or savings account': 'checking savings account overdraft deposit withdrawal branch closed hold',
+    'Student loan': 'student loan servicer forbearance deferment repayment income forgiveness navient',
+    'Vehicle loan or lease': 'vehicle car auto lease repossession dealer title payoff insurance',
+    'Money transfer, virtual currency, or money service': 'transfer wire zelle paypal crypto sent recipient',
+    'Credit reporting': 'credit report bureau equifax experian transunion inaccurate score inquiry identity',
+}
+# Product mix of the real dataset, roughly: a few large products and a long tail
+PRODUCT_WEIGHTS = [0.14, 0.10, 0.14, 0.08, 0.04, 0.03, 0.04, 0.43]
+COMMON_WORDS = ('i my the bank they told me called account payment received never months after times '
+                'customer service company refused requested again still charged informed email phone '
+                'week days report number paid asked problem help').split()
+COMPANIES = ['Bank A', 'Bank B', 'Lender C', 'Servicer D', 'Collector E', 'Bureau F', 'Fintech G', 'Credit Union H']
+STATES = ['CA', 'TX', 'FL', 'NY', 'GA', 'IL', 'PA', 'NC', 'OH', 'NJ', 'VA', 'MI', 'WA', 'AZ', 'MA', 'WY']
+DATE_RANGE = ('2015-01-01', '2024-12-31')
+
+_WORD = re.compile(r"\w+")
+
+
+def vocabulary() -> list:
+    words = list(COMMON_WORDS)
+    for topic in PRODUCTS.values():
+        words.extend(w for w in topic.split() if w not in words)
+    return words
+
+
+class HashingEncoder:
+    """
+    Deterministic bag-of-words encoder with the SentenceTransformer `encode` API.
+
+    Each word maps to a fixed pseudo-random unit vector (seeded by its hash); a
+    text is the normalized mean of its words' vectors.
+    """
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self._vectors = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def word_vector(self, word: str) -> np.ndarray:
+        vector = self._vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype('float32')
+            vector /= np.linalg.norm(vector)
+            self._vectors[word] = vector
+        return vector
+
+    def word_matrix(self, words: list) -> np.ndarray:
+        return np.stack([self.word_vector(w) for w in words])
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        out = np.zeros((len(texts), self.dimension), dtype='float32')
+        for i, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            if words:
+                out[i] = self.word_matrix(words).mean(axis=0)
+        return _normalize(out)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class SyntheticCorpus:
+    """Generates chunk batches (texts, metadata, embeddings) reproducibly from `seed`."""
+    def __init__(self, n_chunks: int, seed: int = 42, encoder: HashingEncoder = None):
+        self.n_chunks = n_chunks
+        self.seed = seed
+        self.encoder = encoder or HashingEncoder()
+        self.words = np.array(vocabulary())
+        self.word_vectors = self.encoder.word_matrix(list(self.words))
+        index = {w: i for i, w in enumerate(self.words)}
+        self.products = list(PRODUCTS)
+        self.common_ids = np.array([index[w] for w in COMMON_WORDS])
+        self.topic_ids = [np.array([index[w] for w in PRODUCTS[p].split()]) for p in self.products]
+        start, end = (np.datetime64(d) for d in DATE_RANGE)
+        self.first_day, self.n_days = start, int((end - start).astype(int)) + 1
+
+    def batches(self, batch_size: int = 50000):
+        """Yield (embeddings, columns) for consecutive slices of the corpus."""
+        for start in range(0, self.n_chunks, batch_size):
+            yield self.batch(start, min(batch_size, self.n_chunks - start))
+
+    def batch(self, start: int, size: int):
+        # Each slice has its own stream, so any slice can be regenerated on its own
+        rng = np.random.default_rng([self.seed, start])
+        product = rng.choice(len(self.products), size=size, p=PRODUCT_WEIGHTS)
+
+        # Half the words come from the product's topic vocabulary, half are common words
+        word_ids = self.common_ids[rng.integers(0, len(self.common_ids), size=(size, WORDS_PER_CHUNK))]
+        topical = rng.random((size, WORDS_PER_CHUNK)) < 0.5
+        for p, ids in enumerate(self.topic_ids):
+            rows = product == p
+            mask = topical & rows[:, None]
+            word_ids[mask] = ids[rng.integers(0, len(ids), size=int(mask.sum()))]
+
+        embeddings = np.zeros((size, self.encoder.dimension), dtype='float32')
+        for j in range(WORDS_PER_CHUNK):
+            embeddings += self.word_vectors[word_ids[:, j]]
+        embeddings = _normalize(embeddings)
+
+        # Complaints are split into 1-4 chunks; chunk ids follow TextChunker's '<complaint id>_<i>'
+        complaint = (start + np.arange(size)) // 3
+        part = (start + np.arange(size)) % 3
+        days = rng.integers(0, self.n_days, size=size)
+        columns = {
+            'chunk_id': [f'{c}_{i}' for c, i in zip(complaint, part)],
+            'text': [' '.join(row) for row in self.words[word_ids]],
+            'product': [self.products[p] for p in product],
+            'company': [COMPANIES[c] for c in rng.integers(0, len(COMPANIES), size=size)],
+            'state': [STATES[s] for s in rng.integers(0, len(STATES), size=size)],
+            'date': [str(self.first_day + int(d)) for d in days],
+        }
+        return embeddings, columns
+
+    def queries(self, n: int, seed: int = 7) -> list:
+        """Analyst-style questions built from the same vocabularies."""
+        rng = np.random.default_rng(seed)
+        questions = []
+        for i in range(n):
+            p = int(rng.choice(len(self.products), p=PRODUCT_WEIGHTS))
+            topic = self.words[self.topic_ids[p][rng.integers(0, len(self.topic_ids[p]), size=3)]]
+            questions.append(f"why did the {topic[0]} {topic[1]} {topic[2]} problem happen {i}")
+        return questions
+
+
+def build_vector_store(store_dir: Path, n_chunks: int, index_type: str = 'flat', seed: int = 42,
+                       batch_size: int = 50000, lexical: bool = False, **index_kwargs) -> dict:
+    """
+    Write a synthetic `medium_*` vector store that ComplaintRetriever can open.
+
+    Reuses an existing store built with the same parameters (see `manifest.json`).
+    Returns timings: 'generate_s' (texts + embeddings), 'index_s' (FAISS + metadata
+    writes), 'lexical_s' when a BM25 index is built, and 'reused'.
+    """
+    from src.rag.index_builder import IndexBuilder
+    from src.rag.lexical import build_lexical_index
+    from src.rag.metadata_store import load_metadata
+
+    store_dir = Path(store_dir)
+    manifest_path = store_dir / 'manifest.json'
+    params = {'version': CORPUS_VERSION, 'n_chunks': n_chunks, 'index_type': index_type, 'seed': seed,
+              'lexical': lexical, 'index_kwargs': index_kwargs}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest['params'] == params:
+            return dict(manifest['timings'], reused=True)
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    corpus = SyntheticCorpus(n_chunks, seed)
+    builder = IndexBuilder(store_dir / 'medium_faiss_index.index', store_dir / 'medium_metadata_store',
+                           DIMENSION, index_type=index_type, **index_kwargs)
+    timings = {'generate_s': 0.0, 'index_s': 0.0}
+    batches = corpus.batches(batch_size)
+    while True:
+        start = time.perf_counter()
+        batch = next(batches, None)
+        timings['generate_s'] += time.perf_counter() - start
+        if batch is None:
+            break
+        start = time.perf_counter()
+        builder.add_batch(batch[0], **batch[1])
+        timings['index_s'] += time.perf_counter() - start
+    start = time.perf_counter()
+    builder.close()
+    timings['index_s'] += time.perf_counter() - start
+
+    if lexical:
+        start = time.perf_counter()
+        build_lexical_index(load_metadata(store_dir / 'medium_metadata_store'), store_dir / 'medium_lexical_index')
+        timings['lexical_s'] = time.perf_counter() - start
+
+    manifest_path.write_text(json.dumps({'params': params, 'timings': timings}, indent=2))
+    return dict(timings, reused=False)
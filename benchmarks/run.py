@@ -0,0 +1,253 @@
+"""
+Retrieval and pipeline benchmarks over a synthetic complaint corpus.
+
+    python -m benchmarks.run --chunks 100000 --index-type hnsw --output results/hnsw-100k.json
+    python -m benchmarks.compare results/base.json results/hnsw-100k.json
+
+Builds (or reuses) an offline corpus of `--chunks` chunks, then measures index
+build time, startup time, resident memory, single and batched query latency,
+filtered-query latency and end-to-end answer latency with a stub generator.
+Everything is written to one JSON file; keys ending in `_ms`, `_s` and `_mb`
+are lower-is-better and keys ending in `_qps` / `_per_s` higher-is-better,
+which is what `benchmarks.compare` relies on.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from benchmarks.corpus import HashingEncoder, SyntheticCorpus, build_vector_store
+from src.rag.telemetry import configure_logging
+
+DEFAULT_WORK_DIR = ROOT / 'benchmarks' / '.corpus'
+DEFAULT_OUTPUT_DIR = ROOT / 'benchmarks' / 'results'
+BATCH_SIZES = [8, 64]
+TOP_K = 5
+WARMUP_QUERIES = 5
+
+# Filters from very selective to barely selective; the corpus' product mix makes
+# 'Vehicle loan or lease' ~3% of chunks and 'Credit reporting' ~43%
+FILTER_SCENARIOS = {
+    'rare_product': {'product': 'Vehicle loan or lease'},
+    'common_product': {'product': 'Credit reporting'},
+    'state': {'state': 'WY'},
+    'date_range': {'date_from': '2020-01-01', 'date_to': '2020-01-31'},
+    'combined': {'product': 'Credit reporting', 'state': ['CA', 'TX'], 'date_from': '2022-01-01'},
+}
+
+
+class StubGenerator:
+    """Replaces the LLM so answer latency measures everything except generation."""
+    ANSWER = "Customers mostly complain about fees and unresolved disputes."
+
+    def load(self):
+        pass
+
+    def generate_answer(self, query, context_chunks):
+        return self.ANSWER
+
+    def generate_stream(self, query, context_chunks):
+        for word in self.ANSWER.split():
+            yield word + " "
+
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        import resource
+
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def latency_summary(seconds: list) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {
+        'n': int(ms.size),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def time_calls(fn, inputs: list) -> list:
+    """Seconds taken by `fn(x)` for each input, after a short warm-up."""
+    for x in inputs[:WARMUP_QUERIES]:
+        fn(x)
+    seconds = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def environment() -> dict:
+    import faiss
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'faiss': getattr(faiss, '__version__', 'unknown'),
+    }
+
+
+def build(store_dir: Path, args) -> dict:
+    """Build the store in a child process, so its memory doesn't count towards the startup RSS."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        timings = pool.submit(build_vector_store, store_dir, args.chunks, index_type=args.index_type,
+                              seed=args.seed, lexical=args.lexical).result()
+    timings['chunks_per_s'] = args.chunks / max(timings['generate_s'] + timings['index_s'], 1e-9)
+    return timings
+
+
+def startup(store_dir: Path) -> tuple:
+    """Open the retriever the way the pipeline does; the encoder is swapped for HashingEncoder."""
+    from src.rag.retriever import ComplaintRetriever
+
+    rss_before = resident_memory_mb()
+    start = time.perf_counter()
+    # Caching off: every timed query below must reach the index
+    retriever = ComplaintRetriever(store_dir, cache_size=0, defer_loading=True)
+    retriever.model = HashingEncoder()
+    stages = {}
+    for name, load in [('index', retriever.load_index), ('metadata', retriever.load_metadata)]:
+        stage_start = time.perf_counter()
+        load()
+        stages[f'{name}_s'] = time.perf_counter() - stage_start
+    rss = resident_memory_mb()
+    return retriever, dict(stages, total_s=time.perf_counter() - start, rss_mb=rss,
+                           rss_delta_mb=rss - rss_before)
+
+
+def single_queries(retriever, queries: list, filters: dict = None, mode: str = 'dense') -> dict:
+    return latency_summary(time_calls(
+        lambda q: retriever.search(q, top_k=TOP_K, filters=filters, mode=mode), queries))
+
+
+def batched_queries(retriever, queries: list) -> dict:
+    results = {}
+    for batch_size in BATCH_SIZES:
+        batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+        seconds = time_calls(lambda b: retriever.search_batch(b, top_k=TOP_K), batches)
+        summary = latency_summary(seconds)
+        summary['queries_qps'] = sum(len(b) for b in batches) / sum(seconds)
+        results[f'batch_{batch_size}'] = summary
+    return results
+
+
+def filtered_queries(retriever, queries: list) -> dict:
+    results = {}
+    for name, filters in FILTER_SCENARIOS.items():
+        summary = single_queries(retriever, queries, filters=filters)
+        summary['matching_chunks'] = retriever.filter_index.select(filters).count
+        results[name] = summary
+    return results
+
+
+def end_to_end(retriever, store_dir: Path, queries: list) -> dict:
+    """`RAGPipeline.query` (retrieval, context building, stub answer) per question."""
+    from src.rag.pipeline import RAGPipeline
+
+    rag = RAGPipeline(store_dir, background_load=False, retriever=retriever, generator=StubGenerator())
+    stage_seconds = {}
+
+    def ask(question):
+        for stage, seconds in rag.query(question)['timings'].items():
+            stage_seconds.setdefault(stage, []).append(seconds)
+
+    summary = latency_summary(time_calls(ask, queries))
+    summary['stages_mean_ms'] = {stage: float(np.mean(s) * 1000) for stage, s in stage_seconds.items()
+                                 if isinstance(s[0], float)}
+    return summary
+
+
+def run(args) -> dict:
+    store_dir = Path(args.work_dir) / f'{args.index_type}-{args.chunks}-{args.seed}'
+    report = {'meta': environment(), 'config': {
+        'chunks': args.chunks, 'index_type': args.index_type, 'queries': args.queries, 'seed': args.seed,
+        'lexical': args.lexical, 'top_k': TOP_K, 'batch_sizes': BATCH_SIZES,
+    }}
+    results = report['results'] = {}
+
+    print(f"🏗️ Building {args.chunks:,}-chunk {args.index_type} corpus in {store_dir}...")
+    results['build'] = build(store_dir, args)
+    print("🚀 Opening the retriever...")
+    retriever, results['startup'] = startup(store_dir)
+
+    queries = SyntheticCorpus(args.chunks, args.seed).queries(args.queries)
+    print(f"🔍 Timing {len(queries)} queries...")
+    results['single'] = single_queries(retriever, queries)
+    if args.lexical:
+        results['single_hybrid'] = single_queries(retriever, queries, mode='hybrid')
+    results['batched'] = batched_queries(retriever, queries)
+    results['filtered'] = filtered_queries(retriever, queries)
+    results['end_to_end'] = end_to_end(retriever, store_dir, queries)
+    results['memory'] = {'rss_mb': resident_memory_mb()}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=100000, help="Corpus size (e.g. 10000 to 2000000)")
+    parser.add_argument('--index-type', default='flat', choices=['flat', 'ivf', 'hnsw'])
+    parser.add_argument('--queries', type=int, default=200, help="Queries timed per measurement")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--lexical', action='store_true', help="Also build BM25 and time hybrid search")
+    parser.add_argument('--work-dir', default=str(DEFAULT_WORK_DIR), help="Where corpora are built and reused")
+    parser.add_argument('--log-level', default='WARNING', help="Level for the pipeline's own logs")
+    parser.add_argument('--output', help="JSON report path (default: benchmarks/results/<commit>-<index>-<chunks>.json)")
+    args = parser.parse_args(argv)
+
+    # Per-query log lines would otherwise dominate (and slow down) the timed loops
+    configure_logging(args.log_level)
+    report = run(args)
+    output = Path(args.output) if args.output else (
+        DEFAULT_OUTPUT_DIR / f"{report['meta']['commit']}-{args.index_type}-{args.chunks}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    results = report['results']
+    print(f"\n📊 {args.chunks:,} chunks, {args.index_type}: built in "
+          f"{results['build']['generate_s'] + results['build']['index_s']:.1f}s, "
+          f"startup {results['startup']['total_s']:.2f}s, RSS {results['memory']['rss_mb']:.0f} MB")
+    for name in ('single', 'end_to_end'):
+        s = results[name]
+        print(f"   {name:>12}: p50 {s['p50_ms']:.2f} ms | p95 {s['p95_ms']:.2f} ms | p99 {s['p99_ms']:.2f} ms")
+    for name, s in results['filtered'].items():
+        print(f"   {name:>12}: p50 {s['p50_ms']:.2f} ms | p95 {s['p95_ms']:.2f} ms ({s['matching_chunks']:,} match)")
+    print(f"💾 Report written to {output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.index_factory import build_index, search_parameters, train_index
+
+# Config
+VECTOR_STORE_DIR = Path("vector_store")
+DEFAULT_OUTPUT = VECTOR_STORE_DIR / "ann_report.json"
+
+# (label, index_type, build kwargs, search-time sweep)
+CANDIDATES = [
+    ('IVF-Flat', 'ivf_flat', {}, {'nprobe': [4, 16, 64]}),
+    ('IVF-PQ', 'ivf_pq', {}, {'nprobe': [4, 16, 64]}),
+    ('HNSW', 'hnsw', {}, {'ef_search': [16, 64, 256]}),
+]
+
+
+def load_vectors(index_path: Path, max_vectors: int = None, seed: int = 42) -> np.ndarray:
+    """Read the raw vectors back out of an exact (flat) index."""
+    print(f"📂 Loading vectors from {index_path}...")
+    index = faiss.read_index(str(index_path))
+    if not isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        raise ValueError(f"{index_path} is not a flat index; the report needs the exact vectors")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    if max_vectors and len(vectors) > max_vectors:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[np.sort(rng.choice(len(vectors), size=max_vectors, replace=False))]
+    return np.ascontiguousarray(vectors, dtype='float32')
+
+
+def split_holdout(vectors: np.ndarray, n_queries: int, seed: int = 42):
+    """Hold out `n_queries` vectors as queries so they are never in the indexed corpus."""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[rng.choice(len(vectors), size=n_queries, replace=False)] = True
+    return vectors[~mask], vectors[mask]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """Mean fraction of the exact top-k neighbours present in the approximate top-k."""
+    hits = [len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth)]
+    return float(np.mean(hits) / k)
+
+
+def time_queries(index, queries: np.ndarray, k: int, params=None):
+    """Run queries one at a time (as the retriever does) and return (ids, latencies in ms)."""
+    ids = np.empty((len(queries), k), dtype='int64')
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k, params=params)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        ids[i] = found[0]
+    return ids, latencies
+
+
+def latency_summary(latencies: np.ndarray) -> dict:
+    return {
+        'mean_ms': float(np.mean(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+    }
+
+
+def run_report(corpus: np.ndarray, queries: np.ndarray, k: int, nlist: int, train_size: int) -> list:
+    dimension = corpus.shape[1]
+    rows = []
+
+    print(f"📏 Building exact baseline over {len(corpus):,} vectors...")
+    start = time.perf_counter()
+    flat = build_index('flat', dimension)
+    flat.add(corpus)
+    build_s = time.perf_counter() - start
+    truth, latencies = time_queries(flat, queries, k)
+    rows.append({
+        'index': 'Flat', 'params': {}, 'recall_at_k': 1.0,
+        'build_s': build_s, 'size_mb': len(faiss.serialize_index(flat)) / 1024 ** 2,
+        **latency_summary(latencies),
+    })
+
+    rng = np.random.default_rng(0)
+    train_ids = np.sort(rng.choice(len(corpus), size=min(train_size, len(corpus)), replace=False))
+    for label, index_type, build_kwargs, sweep in CANDIDATES:
+        print(f"🗄️ Building {label}...")
+        start = time.perf_counter()
+        index = build_index(index_type, dimension, nlist=nlist, **build_kwargs)
+        train_index(index, corpus[train_ids])
+        index.add(corpus)
+        build_s = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 1024 ** 2
+
+        (param_name, values), = sweep.items()
+        for value in values:
+            params = search_parameters(index, **{param_name: value})
+            found, latencies = time_queries(index, queries, k, params)
+            rows.append({
+                'index': label, 'params': {param_name: value},
+                'recall_at_k': recall_at_k(found, truth, k),
+                'build_s': build_s, 'size_mb': size_mb,
+                **latency_summary(latencies),
+            })
+    return rows
+
+
+def print_table(rows: list, k: int):
+    print(f"\n| Index | Params | Recall@{k} | p50 ms | p95 ms | Size MB | Build s |")
+    print("| :--- | :--- | ---: | ---: | ---: | ---: | ---: |")
+    for r in rows:
+        params = ", ".join(f"{name}={value}" for name, value in r['params'].items()) or "-"
+        print(f"| {r['index']} | {params} | {r['recall_at_k']:.3f} | {r['p50_ms']:.2f} | "
+              f"{r['p95_ms']:.2f} | {r['size_mb']:.1f} | {r['build_s']:.1f} |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency report for ANN index options.")
+    parser.add_argument('--index', type=Path, default=VECTOR_STORE_DIR / 'full_faiss_index.index',
+                        help="Flat index holding the exact vectors")
+    parser.add_argument('--max-vectors', type=int, default=None, help="Subsample the corpus for a quicker run")
+    parser.add_argument('--queries', type=int, default=1000, help="Held-out query vectors")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=4096)
+    parser.add_argument('--train-size', type=int, default=200000)
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index, args.max_vectors)
+    corpus, queries = split_holdout(vectors, args.queries)
+    rows = run_report(corpus, queries, args.k, args.nlist, args.train_size)
+    print_table(rows, args.k)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'corpus_size': len(corpus), 'queries': len(queries), 'k': args.k, 'results': rows}, f, indent=2)
+    print(f"\n💾 Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
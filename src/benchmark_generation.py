@@ -0,0 +1,100 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.local_generator import GENERATOR_BACKENDS, LocalComplaintGenerator
+
+# Config
+VECTOR_STORE_DIR = Path("vector_store")
+DEFAULT_OUTPUT = VECTOR_STORE_DIR / "generation_report.json"
+DEFAULT_MODEL = "Qwen/Qwen2.5-0.5B-Instruct"
+
+# A fixed, realistic-sized context so every backend sees the same prompt
+QUESTIONS = [
+    "Why are people unhappy with Credit Cards?",
+    "Common issues with mortgage foreclosures?",
+    "What are the complaints about debt collection?",
+]
+CONTEXT = [
+    {'text': "I was charged a late fee even though my payment was made two days before the due date. "
+             "The bank refused to refund it and said the payment posted late."},
+    {'text': "My credit card was used for unauthorized purchases overseas. I reported it immediately "
+             "but the dispute was closed without explanation and the charges remain on my account."},
+    {'text': "The servicer increased my monthly mortgage payment because of an escrow shortage "
+             "that was never explained. I asked for an escrow analysis several times."},
+    {'text': "A debt collector keeps calling me at work about a debt I do not owe. I sent a written "
+             "dispute letter and they never validated the debt."},
+    {'text': "My interest rate was raised without notice after one late payment, "
+             "and customer service could not tell me when it would be lowered again."},
+]
+
+
+def benchmark_backend(model_id: str, backend: str, runs: int, max_new_tokens: int,
+                      num_threads: int = None, prefix_cache: bool = True) -> dict:
+    """Load one backend and time `runs` greedy answers; the first (warm-up) answer is not counted."""
+    start = time.perf_counter()
+    generator = LocalComplaintGenerator(
+        model_id, backend=backend, num_threads=num_threads, prefix_cache=prefix_cache,
+        generation_kwargs=dict(do_sample=False, max_new_tokens=max_new_tokens,
+                               temperature=None, top_k=None, top_p=None))
+    load_seconds = time.perf_counter() - start
+
+    generator.generate_answer(QUESTIONS[0], CONTEXT)
+    stats = []
+    for i in range(runs):
+        generator.generate_answer(QUESTIONS[i % len(QUESTIONS)], CONTEXT)
+        stats.append(generator.last_stats)
+
+    ttft = np.array([s['ttft_s'] for s in stats if s['ttft_s'] is not None])
+    return {
+        'backend': backend,
+        'prefix_cache': prefix_cache,
+        'threads': num_threads,
+        'load_s': load_seconds,
+        'prompt_tokens': stats[0]['prompt_tokens'],
+        'ttft_mean_s': float(ttft.mean()) if len(ttft) else None,
+        'ttft_p50_s': float(np.percentile(ttft, 50)) if len(ttft) else None,
+        'tokens_per_s': sum(s['new_tokens'] for s in stats) / sum(s['total_s'] for s in stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time-to-first-token and tokens/sec of the local generator backends.")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--backends', nargs='+', choices=GENERATOR_BACKENDS, default=['fp32', 'int8', 'int4'])
+    parser.add_argument('--threads', type=int, default=None, help="torch threads (default: torch's choice)")
+    parser.add_argument('--runs', type=int, default=5, help="Timed answers per backend")
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--no-prefix-cache', action='store_true', help="Prefill the whole prompt every time")
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    rows = [benchmark_backend(args.model, backend, args.runs, args.max_new_tokens,
+                              args.threads, not args.no_prefix_cache)
+            for backend in args.backends]
+
+    print(f"\n⏱️ Generation over {args.runs} answers of up to {args.max_new_tokens} tokens")
+    print("| Backend | Prefix cache | Load (s) | TTFT mean (s) | TTFT p50 (s) | Tokens/sec |")
+    print("| --- | --- | ---: | ---: | ---: | ---: |")
+    for row in rows:
+        ttft_mean = f"{row['ttft_mean_s']:.3f}" if row['ttft_mean_s'] is not None else "-"
+        ttft_p50 = f"{row['ttft_p50_s']:.3f}" if row['ttft_p50_s'] is not None else "-"
+        print(f"| {row['backend']} | {row['prefix_cache']} | {row['load_s']:.1f} | {ttft_mean} | "
+              f"{ttft_p50} | {row['tokens_per_s']:.1f} |")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'model': args.model, 'runs': args.runs, 'max_new_tokens': args.max_new_tokens,
+                   'results': rows}, f, indent=2)
+    print(f"\n💾 Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.retriever import ComplaintRetriever
+
+# Config
+VECTOR_STORE_DIR = Path("vector_store")
+BATCH_SIZES = [1, 8, 64]
+
+# Dashboard example questions plus the kind of close variants analysts type
+BASE_QUERIES = [
+    "Why are people unhappy with Credit Cards?",
+    "Common issues with mortgage foreclosures?",
+    "What are the complaints about debt collection?",
+    "Issues with opening savings accounts?",
+    "Unauthorized charges on my credit card",
+    "Escrow shortage increased my mortgage payment",
+    "Debt collector keeps calling about a debt I don't owe",
+    "Bank closed my checking account without notice",
+]
+
+
+def make_queries(n: int) -> list:
+    """Cycle the base questions with a numeric suffix so every query is distinct."""
+    return [f"{BASE_QUERIES[i % len(BASE_QUERIES)]} ({i})" for i in range(n)]
+
+
+def measure(retriever, queries: list, batch_size: int, top_k: int, product_filter: str = None) -> float:
+    """Return queries/sec answering `queries` in chunks of `batch_size`."""
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        chunk = queries[i:i + batch_size]
+        if batch_size == 1:
+            retriever.search(chunk[0], top_k=top_k, product_filter=product_filter)
+        else:
+            retriever.search_batch(chunk, top_k=top_k, product_filter=product_filter)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retriever throughput at different batch sizes.")
+    parser.add_argument('--vector-store', type=Path, default=VECTOR_STORE_DIR)
+    parser.add_argument('--queries', type=int, default=256, help="Queries per measurement")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--product-filter', default=None)
+    parser.add_argument('--sharded', action='store_true',
+                        help="Search the split index with one worker process per shard (see src/rag/sharding.py)")
+    args = parser.parse_args()
+
+    retriever = ComplaintRetriever(args.vector_store, sharded=args.sharded)
+    queries = make_queries(args.queries)
+
+    # Warm up the encoder and page in the index before timing
+    retriever.search_batch(queries[:8], top_k=args.top_k)
+
+    print(f"\n⏱️ Throughput over {len(queries)} queries (top_k={args.top_k}, filter={args.product_filter})")
+    print("| Batch size | Queries/sec | Speed-up |")
+    print("| ---: | ---: | ---: |")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        qps = measure(retriever, queries, batch_size, args.top_k, args.product_filter)
+        baseline = baseline or qps
+        print(f"| {batch_size} | {qps:.1f} | {qps / baseline:.1f}x |")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,27 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Any
 
+import numpy as np
+import pandas as pd
+
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces, [CLS] and [SEP] included
+MAX_MODEL_TOKENS = 256
+DEFAULT_CHUNK_TOKENS = 200
+DEFAULT_OVERLAP_TOKENS = 32
+
+# Sentence ends: terminal punctuation (optionally closed by a quote or bracket)
+# followed by whitespace, and line breaks. "$1,234.56" or "x.com" have no space
+# after the dot, so they aren't split. Boundaries are marked with SENTENCE_MARK
+# by a regex replace and then split on as a plain string, which lets pandas' Arrow
+# string kernels do the whole batch without a Python call per narrative.
+SENTENCE_END = r"""([.!?]["')\]]?)\s+|\s*\n\s*"""
+SENTENCE_MARK = '\x00'
+# Cheap stand-in for WordPiece: words in pieces of up to 8 letters, numbers in
+# groups of 3 digits, and every punctuation mark, each counted as one token
+TOKEN_ESTIMATE = r"[^\W\d_]{1,8}|\d{1,3}|[^\w\s]|_"
+
+
 class TextChunker:
     """
     A class to handle splitting text into smaller chunks for RAG pipelines.
@@ -76,3 +98,214 @@ class TextChunker:
                 chunked_docs.append(chunk_doc)
                 
         return chunked_docs
+
+
+@lru_cache(maxsize=4)
+def load_tokenizer(name: str):
+    """Load a Hugging Face tokenizer once per process."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(name)
+
+
+class SentenceChunker:
+    """
+    Splits narratives into chunks of whole sentences with a target token count.
+
+    Unlike TextChunker's fixed character windows, chunks never cut through a word
+    or (unless one sentence alone is over the limit) a sentence, and their size is
+    measured in the encoder's tokens, so a chunk is neither truncated at encode time
+    nor needlessly short. Neighbouring chunks share whole trailing sentences of up
+    to `overlap_tokens` tokens.
+
+    Work is done a pandas Series at a time: sentence boundaries are found with one
+    vectorized regex replace and split over the batch and token counts with one
+    vectorized count (or one batched tokenizer call); only the greedy packing of
+    sentence lengths into chunks is a plain loop over integers.
+    """
+    def __init__(self, chunk_tokens: int = DEFAULT_CHUNK_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                 tokenizer=None):
+        """
+        Initialize the SentenceChunker.
+
+        Args:
+            chunk_tokens (int): Maximum tokens per chunk. The default leaves head-room
+                under MiniLM's 256 for the special tokens and for estimation error.
+            overlap_tokens (int): Maximum tokens of trailing sentences repeated at the
+                start of the next chunk (0 = no overlap).
+            tokenizer: None to estimate token counts with TOKEN_ESTIMATE, a Hugging
+                Face tokenizer, or the name of one to load (e.g.
+                'sentence-transformers/all-MiniLM-L6-v2') for exact counts.
+        """
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than chunk_tokens ({chunk_tokens})")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        # A name is only resolved when counting, so pickling the chunker to worker
+        # processes stays cheap and each process loads the tokenizer once
+        self.tokenizer = tokenizer
+
+    def count_tokens(self, texts: pd.Series) -> np.ndarray:
+        """Tokens in each text (no special tokens)."""
+        if self.tokenizer is None:
+            return texts.str.count(TOKEN_ESTIMATE).to_numpy(dtype='int64')
+        tokenizer = load_tokenizer(self.tokenizer) if isinstance(self.tokenizer, str) else self.tokenizer
+        ids = tokenizer(texts.tolist(), add_special_tokens=False)['input_ids']
+        return np.fromiter((len(x) for x in ids), dtype='int64', count=len(ids))
+
+    def _split_long(self, sentence: str) -> List[str]:
+        """Cut a sentence over the limit at word boundaries."""
+        words = sentence.split()
+        counts = self.count_tokens(pd.Series(words, dtype=object)) if words else []
+        pieces, piece, piece_tokens = [], [], 0
+        for word, n in zip(words, counts):
+            if piece and piece_tokens + n > self.chunk_tokens:
+                pieces.append(' '.join(piece))
+                piece, piece_tokens = [], 0
+            piece.append(word)
+            piece_tokens += n
+        if piece:
+            pieces.append(' '.join(piece))
+        return pieces
+
+    def split_series(self, texts: pd.Series) -> pd.DataFrame:
+        """
+        Chunk a batch of texts.
+
+        Args:
+            texts (pd.Series): Narratives (missing values count as empty).
+
+        Returns:
+            pd.DataFrame: One row per chunk, in order, with 'doc' (position of its
+            text in `texts`), 'chunk_index', 'text' and 'tokens'.
+        """
+        texts = pd.Series(texts, dtype=object).fillna('').astype('str').reset_index(drop=True)
+        marked = texts.str.replace(SENTENCE_END, r'\1' + SENTENCE_MARK, regex=True)
+        sentences = marked.str.split(SENTENCE_MARK).explode().str.strip()
+        sentences = sentences[sentences.str.len() > 0]
+        tokens = self.count_tokens(sentences)
+
+        docs = sentences.index.to_numpy()
+        sentences = sentences.to_numpy()
+        long_rows = np.flatnonzero(tokens > self.chunk_tokens)
+        if len(long_rows):
+            docs, sentences, tokens = self._expand_long(docs, sentences, tokens, long_rows)
+        return self._pack(docs.tolist(), sentences, tokens.tolist())
+
+    def _expand_long(self, docs, sentences, tokens, long_rows):
+        """Replace each over-long sentence by its word-boundary pieces."""
+        pieces = {row: self._split_long(sentences[row]) for row in long_rows}
+        repeats = np.ones(len(sentences), dtype='int64')
+        for row, parts in pieces.items():
+            repeats[row] = len(parts)
+        new_docs = np.repeat(docs, repeats)
+        new_sentences = np.repeat(sentences, repeats)
+        new_tokens = np.repeat(tokens, repeats)
+        starts = np.cumsum(repeats) - repeats
+        for row, parts in pieces.items():
+            span = slice(starts[row], starts[row] + len(parts))
+            new_sentences[span] = parts
+            new_tokens[span] = self.count_tokens(pd.Series(parts, dtype=object))
+        return new_docs, new_sentences, new_tokens
+
+    def _pack(self, docs: list, sentences, tokens: list) -> pd.DataFrame:
+        """Greedily fill chunks with consecutive sentences of the same doc."""
+        out_docs, out_index, out_text, out_tokens = [], [], [], []
+
+        def flush(doc, chunk, n_tokens):
+            out_index.append(out_index[-1] + 1 if out_docs and out_docs[-1] == doc else 0)
+            out_docs.append(doc)
+            out_text.append(' '.join(sentences[j] for j in chunk))
+            out_tokens.append(n_tokens)
+
+        current, chunk, chunk_tokens = None, [], 0
+        for i, (doc, n) in enumerate(zip(docs, tokens)):
+            if doc != current:
+                if chunk:
+                    flush(current, chunk, chunk_tokens)
+                current, chunk, chunk_tokens = doc, [], 0
+            elif chunk_tokens + n > self.chunk_tokens:
+                flush(doc, chunk, chunk_tokens)
+                # Start the next chunk with the previous one's trailing sentences
+                carry, carry_tokens = [], 0
+                for j in reversed(chunk):
+                    if carry_tokens + tokens[j] > self.overlap_tokens or \
+                            carry_tokens + tokens[j] + n > self.chunk_tokens:
+                        break
+                    carry.insert(0, j)
+                    carry_tokens += tokens[j]
+                chunk, chunk_tokens = carry, carry_tokens
+            chunk.append(i)
+            chunk_tokens += n
+        if chunk:
+            flush(current, chunk, chunk_tokens)
+
+        return pd.DataFrame({'doc': np.asarray(out_docs, dtype='int64'), 'chunk_index': out_index,
+                             'text': out_text, 'tokens': out_tokens})
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split a single text string into chunks.
+
+        Args:
+            text (str): The input text to split.
+
+        Returns:
+            List[str]: A list of text chunks.
+        """
+        if not text:
+            return []
+        return self.split_series(pd.Series([text]))['text'].tolist()
+
+    def split_documents(self, documents: List[Dict[str, Any]], text_key: str = 'text') -> List[Dict[str, Any]]:
+        """
+        Split a list of document dictionaries into chunked documents, like
+        TextChunker.split_documents (same keys and chunk ids) but in one batch.
+
+        Args:
+            documents (List[Dict]): List of document dicts.
+            text_key (str): The key in the dict containing the text to split.
+
+        Returns:
+            List[Dict]: List of chunked document dicts with metadata preserved.
+        """
+        documents = [doc for doc in documents
+                     if isinstance(doc.get(text_key), str) and doc[text_key].strip()]
+        if not documents:
+            return []
+        chunks = self.split_series(pd.Series([doc[text_key] for doc in documents], dtype=object))
+        chunked_docs = []
+        for doc_pos, i, chunk_text in zip(chunks['doc'].tolist(), chunks['chunk_index'].tolist(),
+                                          chunks['text'].tolist()):
+            doc = documents[doc_pos]
+            chunk_doc = doc.copy()
+            chunk_doc[text_key] = chunk_text
+            chunk_doc['chunk_index'] = i
+            chunk_doc['chunk_id'] = f"{doc.get('Complaint ID', 'doc')}_{i}"
+            chunked_docs.append(chunk_doc)
+        return chunked_docs
+
+
+def _split_batch(chunker: SentenceChunker, texts: pd.Series, offset: int) -> pd.DataFrame:
+    chunks = chunker.split_series(texts)
+    chunks['doc'] += offset
+    return chunks
+
+
+def split_series_parallel(chunker: SentenceChunker, texts: pd.Series, workers: int = 4,
+                          batch_size: int = 20000) -> pd.DataFrame:
+    """
+    `chunker.split_series` over a large Series, in batches spread across processes.
+    Rows come back in input order, with 'doc' indexing into the whole of `texts`.
+    """
+    texts = pd.Series(texts, dtype=object).reset_index(drop=True)
+    starts = range(0, len(texts), batch_size)
+    if workers <= 1 or len(texts) <= batch_size:
+        parts = [_split_batch(chunker, texts.iloc[s:s + batch_size], s) for s in starts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_split_batch, [chunker] * len(starts),
+                                  [texts.iloc[s:s + batch_size] for s in starts], starts))
+    if not parts:
+        return chunker.split_series(texts)
+    return pd.concat(parts, ignore_index=True)
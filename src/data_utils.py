@@ -58,4 +58,20 @@ def clean_narratives(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     df['narrative_clean'] = df['Consumer complaint narrative'].str.lower().str.strip()
     df['narrative_length'] = df['narrative_clean'].str.len()
-    return df
\ No newline at end of file
+    return df
+
+def prepare_narratives(df: pd.DataFrame, product_list: list, min_length: int = 50) -> pd.DataFrame:
+    """
+    Filter and clean a (chunk of the) raw complaints DataFrame in one vectorized pass.
+
+    Keeps rows whose product is in `product_list` and whose narrative is longer
+    than `min_length` characters after lower-casing and stripping, and adds the
+    cleaned narrative as a 'text' column.
+    """
+    df = df[df['Product'].isin(product_list)]
+    df = df.dropna(subset=['Consumer complaint narrative'])
+    text = df['Consumer complaint narrative'].str.lower().str.strip()
+    keep = text.str.len() > min_length
+    df = df.loc[keep].copy()
+    df['text'] = text[keep]
+    return df
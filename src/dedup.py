@@ -0,0 +1,221 @@
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE_SIZE = 3
+MISSING_ID = -1
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def lsh_bands(num_perm: int, threshold: float):
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve threshold
+    (1 / bands) ** (1 / rows) is closest to `threshold`, preferring more bands
+    (fewer missed duplicates) on ties.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0] - 1e-9:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """
+    MinHash signatures of texts' word shingles, computed a batch at a time.
+
+    Words are hashed with pandas' vectorized `hash_array`, shingles are combined
+    from their words' hashes, and each of the `num_perm` permutations is a
+    multiply-shift hash, so the whole batch is a few numpy passes with no Python
+    call per word. Signatures are stable across processes and runs.
+    """
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, shingle_size: int = DEFAULT_SHINGLE_SIZE, seed: int = 1):
+        """
+        Args:
+            num_perm (int): Hash functions per signature.
+            shingle_size (int): Words per shingle.
+            seed (int): Seed of the hash functions; signatures are only comparable
+                between hashers with the same settings.
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._shingle_mix = rng.integers(1, 2**63, size=shingle_size, dtype=np.uint64) | np.uint64(1)
+
+    def signatures(self, texts: Sequence[str], batch_size: int = 256) -> np.ndarray:
+        """uint32[len(texts), num_perm]; texts without words get all-max signatures."""
+        texts = pd.Series(list(texts), dtype=object).fillna('')
+        out = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        for start in range(0, len(texts), batch_size):
+            out[start:start + batch_size] = self._batch(texts.iloc[start:start + batch_size])
+        return out
+
+    def _batch(self, texts: pd.Series) -> np.ndarray:
+        out = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        words = texts.str.lower().str.split().explode().dropna()
+        if words.empty:
+            return out
+        doc = words.index.to_numpy() - texts.index[0]
+        hashes = pd.util.hash_array(words.to_numpy(dtype=object))
+
+        # Shingle i mixes the hashes of words i .. i + size - 1 of the same text;
+        # texts shorter than a shingle get one shingle of all their words
+        n = len(hashes)
+        size = self.shingle_size
+        with np.errstate(over='ignore'):
+            shingles = hashes * self._shingle_mix[0]
+            valid = np.ones(n, dtype=bool)
+            for j in range(1, size):
+                shifted = np.zeros(n, dtype=np.uint64)
+                shifted[:n - j] = hashes[j:] * self._shingle_mix[j]
+                same_doc = np.zeros(n, dtype=bool)
+                same_doc[:n - j] = doc[j:] == doc[:n - j]
+                shingles = np.where(same_doc, shingles + shifted, shingles)
+                valid &= same_doc
+        counts = np.bincount(doc, minlength=len(texts))
+        first = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum(counts[:-1], out=first[1:])
+        short = counts < size
+        valid[first[short & (counts > 0)]] = True
+        shingle_doc = doc[valid]
+        shingles = shingles[valid]
+        shingles = (shingles >> np.uint64(32)) ^ (shingles & _MASK32)
+
+        # Multiply-shift hash per permutation; the minimum over each text's shingles
+        # (laid out permutation-major so the reduction runs along contiguous rows)
+        with np.errstate(over='ignore'):
+            values = ((self._a[:, None] * shingles + self._b[:, None]) >> np.uint64(32)).astype(np.uint32)
+        present = np.flatnonzero(counts > 0)
+        starts = np.searchsorted(shingle_doc, present)
+        out[present] = np.minimum.reduceat(values, starts, axis=1).T
+        return out
+
+
+class NearDuplicateIndex:
+    """
+    Streaming LSH over MinHash signatures that maps every item to a canonical one.
+
+    Signatures are cut into `bands` bands of `rows` values; items sharing any
+    band are candidates, and a candidate counts as a near-duplicate when the
+    share of equal signature values (the estimated Jaccard similarity of their
+    shingle sets) is at least `threshold`. Only canonical items are indexed.
+
+    Each band is a sorted array of (key, canonical id) plus a small dict of keys
+    added since the last merge; merging once the dicts hold a quarter of the
+    sorted size keeps inserts amortized O(log n) and memory at about
+    `num_perm * 4 + bands * 16` bytes per canonical item.
+    """
+    MIN_MERGE = 50000
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, threshold: float = DEFAULT_THRESHOLD, seed: int = 2):
+        """
+        Args:
+            num_perm (int): Signature length (must match the MinHasher's).
+            threshold (float): Estimated Jaccard similarity from which two items
+                are near-duplicates.
+            seed (int): Seed of the band hashes.
+        """
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._band_mix = np.random.default_rng(seed).integers(
+            1, 2**63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._keys = [np.empty(0, dtype=np.uint64) for _ in range(self.bands)]
+        self._ids = [np.empty(0, dtype=np.int64) for _ in range(self.bands)]
+        self._recent = [{} for _ in range(self.bands)]
+        self._n_recent = 0
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self._counts = np.empty(1024, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Number of canonical items."""
+        return self._size
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Items collapsed into each canonical item (itself included), by canonical id."""
+        return self._counts[:self._size]
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """uint64[n, bands] hash of each band of each signature."""
+        bands = signatures[:, :self.bands * self.rows].astype(np.uint64)
+        bands = bands.reshape(len(signatures), self.bands, self.rows)
+        with np.errstate(over='ignore'):
+            return (bands * self._band_mix).sum(axis=2, dtype=np.uint64)
+
+    def add_batch(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        Assign each signature, in order, to a canonical item.
+
+        Returns:
+            np.ndarray: int64 canonical id per input. An input unlike every item
+            seen so far becomes a canonical item itself, with the next id
+            (0, 1, 2, ... in order of arrival); later inputs of the same batch
+            may already map to it, so the new canonical items are the first
+            occurrences of the ids >= `len(index)` taken before the call.
+        """
+        signatures = np.ascontiguousarray(signatures, dtype=np.uint32)
+        keys = self.band_keys(signatures)
+
+        # Candidates among the sorted tables, looked up for the whole batch at once
+        candidates = [[] for _ in range(len(signatures))]
+        for band in range(self.bands):
+            table_keys, table_ids = self._keys[band], self._ids[band]
+            if not len(table_keys):
+                continue
+            left = np.searchsorted(table_keys, keys[:, band], side='left')
+            right = np.searchsorted(table_keys, keys[:, band], side='right')
+            for row in np.flatnonzero(right > left):
+                candidates[row].extend(table_ids[left[row]:right[row]].tolist())
+
+        assigned = np.empty(len(signatures), dtype=np.int64)
+        for row, signature in enumerate(signatures):
+            row_keys = keys[row].tolist()
+            found = candidates[row]
+            for band, key in enumerate(row_keys):
+                found.extend(self._recent[band].get(key, ()))
+            match = next((c for c in dict.fromkeys(found)
+                          if np.mean(self._signatures[c] == signature) >= self.threshold), None)
+            if match is None:
+                match = self._add(signature, row_keys)
+            else:
+                self._counts[match] += 1
+            assigned[row] = match
+
+        if self._n_recent >= max(self.MIN_MERGE, self._size // 4):
+            self._merge()
+        return assigned
+
+    def _add(self, signature: np.ndarray, keys: list) -> int:
+        canonical_id = self._size
+        if canonical_id == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            self._counts = np.concatenate([self._counts, np.empty_like(self._counts)])
+        self._signatures[canonical_id] = signature
+        self._counts[canonical_id] = 1
+        for band, key in enumerate(keys):
+            self._recent[band].setdefault(key, []).append(canonical_id)
+        self._n_recent += 1
+        self._size += 1
+        return canonical_id
+
+    def _merge(self):
+        """Fold the recent keys into the sorted tables."""
+        for band, recent in enumerate(self._recent):
+            keys = np.fromiter((k for k, ids in recent.items() for _ in ids), dtype=np.uint64)
+            ids = np.fromiter((i for ids in recent.values() for i in ids), dtype=np.int64)
+            merged_keys = np.concatenate([self._keys[band], keys])
+            order = np.argsort(merged_keys, kind='stable')
+            self._keys[band] = merged_keys[order]
+            self._ids[band] = np.concatenate([self._ids[band], ids])[order]
+            recent.clear()
+        self._n_recent = 0
@@ -1,9 +1,15 @@
 import json
-import faiss
-import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-import pandas as pd
+import sys
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.embedding_cache import EmbeddingCache, cache_model_key
+from src.rag.encoders import add_encoder_arguments, load_encoder
+from src.rag.index_builder import IndexBuilder
+from src.rag.index_factory import add_index_arguments, build_index_from_args, train_index
+from src.rag.shards import ShardLog, compact
 
 # Config
 INPUT_FILE = Path(r"C:\Users\My Device\Desktop\week-7-rag-complaint-chatbot\data\processed\sampled_150k.jsonl")
@@ -11,70 +17,49 @@ OUTPUT_DIR = Path(r"C:\Users\My Device\Desktop\week-7-rag-complaint-chatbot\vect
 MODEL_NAME = 'all-MiniLM-L6-v2'
 BATCH_SIZE = 256
 
-def main():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    
-    print(f"📂 Loading chunks from {INPUT_FILE}...")
-    chunks = []
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            chunks.append(json.loads(line))
-    print(f"✅ Loaded {len(chunks)} chunks.")
-    
-    # Initialize model
-    print(f"🚀 Loading model {MODEL_NAME}...")
-    model = SentenceTransformer(MODEL_NAME)
-    
-    # Generate embeddings
-    print("⚡ Generating embeddings (this may take 10-15 mins)...")
-    texts = [c['text'] for c in chunks]
-    embeddings = model.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=True, convert_to_numpy=True)
-    
-    # Create Index
-    print("🗄️ Creating FAISS index...")
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
-    
-    # Save Index
-    index_path = OUTPUT_DIR / 'medium_faiss_index.index'
-    faiss.write_index(index, str(index_path))
-    print(f"💾 Index saved to {index_path}")
-    
-    # Save Metadata
-    metadata_path = OUTPUT_DIR / 'medium_metadata.json'
-    # Keep only necessary fields
-    meta_export = [{
-        'chunk_id': c['chunk_id'],
-        'text': c['text'],
-        'product': c.get('product', 'Unknown'),
-        'original_id': c.get('original_id')
-    } for c in chunks]
-    
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(meta_export, f)
-    print(f"📄 Metadata saved to {metadata_path}")
-    print("🎉 Done! Vector store is ready.")
 INDEX_PATH = OUTPUT_DIR / 'medium_faiss_index.index'
-METADATA_PATH = OUTPUT_DIR / 'medium_metadata.json'
-MODEL_NAME = 'all-MiniLM-L6-v2'
-BATCH_SIZE = 256
+METADATA_STORE_DIR = OUTPUT_DIR / 'medium_metadata_store'
+SHARD_DIR = OUTPUT_DIR / 'medium_shards'
+
+# Metadata store column -> key in the shard rows
+STORE_COLUMNS = {
+    'chunk_id': 'chunk_id',
+    'text': 'text',
+    'product': 'product',
+    'company': 'company',
+    'state': 'state',
+    'date': 'date_received',
+}
+
+def compact_shards(shards, args):
+    """Merge the embedding shards into the serving FAISS index and metadata store."""
+    print(f"🗜️ Compacting {len(shards)} segments ({shards.count:,} vectors)...")
+    index = build_index_from_args(args, shards.dimension)
+    # IVF/PQ indexes need their centroids and codebooks trained before any add
+    if not index.is_trained:
+        sample = shards.sample(args.train_size)
+        print(f"🎯 Training {args.index_type} index on {len(sample):,} sampled embeddings...")
+        train_index(index, sample)
+        del sample
+    builder = IndexBuilder(INDEX_PATH, METADATA_STORE_DIR, shards.dimension, index=index)
+    info = compact(shards, builder, STORE_COLUMNS)
+    print(f"💾 Index saved to {INDEX_PATH}")
+    print(f"📄 Metadata store saved to {METADATA_STORE_DIR}")
+    print(f"🧭 Index: {info}")
 
-def load_existing_progress():
-    if INDEX_PATH.exists() and METADATA_PATH.exists():
-        print(f"🔄 Found existing data. Loading...")
-        try:
-            index = faiss.read_index(str(INDEX_PATH))
-            with open(METADATA_PATH, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            print(f"✅ Loaded {index.ntotal} vectors and {len(metadata)} metadata items.")
-            return index, metadata
-        except Exception as e:
-            print(f"⚠️ Error loading existing data: {e}. Starting fresh.")
-            return None, []
-    return None, []
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed the sampled chunks into the medium FAISS index.")
+    parser.add_argument('--segment-size', type=int, default=5000,
+                        help="Chunks per checkpoint segment")
+    parser.add_argument('--embedding-cache', type=Path, default=OUTPUT_DIR / 'embedding_cache',
+                        help="Reuse embeddings of chunks embedded by earlier runs kept here")
+    parser.add_argument('--no-embedding-cache', action='store_true', help="Embed every chunk")
+    add_encoder_arguments(parser)
+    add_index_arguments(parser)
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     # 1. Load Input Data
@@ -85,74 +70,70 @@ def main():
             all_chunks.append(json.loads(line))
     print(f"✅ Total input chunks: {len(all_chunks)}")
     
-    # 2. Check for existing progress
-    index, metadata = load_existing_progress()
-    
-    if index is None:
-        print("🆕 Starting fresh embedding process...")
-        dimension = 384 # all-MiniLM-L6-v2 dimension
-        index = faiss.IndexFlatL2(dimension)
-        metadata = []
-        processed_ids = set()
+    # 2. Check for existing progress: the shard manifest records how far we got
+    shards = ShardLog(SHARD_DIR)
+    if shards.input_offset:
+        print(f"♻️ Resuming: {shards.input_offset} chunks already processed in {len(shards)} segments.")
     else:
-        # Create set of processed IDs for fast lookup
-        processed_ids = {item['chunk_id'] for item in metadata}
-        print(f"♻️ Resuming: {len(processed_ids)} chunks already processed.")
+        print("🆕 Starting fresh embedding process...")
         
-    # 3. Filter chunks to process
-    chunks_to_process = [c for c in all_chunks if c['chunk_id'] not in processed_ids]
+    # 3. Chunks to process
+    chunks_to_process = all_chunks[shards.input_offset:]
     
     if not chunks_to_process:
         print("🎉 All chunks already processed! Nothing to do.")
+        if shards.count and not (INDEX_PATH.exists() and (METADATA_STORE_DIR / 'manifest.json').exists()):
+            compact_shards(shards, args)
         return
 
     print(f"📝 {len(chunks_to_process)} chunks remaining to embed.")
     
     # 4. Initialize model
-    print(f"🚀 Loading model {MODEL_NAME}...")
-    model = SentenceTransformer(MODEL_NAME)
+    print(f"🚀 Loading model {MODEL_NAME} ({args.encoder_backend})...")
+    model = load_encoder(MODEL_NAME, args.encoder_backend)
+    cache = None
+    if not args.no_embedding_cache:
+        cache = EmbeddingCache(args.embedding_cache, cache_model_key(MODEL_NAME, args.encoder_backend),
+                               model.get_sentence_embedding_dimension())
+        print(f"📦 Embedding cache {cache.cache_dir}: {len(cache):,} vectors")
     
-    # 5. Process in batches
-    batch_size = BATCH_SIZE
+    # 5. Process in segments; each one is committed to the shard log on its own
+    segment_size = args.segment_size
     total_processed = 0
-    checkpoint_interval = 5000 # Save every 5000 chunks
     
-    for i in range(0, len(chunks_to_process), batch_size):
-        batch = chunks_to_process[i:i + batch_size]
-        texts = [c['text'] for c in batch]
+    for i in range(0, len(chunks_to_process), segment_size):
+        segment = chunks_to_process[i:i + segment_size]
+        texts = [c['text'] for c in segment]
         
-        # Embed
-        embeddings = model.encode(texts, batch_size=len(batch), show_progress_bar=False, convert_to_numpy=True)
+        # Embed, only the chunks no earlier run has seen
+        if cache is not None:
+            embeddings = cache.encode(model, texts, batch_size=BATCH_SIZE)
+            cache.flush()
+        else:
+            embeddings = model.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True)
         
-        # Add to index
-        index.add(embeddings)
+        # Metadata
+        rows = [{
+            'chunk_id': c['chunk_id'],
+            'text': c['text'],
+            'product': c.get('product', 'Unknown'),
+            'original_id': c.get('original_id'),
+            'company': c.get('company'),
+            'state': c.get('state'),
+            'date_received': c.get('date_received')
+        } for c in segment]
         
-        # Update metadata
-        for c in batch:
-            metadata.append({
-                'chunk_id': c['chunk_id'],
-                'text': c['text'],
-                'product': c.get('product', 'Unknown'),
-                'original_id': c.get('original_id')
-            })
-            
-        total_processed += len(batch)
-        print(f"✅ Processed batch {i//batch_size + 1} ({len(batch)} items). Total new: {total_processed}")
-        
-        # Checkpoint
-        if total_processed % checkpoint_interval < batch_size: # Approximate check
-            print("💾 Saving checkpoint...")
-            faiss.write_index(index, str(INDEX_PATH))
-            with open(METADATA_PATH, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f)
-            print(f"Checkpoint saved at {len(metadata)} items.")
+        # Checkpoint: only this segment is written, never the whole index
+        shards.append(embeddings, rows)
+        total_processed += len(segment)
+        print(f"✅ Checkpointed segment {len(shards)} ({len(segment)} items). Total new: {total_processed}")
+
+    if cache is not None:
+        print(f"📦 Embedding cache: {cache.hits:,} hits, {cache.misses:,} misses")
 
-    # 6. Final Save
-    print("💾 Saving final output...")
-    faiss.write_index(index, str(INDEX_PATH))
-    with open(METADATA_PATH, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f)
-    print(f"🎉 Done! Final count: {len(metadata)} items.")
+    # 6. Final compaction into the serving index
+    compact_shards(shards, args)
+    print(f"🎉 Done! Final count: {shards.count} items.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.ann_report import recall_at_k
+from src.rag.encoders import DEFAULT_MODEL, ENCODER_BACKENDS, load_encoder
+from src.rag.metadata_store import load_metadata
+
+# Config
+VECTOR_STORE_DIR = Path("vector_store")
+DEFAULT_METADATA = VECTOR_STORE_DIR / "medium_metadata_store"
+DEFAULT_OUTPUT = VECTOR_STORE_DIR / "encoder_report.json"
+BATCH_SIZES = [1, 32, 256]
+
+
+def sample_texts(metadata_path: Path, n: int, seed: int = 42) -> list:
+    """Random chunk texts from a metadata store (or legacy JSON)."""
+    metadata = load_metadata(metadata_path)
+    rng = np.random.default_rng(seed)
+    ids = np.sort(rng.choice(len(metadata), size=min(n, len(metadata)), replace=False))
+    return [metadata.field(int(i), 'text') for i in ids]
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Row-wise cosine similarity between two encodings of the same texts."""
+    ref = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    cand = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    cosine = np.sum(ref * cand, axis=1)
+    return {
+        'cosine_mean': float(np.mean(cosine)),
+        'cosine_p05': float(np.percentile(cosine, 5)),
+        'cosine_min': float(np.min(cosine)),
+    }
+
+
+def neighbour_recall(ref_corpus: np.ndarray, ref_queries: np.ndarray,
+                     cand_corpus: np.ndarray, cand_queries: np.ndarray, k: int = 10) -> float:
+    """
+    recall@k of the candidate backend's L2 neighbours against the fp32 ones,
+    each side searching its own encoding of the corpus (as a rebuilt index would).
+    """
+    def top_k(corpus, queries):
+        index = faiss.IndexFlatL2(corpus.shape[1])
+        index.add(np.ascontiguousarray(corpus, dtype='float32'))
+        return index.search(np.ascontiguousarray(queries, dtype='float32'), k)[1]
+
+    return recall_at_k(top_k(cand_corpus, cand_queries), top_k(ref_corpus, ref_queries), k)
+
+
+def throughput(model, texts: list, batch_size: int) -> float:
+    """Texts/sec encoding `texts` in calls of `batch_size` (one call per query at batch size 1)."""
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        model.encode(texts[i:i + batch_size], batch_size=batch_size, convert_to_numpy=True)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def encode(model, texts: list) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=64, convert_to_numpy=True), dtype='float32')
+
+
+def run_report(model_name: str, backends: list, corpus: list, queries: list, k: int,
+               bench_texts: int, batch_sizes: list = None) -> list:
+    batch_sizes = batch_sizes or BATCH_SIZES
+    rows = []
+    reference = None
+    for backend in backends:
+        print(f"🔧 Loading {backend} encoder...")
+        start = time.perf_counter()
+        model = load_encoder(model_name, backend)
+        load_seconds = time.perf_counter() - start
+
+        corpus_emb, query_emb = encode(model, corpus), encode(model, queries)
+        if reference is None:
+            # The first backend is the baseline (torch fp32 by default)
+            reference = (corpus_emb, query_emb)
+        row = {'backend': backend, 'load_s': load_seconds}
+        row.update(cosine_agreement(np.vstack(reference), np.vstack([corpus_emb, query_emb])))
+        row[f'recall@{k}'] = neighbour_recall(reference[0], reference[1], corpus_emb, query_emb, k)
+
+        encode(model, corpus[:8])  # warm up
+        for batch_size in batch_sizes:
+            row[f'texts_per_s@{batch_size}'] = throughput(model, corpus[:bench_texts], batch_size)
+        rows.append(row)
+        print(f"   {row}")
+    return rows
+
+
+def print_table(rows: list):
+    columns = list(rows[0])
+    print("\n" + " | ".join(f"{c:>16}" for c in columns))
+    for row in rows:
+        print(" | ".join(f"{row[c]:>16.4f}" if isinstance(row[c], float) else f"{row[c]:>16}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parity (cosine, recall@k vs fp32) and throughput of the encoder backends.")
+    parser.add_argument('--metadata', type=Path, default=DEFAULT_METADATA,
+                        help="Metadata store (or JSON) to sample chunk texts from")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--backends', nargs='+', choices=ENCODER_BACKENDS, default=list(ENCODER_BACKENDS),
+                        help="The first one is the reference")
+    parser.add_argument('--corpus', type=int, default=5000, help="Chunks encoded as the search corpus")
+    parser.add_argument('--queries', type=int, default=200, help="Held-out chunks used as queries")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--bench-texts', type=int, default=1024, help="Texts per throughput measurement")
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.metadata, args.corpus + args.queries)
+    corpus, queries = texts[args.queries:], texts[:args.queries]
+    rows = run_report(args.model, args.backends, corpus, queries, args.k, args.bench_texts)
+    print_table(rows)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'model': args.model, 'corpus': len(corpus), 'queries': len(queries), 'results': rows}, f, indent=2)
+    print(f"\n💾 Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
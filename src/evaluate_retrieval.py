@@ -0,0 +1,99 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.encoders import DEFAULT_MODEL, ENCODER_BACKENDS, load_encoder
+from src.rag.evaluation import RetrievalEvaluator, load_ground_truth, mark_pareto
+from src.rag.retriever import SEARCH_MODES, ComplaintRetriever
+
+# Config
+VECTOR_STORE_DIR = Path("vector_store")
+DEFAULT_OUTPUT = VECTOR_STORE_DIR / "eval_report.json"
+DEFAULT_CACHE_DIR = VECTOR_STORE_DIR / "eval_cache"
+QUERY_WORDS = 12
+
+
+def read_queries(path: Path) -> list:
+    """One question per line (blank lines skipped)."""
+    return [line.strip() for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+def sample_queries(metadata, n: int, seed: int = 42) -> list:
+    """The opening words of random chunks, as stand-in questions when no query file is given."""
+    rng = np.random.default_rng(seed)
+    ids = np.sort(rng.choice(len(metadata), size=min(n, len(metadata)), replace=False))
+    return [' '.join(metadata.field(int(i), 'text').split()[:QUERY_WORDS]) for i in ids]
+
+
+def sweep(retriever, args) -> list:
+    """Search-time settings to try for the retriever's index type."""
+    kind = retriever.index_info['kind']
+    if kind == 'ivf':
+        return [{'nprobe': value} for value in args.nprobe]
+    if kind == 'hnsw':
+        return [{'ef_search': value} for value in args.ef_search]
+    return [{}]
+
+
+def print_table(rows: list, k: int):
+    print(f"\n| Config | Params | Recall@{k} | MRR | nDCG@{k} | p50 ms | p95 ms | Pareto |")
+    print("| :--- | :--- | ---: | ---: | ---: | ---: | ---: | :---: |")
+    for r in rows:
+        params = ", ".join(f"{name}={value}" for name, value in r['params'].items()) or "-"
+        print(f"| {r['config']} | {params} | {r['recall_at_k']:.3f} | {r['mrr']:.3f} | {r['ndcg_at_k']:.3f} | "
+              f"{r['p50_ms']:.2f} | {r['p95_ms']:.2f} | {'★' if r['pareto'] else ''} |")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="recall@k / MRR / nDCG vs latency of retriever configurations, against exact search.")
+    parser.add_argument('--vector-store', type=Path, default=VECTOR_STORE_DIR)
+    parser.add_argument('--exact-index', type=Path, default=None,
+                        help="Index holding the exact vectors (default: the retriever's own index)")
+    parser.add_argument('--queries-file', type=Path, default=None, help="One question per line")
+    parser.add_argument('--queries', type=int, default=200, help="Questions sampled when no file is given")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--encoder-backends', nargs='+', choices=ENCODER_BACKENDS, default=['torch'])
+    parser.add_argument('--modes', nargs='+', choices=SEARCH_MODES, default=['dense'])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 16, 64], help="Swept on IVF indexes")
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[16, 64, 256], help="Swept on HNSW indexes")
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    retrievers = {backend: ComplaintRetriever(args.vector_store, model_name=args.model, encoder_backend=backend)
+                  for backend in args.encoder_backends}
+    reference = next(iter(retrievers.values()))
+    queries = read_queries(args.queries_file) if args.queries_file else sample_queries(reference.metadata, args.queries)
+
+    # Ground truth always uses the fp32 encoder, so quantized encoders are scored too
+    encoder = retrievers['torch'].model if 'torch' in retrievers else load_encoder(args.model, 'torch')
+    truth = load_ground_truth(queries, args.exact_index or reference.index_path, reference.metadata, encoder,
+                              k=args.k, cache_dir=args.cache_dir, model_name=args.model)
+    evaluator = RetrievalEvaluator(queries, truth)
+
+    rows = []
+    for backend, retriever in retrievers.items():
+        for mode in args.modes:
+            for params in sweep(retriever, args):
+                label = f"{retriever.index_info['kind']}/{backend}/{mode}"
+                print(f"🔍 Evaluating {label} {params or ''}...")
+                rows.append(evaluator.evaluate(retriever, label, mode=mode, **params))
+    mark_pareto(rows)
+    print_table(rows, args.k)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'queries': len(queries), 'k': args.k, 'corpus_size': len(reference.metadata),
+                   'results': rows}, f, indent=2)
+    print(f"\n💾 Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import argparse
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, SentenceChunker, TextChunker
+from src.data_utils import prepare_narratives
+from src.dedup import DEFAULT_NUM_PERM, DEFAULT_THRESHOLD, MinHasher, NearDuplicateIndex
+from src.rag.embedding_cache import EmbeddingCache, cache_model_key
+from src.rag.encoders import add_encoder_arguments, load_encoder
+from src.rag.index_builder import IndexBuilder
+from src.rag.index_factory import add_index_arguments
+from src.rag.metadata_store import update_int_column
+
+# Config
+RAW_DATA_PATH = Path("data/raw/complaints.csv")
+OUTPUT_DIR = Path("vector_store")
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+TARGET_PRODUCTS = [
+    "Credit card",
+    "Credit card or prepaid card",
+    "Mortgage",
+    "Checking or savings account",
+    "Student loan",
+    "Vehicle loan or lease"
+]
+
+# Only the raw CSV columns the index and its metadata need
+CSV_COLUMNS = ['Complaint ID', 'Product', 'Company', 'State', 'Date received', 'Consumer complaint narrative']
+
+_SENTINEL = None
+
+
+CHUNKERS = ('sentences', 'characters')
+
+
+def make_chunker(args):
+    """The chunker selected by the CLI options (see `parse_args`)."""
+    if args.chunker == 'characters':
+        return TextChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    return SentenceChunker(chunk_tokens=args.chunk_tokens, overlap_tokens=args.chunk_overlap_tokens,
+                           tokenizer=args.chunk_tokenizer)
+
+
+def chunk_records(records: list, chunker) -> list:
+    """
+    Split cleaned complaint records into chunk dicts. Runs in a worker process.
+    """
+    return [
+        {
+            'chunk_id': chunk['chunk_id'],
+            'text': chunk['text'],
+            'product': chunk['Product'],
+            'company': chunk.get('Company'),
+            'state': chunk.get('State'),
+            'date': chunk.get('Date received'),
+        }
+        for chunk in chunker.split_documents(records, text_key='text')
+    ]
+
+
+def chunk_and_sign(records: list, chunker, hasher: MinHasher = None) -> tuple:
+    """
+    `chunk_records` plus the chunks' MinHash signatures (None without a hasher),
+    so the expensive hashing runs in the worker processes too.
+    """
+    chunks = chunk_records(records, chunker)
+    signatures = hasher.signatures([c['text'] for c in chunks]) if hasher is not None else None
+    return chunks, signatures
+
+
+class ChunkDeduplicator:
+    """
+    Collapses near-duplicate chunks as they stream past, keeping the first of each
+    group (the canonical chunk) and counting how many chunks it stands for.
+    """
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, threshold: float = DEFAULT_THRESHOLD):
+        self.index = NearDuplicateIndex(num_perm=num_perm, threshold=threshold)
+        self._placed = []  # (canonical ids, store rows) of each batch handed to the index builder
+
+    @property
+    def duplicates(self) -> int:
+        return int(self.index.counts.sum()) - len(self.index)
+
+    def filter(self, chunks: list, signatures: np.ndarray) -> list:
+        """The chunks of this batch that are not near-duplicates of an earlier chunk."""
+        if not chunks:
+            return chunks
+        first_new = len(self.index)
+        assigned = self.index.add_batch(signatures)
+        # New canonical ids are handed out in order, so each one's first occurrence created it
+        _, first = np.unique(assigned, return_index=True)
+        created = np.sort(first[assigned[first] >= first_new])
+        kept = [chunks[i] for i in created]
+        for chunk, canonical_id in zip(kept, assigned[created]):
+            chunk['canonical_id'] = int(canonical_id)
+        return kept
+
+    def place(self, batch: list, first_row: int):
+        """Note the store rows of a batch of kept chunks, written from `first_row` on."""
+        canonical = np.array([c['canonical_id'] for c in batch], dtype=np.int64)
+        self._placed.append((canonical, first_row + np.arange(len(batch), dtype=np.int64)))
+
+    def write_counts(self, store_dir: Path) -> int:
+        """
+        Record `duplicate_count` on the canonical chunks that absorbed others.
+        Counts are only final once the whole input has been seen, so this patches
+        the finished metadata store. Returns the number of rows updated.
+        """
+        counts = self.index.counts
+        duplicated = np.flatnonzero(counts > 1)
+        if not len(duplicated):
+            return 0
+        rows = np.full(len(counts), -1, dtype=np.int64)
+        for canonical, placed in self._placed:
+            rows[canonical] = placed
+        duplicated = duplicated[rows[duplicated] >= 0]
+        update_int_column(store_dir, 'duplicate_count', rows[duplicated], counts[duplicated])
+        return len(duplicated)
+
+
+def read_clean_batches(csv_path: Path, csv_chunksize: int, products: list):
+    """Stream the raw CSV and yield cleaned record lists, one per CSV chunk."""
+    reader = pd.read_csv(csv_path, usecols=CSV_COLUMNS, dtype=str, chunksize=csv_chunksize)
+    for df in reader:
+        df = prepare_narratives(df, products)
+        if len(df):
+            df = df.drop(columns=['Consumer complaint narrative']).astype(object)
+            yield df.where(df.notna(), None).to_dict('records')
+
+
+class IngestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.complaints = 0
+        self.chunks = 0
+        self.duplicates = 0
+        self.embedded = 0
+        self._lock = threading.Lock()
+
+    def add_embedded(self, n: int):
+        with self._lock:
+            self.embedded += n
+
+    def report(self, final: bool = False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.embedded / elapsed if elapsed else 0.0
+        label = "✅ Done" if final else "📈 Progress"
+        print(f"{label}: {self.complaints:,} complaints -> {self.chunks:,} chunks "
+              f"({self.duplicates:,} near-duplicates dropped), {self.embedded:,} embedded "
+              f"({rate:,.0f} chunks/s, {elapsed:,.0f}s)")
+
+
+def encode_worker(model, chunk_queue: queue.Queue, builder: IndexBuilder, stats: IngestStats,
+                  errors: list, batch_size: int, cache: EmbeddingCache = None,
+                  dedup: ChunkDeduplicator = None):
+    """
+    Pull chunk batches off the queue, embed them (only the ones not in `cache`)
+    and hand them to the index builder, telling `dedup` which rows they landed in.
+    """
+    while True:
+        batch = chunk_queue.get()
+        try:
+            if batch is _SENTINEL:
+                return
+            if errors:
+                continue  # drain the queue so the producer never blocks forever
+            texts = [c['text'] for c in batch]
+            if cache is not None:
+                embeddings = cache.encode(model, texts, batch_size=batch_size)
+            else:
+                embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                                          convert_to_numpy=True)
+            first_row = builder.add_batch(
+                embeddings,
+                chunk_id=[c['chunk_id'] for c in batch],
+                text=[c['text'] for c in batch],
+                product=[c['product'] for c in batch],
+                company=[c['company'] for c in batch],
+                state=[c['state'] for c in batch],
+                date=[c['date'] for c in batch],
+            )
+            if dedup is not None:
+                dedup.place(batch, first_row)
+            stats.add_embedded(len(batch))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunk_queue.task_done()
+
+
+def run_ingest(args, model=None) -> dict:
+    """
+    Stream CSV -> clean -> chunk (process pool) -> dedup -> bounded queue -> encode -> index.
+
+    Only a bounded number of CSV chunks, chunking tasks and embedding batches are
+    in flight at once, so memory stays flat in the size of the input; the only
+    thing that grows is the index being built (compact for IVF-PQ).
+    """
+    if model is None:
+        print(f"🚀 Loading model {args.model} ({args.encoder_backend})...")
+        model = load_encoder(args.model, args.encoder_backend)
+
+    builder = IndexBuilder(
+        args.output_dir / f'{args.prefix}_faiss_index.index',
+        args.output_dir / f'{args.prefix}_metadata_store',
+        model.get_sentence_embedding_dimension(),
+        index_type=args.index_type, train_size=args.train_size,
+        nlist=args.nlist, nprobe=args.nprobe, pq_m=args.pq_m, pq_bits=args.pq_bits,
+        hnsw_m=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search,
+    )
+
+    cache = None
+    if not args.no_embedding_cache:
+        cache = EmbeddingCache(args.embedding_cache or args.output_dir / 'embedding_cache',
+                               cache_model_key(args.model, args.encoder_backend),
+                               model.get_sentence_embedding_dimension())
+        print(f"📦 Embedding cache {cache.cache_dir}: {len(cache):,} vectors")
+
+    hasher = MinHasher(num_perm=args.dedup_num_perm) if args.dedup else None
+    dedup = ChunkDeduplicator(args.dedup_num_perm, args.dedup_threshold) if args.dedup else None
+
+    stats = IngestStats()
+    errors = []
+    chunk_queue = queue.Queue(maxsize=args.queue_size)
+    encoders = [
+        threading.Thread(target=encode_worker,
+                         args=(model, chunk_queue, builder, stats, errors, args.embed_batch, cache, dedup),
+                         name=f"encode-{i}", daemon=True)
+        for i in range(args.encode_workers)
+    ]
+    for thread in encoders:
+        thread.start()
+
+    pending = []  # chunk lists waiting to be cut into embedding batches
+
+    def enqueue(chunks, flush=False):
+        pending.extend(chunks)
+        while len(pending) >= args.embed_batch or (flush and pending):
+            batch = pending[:args.embed_batch]
+            del pending[:args.embed_batch]
+            chunk_queue.put(batch)  # blocks when the encoders fall behind
+
+    chunker = make_chunker(args)
+
+    def collect(future):
+        chunks, signatures = future.result()
+        stats.chunks += len(chunks)
+        if dedup is not None:
+            chunks = dedup.filter(chunks, signatures)
+            stats.duplicates = dedup.duplicates
+        enqueue(chunks)
+
+    print(f"📂 Streaming {args.input} in chunks of {args.csv_chunksize:,} rows with {args.workers} chunking workers...")
+    max_in_flight = args.workers * 2
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        in_flight = []
+        for records in read_clean_batches(args.input, args.csv_chunksize, args.products):
+            stats.complaints += len(records)
+            for start in range(0, len(records), args.task_size):
+                in_flight.append(pool.submit(chunk_and_sign, records[start:start + args.task_size],
+                                             chunker, hasher))
+                # Consume in submission order: the first of a group of near-duplicates is the one
+                # kept, and with one encoder the index row order is deterministic
+                while len(in_flight) >= max_in_flight:
+                    collect(in_flight.pop(0))
+            if errors:
+                break
+            stats.report()
+        for future in in_flight:
+            collect(future)
+    enqueue([], flush=True)
+
+    for _ in encoders:
+        chunk_queue.put(_SENTINEL)
+    for thread in encoders:
+        thread.join()
+    if cache is not None:
+        cache.flush()  # keep what was embedded even if the run failed
+        print(f"📦 Embedding cache: {cache.hits:,} hits, {cache.misses:,} misses, {len(cache):,} vectors")
+    if errors:
+        raise errors[0]
+
+    info = builder.close()
+    if dedup is not None:
+        updated = dedup.write_counts(args.output_dir / f'{args.prefix}_metadata_store')
+        print(f"🧬 {stats.duplicates:,} near-duplicate chunks folded into {updated:,} canonical chunks")
+    stats.report(final=True)
+    print(f"🧭 Index: {info}")
+    return info
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="End-to-end ingest: raw CFPB CSV -> chunks -> embeddings -> FAISS index + metadata store.")
+    parser.add_argument('--input', type=Path, default=RAW_DATA_PATH)
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR)
+    parser.add_argument('--prefix', default='full', help="Output name prefix: <prefix>_faiss_index.index etc.")
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--products', nargs='+', default=TARGET_PRODUCTS)
+    parser.add_argument('--csv-chunksize', type=int, default=50000, help="Raw CSV rows read at a time")
+    parser.add_argument('--workers', type=int, default=4, help="Chunking processes")
+    parser.add_argument('--task-size', type=int, default=2000, help="Complaints per chunking task")
+    parser.add_argument('--chunker', choices=CHUNKERS, default='sentences',
+                        help="'sentences': whole sentences up to --chunk-tokens tokens; "
+                             "'characters': the legacy fixed --chunk-size windows")
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help="Max tokens per chunk")
+    parser.add_argument('--chunk-overlap-tokens', type=int, default=DEFAULT_OVERLAP_TOKENS,
+                        help="Max tokens of whole sentences shared by neighbouring chunks")
+    parser.add_argument('--chunk-tokenizer', default=None,
+                        help="Count tokens with this Hugging Face tokenizer instead of estimating them")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Characters per chunk (--chunker characters)")
+    parser.add_argument('--chunk-overlap', type=int, default=50, help="Overlap in characters (--chunker characters)")
+    parser.add_argument('--no-dedup', dest='dedup', action='store_false',
+                        help="Keep near-duplicate chunks instead of collapsing them")
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Estimated Jaccard similarity of word 3-grams from which chunks are near-duplicates")
+    parser.add_argument('--dedup-num-perm', type=int, default=DEFAULT_NUM_PERM, help="MinHash signature length")
+    parser.add_argument('--embedding-cache', type=Path, default=None,
+                        help="Reuse embeddings of unchanged chunks from earlier runs kept here "
+                             "(default: <output-dir>/embedding_cache)")
+    parser.add_argument('--no-embedding-cache', action='store_true', help="Embed every chunk")
+    parser.add_argument('--embed-batch', type=int, default=256, help="Chunks per encode call")
+    parser.add_argument('--encode-workers', type=int, default=1, help="Threads calling model.encode")
+    parser.add_argument('--queue-size', type=int, default=32, help="Embedding batches buffered ahead of the encoders")
+    add_encoder_arguments(parser)
+    add_index_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main():
+    run_ingest(parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import pandas as pd
 from pathlib import Path
 from tqdm.auto import tqdm
 from data_utils import load_complaints_data, filter_products, clean_narratives
-from chunking import TextChunker
+from chunking import SentenceChunker
 
 # Configuration
 RAW_DATA_PATH = Path(r"C:\Users\My Device\Desktop\week-7-rag-complaint-chatbot\data\raw\complaints.csv")
@@ -62,7 +62,7 @@ def process_data():
 
     # 5. Chunking Implementation (Requirement 2)
     print("✂️ Demonstrating Chunking Implementation...")
-    chunker = TextChunker(chunk_size=500, chunk_overlap=50)
+    chunker = SentenceChunker()
     
     # Chunk a sample to demonstrate functionality (processing all might take too long for this script)
     sample_size = 1000
@@ -1,8 +1,23 @@
 # Expose key classes
-from .retriever import ComplaintRetriever  #this is used to retrieve the relevant chunks of data
-# it works by retrieving ... 
-from .generator import ComplaintGenerator  # this is used to generate...
-from .pipeline import RAGPipeline 
-from .retriever import ComplaintRetriever
-from .generator import ComplaintGenerator
-from .pipeline import RAGPipeline
+# ComplaintRetriever retrieves the relevant complaint chunks (FAISS + MiniLM),
+# ComplaintGenerator is the mock answer generator and RAGPipeline ties
+# retrieval and local-LLM generation together.
+#
+# They are resolved lazily (PEP 562) so `import src.rag` doesn't pull in
+# faiss, torch or transformers until one of the classes is actually used.
+import importlib
+
+_EXPORTS = {
+    'ComplaintRetriever': '.retriever',
+    'ComplaintGenerator': '.generator',
+    'LocalComplaintGenerator': '.local_generator',
+    'RAGPipeline': '.pipeline',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
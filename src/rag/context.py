@@ -0,0 +1,190 @@
+import re
+
+DEFAULT_TOKEN_BUDGET = 1024
+DUPLICATE_THRESHOLD = 0.8
+# Tokens the prompt spends around each chunk ("- " prefix and the blank line between chunks)
+CHUNK_OVERHEAD_TOKENS = 3
+# Truncating a chunk to fewer tokens than this isn't worth the space; it's dropped instead
+MIN_TRUNCATED_TOKENS = 32
+# SentenceChunker repeats up to 32 tokens of whole sentences (TextChunker 50 characters)
+# between neighbouring chunks; look a little further to be safe
+MAX_OVERLAP_CHARS = 400
+
+_WORD = re.compile(r"\w+")
+
+
+def split_chunk_id(chunk_id: str):
+    """'<complaint id>_<chunk index>' -> (complaint id, index), or (chunk_id, None) for other ids."""
+    if not chunk_id:
+        return chunk_id, None
+    doc_id, _, index = str(chunk_id).rpartition('_')
+    if not doc_id or not index.isdigit():
+        return chunk_id, None
+    return doc_id, int(index)
+
+
+def join_overlapping(left: str, right: str, max_overlap: int = MAX_OVERLAP_CHARS) -> str:
+    """Concatenate two neighbouring chunks, writing the text they share only once."""
+    for k in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:k]):
+            return left + right[k:]
+    return left + " " + right
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Set of lower-cased word `size`-grams (the whole text for shorter ones)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into the context the LLM actually reads.
+
+    In rank order it:
+        1. merges chunks of the same complaint that are adjacent in the original
+           narrative (chunk ids '<complaint id>_<i>'), removing their overlap;
+        2. drops near-duplicates: a chunk whose word-shingle Jaccard similarity to an
+           already kept chunk is at least `duplicate_threshold` (at a handful of
+           candidates this is computed exactly rather than estimated with MinHash);
+        3. fits what is left into `token_budget` tokens, measured with the model's
+           tokenizer, truncating the last chunk that partly fits.
+
+    Everything merged, dropped or truncated is listed in the report returned with
+    the context.
+    """
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, duplicate_threshold: float = DUPLICATE_THRESHOLD,
+                 merge_adjacent: bool = True, shingle_size: int = 3, min_truncated_tokens: int = MIN_TRUNCATED_TOKENS):
+        """
+        Args:
+            token_budget (int): Maximum prompt tokens spent on context (None = unlimited).
+            duplicate_threshold (float): Jaccard similarity at or above which a chunk
+                counts as a near-duplicate (None = keep duplicates).
+            merge_adjacent (bool): Merge neighbouring chunks of the same complaint.
+            shingle_size (int): Words per shingle for the duplicate check.
+            min_truncated_tokens (int): Smallest truncated chunk worth keeping.
+        """
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.merge_adjacent = merge_adjacent
+        self.shingle_size = shingle_size
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def build(self, chunks: list, tokenizer=None):
+        """
+        Args:
+            chunks (list): Retriever (or reranker) results, best first.
+            tokenizer: Hugging Face tokenizer of the generator. Without one, tokens
+                are approximated by whitespace-separated words.
+
+        Returns:
+            (context, report): the chunks to put in the prompt, best first, and
+                {'token_budget', 'tokens', 'kept', 'merged', 'dropped', 'truncated'},
+                where 'dropped' holds {'chunk_id', 'reason', ...} entries with reason
+                'duplicate' (plus 'duplicate_of') or 'budget'.
+        """
+        report = {'token_budget': self.token_budget, 'tokens': 0, 'kept': [], 'merged': [],
+                  'dropped': [], 'truncated': []}
+        candidates = self._merge(chunks, report) if self.merge_adjacent else [dict(c) for c in chunks]
+
+        context = []
+        kept_shingles = []
+        for chunk in candidates:
+            chunk_shingles = shingles(chunk['text'], self.shingle_size)
+            if self.duplicate_threshold is not None:
+                duplicate_of = next((kept['chunk_id'] for kept, seen in zip(context, kept_shingles)
+                                     if jaccard(chunk_shingles, seen) >= self.duplicate_threshold), None)
+                if duplicate_of is not None:
+                    report['dropped'].append({'chunk_id': chunk['chunk_id'], 'reason': 'duplicate',
+                                              'duplicate_of': duplicate_of})
+                    continue
+
+            if not self._fit(chunk, tokenizer, report):
+                report['dropped'].append({'chunk_id': chunk['chunk_id'], 'reason': 'budget'})
+                continue
+            context.append(chunk)
+            kept_shingles.append(chunk_shingles)
+
+        report['kept'] = [c['chunk_id'] for c in context]
+        return context, report
+
+    def _merge(self, chunks: list, report: dict) -> list:
+        """Merge runs of consecutive chunks of one complaint; each run takes its best member's rank."""
+        by_doc = {}
+        for rank, chunk in enumerate(chunks):
+            doc_id, index = split_chunk_id(chunk.get('chunk_id'))
+            if index is not None:
+                by_doc.setdefault(doc_id, []).append((index, rank))
+
+        run_of = {}  # rank -> ranks (in narrative order) of the run it belongs to
+        for members in by_doc.values():
+            members.sort()
+            run = [members[0]]
+            for index, rank in members[1:]:
+                if index == run[-1][0] + 1:
+                    run.append((index, rank))
+                elif index != run[-1][0]:
+                    self._close_run(run, run_of)
+                    run = [(index, rank)]
+            self._close_run(run, run_of)
+
+        merged = []
+        for rank, chunk in enumerate(chunks):
+            run = run_of.get(rank, [rank])
+            if rank != min(run):
+                continue  # already emitted with a better-ranked member
+            if len(run) == 1:
+                merged.append(dict(chunk))
+                continue
+            parts = [chunks[r] for r in run]
+            text = parts[0]['text']
+            for part in parts[1:]:
+                text = join_overlapping(text, part['text'])
+            ids = [p['chunk_id'] for p in parts]
+            merged.append(dict(chunk, text=text, chunk_id=ids[0], merged_chunk_ids=ids))
+            report['merged'].append(ids)
+        return merged
+
+    @staticmethod
+    def _close_run(run: list, run_of: dict):
+        ranks = [rank for _, rank in run]
+        for rank in ranks:
+            run_of[rank] = ranks
+
+    def _fit(self, chunk: dict, tokenizer, report: dict) -> bool:
+        """Charge `chunk` against the budget, truncating it if only part fits."""
+        tokens = _encode(chunk['text'], tokenizer)
+        cost = len(tokens) + CHUNK_OVERHEAD_TOKENS
+        if self.token_budget is None or report['tokens'] + cost <= self.token_budget:
+            report['tokens'] += cost
+            chunk['tokens'] = len(tokens)
+            return True
+
+        room = self.token_budget - report['tokens'] - CHUNK_OVERHEAD_TOKENS
+        if room < self.min_truncated_tokens:
+            return False
+        chunk['text'] = _decode(tokens[:room], tokenizer).rstrip() + " ..."
+        chunk['tokens'] = room
+        report['tokens'] += room + CHUNK_OVERHEAD_TOKENS
+        report['truncated'].append(chunk['chunk_id'])
+        return True
+
+
+def _encode(text: str, tokenizer) -> list:
+    if tokenizer is None:
+        return text.split()
+    return tokenizer.encode(text, add_special_tokens=False)
+
+
+def _decode(tokens: list, tokenizer) -> str:
+    if tokenizer is None:
+        return " ".join(tokens)
+    return tokenizer.decode(tokens, skip_special_tokens=True)
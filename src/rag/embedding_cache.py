@@ -0,0 +1,218 @@
+"""
+Persistent chunk-embedding cache, keyed by (model, normalized chunk text).
+
+A refresh of the CFPB dump re-chunks every narrative, but most chunks come out
+exactly as they did last time. Looking their vectors up here instead of
+re-encoding them makes a re-ingest cost time in proportion to the new text.
+
+    cache = EmbeddingCache('vector_store/embedding_cache', cache_model_key(MODEL_NAME, 'torch'))
+    embeddings = cache.encode(model, texts, batch_size=256)  # encodes the misses only
+    cache.flush()
+
+Layout of `<cache_dir>/<model>/`:
+    vectors.f32     float32[n, d] embeddings, in insertion order (memory-mapped)
+    keys.u64        uint64[n, 2] 128-bit BLAKE2b hash of each entry's text
+    manifest.json   model, dimension and committed row count (written last)
+
+Entries are appended on `flush`; rows past the manifest's count (from a run
+that died mid-flush) are ignored and overwritten. The hash index is a sorted
+copy of the keys, rebuilt in memory when the cache is opened or flushed.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from .telemetry import get_logger
+
+logger = get_logger('embedding_cache')
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_NAME = 'embedding-cache'
+FORMAT_VERSION = 1
+KEY_DTYPE = np.uint64
+KEY_BYTES = 16
+
+
+def cache_model_key(model_name: str, backend: str = 'torch') -> str:
+    """Cache namespace of an encoder: quantized backends give slightly different vectors."""
+    return model_name if backend == 'torch' else f'{model_name}@{backend}'
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a chunk, which the encoder's tokenizer ignores anyway."""
+    return ' '.join((text or '').split())
+
+
+def text_keys(texts: Sequence[str]) -> np.ndarray:
+    """uint64[n, 2] 128-bit hashes of the normalized texts."""
+    digests = b''.join(hashlib.blake2b(normalize_text(t).encode('utf-8'), digest_size=KEY_BYTES).digest()
+                       for t in texts)
+    return np.frombuffer(digests, dtype=KEY_DTYPE).reshape(len(texts), 2)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache of one model. Thread-safe; lookups are vectorized
+    binary searches over the sorted 64-bit key prefixes, verified against the
+    other 64 bits.
+    """
+    def __init__(self, cache_dir: Path, model_key: str, dimension: int = None, max_pending: int = 65536):
+        """
+        Args:
+            cache_dir (Path): Root directory shared by all models' caches.
+            model_key (str): Encoder identity, see `cache_model_key`.
+            dimension (int): Embedding size; taken from the first vectors added if None.
+            max_pending (int): Staged entries that trigger a `flush`, bounding memory.
+        """
+        self.model_key = model_key
+        self.max_pending = max_pending
+        self.cache_dir = Path(cache_dir) / re.sub(r'[^A-Za-z0-9_.-]+', '_', model_key)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_keys = []
+        self._pending_vectors = []
+        self._pending_rows = {}  # (hi, lo) -> (batch, row) of entries not yet flushed
+
+        manifest_path = self.cache_dir / MANIFEST_NAME
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            if manifest.get('format') != FORMAT_NAME:
+                raise ValueError(f"{self.cache_dir} is not an embedding cache")
+            if manifest.get('version', 0) > FORMAT_VERSION:
+                raise ValueError(f"Unsupported embedding cache version {manifest['version']}")
+            if manifest['model'] != model_key:
+                raise ValueError(f"{self.cache_dir} caches {manifest['model']!r}, not {model_key!r}")
+            if dimension is not None and manifest['dimension'] not in (None, dimension):
+                raise ValueError(f"Cached vectors have dimension {manifest['dimension']}, expected {dimension}")
+            self.dimension = manifest['dimension']
+            self.count = manifest['count']
+        else:
+            self.dimension = dimension
+            self.count = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return self.count + len(self._pending_rows)
+
+    def _load(self):
+        """Map the committed entries and rebuild the sorted hash index."""
+        if not self.count:
+            self._vectors = np.empty((0, self.dimension or 0), dtype='float32')
+            self._sorted_hi = np.empty(0, dtype=KEY_DTYPE)
+            self._sorted_lo = np.empty(0, dtype=KEY_DTYPE)
+            self._sorted_rows = np.empty(0, dtype=np.int64)
+            return
+        self._vectors = np.memmap(self.cache_dir / 'vectors.f32', dtype='float32', mode='r',
+                                  shape=(self.count, self.dimension))
+        keys = np.fromfile(self.cache_dir / 'keys.u64', dtype=KEY_DTYPE, count=self.count * 2).reshape(-1, 2)
+        order = np.argsort(keys[:, 0], kind='stable')
+        self._sorted_hi = keys[order, 0]
+        self._sorted_lo = keys[order, 1]
+        self._sorted_rows = order
+
+    def lookup(self, keys: np.ndarray):
+        """
+        Cached vectors of `keys` (from `text_keys`).
+
+        Returns:
+            (vectors, found): float32[n, d] with zeros where `found` (bool[n]) is False.
+        """
+        with self._lock:
+            n = len(keys)
+            vectors = np.zeros((n, self.dimension or 0), dtype='float32')
+            found = np.zeros(n, dtype=bool)
+            if self.count and n:
+                pos = np.minimum(np.searchsorted(self._sorted_hi, keys[:, 0]), self.count - 1)
+                found = (self._sorted_hi[pos] == keys[:, 0]) & (self._sorted_lo[pos] == keys[:, 1])
+                rows = self._sorted_rows[pos[found]]
+                # Read the mapped rows in file order so cold lookups stay sequential-ish
+                order = np.argsort(rows)
+                vectors[np.flatnonzero(found)[order]] = self._vectors[rows[order]]
+            if self._pending_rows:
+                for i in np.flatnonzero(~found):
+                    entry = self._pending_rows.get((int(keys[i, 0]), int(keys[i, 1])))
+                    if entry is not None:
+                        vectors[i] = self._pending_vectors[entry[0]][entry[1]]
+                        found[i] = True
+            hits = int(found.sum())
+            self.hits += hits
+            self.misses += n - hits
+            return vectors, found
+
+    def add(self, keys: np.ndarray, vectors: np.ndarray):
+        """Stage new entries; they are visible to `lookup` at once and written by `flush`."""
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected dimension {self.dimension}, got {vectors.shape[1]}")
+            batch = len(self._pending_vectors)
+            fresh = []
+            for row, (hi, lo) in enumerate(keys.tolist()):
+                if (hi, lo) not in self._pending_rows:
+                    self._pending_rows[(hi, lo)] = (batch, len(fresh))
+                    fresh.append(row)
+            self._pending_keys.append(np.ascontiguousarray(keys[fresh], dtype=KEY_DTYPE))
+            self._pending_vectors.append(vectors[fresh])
+            full = len(self._pending_rows) >= self.max_pending
+        if full:
+            self.flush()
+
+    def encode(self, model, texts: Sequence[str], batch_size: int = 256) -> np.ndarray:
+        """
+        Embeddings of `texts`: cached ones are looked up in bulk and only the
+        distinct misses go through `model.encode`, then get cached.
+        """
+        texts = list(texts)
+        keys = text_keys(texts)
+        vectors, found = self.lookup(keys)
+        if found.all():
+            return vectors
+        missing = np.flatnonzero(~found)
+        _, first, inverse = np.unique(keys[missing], axis=0, return_index=True, return_inverse=True)
+        unique = missing[first]
+        fresh = np.asarray(model.encode([texts[i] for i in unique], batch_size=batch_size,
+                                        show_progress_bar=False, convert_to_numpy=True), dtype='float32')
+        self.add(keys[unique], fresh)
+        if found.any():
+            vectors[missing] = fresh[inverse.ravel()]
+            return vectors
+        return fresh[inverse.ravel()]
+
+    def flush(self):
+        """Append the staged entries to disk and commit them in the manifest."""
+        with self._lock:
+            if not self._pending_rows:
+                return
+            keys = np.concatenate(self._pending_keys)
+            vectors = np.concatenate(self._pending_vectors)
+            # Drop entries that were already committed when they were staged
+            if self.count:
+                pos = np.minimum(np.searchsorted(self._sorted_hi, keys[:, 0]), self.count - 1)
+                new = ~((self._sorted_hi[pos] == keys[:, 0]) & (self._sorted_lo[pos] == keys[:, 1]))
+                keys, vectors = keys[new], vectors[new]
+            for name, data, row_bytes in (('vectors.f32', vectors, self.dimension * 4), ('keys.u64', keys, KEY_BYTES)):
+                with open(self.cache_dir / name, 'ab') as f:
+                    f.truncate(self.count * row_bytes)  # rows a crashed flush left behind
+                    data.tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.count += len(keys)
+            manifest = {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'model': self.model_key,
+                        'dimension': self.dimension, 'count': self.count}
+            tmp_path = self.cache_dir / (MANIFEST_NAME + '.tmp')
+            tmp_path.write_text(json.dumps(manifest), encoding='utf-8')
+            os.replace(tmp_path, self.cache_dir / MANIFEST_NAME)
+            self._pending_keys, self._pending_vectors = [], []
+            self._pending_rows = {}
+            self._load()
+        logger.debug(f"💾 [EmbeddingCache] {self.count:,} vectors cached in {self.cache_dir}")
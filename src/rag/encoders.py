@@ -0,0 +1,91 @@
+from pathlib import Path
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+MODEL_CACHE_DIR = Path("model_cache")
+
+ENCODER_BACKENDS = ('torch', 'int8', 'onnx', 'onnx-int8')
+
+# ONNX graphs inside the model repo / cache (all-MiniLM-L6-v2 ships both on the Hub;
+# `export_onnx` writes the same layout for models that don't)
+ONNX_FILES = {
+    'onnx': 'onnx/model.onnx',
+    'onnx-int8': 'onnx/model_quint8_avx2.onnx',
+}
+
+
+def load_encoder(model_name: str = DEFAULT_MODEL, backend: str = 'torch', cache_dir: Path = None):
+    """
+    Load a SentenceTransformer query/document encoder on the chosen backend.
+
+    Backends:
+        torch      full-precision PyTorch (the default; what the index was built with)
+        int8       PyTorch with dynamic int8 quantization of every Linear layer, on CPU
+        onnx       ONNX Runtime, fp32 graph
+        onnx-int8  ONNX Runtime, dynamically quantized int8 graph
+
+    All backends return the same `encode` API, so callers don't need to know which
+    one they got. Check a backend against fp32 with `python src/encoder_report.py`
+    before serving an index built with a different one.
+
+    Args:
+        model_name (str): Hub id or local directory.
+        backend (str): One of ENCODER_BACKENDS.
+        cache_dir (Path): Where models are cached; the ONNX backends default to model_cache/.
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}. Supported: {list(ENCODER_BACKENDS)}")
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'torch':
+        kwargs = {} if cache_dir is None else {'cache_folder': str(cache_dir)}
+        return SentenceTransformer(model_name, **kwargs)
+
+    if backend == 'int8':
+        import torch
+
+        kwargs = {} if cache_dir is None else {'cache_folder': str(cache_dir)}
+        model = SentenceTransformer(model_name, device='cpu', **kwargs)
+        # Weights are stored as int8; activations are quantized on the fly per batch
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return SentenceTransformer(
+        model_name,
+        backend='onnx',
+        device='cpu',
+        cache_folder=str(cache_dir or MODEL_CACHE_DIR),
+        model_kwargs={'file_name': ONNX_FILES[backend], 'provider': 'CPUExecutionProvider'},
+    )
+
+
+def export_onnx(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """
+    Export `model_name` to ONNX (plus an int8 graph) in `output_dir`, for models
+    whose Hub repo doesn't ship one. Load it back with
+    `load_encoder(str(output_dir), 'onnx' | 'onnx-int8')`.
+    """
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    output_dir = Path(output_dir)
+    model = SentenceTransformer(model_name, backend='onnx', device='cpu')
+    model.save_pretrained(str(output_dir))
+    if quantize:
+        export_dynamic_quantized_onnx_model(model, 'avx2', str(output_dir))
+    return output_dir
+
+
+def add_encoder_arguments(parser):
+    """Add the --encoder-backend option shared by the embedding scripts."""
+    parser.add_argument('--encoder-backend', choices=ENCODER_BACKENDS, default='torch',
+                        help="How to run the sentence encoder (see src/encoder_report.py for parity)")
+    return parser
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m src.rag.encoders <model_name> <output_dir>")
+        sys.exit(1)
+    out = export_onnx(sys.argv[1], Path(sys.argv[2]))
+    print(f"✅ Exported ONNX graphs to {out}")
@@ -0,0 +1,225 @@
+"""
+Retrieval quality against exact search.
+
+Speed-ups to the retriever (ANN indexes, quantized encoders, caching) trade away
+some quality. This module measures how much: exact nearest neighbours of a query
+set are computed once with `IndexFlatL2` and cached on disk, then any retriever
+configuration is scored against them (recall@k, MRR, nDCG@k) together with its
+per-query latency, giving a speed/quality Pareto table.
+
+    truth = load_ground_truth(queries, exact_index_path, metadata, encoder, k=10,
+                              cache_dir='vector_store/eval_cache')
+    evaluator = RetrievalEvaluator(queries, truth)
+    rows = [evaluator.evaluate(retriever, 'hnsw', ef_search=ef) for ef in (16, 64, 256)]
+    mark_pareto(rows)
+
+See `src/evaluate_retrieval.py` for the command-line sweep.
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .index_factory import index_kind
+from .telemetry import get_logger
+
+logger = get_logger('evaluation')
+
+GROUND_TRUTH_VERSION = 1
+
+
+class GroundTruth:
+    """Exact top-k neighbours (row ids and chunk ids) of each query, nearest first."""
+    def __init__(self, queries: list, rows: np.ndarray, distances: np.ndarray, chunk_ids: np.ndarray):
+        self.queries = list(queries)
+        self.rows = rows
+        self.distances = distances
+        self.chunk_ids = chunk_ids
+
+    @property
+    def k(self) -> int:
+        return self.rows.shape[1]
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez(tmp_path, queries=np.array(self.queries), rows=self.rows, distances=self.distances,
+                 chunk_ids=self.chunk_ids)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'GroundTruth':
+        with np.load(path) as data:
+            return cls(data['queries'].tolist(), data['rows'], data['distances'], data['chunk_ids'])
+
+
+def exact_index(index):
+    """
+    An IndexFlatL2 over the vectors stored in `index`.
+
+    Flat indexes are used as they are; HNSW and IVF-Flat indexes keep the full
+    vectors, which are copied out. Compressed (PQ) indexes can't give exact
+    answers, so the flat index they were built from has to be passed instead.
+    """
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexFlatL2):
+        return index
+    kind = index_kind(index)
+    if kind == 'ivf':
+        ivf = faiss.extract_index_ivf(index)
+        if not isinstance(faiss.downcast_index(ivf), faiss.IndexIVFFlat):
+            raise ValueError("This IVF index stores compressed vectors; pass the flat index it was built from")
+        ivf.make_direct_map()
+    elif kind == 'hnsw' and not isinstance(index, faiss.IndexHNSWFlat):
+        raise ValueError("This HNSW index stores compressed vectors; pass the flat index it was built from")
+    flat = faiss.IndexFlatL2(index.d)
+    flat.add(index.reconstruct_n(0, index.ntotal))
+    return flat
+
+
+def compute_ground_truth(queries: list, query_embeddings: np.ndarray, index, metadata, k: int,
+                         batch_size: int = 256) -> GroundTruth:
+    """Exact top-k of every query embedding over `index`, with the hits' chunk ids from `metadata`."""
+    flat = exact_index(index)
+    embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+    distances = np.empty((len(embeddings), k), dtype='float32')
+    rows = np.empty((len(embeddings), k), dtype='int64')
+    for start in range(0, len(embeddings), batch_size):
+        end = start + batch_size
+        distances[start:end], rows[start:end] = flat.search(embeddings[start:end], k)
+    chunk_ids = np.array([[metadata.field(int(r), 'chunk_id') if r >= 0 else '' for r in row] for row in rows])
+    return GroundTruth(queries, rows, distances, chunk_ids)
+
+
+def ground_truth_key(queries: list, index_path: Path, model_name: str, k: int) -> str:
+    """Cache key: the query set, the encoder, k and the exact index file's identity."""
+    stat = Path(index_path).stat()
+    payload = json.dumps([GROUND_TRUTH_VERSION, model_name, k, str(Path(index_path).resolve()),
+                          stat.st_size, stat.st_mtime_ns, list(queries)])
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def load_ground_truth(queries: list, index_path: Path, metadata, encoder, k: int = 10,
+                      cache_dir: Path = None, model_name: str = '') -> GroundTruth:
+    """
+    Ground truth for `queries`, read from `cache_dir` when it was computed before.
+
+    Args:
+        queries (list): Natural-language questions.
+        index_path (Path): FAISS index holding the exact vectors (see `exact_index`).
+        metadata: Metadata store row-aligned with the index, for the chunk ids.
+        encoder: Reference query encoder (SentenceTransformer-like `encode`).
+        k (int): Neighbours per query.
+        cache_dir (Path): Where ground truth files are kept (None = no caching).
+        model_name (str): Name of `encoder`, part of the cache key.
+    """
+    import faiss
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir) / f'truth-{ground_truth_key(queries, index_path, model_name, k)}.npz'
+        if cache_path.exists():
+            logger.info(f"📦 [Evaluation] Using cached ground truth {cache_path}")
+            return GroundTruth.load(cache_path)
+
+    logger.info(f"📏 [Evaluation] Computing exact top-{k} for {len(queries)} queries over {index_path}...")
+    start = time.perf_counter()
+    embeddings = encoder.encode(list(queries), batch_size=64, convert_to_numpy=True)
+    truth = compute_ground_truth(queries, embeddings, faiss.read_index(str(index_path)), metadata, k)
+    logger.info(f"✅ [Evaluation] Ground truth ready in {time.perf_counter() - start:.1f}s")
+    if cache_path is not None:
+        truth.save(cache_path)
+    return truth
+
+
+def score(found: list, truth: list, k: int) -> dict:
+    """
+    Quality of one result list against the exact neighbours, both as chunk ids.
+
+    recall@k is the share of the exact top-k that was returned; MRR is the
+    reciprocal rank at which the exact nearest neighbour was returned (0 if it
+    wasn't); nDCG@k grades each returned chunk by its exact rank (the nearest
+    neighbour is worth k, the k-th one 1).
+    """
+    truth = [c for c in truth[:k] if c]
+    if not truth:
+        return {'recall_at_k': 1.0, 'mrr': 1.0, 'ndcg_at_k': 1.0}
+    found = list(found[:k])
+    relevance = {chunk_id: k - rank for rank, chunk_id in enumerate(truth)}
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    dcg = sum(relevance.get(chunk_id, 0) * discounts[i] for i, chunk_id in enumerate(found))
+    ideal = sum(rel * discounts[i] for i, rel in enumerate(sorted(relevance.values(), reverse=True)))
+    return {
+        'recall_at_k': len(set(found) & set(truth)) / len(truth),
+        'mrr': 1 / (found.index(truth[0]) + 1) if truth[0] in found else 0.0,
+        'ndcg_at_k': float(dcg / ideal),
+    }
+
+
+class RetrievalEvaluator:
+    """Scores retriever configurations on one query set against its ground truth."""
+    def __init__(self, queries: list, truth: GroundTruth, k: int = None, warmup: int = 5):
+        """
+        Args:
+            queries (list): The questions `truth` was computed for.
+            truth (GroundTruth): Exact neighbours of `queries`.
+            k (int): Cut-off for the metrics (default: the ground truth's k).
+            warmup (int): Untimed searches run first to page in the index.
+        """
+        if list(queries) != truth.queries:
+            raise ValueError("The ground truth was computed for a different query set")
+        self.queries = list(queries)
+        self.truth = truth
+        self.k = k or truth.k
+        if self.k > truth.k:
+            raise ValueError(f"k={self.k} is larger than the ground truth's k={truth.k}")
+        self.warmup = warmup
+
+    def evaluate(self, retriever, label: str, **search_kwargs) -> dict:
+        """
+        Run every query through `retriever.search(query, top_k=k, **search_kwargs)`
+        one at a time and return its mean quality metrics and latency percentiles.
+        The retriever's caches are cleared first so every query reaches the index.
+        """
+        for query in self.queries[:self.warmup]:
+            retriever.search(query, top_k=self.k, **search_kwargs)
+        retriever.embedding_cache.clear()
+        retriever.result_cache.clear()
+
+        latencies = np.empty(len(self.queries))
+        scores = []
+        for i, query in enumerate(self.queries):
+            start = time.perf_counter()
+            results = retriever.search(query, top_k=self.k, **search_kwargs)
+            latencies[i] = (time.perf_counter() - start) * 1000
+            scores.append(score([r['chunk_id'] for r in results], list(self.truth.chunk_ids[i]), self.k))
+
+        row = {'config': label, 'params': search_kwargs, 'k': self.k}
+        for metric in ('recall_at_k', 'mrr', 'ndcg_at_k'):
+            row[metric] = float(np.mean([s[metric] for s in scores]))
+        row.update({
+            'mean_ms': float(np.mean(latencies)),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+        })
+        return row
+
+
+def mark_pareto(rows: list, quality: str = 'recall_at_k', latency: str = 'p50_ms') -> list:
+    """
+    Flag (`row['pareto']`) the configurations no other one beats on both quality
+    and latency, and return those, fastest first.
+    """
+    for row in rows:
+        row['pareto'] = not any(
+            other[quality] >= row[quality] and other[latency] <= row[latency]
+            and (other[quality] > row[quality] or other[latency] < row[latency])
+            for other in rows
+        )
+    return sorted((r for r in rows if r['pareto']), key=lambda r: r[latency])
@@ -0,0 +1,192 @@
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .cache import LRUCache
+from .index_factory import index_kind, search_parameters, widened_parameters
+from .metadata_store import build_date_order, build_postings, to_days, MISSING_DAY
+
+DATE_RANGE_KEYS = {'date_from': 'date', 'date_to': 'date'}
+# Selections matching at most this many rows are scored exactly over their own vectors
+EXACT_FILTER_LIMIT = 20000
+
+
+def active_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Drop unset fields so {'product': None} behaves like no filter at all."""
+    return {k: v for k, v in (filters or {}).items() if v not in (None, '', [])}
+
+
+def filter_key(filters: Optional[Dict[str, Any]]) -> tuple:
+    """Hashable, order-independent key for a filter dict."""
+    return tuple(sorted(
+        (k, tuple(v) if isinstance(v, (list, tuple)) else v) for k, v in active_filters(filters).items()
+    ))
+
+
+def date_bounds(date_from, date_to) -> np.ndarray:
+    """
+    The [date_from, date_to] range as days since the epoch, MISSING_DAY for an
+    open end. A bound that is given but can't be parsed raises ValueError rather
+    than silently widening the range.
+    """
+    bounds = to_days([date_from, date_to])
+    for key, value, day in zip(DATE_RANGE_KEYS, (date_from, date_to), bounds):
+        if value not in (None, '') and day == MISSING_DAY:
+            raise ValueError(f"Can't parse {key}={value!r}; expected a 'YYYY-MM-DD' date")
+    return bounds
+
+
+class Selection:
+    """The set of row ids matching a filter, as a boolean mask, a sorted id array and a packed bitmap."""
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+        self.ids = np.flatnonzero(mask).astype('int64')
+        self.count = len(self.ids)
+        self.bitmap = np.packbits(mask, bitorder='little')
+
+    def selector(self):
+        """FAISS IDSelector restricting a search to this selection."""
+        import faiss
+
+        selector = faiss.IDSelectorBitmap(self.bitmap)
+        # Keep the bitmap alive for as long as FAISS holds a pointer to it
+        selector.referenced_bitmap = self.bitmap
+        return selector
+
+
+def filtered_search(index, query_embeddings: np.ndarray, top_k: int, selection: Selection,
+                    nprobe: int = None, ef_search: int = None, exact_limit: int = EXACT_FILTER_LIMIT):
+    """
+    Search only the rows of `index` in `selection`.
+
+    Small selections are scored exactly over their own vectors; larger ones run
+    the index with an IDSelector, widening the probe for any query an
+    approximate index answered with fewer hits than there are matching rows.
+    """
+    k = min(top_k, selection.count)
+    if selection.count <= exact_limit:
+        exact = exact_subset_search(index, query_embeddings, selection.ids, k)
+        if exact is not None:
+            return exact
+
+    selector = selection.selector()
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    distances, indices = index.search(query_embeddings, k, params=params)
+    short = (indices >= 0).sum(axis=1) < k
+    if index_kind(index) != 'flat' and short.any():
+        params = widened_parameters(index, k, selector=selector)
+        distances[short], indices[short] = index.search(query_embeddings[short], k, params=params)
+    return distances, indices
+
+
+def exact_subset_search(index, query_embeddings: np.ndarray, ids: np.ndarray, k: int):
+    """
+    Brute-force L2 over the vectors of `ids`; None if the index can't reconstruct
+    them (e.g. an IVF index loaded without `index_factory.enable_reconstruction`).
+    """
+    import faiss
+
+    try:
+        vectors = index.reconstruct_batch(ids)
+    except RuntimeError:
+        return None
+    distances, positions = faiss.knn(query_embeddings, vectors, k)
+    return distances, np.where(positions >= 0, ids[positions], -1)
+
+
+class FilterIndex:
+    """
+    Inverted index over the metadata columns used to pre-filter vector search.
+
+    Category filters (product, company, state) match case-insensitively as a
+    substring of the stored value, so 'Credit card' also selects 'Credit card or
+    prepaid card'. A list of values selects their union. Dates are filtered with
+    inclusive `date_from` / `date_to` bounds ('YYYY-MM-DD').
+
+    Postings come from the metadata store when it was written with them; older
+    stores and legacy JSON metadata have theirs built in memory on first use.
+    """
+    def __init__(self, metadata, cache_size: int = 64):
+        self.metadata = metadata
+        self.count = len(metadata)
+        self.cache_size = cache_size
+        self._postings = {}
+        self._date_orders = {}
+        # Shared by concurrent searches, so it needs the thread-safe cache
+        self._cache = LRUCache(max_size=cache_size)
+
+    @property
+    def columns(self):
+        return tuple(self.metadata.categories) + tuple(DATE_RANGE_KEYS)
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[Selection]:
+        """
+        Resolve `filters` to the matching rows.
+
+        Returns:
+            Selection, or None when no filter is active (search everything).
+        """
+        filters = active_filters(filters)
+        if not filters:
+            return None
+        unknown = set(filters) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown filter fields {sorted(unknown)}. Supported: {list(self.columns)}")
+
+        key = filter_key(filters)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        mask = np.ones(self.count, dtype=bool)
+        for name, value in filters.items():
+            if name in DATE_RANGE_KEYS:
+                continue
+            mask &= self._category_mask(name, value)
+        if 'date_from' in filters or 'date_to' in filters:
+            mask &= self._date_mask('date', filters.get('date_from'), filters.get('date_to'))
+
+        selection = Selection(mask)
+        self._cache.put(key, selection)
+        return selection
+
+    def matching_codes(self, name: str, value) -> list:
+        """Codes of the stored values of category `name` that `value` (or any of a list) is a substring of."""
+        values = value if isinstance(value, (list, tuple)) else [value]
+        needles = [str(v).lower() for v in values]
+        return [code for code, stored in enumerate(self.metadata.categories[name])
+                if any(needle in stored.lower() for needle in needles)]
+
+    def _category_mask(self, name: str, value) -> np.ndarray:
+        codes = self.matching_codes(name, value)
+
+        offsets, ids = self._get_postings(name)
+        mask = np.zeros(self.count, dtype=bool)
+        for code in codes:
+            mask[ids[offsets[code]:offsets[code + 1]]] = True
+        return mask
+
+    def _date_mask(self, name: str, date_from, date_to) -> np.ndarray:
+        sorted_days, ids = self._get_date_order(name)
+        lo, hi = date_bounds(date_from, date_to)
+        start = 0 if lo == MISSING_DAY else np.searchsorted(sorted_days, lo, side='left')
+        end = len(sorted_days) if hi == MISSING_DAY else np.searchsorted(sorted_days, hi, side='right')
+        mask = np.zeros(self.count, dtype=bool)
+        mask[ids[start:end]] = True
+        return mask
+
+    def _get_postings(self, name: str):
+        if name not in self._postings:
+            postings = self.metadata.postings(name)
+            if postings is None:
+                postings = build_postings(self.metadata.codes(name), len(self.metadata.categories[name]))
+            self._postings[name] = postings
+        return self._postings[name]
+
+    def _get_date_order(self, name: str):
+        if name not in self._date_orders:
+            order = self.metadata.date_order(name)
+            if order is None:
+                order = build_date_order(self.metadata.days(name))
+            self._date_orders[name] = order
+        return self._date_orders[name]
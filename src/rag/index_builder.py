@@ -0,0 +1,113 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .index_factory import build_index, describe_index, train_index
+from .metadata_store import MetadataWriter
+from .telemetry import get_logger
+
+logger = get_logger('index_builder')
+
+
+class IndexBuilder:
+    """
+    Incrementally builds a FAISS index and its metadata store side by side.
+
+    Every `add_batch` appends vectors to the index and the matching rows to the
+    MetadataWriter under one lock, so row i of the metadata always describes
+    vector i regardless of how many threads feed the builder.
+
+    Indexes that need training (IVF / PQ) can't take vectors until the end of
+    the stream: the input is ordered by date and product, so its first vectors
+    are no sample of the rest. Until `close` they are spilled to a scratch file
+    next to the index while a uniform reservoir sample of `train_size` of them
+    is kept; `close` trains on that sample and then adds the spilled vectors.
+    Memory use is therefore the index itself plus the training sample.
+    """
+    def __init__(self, index_path: Path, metadata_dir: Path, dimension: int,
+                 index_type: str = 'flat', train_size: int = 200000, index=None, seed: int = 42,
+                 **index_kwargs):
+        """
+        Args:
+            index_path (Path): Where the finished FAISS index is written.
+            metadata_dir (Path): Directory of the metadata store.
+            dimension (int): Embedding dimension.
+            index_type (str): See index_factory.INDEX_TYPES.
+            train_size (int): Vectors sampled to train IVF/PQ indexes.
+            index: Use this (empty) index instead of building one from `index_type`.
+            seed (int): Seed of the training sample.
+            **index_kwargs: Extra options for `build_index` (nlist, pq_m, ...).
+        """
+        self.index_path = Path(index_path)
+        self.index = index if index is not None else build_index(index_type, dimension, **index_kwargs)
+        self.metadata = MetadataWriter(metadata_dir)
+        self.train_size = train_size
+        self.count = 0
+        self._sample = None  # reservoir of training vectors, while the index is untrained
+        self._spill = None
+        self._spill_path = self.index_path.with_name(self.index_path.name + '.spill')
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def add_batch(self, embeddings: np.ndarray, **columns):
+        """
+        Append embeddings and their metadata columns (see MetadataWriter.append_batch).
+        Returns the row id of the batch's first row.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        with self._lock:
+            first_row = self.count
+            self.metadata.append_batch(**columns)
+            if self.index.is_trained:
+                self.index.add(embeddings)
+            else:
+                self._reservoir_add(embeddings, first_row)
+                if self._spill is None:
+                    self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._spill = open(self._spill_path, 'wb')
+                embeddings.tofile(self._spill)
+            self.count += len(embeddings)
+        return first_row
+
+    def _reservoir_add(self, embeddings: np.ndarray, first_row: int):
+        """Algorithm R: row i replaces a random sample slot with probability train_size / (i + 1)."""
+        if self._sample is None:
+            self._sample = np.empty((self.train_size, embeddings.shape[1]), dtype='float32')
+        fill = max(0, min(len(embeddings), self.train_size - first_row))
+        self._sample[first_row:first_row + fill] = embeddings[:fill]
+        rows = np.arange(first_row + fill, first_row + len(embeddings))
+        slots = self._rng.integers(0, rows + 1)
+        keep = slots < self.train_size
+        self._sample[slots[keep]] = embeddings[fill:][keep]
+
+    def _train_and_flush(self, batch_size: int = 65536):
+        sample = self._sample[:min(self.count, self.train_size)]
+        logger.info(f"🎯 [IndexBuilder] Training index on a sample of {len(sample):,} of {self.count:,} vectors...")
+        train_index(self.index, sample)
+        self._sample = None
+        self._spill.close()
+        spilled = np.memmap(self._spill_path, dtype='float32', mode='r', shape=(self.count, self.index.d))
+        for start in range(0, self.count, batch_size):
+            self.index.add(np.ascontiguousarray(spilled[start:start + batch_size]))
+        del spilled
+        self._spill_path.unlink()
+        self._spill = None
+
+    def close(self) -> dict:
+        """
+        Train on the sample and add the spilled vectors (if still untrained), then
+        publish the metadata and the index. The index goes last: servers reload
+        when its file changes, and must find the matching metadata already in place.
+        """
+        import faiss
+
+        with self._lock:
+            if self._spill is not None:
+                self._train_and_flush()
+            self.metadata.close()
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(self.index_path.suffix + '.tmp')
+            faiss.write_index(self.index, str(tmp_path))
+            tmp_path.replace(self.index_path)
+            return describe_index(self.index)
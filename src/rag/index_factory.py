@@ -0,0 +1,200 @@
+import numpy as np
+
+# faiss is imported inside each function so importing this module (and with it
+# the retriever) stays cheap until an index is actually built or loaded.
+
+# Index types the build scripts can produce
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+DEFAULT_NLIST = 4096
+DEFAULT_NPROBE = 16
+DEFAULT_PQ_M = 48  # 384 dims / 48 sub-quantizers = 8 dims each -> 48 bytes per vector
+DEFAULT_PQ_BITS = 8
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 200
+DEFAULT_EF_SEARCH = 64
+
+
+def factory_string(index_type: str, nlist: int = DEFAULT_NLIST, pq_m: int = DEFAULT_PQ_M,
+                   pq_bits: int = DEFAULT_PQ_BITS, hnsw_m: int = DEFAULT_HNSW_M) -> str:
+    """Translate an index type and its knobs into a `faiss.index_factory` description."""
+    if index_type == 'flat':
+        return 'Flat'
+    if index_type == 'ivf_flat':
+        return f'IVF{nlist},Flat'
+    if index_type == 'ivf_pq':
+        return f'IVF{nlist},PQ{pq_m}x{pq_bits}'
+    if index_type == 'hnsw':
+        return f'HNSW{hnsw_m},Flat'
+    raise ValueError(f"Unknown index type '{index_type}'. Choose from {INDEX_TYPES}")
+
+
+def build_index(index_type: str, dimension: int, nlist: int = DEFAULT_NLIST,
+                nprobe: int = DEFAULT_NPROBE, pq_m: int = DEFAULT_PQ_M, pq_bits: int = DEFAULT_PQ_BITS,
+                hnsw_m: int = DEFAULT_HNSW_M, ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+                ef_search: int = DEFAULT_EF_SEARCH):
+    """
+    Create an empty (possibly untrained) L2 index.
+
+    The search-time defaults (nprobe / efSearch) are stored on the index, so they
+    are persisted by `faiss.write_index` and picked up again by the retriever.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        dimension (int): Embedding dimension.
+        nlist (int): Number of IVF centroids.
+        nprobe (int): Default number of IVF lists visited per query.
+        pq_m (int): Number of PQ sub-quantizers (must divide `dimension`).
+        pq_bits (int): Bits per PQ code.
+        hnsw_m (int): Neighbours per HNSW node.
+        ef_construction (int): HNSW build-time beam width.
+        ef_search (int): Default HNSW query-time beam width.
+    """
+    import faiss
+
+    if index_type == 'ivf_pq' and dimension % pq_m != 0:
+        raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dimension}")
+
+    index = faiss.index_factory(dimension, factory_string(index_type, nlist, pq_m, pq_bits, hnsw_m),
+                                faiss.METRIC_L2)
+    kind = index_kind(index)
+    if kind == 'ivf':
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    elif kind == 'hnsw':
+        hnsw = faiss.downcast_index(index).hnsw
+        hnsw.efConstruction = ef_construction
+        hnsw.efSearch = ef_search
+    return index
+
+
+def train_index(index, sample: np.ndarray):
+    """Train centroids / codebooks on `sample` if the index needs it."""
+    import faiss
+
+    if index.is_trained:
+        return
+    sample = np.ascontiguousarray(sample, dtype='float32')
+    if index_kind(index) == 'ivf':
+        nlist = faiss.extract_index_ivf(index).nlist
+        if len(sample) < nlist:
+            raise ValueError(f"Need at least nlist={nlist} training vectors, got {len(sample)}")
+    index.train(sample)
+
+
+def index_kind(index) -> str:
+    """Classify a loaded index as 'flat', 'ivf' or 'hnsw'."""
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    try:
+        faiss.extract_index_ivf(index)
+        return 'ivf'
+    except RuntimeError:
+        pass
+    return 'flat'
+
+
+def enable_reconstruction(index) -> bool:
+    """
+    Build the id -> inverted-list map IVF indexes need before `reconstruct_batch`
+    works. This mutates the index, so do it before the index is shared between
+    threads (e.g. right after loading), never on the search path.
+
+    Returns:
+        bool: Whether the index can reconstruct vectors (memory-mapped IVF lists can't take the map).
+    """
+    import faiss
+
+    if index_kind(index) != 'ivf':
+        return True
+    ivf = faiss.extract_index_ivf(index)
+    if ivf.direct_map.type != faiss.DirectMap.NoMap:
+        return True
+    try:
+        ivf.make_direct_map()
+    except RuntimeError:
+        return False
+    return True
+
+
+def search_parameters(index, nprobe: int = None, ef_search: int = None, selector=None):
+    """
+    Build per-query FAISS search parameters for `index`.
+
+    Returns None when nothing needs overriding so callers can pass it straight
+    through to `index.search(..., params=...)`.
+    """
+    import faiss
+
+    kind = index_kind(index)
+    kwargs = {} if selector is None else {'sel': selector}
+    if kind == 'ivf' and nprobe is not None:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe), **kwargs)
+    if kind == 'hnsw' and ef_search is not None:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search), **kwargs)
+    if kwargs:
+        if kind == 'ivf':
+            return faiss.SearchParametersIVF(nprobe=faiss.extract_index_ivf(index).nprobe, **kwargs)
+        if kind == 'hnsw':
+            return faiss.SearchParametersHNSW(efSearch=faiss.downcast_index(index).hnsw.efSearch, **kwargs)
+        return faiss.SearchParameters(**kwargs)
+    return None
+
+
+def widened_parameters(index, top_k: int, selector=None):
+    """
+    Search parameters that trade speed for completeness: every IVF list, or a much
+    wider HNSW beam. Used when a filtered search on an approximate index came back
+    short because the matching ids sat outside the probed region.
+    """
+    import faiss
+
+    kind = index_kind(index)
+    if kind == 'ivf':
+        return search_parameters(index, nprobe=faiss.extract_index_ivf(index).nlist, selector=selector)
+    if kind == 'hnsw':
+        ef = faiss.downcast_index(index).hnsw.efSearch
+        return search_parameters(index, ef_search=max(ef * 8, top_k * 16), selector=selector)
+    return search_parameters(index, selector=selector)
+
+
+def describe_index(index) -> dict:
+    """Summarise an index for logs and reports."""
+    import faiss
+
+    kind = index_kind(index)
+    info = {'kind': kind, 'ntotal': int(index.ntotal), 'dimension': int(index.d)}
+    if kind == 'ivf':
+        ivf = faiss.extract_index_ivf(index)
+        info.update(nlist=int(ivf.nlist), nprobe=int(ivf.nprobe))
+    elif kind == 'hnsw':
+        info.update(ef_search=int(faiss.downcast_index(index).hnsw.efSearch))
+    return info
+
+
+def add_index_arguments(parser):
+    """Register the shared index-building CLI options on an argparse parser."""
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default='flat',
+                        help="FAISS index to build (default: exact flat L2)")
+    parser.add_argument('--nlist', type=int, default=DEFAULT_NLIST, help="IVF centroids")
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help="Default IVF lists probed per query")
+    parser.add_argument('--pq-m', type=int, default=DEFAULT_PQ_M, help="PQ sub-quantizers (ivf_pq)")
+    parser.add_argument('--pq-bits', type=int, default=DEFAULT_PQ_BITS, help="Bits per PQ code (ivf_pq)")
+    parser.add_argument('--hnsw-m', type=int, default=DEFAULT_HNSW_M, help="HNSW neighbours per node")
+    parser.add_argument('--ef-construction', type=int, default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument('--ef-search', type=int, default=DEFAULT_EF_SEARCH, help="Default HNSW efSearch")
+    parser.add_argument('--train-size', type=int, default=200000,
+                        help="Vectors sampled to train IVF centroids / PQ codebooks")
+    return parser
+
+
+def build_index_from_args(args, dimension: int):
+    """Create an index from options registered by `add_index_arguments`."""
+    return build_index(
+        args.index_type, dimension,
+        nlist=args.nlist, nprobe=args.nprobe,
+        pq_m=args.pq_m, pq_bits=args.pq_bits,
+        hnsw_m=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search,
+    )
@@ -0,0 +1,341 @@
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_NAME = 'complaint-bm25'
+FORMAT_VERSION = 1
+
+OFFSET_DTYPE = np.uint64
+DOC_DTYPE = np.uint32
+TF_DTYPE = np.uint16
+LENGTH_DTYPE = np.uint32
+SCORE_DTYPE = np.float32
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Very common English words carry no signal for BM25 but have the longest postings
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from had has have i if in into is it its me my of on or our so "
+    "that the their them then there these they this to was we were what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case alphanumeric tokens, minus stopwords. Keeps acronyms like 'respa' and 'fdcpa' intact."""
+    return [t for t in _TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def is_lexical_index(path: Path) -> bool:
+    """Return True if `path` is a directory written by LexicalIndexWriter."""
+    return (Path(path) / MANIFEST_NAME).exists()
+
+
+def bm25_scores(tfs: np.ndarray, doc_lengths: np.ndarray, idf: float, avgdl: float,
+                k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> np.ndarray:
+    """Okapi BM25 contribution of one term for each (tf, document length) pair."""
+    tfs = tfs.astype(SCORE_DTYPE)
+    norm = k1 * (1.0 - b + b * doc_lengths.astype(SCORE_DTYPE) / avgdl)
+    return (idf * tfs * (k1 + 1.0) / (tfs + norm)).astype(SCORE_DTYPE)
+
+
+def bm25_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    """Non-negative BM25 idf (the Lucene variant), so every match adds a positive score."""
+    df = np.asarray(df, dtype=np.float64)
+    return np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(SCORE_DTYPE)
+
+
+class LexicalIndexWriter:
+    """
+    Builds an on-disk BM25 inverted index over the same rows as a FAISS index.
+
+    Layout of `index_dir`:
+        terms.offsets / terms.data   sorted vocabulary (uint64 offsets + UTF-8 blob)
+        postings.offsets             uint64 CSR offsets, one slice per term
+        postings.docs                uint32 row ids, ascending within each term
+        postings.tfs                 uint16 term frequencies, parallel to docs
+        term_max.scores              float32 best BM25 score of each term (MaxScore bound)
+        doc_lengths                  uint32 token count of each row
+        manifest.json                counts and BM25 parameters, written last
+
+    Row i of the lexical index is row i of the metadata store and vector i of the
+    FAISS index, so results from either side can be fused by id.
+    """
+    def __init__(self, index_dir: Path, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self.index_dir / MANIFEST_NAME
+        if manifest.exists():
+            manifest.unlink()
+        self.k1 = k1
+        self.b = b
+        self.count = 0
+        self._vocab: Dict[str, int] = {}
+        self._term_ids: List[np.ndarray] = []
+        self._doc_ids: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+        self._lengths: List[np.ndarray] = []
+
+    def add_batch(self, texts: Sequence[str]):
+        """Tokenize and append one batch of rows."""
+        term_ids, doc_ids, tfs, lengths = [], [], [], []
+        vocab = self._vocab
+        for offset, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(self.count + offset)
+                tfs.append(tf)
+        self._term_ids.append(np.asarray(term_ids, dtype=np.int64))
+        self._doc_ids.append(np.asarray(doc_ids, dtype=DOC_DTYPE))
+        self._tfs.append(np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(TF_DTYPE).max).astype(TF_DTYPE))
+        self._lengths.append(np.asarray(lengths, dtype=LENGTH_DTYPE))
+        self.count += len(texts)
+
+    def close(self) -> int:
+        """Sort the postings by term, compute the MaxScore bounds and publish the manifest."""
+        terms = sorted(self._vocab)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[self._vocab[t] for t in terms]] = np.arange(len(terms))
+
+        term_ids = rank[np.concatenate(self._term_ids)] if self._term_ids else np.empty(0, np.int64)
+        # Stable sort keeps each term's row ids ascending, as they were appended
+        order = np.argsort(term_ids, kind='stable')
+        docs = np.concatenate(self._doc_ids)[order] if self._doc_ids else np.empty(0, DOC_DTYPE)
+        tfs = np.concatenate(self._tfs)[order] if self._tfs else np.empty(0, TF_DTYPE)
+        lengths = np.concatenate(self._lengths) if self._lengths else np.empty(0, LENGTH_DTYPE)
+        df = np.bincount(term_ids, minlength=len(terms))
+        offsets = np.zeros(len(terms) + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(df, out=offsets[1:])
+
+        avgdl = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        idf = bm25_idf(df, self.count)
+        scores = bm25_scores(tfs, lengths[docs], 1.0, avgdl, self.k1, self.b)  # tf part only
+        term_max = (np.maximum.reduceat(scores, offsets[:-1].astype(np.int64)) * idf
+                    if len(terms) else np.empty(0, SCORE_DTYPE))
+        del scores
+
+        encoded = [t.encode('utf-8') for t in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=OFFSET_DTYPE)
+        np.cumsum([len(t) for t in encoded], out=term_offsets[1:])
+        term_offsets.tofile(self.index_dir / 'terms.offsets')
+        with open(self.index_dir / 'terms.data', 'wb') as f:
+            f.write(b''.join(encoded))
+        offsets.tofile(self.index_dir / 'postings.offsets')
+        docs.astype(DOC_DTYPE).tofile(self.index_dir / 'postings.docs')
+        tfs.astype(TF_DTYPE).tofile(self.index_dir / 'postings.tfs')
+        term_max.astype(SCORE_DTYPE).tofile(self.index_dir / 'term_max.scores')
+        lengths.tofile(self.index_dir / 'doc_lengths')
+
+        manifest = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'count': self.count,
+            'terms': len(terms),
+            'postings': int(len(docs)),
+            'avgdl': avgdl,
+            'k1': self.k1,
+            'b': self.b,
+        }
+        tmp_path = self.index_dir / (MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.index_dir / MANIFEST_NAME)
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def _memmap(path: Path, dtype) -> np.ndarray:
+    # np.memmap can't map empty files
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class LexicalIndex:
+    """
+    Read-only, memory-mapped BM25 index written by LexicalIndexWriter.
+
+    `search` returns the exact BM25 top-k using vectorized MaxScore pruning:
+    query terms are scored from the highest score bound down, and once the
+    bounds of the terms still to come can no longer lift an unseen row past the
+    current k-th best score, those terms only probe the surviving candidates
+    (binary search into their postings) instead of being scored in full. Common
+    terms therefore cost O(candidates * log df) rather than O(df).
+    """
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_NAME:
+            raise ValueError(f"{self.index_dir} is not a lexical index")
+        if manifest.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexical index version {manifest['version']}")
+
+        self.count = manifest['count']
+        self.n_terms = manifest['terms']
+        self.avgdl = manifest['avgdl']
+        self.k1 = manifest['k1']
+        self.b = manifest['b']
+
+        self._term_offsets = _memmap(self.index_dir / 'terms.offsets', OFFSET_DTYPE)
+        self._term_data = _memmap(self.index_dir / 'terms.data', np.uint8)
+        self._offsets = _memmap(self.index_dir / 'postings.offsets', OFFSET_DTYPE)
+        self._docs = _memmap(self.index_dir / 'postings.docs', DOC_DTYPE)
+        self._tfs = _memmap(self.index_dir / 'postings.tfs', TF_DTYPE)
+        self._term_max = _memmap(self.index_dir / 'term_max.scores', SCORE_DTYPE)
+        self._lengths = _memmap(self.index_dir / 'doc_lengths', LENGTH_DTYPE)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _term(self, i: int) -> bytes:
+        return bytes(self._term_data[int(self._term_offsets[i]):int(self._term_offsets[i + 1])])
+
+    def term_id(self, term: str) -> Optional[int]:
+        """Binary search of the memory-mapped vocabulary."""
+        target = term.encode('utf-8')
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.n_terms and self._term(lo) == target else None
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(row ids, term frequencies) of one term."""
+        start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+        return self._docs[start:end], self._tfs[start:end]
+
+    def document_frequency(self, term_id: int) -> int:
+        return int(self._offsets[term_id + 1] - self._offsets[term_id])
+
+    def search(self, query: str, top_k: int = 10, mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact BM25 top-k.
+
+        Args:
+            query (str): Free text; tokenized like the indexed chunks.
+            top_k (int): Number of rows to return.
+            mask (np.ndarray): Optional boolean array over rows; only True rows are returned.
+
+        Returns:
+            (ids, scores): int64 row ids and float32 scores, best first (ties by row id).
+        """
+        term_ids = sorted({t for t in (self.term_id(tok) for tok in tokenize(query)) if t is not None})
+        if not term_ids or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=SCORE_DTYPE)
+
+        idf = bm25_idf([self.document_frequency(t) for t in term_ids], self.count)
+        bounds = np.asarray([self._term_max[t] for t in term_ids], dtype=SCORE_DTYPE)
+        order = np.argsort(-bounds, kind='stable')
+        # rest[j]: best score the terms after position j could still add to any row
+        # (padded slightly so float32 rounding can never prune a true top-k row)
+        rest = np.concatenate([np.cumsum(bounds[order][::-1], dtype=np.float64)[::-1][1:], [0.0]]) * (1 + 1e-5)
+
+        # Scores are kept for the candidate rows only (sorted ids), so a query costs
+        # its postings, not the corpus size
+        candidates = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=SCORE_DTYPE)
+        pruned = False
+        for j, position in enumerate(order):
+            docs, tfs = self.postings(term_ids[position])
+            if not pruned:
+                # Essential term: score its whole postings list
+                if mask is not None:
+                    keep = mask[docs]
+                    docs, tfs = docs[keep], tfs[keep]
+                docs = docs.astype(np.int64)
+                contribution = bm25_scores(tfs, self._lengths[docs], idf[position], self.avgdl, self.k1, self.b)
+                if j == 0:
+                    candidates, scores = docs, contribution.astype(SCORE_DTYPE)
+                else:
+                    merged = np.union1d(candidates, docs)
+                    merged_scores = np.zeros(len(merged), dtype=SCORE_DTYPE)
+                    merged_scores[np.searchsorted(merged, candidates)] = scores
+                    merged_scores[np.searchsorted(merged, docs)] += contribution
+                    candidates, scores = merged, merged_scores
+            else:
+                # Non-essential term: only probe rows that can still make the top-k
+                at = np.searchsorted(docs, candidates)
+                hit = at < len(docs)
+                hit[hit] = docs[at[hit]] == candidates[hit]
+                rows = candidates[hit]
+                scores[hit] += bm25_scores(tfs[at[hit]], self._lengths[rows], idf[position],
+                                           self.avgdl, self.k1, self.b)
+            if len(candidates) >= top_k:
+                threshold = np.partition(scores, len(candidates) - top_k)[len(candidates) - top_k]
+                if pruned or rest[j] < threshold:
+                    pruned = True
+                    keep = scores + rest[j] >= threshold
+                    candidates, scores = candidates[keep], scores[keep]
+
+        best = np.lexsort((candidates, -scores))[:top_k]
+        return candidates[best], scores[best]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], top_k: int, k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank), rank from 1.
+
+    Ids of -1 (FAISS padding) are ignored. Ties are broken by the smaller id.
+
+    Returns:
+        (ids, scores): the fused top-k, best first.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        rank = 0
+        for doc in ranking:
+            doc = int(doc)
+            if doc < 0:
+                continue
+            rank += 1
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank)
+    best = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+    return (np.asarray([doc for doc, _ in best], dtype=np.int64),
+            np.asarray([score for _, score in best], dtype=np.float64))
+
+
+def build_lexical_index(metadata, index_dir: Path, batch_size: int = 50000) -> int:
+    """
+    Build the BM25 index over the 'text' column of a metadata store (or legacy JSON
+    metadata), row-aligned with the FAISS index built from the same chunks.
+
+    Returns:
+        int: Number of rows indexed.
+    """
+    with LexicalIndexWriter(index_dir) as writer:
+        for start in range(0, len(metadata), batch_size):
+            end = min(start + batch_size, len(metadata))
+            writer.add_batch([metadata.field(i, 'text') for i in range(start, end)])
+    return writer.count
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .metadata_store import load_metadata
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m src.rag.lexical <metadata_store_or_json> <lexical_index_dir>")
+        sys.exit(1)
+    n = build_lexical_index(load_metadata(Path(sys.argv[1])), Path(sys.argv[2]))
+    print(f"✅ Indexed {n:,} rows into {sys.argv[2]}")
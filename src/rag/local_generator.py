@@ -1,48 +1,257 @@
-import torch
-from transformers import pipeline
+from threading import Event, Lock, Thread
+import copy
 import os
+import time
+from .telemetry import GENERATED_TOKENS, get_logger, observe_stage, timed
+
+logger = get_logger('generator')
+
+GENERATION_KWARGS = dict(
+    max_new_tokens=256,
+    do_sample=True,
+    temperature=0.7,
+    top_k=50,
+    top_p=0.95
+)
+
+# How the model weights are loaded:
+#   auto  transformers' default dtype/device placement (the original behaviour)
+#   fp32  float32 on CPU
+#   int8  float32 on CPU with dynamic int8 quantization of every Linear layer
+#   int4  int4 grouped weights with int8 dynamic activations (needs torchao)
+GENERATOR_BACKENDS = ('auto', 'fp32', 'int8', 'int4')
+INT4_GROUP_SIZE = 32
+
+# Every prompt starts with this exact text, so its KV-cache is computed once and reused
+PROMPT_PREFIX = ("You are a knowledgeable financial analyst assistant for CrediTrust. \n"
+                 """Your task is to answer questions about customer complaints using ONLY the provided context.
+If the context doesn't contain the answer, state that you don't have enough information.
+
+Context:
+""")
+
+def cancel_criteria(cancelled: Event):
+    """Stopping criteria that end `model.generate` once `cancelled` is set."""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class Cancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([Cancelled()])
+
 
 class LocalComplaintGenerator:
-    def __init__(self, model_id="Qwen/Qwen2.5-0.5B-Instruct"):
-        print(f"🚀 [Generator] Loading Local LLM: {model_id}...")
-        # device=-1 forces CPU. If you have a GPU, change to 0.
-        self.pipe = pipeline(
-            "text-generation",
-            model=model_id,
-            torch_dtype="auto",
-            device_map="auto"
-        )
-        print("✅ [Generator] Local Model Ready!")
+    def __init__(self, model_id="Qwen/Qwen2.5-0.5B-Instruct", defer_loading: bool = False,
+                 backend: str = 'auto', num_threads: int = None, prefix_cache: bool = True,
+                 generation_kwargs: dict = None):
+        """
+        Args:
+            model_id (str): Hugging Face model id or local path.
+            defer_loading (bool): Don't load the model (or import torch/transformers)
+                until `load` is called or the first answer is generated.
+            backend (str): One of GENERATOR_BACKENDS.
+            num_threads (int): torch intra-op threads (None = torch's default).
+            prefix_cache (bool): Precompute the KV-cache of PROMPT_PREFIX once and
+                start every generation from a copy of it.
+            generation_kwargs (dict): Overrides for GENERATION_KWARGS.
+        """
+        if backend not in GENERATOR_BACKENDS:
+            raise ValueError(f"Unknown generator backend {backend!r}. Supported: {list(GENERATOR_BACKENDS)}")
+        self.model_id = model_id
+        self.backend = backend
+        self.num_threads = num_threads
+        self.prefix_cache = prefix_cache
+        self.generation_kwargs = dict(GENERATION_KWARGS, **(generation_kwargs or {}))
+        self.pipe = None
+        self.last_stats = None
+        self._prefix_ids = None
+        self._prefix_kv = None
+        self._load_lock = Lock()
+        if not defer_loading:
+            self.load()
 
-    def generate_answer(self, query: str, context_chunks: list) -> str:
+    @property
+    def is_loaded(self) -> bool:
+        return self.pipe is not None
+
+    def load(self):
+        """Load the model once. Safe to call from several threads."""
+        with self._load_lock:
+            if self.pipe is not None:
+                return
+            logger.info(f"🚀 [Generator] Loading Local LLM: {self.model_id} ({self.backend})...")
+            import torch
+            from transformers import pipeline
+
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+
+            if self.backend == 'auto':
+                # device=-1 forces CPU. If you have a GPU, change to 0.
+                pipe = pipeline(
+                    "text-generation",
+                    model=self.model_id,
+                    torch_dtype="auto",
+                    device_map="auto"
+                )
+            else:
+                pipe = pipeline("text-generation", model=self._load_quantized_model(), tokenizer=self.model_id)
+
+            if self.prefix_cache:
+                self._build_prefix_cache(pipe)
+            self.pipe = pipe
+            logger.info("✅ [Generator] Local Model Ready!")
+
+    def _load_quantized_model(self):
+        import torch
+        from transformers import AutoModelForCausalLM
+
+        if self.backend == 'int4':
+            try:
+                from torchao.quantization import Int8DynamicActivationIntxWeightConfig, PerGroup
+            except ImportError as e:
+                raise ImportError("The int4 backend needs torchao: pip install torchao") from e
+            from transformers import TorchAoConfig
+
+            config = TorchAoConfig(Int8DynamicActivationIntxWeightConfig(
+                weight_dtype=torch.int4, weight_granularity=PerGroup(INT4_GROUP_SIZE)))
+            return AutoModelForCausalLM.from_pretrained(
+                self.model_id, torch_dtype=torch.float32, quantization_config=config, device_map="cpu")
+
+        model = AutoModelForCausalLM.from_pretrained(self.model_id, torch_dtype=torch.float32)
+        model.eval()
+        if self.backend == 'int8':
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _build_prefix_cache(self, pipe):
+        import torch
+
+        self._prefix_ids = pipe.tokenizer(PROMPT_PREFIX, return_tensors="pt").input_ids.to(pipe.model.device)
+        with torch.no_grad():
+            self._prefix_kv = pipe.model(self._prefix_ids, use_cache=True).past_key_values
+        logger.info(f"🧷 [Generator] Cached KV for the {self._prefix_ids.shape[1]}-token prompt prefix")
+
+    def build_prompt(self, query: str, context_chunks: list) -> str:
         """
-        Generate an answer based on the provided context.
+        Build the analyst prompt from the question and retrieved chunks.
         """
+        return PROMPT_PREFIX + self._prompt_suffix(query, context_chunks)
+
+    def _prompt_suffix(self, query: str, context_chunks: list) -> str:
         context_text = "\n\n".join([f"- {c['text']}" for c in context_chunks])
-        
-        prompt = f"""You are a knowledgeable financial analyst assistant for CrediTrust. 
-Your task is to answer questions about customer complaints using ONLY the provided context.
-If the context doesn't contain the answer, state that you don't have enough information.
 
-Context:
-{context_text}
+        return f"""{context_text}
 
 Question: {query}
 
 Answer:"""
 
-        print("🧠 [Generator] Generating response...")
-        outputs = self.pipe(
-            prompt,
-            max_new_tokens=256,
-            do_sample=True,
-            temperature=0.7,
-            top_k=50,
-            top_p=0.95
-        )
-        
-        full_text = outputs[0]["generated_text"]
-        # Extract the answer part after the prompt
-        answer = full_text.split("Answer:")[-1].strip()
-        
-        return answer
+    def _model_inputs(self, query: str, context_chunks: list) -> dict:
+        """
+        Tokenized prompt for `model.generate`. With the prefix cache, the suffix is
+        tokenized on its own and appended to the cached prefix ids, and generation
+        starts from a copy of the prefix KV-cache so only the suffix is prefilled.
+        """
+        import torch
+
+        tokenizer = self.pipe.tokenizer
+        device = self.pipe.model.device
+        if self._prefix_kv is None:
+            inputs = tokenizer(self.build_prompt(query, context_chunks), return_tensors="pt").to(device)
+            return {'input_ids': inputs.input_ids, 'attention_mask': inputs.attention_mask}
+
+        suffix_ids = tokenizer(self._prompt_suffix(query, context_chunks), add_special_tokens=False,
+                               return_tensors="pt").input_ids.to(device)
+        input_ids = torch.cat([self._prefix_ids, suffix_ids], dim=1)
+        return {
+            'input_ids': input_ids,
+            'attention_mask': torch.ones_like(input_ids),
+            # generate() extends the cache in place, so each request gets its own copy
+            'past_key_values': copy.deepcopy(self._prefix_kv),
+        }
+
+    def generate_answer(self, query: str, context_chunks: list) -> str:
+        """
+        Generate an answer based on the provided context.
+        """
+        logger.debug("🧠 [Generator] Generating response...")
+        answer = "".join(self._generate(query, context_chunks))
+        return answer.strip()
+
+    def generate_stream(self, query: str, context_chunks: list):
+        """
+        Generate an answer token by token.
+
+        `model.generate` runs in a background thread and pushes decoded text into
+        a TextIteratorStreamer, which this generator drains as pieces arrive.
+        Closing the generator early (e.g. a client disconnected) stops decoding,
+        and an error raised by `model.generate` is re-raised here.
+
+        Yields:
+            str: Newly decoded text fragments, in order.
+        """
+        logger.debug("🧠 [Generator] Streaming response...")
+        yield from self._generate(query, context_chunks)
+
+    def _generate(self, query: str, context_chunks: list):
+        from transformers import TextIteratorStreamer
+
+        self.load()
+        tokenizer = self.pipe.tokenizer
+        with timed('prompt'):
+            inputs = self._model_inputs(query, context_chunks)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        start = time.perf_counter()
+        output = {}
+        cancelled = Event()
+
+        def run():
+            try:
+                output['ids'] = self.pipe.model.generate(
+                    **inputs, streamer=streamer, pad_token_id=tokenizer.eos_token_id,
+                    stopping_criteria=cancel_criteria(cancelled), **self.generation_kwargs)
+            except Exception as e:
+                output['error'] = e
+            finally:
+                if 'ids' not in output:
+                    streamer.end()  # generate() didn't get to end the stream; unblock the reader
+
+        thread = Thread(target=run, name='generate-answer', daemon=True)
+        thread.start()
+
+        first_token_at = None
+        try:
+            for text in streamer:
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                    observe_stage('ttft', first_token_at)
+                    logger.debug(f"⏱️ [Generator] Time to first token: {first_token_at:.2f}s")
+                yield text
+        finally:
+            # Only set early, when the consumer stopped reading: stop decoding for nobody
+            cancelled.set()
+            thread.join()
+        if 'error' in output:
+            raise output['error']
+        total = time.perf_counter() - start
+        prompt_tokens = inputs['input_ids'].shape[1]
+        new_tokens = output['ids'].shape[1] - prompt_tokens if 'ids' in output else 0
+        self.last_stats = {
+            'backend': self.backend,
+            'prefix_cache': self._prefix_kv is not None,
+            'prompt_tokens': int(prompt_tokens),
+            'new_tokens': int(new_tokens),
+            'ttft_s': first_token_at,
+            'total_s': total,
+            'tokens_per_s': new_tokens / total if total else 0.0,
+        }
+        observe_stage('generate', total)
+        GENERATED_TOKENS.inc(int(new_tokens), backend=self.backend)
+        logger.info(f"✅ [Generator] {new_tokens} tokens in {total:.2f}s "
+                    f"({self.last_stats['tokens_per_s']:.1f} tok/s, backend={self.backend})", extra=self.last_stats)
@@ -0,0 +1,527 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_NAME = 'complaint-metadata'
+FORMAT_VERSION = 2
+
+OFFSET_DTYPE = np.uint64
+CODE_DTYPE = np.int32
+DAY_DTYPE = np.int32
+ID_DTYPE = np.int64
+INT_DTYPE = np.int32
+MISSING_CODE = -1
+MISSING_DAY = np.iinfo(DAY_DTYPE).min
+MISSING_INT = np.iinfo(INT_DTYPE).min
+
+STRING_COLUMNS = ('chunk_id', 'text')
+CATEGORY_COLUMNS = ('product', 'company', 'state')
+DATE_COLUMNS = ('date',)
+# How many near-identical chunks were collapsed into this one at ingest (see src/dedup.py)
+INT_COLUMNS = ('duplicate_count',)
+
+
+def is_metadata_store(path: Path) -> bool:
+    """Return True if `path` is a directory written by MetadataWriter."""
+    return (Path(path) / MANIFEST_NAME).exists()
+
+
+def replace_dir(src: Path, dst: Path):
+    """
+    Put directory `src` in place of `dst`. The old directory is renamed aside and
+    then deleted, so processes that still have its files memory-mapped keep
+    reading the old contents until they reopen `dst`.
+    """
+    src, dst = Path(src), Path(dst)
+    old = dst.with_name(dst.name + '.old')
+    shutil.rmtree(old, ignore_errors=True)
+    if dst.exists():
+        os.replace(dst, old)
+    os.replace(src, dst)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def to_days(values: Sequence[Any]) -> np.ndarray:
+    """
+    Convert dates ('YYYY-MM-DD', ISO timestamps, datetime/Timestamp objects) into
+    int32 days since the epoch, with MISSING_DAY for blanks and unparseable values.
+    """
+    days = np.full(len(values), MISSING_DAY, dtype=DAY_DTYPE)
+    for i, value in enumerate(values):
+        if value is None or value != value:  # None or NaN/NaT
+            continue
+        try:
+            day = np.datetime64(str(value)[:10], 'D')
+        except ValueError:
+            continue
+        if not np.isnat(day):
+            days[i] = day.astype(np.int64)
+    return days
+
+
+def from_day(day: int) -> Optional[str]:
+    """Inverse of `to_days` for a single value, as an ISO date string."""
+    if day == MISSING_DAY:
+        return None
+    return str(np.datetime64(int(day), 'D'))
+
+
+def build_postings(codes: np.ndarray, n_values: int):
+    """
+    Invert a dictionary-encoded column into CSR postings lists.
+
+    Returns:
+        (offsets, ids): ids[offsets[c]:offsets[c + 1]] are the ascending row ids with code c.
+    """
+    codes = np.asarray(codes)
+    present = np.flatnonzero(codes != MISSING_CODE)
+    ids = present[np.argsort(codes[present], kind='stable')].astype(ID_DTYPE)
+    counts = np.bincount(codes[present], minlength=n_values)
+    offsets = np.zeros(n_values + 1, dtype=ID_DTYPE)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, ids
+
+
+def build_date_order(days: np.ndarray):
+    """
+    Sort a date column for range lookups.
+
+    Returns:
+        (sorted_days, ids): rows with a date, ordered by day; missing dates are dropped.
+    """
+    days = np.asarray(days)
+    present = np.flatnonzero(days != MISSING_DAY)
+    order = present[np.argsort(days[present], kind='stable')].astype(ID_DTYPE)
+    return np.ascontiguousarray(days[order], dtype=DAY_DTYPE), order
+
+
+def _memmap(path: Path, dtype) -> np.ndarray:
+    # np.memmap refuses zero-length files, which an empty store legitimately has
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class MetadataWriter:
+    """
+    Streams chunk metadata into the columnar on-disk format read by MetadataStore.
+
+    Layout of `store_dir`:
+        <col>.offsets   uint64[n + 1] byte offsets into <col>.data (string columns)
+        <col>.data      concatenated UTF-8 bytes (string columns)
+        <col>.codes     int32[n] dictionary codes, -1 for missing (category columns)
+        <col>.postings  int64 row ids grouped by code, with <col>.postings_offsets
+                        int64[n_values + 1] delimiting each value (category columns)
+        <col>.days      int32[n] days since epoch (date columns)
+        <col>.order     int64 row ids sorted by date, with <col>.sorted_days (date columns)
+        <col>.ints      int32[n] values (integer columns)
+        manifest.json   row count, column names and category dictionaries
+
+    Everything is written to a sibling `<store_dir>.writing` directory that
+    replaces `store_dir` on `close`, so readers that have the previous store
+    mapped are never left with truncated files. The manifest is written last, so
+    a store without one is incomplete and ignored.
+    """
+    def __init__(self, store_dir: Path,
+                 string_columns: Sequence[str] = STRING_COLUMNS,
+                 category_columns: Sequence[str] = CATEGORY_COLUMNS,
+                 date_columns: Sequence[str] = DATE_COLUMNS,
+                 int_columns: Sequence[str] = INT_COLUMNS):
+        self.store_dir = Path(store_dir)
+        self._dir = self.store_dir.with_name(self.store_dir.name + '.writing')
+        shutil.rmtree(self._dir, ignore_errors=True)  # left over from an interrupted write
+        self._dir.mkdir(parents=True)
+
+        self.string_columns = tuple(string_columns)
+        self.category_columns = tuple(category_columns)
+        self.date_columns = tuple(date_columns)
+        self.int_columns = tuple(int_columns)
+        self.count = 0
+
+        self._offsets = {}
+        self._data = {}
+        self._data_size = {}
+        for name in self.string_columns:
+            self._offsets[name] = open(self._dir / f'{name}.offsets', 'wb')
+            self._data[name] = open(self._dir / f'{name}.data', 'wb')
+            self._data_size[name] = 0
+            np.zeros(1, dtype=OFFSET_DTYPE).tofile(self._offsets[name])
+
+        self._codes = {}
+        self._dictionaries: Dict[str, Dict[str, int]] = {}
+        for name in self.category_columns:
+            self._codes[name] = open(self._dir / f'{name}.codes', 'wb')
+            self._dictionaries[name] = {}
+
+        self._days = {}
+        for name in self.date_columns:
+            self._days[name] = open(self._dir / f'{name}.days', 'wb')
+
+        self._ints = {}
+        for name in self.int_columns:
+            self._ints[name] = open(self._dir / f'{name}.ints', 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_files()
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+    def append(self, row: Dict[str, Any]):
+        """Append a single row given as a dict of column name -> value."""
+        self.append_batch(**{name: [row.get(name)] for name in self._all_columns()})
+
+    def _all_columns(self):
+        return self.string_columns + self.category_columns + self.date_columns + self.int_columns
+
+    def append_batch(self, **columns: Sequence[Any]):
+        """
+        Append a batch of rows given column-wise.
+
+        Args:
+            **columns: One sequence per column, all of the same length. String
+                columns are required; category, date and integer columns default
+                to missing.
+        """
+        unknown = set(columns) - set(self._all_columns())
+        if unknown:
+            raise ValueError(f"Unknown metadata columns: {sorted(unknown)}")
+
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("All metadata columns in a batch must have the same length")
+        n = lengths.pop()
+        if n == 0:
+            return
+
+        for name in self.string_columns:
+            if name not in columns:
+                raise ValueError(f"Missing required metadata column '{name}'")
+            encoded = [('' if v is None else str(v)).encode('utf-8') for v in columns[name]]
+            sizes = np.fromiter((len(b) for b in encoded), dtype=OFFSET_DTYPE, count=n)
+            offsets = np.cumsum(sizes, dtype=OFFSET_DTYPE) + OFFSET_DTYPE(self._data_size[name])
+            self._data[name].write(b''.join(encoded))
+            offsets.tofile(self._offsets[name])
+            self._data_size[name] = int(offsets[-1])
+
+        for name in self.category_columns:
+            values = columns.get(name)
+            if values is None:
+                codes = np.full(n, MISSING_CODE, dtype=CODE_DTYPE)
+            else:
+                dictionary = self._dictionaries[name]
+                codes = np.fromiter(
+                    (MISSING_CODE if v is None else dictionary.setdefault(str(v), len(dictionary)) for v in values),
+                    dtype=CODE_DTYPE, count=n
+                )
+            codes.tofile(self._codes[name])
+
+        for name in self.date_columns:
+            values = columns.get(name)
+            days = np.full(n, MISSING_DAY, dtype=DAY_DTYPE) if values is None else to_days(values)
+            days.tofile(self._days[name])
+
+        for name in self.int_columns:
+            values = columns.get(name)
+            ints = np.full(n, MISSING_INT, dtype=INT_DTYPE) if values is None else np.fromiter(
+                (MISSING_INT if v is None else int(v) for v in values), dtype=INT_DTYPE, count=n)
+            ints.tofile(self._ints[name])
+
+        self.count += n
+
+    def close(self):
+        """Flush all columns, build the filter postings and publish the store in place of any previous one."""
+        self._close_files()
+        self._write_filter_index()
+        manifest = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'count': self.count,
+            'string_columns': list(self.string_columns),
+            'category_columns': {
+                name: sorted(dictionary, key=dictionary.get)
+                for name, dictionary in self._dictionaries.items()
+            },
+            'date_columns': list(self.date_columns),
+            'int_columns': list(self.int_columns),
+            'filter_index': True,
+        }
+        with open(self._dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        replace_dir(self._dir, self.store_dir)
+
+    def _write_filter_index(self):
+        # Inverted index used for pre-filtered search: value -> row ids, date -> row ids
+        for name in self.category_columns:
+            codes = np.fromfile(self._dir / f'{name}.codes', dtype=CODE_DTYPE)
+            offsets, ids = build_postings(codes, len(self._dictionaries[name]))
+            offsets.tofile(self._dir / f'{name}.postings_offsets')
+            ids.tofile(self._dir / f'{name}.postings')
+        for name in self.date_columns:
+            days = np.fromfile(self._dir / f'{name}.days', dtype=DAY_DTYPE)
+            sorted_days, order = build_date_order(days)
+            sorted_days.tofile(self._dir / f'{name}.sorted_days')
+            order.tofile(self._dir / f'{name}.order')
+
+    def _close_files(self):
+        files = (list(self._offsets.values()) + list(self._data.values())
+                 + list(self._codes.values()) + list(self._days.values()) + list(self._ints.values()))
+        for f in files:
+            if not f.closed:
+                f.close()
+
+
+class MetadataStore:
+    """
+    Read-only, memory-mapped view over a store written by MetadataWriter.
+
+    Nothing is decoded up front: rows are materialised only when requested, so
+    opening a 1.3M-chunk store costs a few page mappings instead of GBs of dicts.
+    """
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_NAME:
+            raise ValueError(f"{self.store_dir} is not a complaint metadata store")
+        if manifest.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported metadata store version {manifest['version']}")
+
+        self.count = manifest['count']
+        self.string_columns = tuple(manifest['string_columns'])
+        self.categories: Dict[str, List[str]] = manifest['category_columns']
+        self.date_columns = tuple(manifest.get('date_columns', ()))
+        self.int_columns = tuple(manifest.get('int_columns', ()))
+        self.has_filter_index = manifest.get('filter_index', False)
+
+        self._offsets = {}
+        self._data = {}
+        for name in self.string_columns:
+            self._offsets[name] = _memmap(self.store_dir / f'{name}.offsets', OFFSET_DTYPE)[:self.count + 1]
+            self._data[name] = _memmap(self.store_dir / f'{name}.data', np.uint8)
+
+        self._codes = {
+            name: _memmap(self.store_dir / f'{name}.codes', CODE_DTYPE)[:self.count]
+            for name in self.categories
+        }
+        self._days = {
+            name: _memmap(self.store_dir / f'{name}.days', DAY_DTYPE)[:self.count]
+            for name in self.date_columns
+        }
+        self._ints = {
+            name: _memmap(self.store_dir / f'{name}.ints', INT_DTYPE)[:self.count]
+            for name in self.int_columns
+        }
+        # Mapped up front too, so this view never mixes in files of a store written over it later
+        self._postings = {}
+        self._date_orders = {}
+        if self.has_filter_index:
+            for name in self.categories:
+                self._postings[name] = (_memmap(self.store_dir / f'{name}.postings_offsets', ID_DTYPE),
+                                        _memmap(self.store_dir / f'{name}.postings', ID_DTYPE))
+            for name in self.date_columns:
+                self._date_orders[name] = (_memmap(self.store_dir / f'{name}.sorted_days', DAY_DTYPE),
+                                           _memmap(self.store_dir / f'{name}.order', ID_DTYPE))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return self.row(idx)
+
+    def field(self, idx: int, name: str) -> Optional[str]:
+        """Decode a single column value of row `idx`."""
+        if name in self._codes:
+            code = int(self._codes[name][idx])
+            return None if code == MISSING_CODE else self.categories[name][code]
+        if name in self._days:
+            return from_day(self._days[name][idx])
+        if name in self._ints:
+            value = int(self._ints[name][idx])
+            return None if value == MISSING_INT else value
+        offsets = self._offsets[name]
+        start, end = int(offsets[idx]), int(offsets[idx + 1])
+        return bytes(self._data[name][start:end]).decode('utf-8')
+
+    def row(self, idx: int) -> Dict[str, Any]:
+        """Decode every column of row `idx` into a dict (integer columns only when set)."""
+        if not 0 <= idx < self.count:
+            raise IndexError(f"Row {idx} out of range for store of {self.count} rows")
+        columns = self.string_columns + tuple(self.categories) + self.date_columns
+        row = {name: self.field(idx, name) for name in columns}
+        for name in self.int_columns:
+            value = self.field(idx, name)
+            if value is not None:
+                row[name] = value
+        return row
+
+    def rows(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.row(int(i)) for i in ids]
+
+    def codes(self, name: str) -> np.ndarray:
+        """Memory-mapped dictionary codes of a category column."""
+        return self._codes[name]
+
+    def days(self, name: str) -> np.ndarray:
+        """Memory-mapped days-since-epoch of a date column."""
+        return self._days[name]
+
+    def postings(self, name: str):
+        """(offsets, ids) postings of a category column, or None for stores without them."""
+        return self._postings.get(name)
+
+    def ints(self, name: str) -> np.ndarray:
+        """Memory-mapped values of an integer column."""
+        return self._ints[name]
+
+    def date_order(self, name: str):
+        """(sorted_days, ids) of a date column, or None for stores without them."""
+        return self._date_orders.get(name)
+
+
+class JsonMetadata:
+    """
+    Adapter exposing the legacy `*_metadata.json` lists through the MetadataStore API.
+
+    Handles both layouts produced by earlier scripts:
+        full scale:   {'id': ..., 'text': ..., 'meta': {'product': ..., 'company': ...}}
+        medium/sample: {'chunk_id': ..., 'text': ..., 'product': ...}
+
+    Category codes and dates are encoded in memory on first use by the filters.
+    """
+    date_columns = DATE_COLUMNS
+    has_filter_index = False
+
+    def __init__(self, json_path: Path):
+        self.json_path = Path(json_path)
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            self._items = json.load(f)
+        self._categories = None
+        self._codes = {}
+        self._days = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return self.row(idx)
+
+    def field(self, idx: int, name: str) -> Optional[str]:
+        return self.row(idx).get(name)
+
+    def row(self, idx: int) -> Dict[str, Any]:
+        item = self._items[idx]
+        if 'meta' in item:
+            meta = item.get('meta') or {}
+            return {
+                'chunk_id': item.get('id'),
+                'text': item.get('text', ''),
+                'product': meta.get('product'),
+                'company': meta.get('company'),
+                'state': meta.get('state'),
+                'date': _date_str(meta.get('date_received', meta.get('date'))),
+            }
+        return {
+            'chunk_id': item.get('chunk_id'),
+            'text': item.get('text', ''),
+            'product': item.get('product'),
+            'company': item.get('company'),
+            'state': item.get('state'),
+            'date': _date_str(item.get('date_received', item.get('date'))),
+        }
+
+    def rows(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.row(int(i)) for i in ids]
+
+    @property
+    def categories(self) -> Dict[str, List[str]]:
+        if self._categories is None:
+            self._categories = {}
+            for name in CATEGORY_COLUMNS:
+                dictionary: Dict[str, int] = {}
+                values = (self.field(i, name) for i in range(len(self)))
+                self._codes[name] = np.fromiter(
+                    (MISSING_CODE if v is None else dictionary.setdefault(str(v), len(dictionary)) for v in values),
+                    dtype=CODE_DTYPE, count=len(self)
+                )
+                self._categories[name] = sorted(dictionary, key=dictionary.get)
+        return self._categories
+
+    def codes(self, name: str) -> np.ndarray:
+        if name not in self.categories:
+            raise KeyError(name)
+        return self._codes[name]
+
+    def days(self, name: str) -> np.ndarray:
+        if name not in self._days:
+            self._days[name] = to_days([self.field(i, name) for i in range(len(self))])
+        return self._days[name]
+
+    def postings(self, name: str):
+        return None
+
+    def date_order(self, name: str):
+        return None
+
+
+def _date_str(value) -> Optional[str]:
+    days = to_days([value])
+    return from_day(days[0])
+
+
+def update_int_column(store_dir: Path, name: str, ids: Sequence[int], values: Sequence[int]):
+    """
+    Overwrite rows `ids` of an integer column of a finished store in place, e.g.
+    duplicate counts that are only known once the whole input has been read.
+    Readers that already mapped the store see the new values.
+    """
+    store = MetadataStore(store_dir)
+    if name not in store.int_columns:
+        raise ValueError(f"{store_dir} has no integer column '{name}'")
+    column = np.memmap(Path(store_dir) / f'{name}.ints', dtype=INT_DTYPE, mode='r+')
+    column[np.asarray(ids, dtype=ID_DTYPE)] = np.asarray(values, dtype=INT_DTYPE)
+    column.flush()
+
+
+def load_metadata(path: Path):
+    """Open either a binary metadata store directory or a legacy JSON file."""
+    path = Path(path)
+    if is_metadata_store(path):
+        return MetadataStore(path)
+    return JsonMetadata(path)
+
+
+def convert_json_metadata(json_path: Path, store_dir: Path, batch_size: int = 50000) -> int:
+    """
+    Convert a legacy metadata JSON file into a binary store.
+
+    Returns:
+        int: Number of rows written.
+    """
+    legacy = JsonMetadata(json_path)
+    with MetadataWriter(store_dir) as writer:
+        for start in range(0, len(legacy), batch_size):
+            rows = legacy.rows(range(start, min(start + batch_size, len(legacy))))
+            writer.append_batch(**{
+                name: [r[name] for r in rows] for name in STRING_COLUMNS + CATEGORY_COLUMNS + DATE_COLUMNS
+            })
+    return writer.count
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m src.rag.metadata_store <metadata.json> <store_dir>")
+        sys.exit(1)
+    n = convert_json_metadata(Path(sys.argv[1]), Path(sys.argv[2]))
+    print(f"✅ Converted {n:,} rows into {sys.argv[2]}")
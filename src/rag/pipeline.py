@@ -1,24 +1,239 @@
+import time
 from pathlib import Path
 from .retriever import ComplaintRetriever
+from .context import DEFAULT_TOKEN_BUDGET, ContextBuilder
 from .local_generator import LocalComplaintGenerator
+from .reranker import CrossEncoderReranker
+from .scheduler import ContinuousBatchScheduler
+from .startup import LoadStage, run_in_background
+from .telemetry import (CONTEXT_CHUNKS, QUERIES, current_trace_id, get_logger, new_trace_id, observe_stage,
+                        timed, trace)
+
+logger = get_logger('pipeline')
+
+RETRIEVAL_STAGES = ('encoder', 'index', 'metadata')
 
 class RAGPipeline:
-    def __init__(self, vector_store_dir: str):
-        self.retriever = ComplaintRetriever(Path(vector_store_dir))
-        self.generator = LocalComplaintGenerator()
-        
-    def query(self, user_question: str, product_filter: str = None) -> dict:
-        """
-        Main RAG pipeline: Retrieve -> Generate
-        Returns a dictionary with 'answer' and 'source_documents'.
-        """
-        # 1. Retrieve
-        context = self.retriever.search(user_question, top_k=5, product_filter=product_filter)
-        
-        # 2. Generate
-        answer = self.generator.generate_answer(user_question, context)
-        
+    def __init__(self, vector_store_dir: str, background_load: bool = True, rerank: bool = False,
+                 rerank_candidates: int = 20, rerank_budget: float = 0.5, encoder_backend: str = 'torch',
+                 generator_backend: str = 'auto', generator_threads: int = None,
+                 batch_generation: bool = False, max_batch_size: int = 8, max_queue: int = 32,
+                 context_token_budget: int = DEFAULT_TOKEN_BUDGET, retriever: ComplaintRetriever = None,
+                 generator=None):
+        """
+        Args:
+            vector_store_dir (str): Directory holding the FAISS index and metadata.
+            background_load (bool): Load the query encoder, FAISS index, metadata and
+                LLM concurrently on background threads and return immediately.
+                Queries block only on the components they need, so retrieval works
+                before the LLM has finished loading. When False, everything is
+                loaded before the constructor returns.
+            rerank (bool): Retrieve `rerank_candidates` chunks and let a CPU
+                cross-encoder pick the ones sent to the LLM. Until the
+                cross-encoder has loaded, queries use the retriever's order.
+            rerank_candidates (int): Chunks retrieved for the reranker to choose from.
+            rerank_budget (float): Seconds the reranker may spend per query before
+                falling back to the retriever's order (None = no limit).
+            encoder_backend (str): Query encoder backend ('torch', 'int8', 'onnx',
+                'onnx-int8').
+            generator_backend (str): LLM weights ('auto', 'fp32', 'int8', 'int4').
+            generator_threads (int): torch threads for generation (None = torch's default).
+            batch_generation (bool): Answer through a ContinuousBatchScheduler, so
+                concurrent queries share decode steps instead of each running
+                its own `generate`. Callers see the same results either way.
+            max_batch_size (int): Answers decoded together when batching.
+            max_queue (int): Answers allowed to wait for a batch slot; further
+                queries raise SchedulerBusy.
+            context_token_budget (int): Prompt tokens the retrieved context may use;
+                see ContextBuilder (None = unlimited).
+            retriever (ComplaintRetriever): Use this (deferred-loading) retriever
+                instead of opening one over `vector_store_dir`.
+            generator: Use this object instead of the local LLM. It needs `load`,
+                `generate_answer` and `generate_stream` (e.g. a stub in benchmarks).
+        """
+        self.retriever = retriever or ComplaintRetriever(Path(vector_store_dir), defer_loading=True,
+                                                         encoder_backend=encoder_backend)
+        self.generator = generator or LocalComplaintGenerator(defer_loading=True, backend=generator_backend,
+                                                              num_threads=generator_threads)
+        self.scheduler = ContinuousBatchScheduler(self.generator, max_batch_size=max_batch_size,
+                                                  max_queue=max_queue) if batch_generation else None
+        self.reranker = CrossEncoderReranker(time_budget=rerank_budget, defer_loading=True) if rerank else None
+        self.rerank_candidates = rerank_candidates
+        self.context_builder = ContextBuilder(token_budget=context_token_budget)
+
+        self.stages = {
+            'encoder': LoadStage('encoder', self.retriever.load_model),
+            'index': LoadStage('index', self.retriever.load_index),
+            'metadata': LoadStage('metadata', self.retriever.load_metadata),
+            'generator': LoadStage('generator', self.generator.load),
+        }
+        if self.reranker is not None:
+            self.stages['reranker'] = LoadStage('reranker', self.reranker.load)
+
+        self._load_started = time.perf_counter()
+        if background_load:
+            run_in_background(self.stages.values(), on_complete=self._report_load_timings)
+        else:
+            for stage in self.stages.values():
+                stage.run()
+            self._report_load_timings()
+
+    def _report_load_timings(self):
+        total = time.perf_counter() - self._load_started
+        timings = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.load_timings().items())
+        logger.info(f"⏱️ [Pipeline] Startup finished in {total:.2f}s ({timings})")
+
+    def is_ready(self, *stages: str) -> bool:
+        """True when every named stage (default: all) has loaded successfully."""
+        names = stages or tuple(self.stages)
+        return all(self.stages[name].is_ready for name in names)
+
+    @property
+    def retrieval_ready(self) -> bool:
+        return self.is_ready(*RETRIEVAL_STAGES)
+
+    def wait_until_ready(self, *stages: str, timeout: float = None) -> bool:
+        """Block until the named stages (default: all) have finished loading."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in stages or tuple(self.stages):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self.stages[name].wait(remaining):
+                return False
+        return self.is_ready(*stages)
+
+    def status(self) -> dict:
+        """Readiness state, load time and error of each stage."""
+        return {name: stage.status() for name, stage in self.stages.items()}
+
+    def load_timings(self) -> dict:
+        return {name: stage.seconds for name, stage in self.stages.items() if stage.seconds is not None}
+
+    @property
+    def _answerer(self):
+        """The batch scheduler when enabled, otherwise the generator itself."""
+        return self.scheduler if self.scheduler is not None else self.generator
+
+    def search(self, user_question: str, top_k: int = 5, product_filter: str = None, mode: str = 'dense') -> list:
+        """
+        Retrieval (and reranking, when enabled). Does not need (or wait for) the LLM.
+        """
+        return self._retrieve(user_question, top_k, product_filter, mode, {})
+
+    def _retrieve(self, user_question: str, top_k: int, product_filter: str, mode: str, timings: dict) -> list:
+        """Retrieve, then optionally rerank, recording each stage's seconds in `timings`."""
+        use_reranker = self.reranker is not None and self.stages['reranker'].is_ready
+        n_candidates = max(top_k, self.rerank_candidates) if use_reranker else top_k
+
+        with timed('retrieve', timings):
+            candidates = self.retriever.search(user_question, top_k=n_candidates,
+                                               product_filter=product_filter, mode=mode)
+        if not use_reranker:
+            return candidates
+
+        context, info = self.reranker.rerank(user_question, candidates, top_k=top_k)
+        observe_stage('rerank', info['seconds'])
+        timings['rerank'] = info['seconds']
+        timings['rerank_timed_out'] = info['timed_out']
+        return context
+
+    def _build_context(self, chunks: list, timings: dict):
+        """Merge, deduplicate and budget the chunks for the prompt (see ContextBuilder)."""
+        pipe = getattr(self.generator, 'pipe', None)
+        with timed('context', timings):
+            context, report = self.context_builder.build(chunks, tokenizer=getattr(pipe, 'tokenizer', None))
+
+        CONTEXT_CHUNKS.inc(len(context), action='kept')
+        CONTEXT_CHUNKS.inc(sum(len(ids) - 1 for ids in report['merged']), action='merged')
+        CONTEXT_CHUNKS.inc(len(report['truncated']), action='truncated')
+        for dropped in report['dropped']:
+            CONTEXT_CHUNKS.inc(action=f"dropped_{dropped['reason']}")
+        if report['merged'] or report['dropped'] or report['truncated']:
+            logger.info(f"✂️ [Pipeline] Context: {len(context)}/{len(chunks)} chunks, {report['tokens']} tokens "
+                        f"(merged {len(report['merged'])} runs, dropped {len(report['dropped'])}, "
+                        f"truncated {len(report['truncated'])})",
+                        extra={'dropped': report['dropped'], 'merged': report['merged']})
+        return context, report
+
+    def _report_query_timings(self, timings: dict, started: float):
+        total = time.perf_counter() - started
+        # 'generate' is observed by the generator / scheduler itself
+        observe_stage('query', total)
+        stages = ", ".join(f"{name}={value:.3f}s" for name, value in timings.items() if not isinstance(value, bool))
+        logger.info(f"⏱️ [Pipeline] Query stages: {stages}" + (" (rerank fell back to dense order)"
+                                                             if timings.get('rerank_timed_out') else ""),
+                    extra={'stages': timings, 'total_s': total})
+
+    def query(self, user_question: str, product_filter: str = None, mode: str = 'dense') -> dict:
+        """
+        Main RAG pipeline: Retrieve -> (Rerank) -> Build context -> Generate
+        Returns a dictionary with 'answer', 'source_documents' (the context the LLM
+        read), 'context_report' (see ContextBuilder.build), per-stage 'timings'
+        (seconds) and the 'trace_id' its log lines are tagged with.
+        """
+        started = time.perf_counter()
+        timings = {}
+        with trace() as trace_id:
+            try:
+                # 1. Retrieve
+                chunks = self._retrieve(user_question, 5, product_filter, mode, timings)
+                context, report = self._build_context(chunks, timings)
+
+                # 2. Generate
+                start = time.perf_counter()
+                answer = self._answerer.generate_answer(user_question, context)
+                timings['generate'] = time.perf_counter() - start
+            except Exception:
+                QUERIES.inc(kind='query', outcome='error')
+                raise
+            QUERIES.inc(kind='query', outcome='ok')
+            self._report_query_timings(timings, started)
+
         return {
             'answer': answer,
-            'source_documents': context
+            'source_documents': context,
+            'context_report': report,
+            'timings': timings,
+            'trace_id': trace_id
         }
+
+    def query_stream(self, user_question: str, product_filter: str = None, mode: str = 'dense'):
+        """
+        Streaming variant of `query`: Retrieve -> Generate, yielding as it goes.
+
+        Yields dicts, in order:
+            {'type': 'sources', 'source_documents': [...], 'trace_id': '...'}  once, before generation
+            {'type': 'token', 'text': '...'}                 for each decoded fragment
+            {'type': 'done', 'answer': '...', 'context_report': {...}, 'timings': {...}, 'trace_id': '...'}
+                once, with the full answer
+        """
+        started = time.perf_counter()
+        timings = {}
+        # The consumer may resume this generator from different threads, so the trace
+        # is entered around each step instead of across the yields
+        trace_id = current_trace_id() or new_trace_id()
+        outcome = 'error'
+        try:
+            # 1. Retrieve
+            with trace(trace_id):
+                chunks = self._retrieve(user_question, 5, product_filter, mode, timings)
+                context, report = self._build_context(chunks, timings)
+            yield {'type': 'sources', 'source_documents': context, 'trace_id': trace_id}
+
+            # 2. Generate
+            start = time.perf_counter()
+            answer = ""
+            for text in self._answerer.generate_stream(user_question, context):
+                answer += text
+                yield {'type': 'token', 'text': text}
+            timings['generate'] = time.perf_counter() - start
+            outcome = 'ok'
+        except GeneratorExit:
+            outcome = 'cancelled'
+            raise
+        finally:
+            QUERIES.inc(kind='stream', outcome=outcome)
+
+        with trace(trace_id):
+            self._report_query_timings(timings, started)
+        yield {'type': 'done', 'answer': answer.strip(), 'context_report': report, 'timings': timings,
+               'trace_id': trace_id}
@@ -0,0 +1,88 @@
+import time
+from threading import Lock
+from .telemetry import get_logger
+
+logger = get_logger('reranker')
+
+DEFAULT_RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+class CrossEncoderReranker:
+    """
+    Rescores retrieved chunks with a small cross-encoder on CPU.
+
+    The cross-encoder reads the question and each chunk together, which ranks far
+    better than the bi-encoder's L2 distance but costs one forward pass per
+    chunk. Candidates are scored in batches and the clock is checked after each
+    one: when a query runs past its time budget the remaining work is abandoned
+    and the original (dense) order is kept instead.
+    """
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, batch_size: int = 16,
+                 time_budget: float = 0.5, max_length: int = 256, defer_loading: bool = False):
+        """
+        Args:
+            model_name (str): sentence-transformers CrossEncoder to load.
+            batch_size (int): (question, chunk) pairs per forward pass.
+            time_budget (float): Default seconds allowed per query (None = no limit).
+            max_length (int): Token limit per pair; longer chunks are truncated.
+            defer_loading (bool): Don't load the model until `load` or the first rerank.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.max_length = max_length
+        self.model = None
+        self._load_lock = Lock()
+        if not defer_loading:
+            self.load()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        """Load the model once. Safe to call from several threads."""
+        with self._load_lock:
+            if self.model is not None:
+                return
+            logger.info(f"🔧 [Reranker] Loading cross-encoder: {self.model_name}...")
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+
+    def rerank(self, query: str, candidates: list, top_k: int = 5, time_budget: float = None):
+        """
+        Reorder `candidates` by cross-encoder score and keep the best `top_k`.
+
+        Args:
+            query (str): The user's question.
+            candidates (list): Retriever results, best first.
+            top_k (int): Results to keep.
+            time_budget (float): Seconds allowed for this query; defaults to the
+                reranker's `time_budget`.
+
+        Returns:
+            (results, info): the kept results (with a 'rerank_score' when reranked)
+                and {'reranked': bool, 'timed_out': bool, 'scored': int, 'seconds': float}.
+        """
+        self.load()
+        budget = self.time_budget if time_budget is None else time_budget
+        start = time.perf_counter()
+        scores = []
+        timed_out = False
+        for i in range(0, len(candidates), self.batch_size):
+            batch = candidates[i:i + self.batch_size]
+            pairs = [(query, c['text']) for c in batch]
+            scores.extend(float(s) for s in self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+            if budget is not None and time.perf_counter() - start > budget and len(scores) < len(candidates):
+                timed_out = True
+                break
+        seconds = time.perf_counter() - start
+
+        if timed_out:
+            logger.warning(f"⏱️ [Reranker] Time budget of {budget:.2f}s exceeded after {len(scores)}/{len(candidates)} "
+                           f"candidates; keeping the retriever's order")
+            results = candidates[:top_k]
+        else:
+            order = sorted(range(len(candidates)), key=lambda i: -scores[i])[:top_k]
+            results = [dict(candidates[i], rerank_score=scores[i]) for i in order]
+        return results, {'reranked': not timed_out, 'timed_out': timed_out, 'scored': len(scores), 'seconds': seconds}
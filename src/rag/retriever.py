@@ -1,83 +1,570 @@
-import faiss
+import hashlib
 import json
+import os
+import threading
 import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
+from .cache import LRUCache
+from .encoders import load_encoder
+from .filters import EXACT_FILTER_LIMIT, FilterIndex, active_filters, filter_key, filtered_search
+from .index_factory import describe_index, enable_reconstruction, search_parameters
+from .lexical import LexicalIndex, build_lexical_index, is_lexical_index, reciprocal_rank_fusion
+from .metadata_store import MetadataStore, is_metadata_store, load_metadata
+from .sharding import MANIFEST_NAME as SHARD_MANIFEST, ShardedIndex, is_shard_dir
+from .telemetry import RESULT_CACHE, SEARCHES, get_logger, timed
+from .updates import (DeltaIndex, ReadWriteLock, build_compacted, finish_compaction, journal_path, merge_results,
+                      merge_scored)
+
+logger = get_logger('retriever')
+
+SEARCH_MODES = ('dense', 'lexical', 'hybrid')
 
 class ComplaintRetriever:
-    def __init__(self, vector_store_dir: Path, model_name: str = 'all-MiniLM-L6-v2'):
+    # Filtered searches matching at most this many chunks are scored exactly over
+    # the matching vectors instead of walking the index with a selector
+    EXACT_FILTER_LIMIT = EXACT_FILTER_LIMIT
+    # Candidates taken from each ranking before reciprocal-rank fusion in hybrid mode
+    HYBRID_DEPTH = 50
+
+    def __init__(self, vector_store_dir: Path, model_name: str = 'all-MiniLM-L6-v2',
+                 cache_size: int = 1024, cache_ttl: float = 3600.0, defer_loading: bool = False,
+                 encoder_backend: str = 'torch', sharded: bool = False, threads_per_shard: int = 1):
+        """
+        Args:
+            vector_store_dir (Path): Directory holding the FAISS index and metadata.
+            model_name (str): SentenceTransformer used to embed queries.
+            cache_size (int): Entries kept in each of the query-embedding and result
+                caches; 0 disables caching.
+            cache_ttl (float): Seconds before a cached entry expires (None = never).
+            defer_loading (bool): Only resolve paths here. The encoder, index and
+                metadata are then loaded by `load_model` / `load_index` /
+                `load_metadata` (e.g. from background threads) or on first search.
+            encoder_backend (str): 'torch', 'int8', 'onnx' or 'onnx-int8'; see
+                `encoders.load_encoder`.
+            sharded (bool): Search the `<prefix>_shards/` split of the index (see
+                sharding.py) with one worker process per shard instead of
+                loading the index into this process.
+            threads_per_shard (int): OpenMP threads of each shard worker.
+        """
         self.vector_store_dir = Path(vector_store_dir)
-        
+        # normalized query text -> embedding
+        self.embedding_cache = LRUCache(cache_size, cache_ttl)
+        # (embedding hash or lexical query text, top_k, filters, mode, search params, index version) -> results
+        self.result_cache = LRUCache(cache_size, cache_ttl)
+        self._reload_lock = threading.Lock()
+        # Searches hold the read side; swapping in a rebuilt index or changing the delta takes the write side
+        self._swap_lock = ReadWriteLock()
+        # One writer (add / delete / compaction) at a time
+        self._update_lock = threading.Lock()
+
+        # A compaction interrupted half way through its file swaps is completed first
+        for prefix in ('full', 'medium'):
+            if finish_compaction(self.vector_store_dir, prefix):
+                logger.info(f"🧹 [Retriever] Finished an interrupted compaction of the {prefix} index")
+
         # Check for full-scale index first, then medium, then fall back
         full_index_path = self.vector_store_dir / 'full_faiss_index.index'
-        full_meta_path = self.vector_store_dir / 'full_metadata.json'
-        
-        if full_index_path.exists() and full_meta_path.exists():
+        full_meta_path = self._find_metadata('full')
+
+        full_available = full_index_path.exists() or (sharded and is_shard_dir(self.vector_store_dir / 'full_shards'))
+        if full_available and full_meta_path is not None:
             self.index_path = full_index_path
             self.metadata_path = full_meta_path
             self.is_full_scale = True
-            print("🏢 [Retriever] Using FULL-SCALE index (1.3M+ Chunks)")
+            prefix = 'full'
+            logger.info("🏢 [Retriever] Using FULL-SCALE index (1.3M+ Chunks)")
         else:
             self.index_path = self.vector_store_dir / 'medium_faiss_index.index'
-            self.metadata_path = self.vector_store_dir / 'medium_metadata.json'
+            self.metadata_path = self._find_metadata('medium') or self.vector_store_dir / 'medium_metadata.json'
             self.is_full_scale = False
-            print("📦 [Retriever] Using MEDIUM/Standard index")
-        
-        print(f"🔧 [Retriever] Loading model: {model_name}...")
-        self.model = SentenceTransformer(model_name)
-        
-        print(f"📂 [Retriever] Loading index from {self.index_path}...")
-        if not self.index_path.exists():
+            prefix = 'medium'
+            logger.info("📦 [Retriever] Using MEDIUM/Standard index")
+
+        self.sharded = sharded
+        self.threads_per_shard = threads_per_shard
+        if sharded:
+            # The shard manifest stands in for the index file; re-splitting rewrites it last
+            shard_dir = self.vector_store_dir / f'{prefix}_shards'
+            if not is_shard_dir(shard_dir):
+                raise FileNotFoundError(
+                    f"Sharded index not found at {shard_dir}. Split the index with `python -m src.rag.sharding "
+                    f"{self.index_path} {self.metadata_path} {shard_dir} --shards N`.")
+            self.index_path = shard_dir / SHARD_MANIFEST
+        elif not self.index_path.exists():
             raise FileNotFoundError(f"Index file not found at {self.index_path}. Please run indexing first.")
-            
-        self.index = faiss.read_index(str(self.index_path))
-        
-        print(f"📄 [Retriever] Loading metadata...")
-        with open(self.metadata_path, 'r', encoding='utf-8') as f:
-            self.metadata = json.load(f)
-            
-        print(f"✅ [Retriever] Ready! ({len(self.metadata):,} chunks loaded)")
 
-    def search(self, query: str, top_k: int = 5, product_filter: str = None) -> list:
+        # Optional BM25 index over the same chunks, used by the lexical/hybrid modes
+        self.lexical_path = self.vector_store_dir / f'{prefix}_lexical_index'
+        # Chunks added / deleted since the index was built (see updates.py)
+        self.prefix = prefix
+        self.delta_path = self.vector_store_dir / f'{prefix}_delta'
+
+        self.model_name = model_name
+        self.encoder_backend = encoder_backend
+        self.model = None
+        self.index = None
+        self.metadata = None
+        self.lexical = None
+        self.delta = None
+        self._load_locks = {name: threading.Lock() for name in ('encoder', 'index', 'metadata', 'lexical', 'delta')}
+
+        if not defer_loading:
+            self.load()
+            logger.info(f"✅ [Retriever] Ready! ({len(self.metadata):,} chunks loaded)")
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.model is not None and self.index is not None and self.metadata is not None
+
+    def load(self):
+        """Load whichever components are not loaded yet. Safe to call from several threads."""
+        self.load_model()
+        self.load_index()
+        self.load_metadata()
+        self.load_delta()
+
+    def load_model(self):
+        with self._load_locks['encoder']:
+            if self.model is not None:
+                return
+            logger.info(f"🔧 [Retriever] Loading model: {self.model_name} ({self.encoder_backend})...")
+            self.model = load_encoder(self.model_name, self.encoder_backend)
+
+    def load_index(self):
+        with self._load_locks['index']:
+            if self.index is None:
+                self._read_index()
+
+    def load_metadata(self):
+        with self._load_locks['metadata']:
+            if self.metadata is None:
+                self._read_metadata()
+
+    def load_delta(self):
+        """Open the delta index of incremental updates (empty when there are none)."""
+        self.load_index()
+        self.load_metadata()
+        with self._load_locks['delta']:
+            if self.delta is not None:
+                return
+            delta = DeltaIndex(self.delta_path, self.index.d, lock=self._swap_lock)
+            delta.attach(self.metadata)
+            if len(delta) or delta.deleted:
+                logger.info(f"🧩 [Retriever] Delta index: {len(delta):,} added chunks, "
+                            f"{delta.deleted:,} deleted from the main index")
+            self.delta = delta
+
+    def load_lexical(self):
+        """Open the BM25 index. Only needed for the 'lexical' and 'hybrid' search modes."""
+        with self._load_locks['lexical']:
+            if self.lexical is not None:
+                return
+            if not is_lexical_index(self.lexical_path):
+                raise FileNotFoundError(
+                    f"Lexical index not found at {self.lexical_path}. Build it with "
+                    f"`python -m src.rag.lexical {self.metadata_path} {self.lexical_path}`.")
+            logger.info(f"🔤 [Retriever] Loading lexical index from {self.lexical_path}...")
+            self.lexical = LexicalIndex(self.lexical_path)
+
+    def _read_index(self):
+        """Read the FAISS index, recording the file version it came from."""
+        import faiss
+
+        version = self._index_file_version()
+        logger.info(f"📂 [Retriever] Loading index from {self.index_path}...")
+        if self.sharded:
+            index = ShardedIndex(self.index_path.parent, threads_per_shard=self.threads_per_shard)
+            info = index.info
+        else:
+            index = faiss.read_index(str(self.index_path))
+            # Filtered searches reconstruct vectors; IVF needs its direct map for that, built
+            # here because building it later would mutate the index under concurrent searches
+            enable_reconstruction(index)
+            info = describe_index(index)
+        previous = self.index
+        self.index_info = info
+        self.index_type = self.index_info['kind']
+        self.index_version = version
+        self.index = index
+        if self.sharded and previous is not None:
+            previous.close()  # callers hold the swap lock, so no search is using it
+        logger.info(f"🧭 [Retriever] Index type: {self.index_info}")
+
+    def _read_metadata(self):
+        logger.info(f"📄 [Retriever] Loading metadata from {self.metadata_path}...")
+        # Binary stores are memory-mapped; legacy JSON files are parsed in full
+        metadata = load_metadata(self.metadata_path)
+        self.filter_index = FilterIndex(metadata)
+        self.metadata = metadata
+
+    def _index_file_version(self):
+        stat = self.index_path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh_if_index_changed(self):
+        """
+        Reload the index and drop every cached result when the index file on disk
+        has been rebuilt since it was loaded.
+        """
+        try:
+            version = self._index_file_version()
+        except FileNotFoundError:
+            return  # mid-replacement; keep serving the loaded index
+        if version == self.index_version:
+            return
+        with self._reload_lock:
+            if self._index_file_version() == self.index_version:
+                return
+            logger.info("🔄 [Retriever] Index file changed on disk, reloading and clearing caches...")
+            try:
+                with self._load_locks['index'], self._load_locks['metadata'], self._load_locks['lexical'], \
+                        self._swap_lock.write():
+                    self._read_index()
+                    self._read_metadata()
+                    self.lexical = None  # reopened on the next lexical/hybrid search
+                    if self.delta is not None:
+                        self.delta.attach(self.metadata)  # delta ids follow the new row count
+            except Exception as e:
+                logger.warning(f"⚠️ [Retriever] Reload failed ({e}); still serving the previous index.")
+                return
+            self.result_cache.clear()
+
+    def close(self):
+        """Stop the shard worker processes of a sharded retriever."""
+        if self.sharded and self.index is not None:
+            self.index.close()
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the embedding and result caches."""
+        return {'embedding': self.embedding_cache.stats(), 'result': self.result_cache.stats()}
+
+    def add_chunks(self, chunks: list, embeddings: np.ndarray = None, batch_size: int = 64) -> int:
+        """
+        Make new or changed chunks searchable without a rebuild. They go into the
+        delta index, which every search mode covers (lexical modes score them with
+        the BM25 index's statistics); a chunk whose `chunk_id` is already indexed
+        replaces it.
+
+        Args:
+            chunks (list): Dicts with 'chunk_id' and 'text', plus any of 'product',
+                'company', 'state', 'date'.
+            embeddings (np.ndarray): Their vectors (default: encoded here).
+            batch_size (int): Encoder batch size.
+
+        Returns:
+            int: Chunks added.
+        """
+        self.load()
+        if embeddings is None:
+            embeddings = self.model.encode([c['text'] for c in chunks], batch_size=batch_size,
+                                           show_progress_bar=False, convert_to_numpy=True)
+        with self._update_lock:
+            added = self.delta.add(embeddings, chunks)
+        self.result_cache.clear()
+        return added
+
+    def delete_chunks(self, chunk_ids: list) -> int:
+        """Remove chunks from search results by id. Returns how many were live."""
+        self.load()
+        with self._update_lock:
+            deleted = self.delta.delete(chunk_ids)
+        self.result_cache.clear()
+        return deleted
+
+    def delete_complaints(self, complaint_ids: list) -> int:
+        """Remove every chunk of withdrawn complaints. Returns how many were live."""
+        self.load()
+        with self._update_lock:
+            deleted = self.delta.delete_complaints(complaint_ids)
+        self.result_cache.clear()
+        return deleted
+
+    def compact(self, background: bool = True):
+        """
+        Fold the delta index and the tombstones into a new main index.
+
+        The new index and metadata store are built next to the live ones while
+        searches carry on against them; only the final swap briefly holds
+        searches back. Adds and deletes wait for the compaction to finish.
+
+        Returns:
+            threading.Thread running the compaction when `background`, else the
+            new index's `describe_index` (None when there was nothing to fold).
+
+        Raises:
+            ValueError: On a sharded retriever; split the compacted index instead.
+        """
+        if self.sharded:
+            raise ValueError("Compacting a sharded index is not supported; compact the unsharded index "
+                             "and split it again")
+        if background:
+            thread = threading.Thread(target=self._compact, name='compact-index', daemon=True)
+            thread.start()
+            return thread
+        return self._compact()
+
+    def _compact(self):
+        self.load()
+        with self._update_lock:
+            if not len(self.delta) and not self.delta.deleted:
+                return None
+            logger.info(f"🗜️ [Retriever] Compacting {len(self.delta):,} added and "
+                        f"{self.delta.deleted:,} deleted chunks into the main index...")
+            store_dir = self.vector_store_dir / f'{self.prefix}_metadata_store'
+            new_index = self.index_path.with_name(self.index_path.name + '.compacting')
+            new_store = store_dir.with_name(store_dir.name + '.compacting')
+            built = build_compacted(self.index, self.metadata, self.delta, new_index, new_store)
+            moves = [[str(new_index), str(self.index_path)], [str(new_store), str(store_dir)]]
+            if is_lexical_index(self.lexical_path):
+                # Lexical rows must follow the new row order
+                new_lexical = self.lexical_path.with_name(self.lexical_path.name + '.compacting')
+                build_lexical_index(MetadataStore(new_store), new_lexical)
+                moves.append([str(new_lexical), str(self.lexical_path)])
+
+            # From here on the swap is journaled, so a crash is rolled forward on the next start
+            journal = journal_path(self.vector_store_dir, self.prefix)
+            tmp_journal = journal.with_name(journal.name + '.tmp')
+            tmp_journal.write_text(json.dumps({'moves': moves, 'clear': [str(self.delta_path)]}), encoding='utf-8')
+            os.replace(tmp_journal, journal)
+
+            with self._swap_lock.write():
+                finish_compaction(self.vector_store_dir, self.prefix)
+                metadata = load_metadata(store_dir)
+                delta = DeltaIndex(self.delta_path, self.index.d, lock=self._swap_lock)
+                delta.attach(metadata)
+                self.index = built['index']
+                self.index_info = built['info']
+                self.index_type = self.index_info['kind']
+                self.index_version = self._index_file_version()
+                self.metadata_path = store_dir
+                self.metadata = metadata
+                self.filter_index = FilterIndex(metadata)
+                self.lexical = None  # reopened on the next lexical/hybrid search
+                self.delta = delta
+            self.result_cache.clear()
+            logger.info(f"✅ [Retriever] Compaction done: {self.index_info}")
+            return self.index_info
+
+    def _find_metadata(self, prefix: str):
+        """
+        Locate the metadata for an index prefix, preferring the memory-mapped store
+        over the legacy JSON dump.
+        """
+        store_dir = self.vector_store_dir / f'{prefix}_metadata_store'
+        if is_metadata_store(store_dir):
+            return store_dir
+        json_path = self.vector_store_dir / f'{prefix}_metadata.json'
+        if json_path.exists():
+            return json_path
+        return None
+
+    def search(self, query: str, top_k: int = 5, product_filter: str = None,
+               nprobe: int = None, ef_search: int = None, filters: dict = None, mode: str = 'dense') -> list:
         """
         Search for relevant complaints.
+
+        Filters are resolved against the metadata's inverted index before the
+        vector search, so a filtered query always returns `top_k` results when at
+        least that many chunks match.
+
+        Args:
+            query (str): Natural-language question.
+            top_k (int): Number of results to return.
+            product_filter (str): Shorthand for `filters={'product': ...}`.
+            nprobe (int): IVF lists to probe for this query (IVF indexes only).
+            ef_search (int): HNSW beam width for this query (HNSW indexes only).
+            filters (dict): Any of 'product', 'company', 'state' (value or list of
+                values, case-insensitive substring match) and 'date_from' /
+                'date_to' ('YYYY-MM-DD', inclusive).
+            mode (str): 'dense' (FAISS only), 'lexical' (BM25 only) or 'hybrid'
+                (both rankings fused with reciprocal-rank fusion). The lexical
+                modes need the BM25 index built next to the FAISS index.
+        """
+        return self.search_batch([query], top_k=top_k, filters=filters, product_filter=product_filter,
+                                 nprobe=nprobe, ef_search=ef_search, mode=mode)[0]
+
+    def search_batch(self, queries: list, top_k: int = 5, filters=None, product_filter: str = None,
+                     nprobe: int = None, ef_search: int = None, batch_size: int = 64, mode: str = 'dense') -> list:
+        """
+        Search for several queries at once.
+
+        All queries are encoded in one `encode` call and queries sharing the same
+        filter go to FAISS as a single matrix, so the per-call model and BLAS
+        overhead is paid once per batch instead of once per query.
+
+        Args:
+            queries (list): Natural-language questions.
+            top_k (int): Number of results per query.
+            filters (dict | list): One filter dict applied to every query, or one
+                dict (or None) per query. See `search` for the supported fields.
+            product_filter (str): Shorthand added to every query's filters.
+            nprobe (int): IVF lists to probe (IVF indexes only).
+            ef_search (int): HNSW beam width (HNSW indexes only).
+            batch_size (int): Encoder batch size.
+            mode (str): 'dense', 'lexical' or 'hybrid'; see `search`.
+
+        Returns:
+            list: One result list per query, in input order.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}. Supported: {list(SEARCH_MODES)}")
+        queries = list(queries)
+        if not queries:
+            return []
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(queries)
+        if len(filters) != len(queries):
+            raise ValueError(f"Got {len(filters)} filters for {len(queries)} queries")
+
+        self.load()
+        self._refresh_if_index_changed()
+        if mode != 'dense':
+            self.load_lexical()
+
+        query_filters = []
+        for f in filters:
+            f = dict(f or {})
+            if product_filter:
+                f['product'] = product_filter
+            query_filters.append(f)
+
+        if mode == 'lexical':
+            # BM25 needs no embedding; cache on the normalized text instead
+            embeddings = None
+            query_keys = [' '.join(q.lower().split()) for q in queries]
+        else:
+            with timed('encode'):
+                embeddings = self._encode(queries, batch_size)
+            query_keys = [hashlib.blake2b(embedding.tobytes(), digest_size=16).digest() for embedding in embeddings]
+
+        # Hold off index swaps (compaction, reloads) while this batch reads the index
+        with self._swap_lock.read():
+            results = self._search_encoded(queries, embeddings, query_keys, query_filters, top_k, mode,
+                                           nprobe, ef_search)
+
+        # Hand out copies so callers can't mutate what is cached
+        return [[dict(r) for r in query_results] for query_results in results]
+
+    def _search_encoded(self, queries: list, embeddings, query_keys: list, query_filters: list, top_k: int,
+                        mode: str, nprobe: int, ef_search: int) -> list:
+        """The cached / FAISS / lexical part of `search_batch`, run under the swap lock's read side."""
+        # Serve repeated questions from the result cache; only the rest hit FAISS
+        result_keys = [
+            (query_key, top_k, filter_key(f), mode, nprobe, ef_search, self.index_version, self.delta.version)
+            for query_key, f in zip(query_keys, query_filters)
+        ]
+        results = [self.result_cache.get(key) for key in result_keys]
+        pending = [row for row, cached in enumerate(results) if cached is None]
+        SEARCHES.inc(len(queries), mode=mode)
+        RESULT_CACHE.inc(len(queries) - len(pending), result='hit')
+        RESULT_CACHE.inc(len(pending), result='miss')
+
+        # Group queries by selection so each distinct filter is one FAISS call
+        groups = {}
+        selections = {}
+        for row in pending:
+            # Deleted chunks are excluded like a filter
+            key = filter_key(query_filters[row])
+            selection = self.delta.restrict(self.filter_index.select(query_filters[row]), key)
+            selections[row] = selection
+            key = None if selection is None else id(selection)
+            groups.setdefault(key, (selection, []))[1].append(row)
+
+        # Hybrid mode fuses deeper rankings than it returns
+        depth = top_k if mode == 'dense' else max(top_k, self.HYBRID_DEPTH)
+        distances = np.full((len(queries), depth), np.inf, dtype='float32')
+        indices = np.full((len(queries), depth), -1, dtype='int64')
+        if mode != 'lexical' and groups:
+            with timed('faiss'):
+                for selection, rows in groups.values():
+                    if selection is not None and selection.count == 0:
+                        group_d = np.empty((len(rows), 0), dtype='float32')
+                        group_i = np.empty((len(rows), 0), dtype='int64')
+                    elif self.sharded:
+                        group_d, group_i = self.index.search(embeddings[rows], depth, nprobe=nprobe,
+                                                             ef_search=ef_search, selection=selection,
+                                                             products=self._filtered_products(query_filters[rows[0]]))
+                    elif selection is None:
+                        params = search_parameters(self.index, nprobe=nprobe, ef_search=ef_search)
+                        group_d, group_i = self.index.search(embeddings[rows], depth, params=params)
+                    else:
+                        group_d, group_i = self._filtered_search(embeddings[rows], depth, selection,
+                                                                 nprobe, ef_search)
+                    if len(self.delta):
+                        delta_d, delta_i = self.delta.search(embeddings[rows], depth, query_filters[rows[0]])
+                        group_d, group_i = merge_results(group_d, group_i, delta_d, delta_i, depth)
+                    distances[rows, :group_d.shape[1]] = group_d
+                    indices[rows, :group_i.shape[1]] = group_i
+
+        stage_seconds = {}
+        for row in pending:
+            if mode == 'dense':
+                ids, scores = indices[row], 1 / (1 + distances[row])
+            else:
+                selection = selections[row]
+                with timed('lexical', stage_seconds):
+                    ids, scores = self.lexical.search(queries[row], depth,
+                                                      mask=None if selection is None else selection.mask)
+                    if len(self.delta):
+                        # Chunks added since the BM25 index was built are scored with its statistics
+                        delta_ids, delta_scores = self.delta.lexical_search(queries[row], depth, self.lexical,
+                                                                            query_filters[row])
+                        ids, scores = merge_scored(ids, scores, delta_ids, delta_scores, depth)
+                if mode == 'hybrid':
+                    ids, scores = reciprocal_rank_fusion([indices[row], ids], top_k)
+                ids, scores = ids[:top_k], scores[:top_k]
+            with timed('metadata', stage_seconds):
+                results[row] = self._format_results(ids, scores)
+            self.result_cache.put(result_keys[row], results[row])
+        if stage_seconds:
+            logger.debug(f"🔎 [Retriever] Searched {len(queries)} queries ({len(queries) - len(pending)} cached)",
+                         extra={'mode': mode, **{f'{k}_s': v for k, v in stage_seconds.items()}})
+        return results
+
+    def _encode(self, queries: list, batch_size: int) -> np.ndarray:
         """
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
-        
-        # FAISS search
-        # We fetch more than top_k initially to allow for filtering
-        fetch_k = top_k * 5 if product_filter else top_k
-        distances, indices = self.index.search(query_embedding, fetch_k)
-        
+        Embed queries, reusing cached embeddings for normalized text seen before.
+
+        Normalization lower-cases and collapses whitespace; MiniLM's tokenizer is
+        uncased, so this does not change the embedding.
+        """
+        keys = [' '.join(q.lower().split()) for q in queries]
+        found = {key: self.embedding_cache.get(key) for key in keys}
+        missing = [key for key, embedding in found.items() if embedding is None]
+        if missing:
+            fresh = self.model.encode(missing, batch_size=batch_size, convert_to_numpy=True)
+            for key, embedding in zip(missing, np.asarray(fresh, dtype='float32')):
+                found[key] = embedding
+                self.embedding_cache.put(key, embedding)
+        return np.ascontiguousarray(np.stack([found[key] for key in keys]), dtype='float32')
+
+    def _format_results(self, indices: np.ndarray, scores: np.ndarray) -> list:
+        """Decode the metadata rows of one query's hits."""
         results = []
-        for idx, dist in zip(indices[0], distances[0]):
+        for idx, score in zip(indices, scores):
             if idx == -1: continue # invalid index
-            
-            meta = self.metadata[idx]
-            
-            # Apply Filter
-            if product_filter and product_filter.lower() not in meta.get('product', '').lower():
-                continue
-            
-            # Format result based on metadata structure (full vs sample)
-            if self.is_full_scale:
-                # Full scale metadata structure: {'id': ..., 'text': ..., 'meta': {...}}
-                results.append({
-                    'text': meta['text'],
-                    'product': meta['meta'].get('product', 'N/A'),
-                    'chunk_id': meta['id'],
-                    'score': float(1 / (1 + dist))
-                })
-            else:
-                # Sample/Medium metadata structure: {'text': ..., 'product': ..., 'chunk_id': ...}
-                results.append({
-                    'text': meta['text'],
-                    'product': meta.get('product', 'N/A'),
-                    'chunk_id': meta['chunk_id'],
-                    'score': float(1 / (1 + dist))
-                })
-            
-            if len(results) >= top_k:
-                break
-                
+
+            idx = int(idx)
+            meta = self.delta.row(idx) if idx >= self.delta.base else self.metadata.row(idx)
+            results.append({
+                'text': meta['text'],
+                'product': meta.get('product') or 'N/A',
+                'chunk_id': meta['chunk_id'],
+                'duplicate_count': meta.get('duplicate_count') or 1,
+                'score': float(score)
+            })
         return results
+
+    def _filtered_products(self, filters) -> list:
+        """The stored product values a product filter matches, or None without one."""
+        value = active_filters(filters).get('product')
+        if value is None:
+            return None
+        names = self.metadata.categories['product']
+        return [names[code] for code in self.filter_index.matching_codes('product', value)]
+
+    def _filtered_search(self, query_embeddings: np.ndarray, top_k: int, selection,
+                         nprobe: int = None, ef_search: int = None):
+        """Search only the rows in `selection`; see `filters.filtered_search`."""
+        return filtered_search(self.index, query_embeddings, top_k, selection, nprobe=nprobe,
+                               ef_search=ef_search, exact_limit=self.EXACT_FILTER_LIMIT)
@@ -0,0 +1,437 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .telemetry import GENERATED_TOKENS, current_trace_id, get_logger, observe_stage, timed
+
+logger = get_logger('scheduler')
+
+_DONE = object()
+
+
+def eos_token_ids(model, tokenizer) -> set:
+    """
+    Token ids that end a sequence, as `model.generate` sees them: the generation
+    config's `eos_token_id` (an int or, e.g. for Qwen2.5, a list), else the tokenizer's.
+    """
+    eos = getattr(getattr(model, 'generation_config', None), 'eos_token_id', None)
+    if eos is None:
+        eos = tokenizer.eos_token_id
+    return {int(token) for token in (eos if isinstance(eos, (list, tuple)) else [eos]) if token is not None}
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised by `submit` when the admission queue is full."""
+
+
+class SchedulerClosed(RuntimeError):
+    """Raised by `submit` after `close`, and by requests that were still waiting when it was called."""
+
+
+class GenerationRequest:
+    """
+    One question being answered by the scheduler.
+
+    Iterate it (or `async for` it) to receive decoded text fragments as they are
+    produced. Abandoning the iteration early cancels the request and frees its
+    batch slot.
+    """
+    def __init__(self, query: str, context_chunks: list):
+        self.query = query
+        self.context_chunks = context_chunks
+        self.submitted_at = time.perf_counter()
+        # Logged with the scheduler's messages about this request (they run on its thread)
+        self.trace_id = current_trace_id()
+        self.stats = None
+        self.error = None
+        self.cancelled = False
+        self._events = queue.Queue()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _check(self, item):
+        """Return True at the end of the stream (re-raising a generation error)."""
+        if item is not _DONE:
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._events.get()
+                if self._check(item):
+                    return
+                yield item
+        finally:
+            self.cancel()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # Waiting happens on a worker thread so the caller's event loop stays free
+                item = await loop.run_in_executor(None, self._events.get)
+                if self._check(item):
+                    return
+                yield item
+        finally:
+            self.cancel()
+
+    def result(self) -> str:
+        """Block until generation finishes and return the whole answer."""
+        return "".join(self).strip()
+
+
+class _Sequence:
+    """Decode state of one admitted request inside the running batch."""
+    def __init__(self, request: GenerationRequest, prompt_tokens: int, first_token: int):
+        self.request = request
+        self.prompt_tokens = prompt_tokens
+        self.length = prompt_tokens  # tokens in the KV-cache (excluding padding)
+        self.next_token = first_token
+        self.generated = [first_token]
+        self.emitted = ""
+        self.first_token_at = time.perf_counter()
+
+
+class ContinuousBatchScheduler:
+    """
+    Serves many concurrent answers from one LocalComplaintGenerator.
+
+    Requests wait in an asyncio queue. A single scheduling loop prefills each new
+    request on its own (reusing the generator's prompt-prefix KV-cache), then adds
+    it to the running batch; every decode step advances all active sequences with
+    one forward pass. Finished sequences leave the batch immediately and waiting
+    ones join at the next step, so the batch stays full while there is work
+    (continuous batching) instead of each answer running `generate` on its own.
+
+    Sequences of different lengths share one left-padded KV-cache; the padding is
+    masked out and trimmed again as short sequences finish.
+
+    Admission control: at most `max_batch_size` sequences decode together and at
+    most `max_queue` more may wait; beyond that `submit` raises SchedulerBusy.
+    """
+    def __init__(self, generator, max_batch_size: int = 8, max_queue: int = 32):
+        """
+        Args:
+            generator (LocalComplaintGenerator): Supplies the model, tokenizer,
+                prompt format, prefix cache and generation settings.
+            max_batch_size (int): Sequences decoded together per step.
+            max_queue (int): Requests allowed to wait for a batch slot.
+        """
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self._counters = {
+            'submitted': 0, 'rejected': 0, 'completed': 0, 'cancelled': 0, 'failed': 0,
+            'decode_steps': 0, 'decoded_tokens': 0, 'peak_queue_depth': 0, 'peak_batch_size': 0,
+        }
+        self._rows = []
+        self._kv = None
+        self._mask = None
+        self._waiting = 0
+        self._eos_ids = None  # from the model's generation config, once it has loaded
+        self._closed = False
+        self._lock = threading.Lock()
+        # Forward passes run on one dedicated thread so the loop stays free to admit requests
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='decode')
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name='batch-scheduler', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, query: str, context_chunks: list) -> GenerationRequest:
+        """
+        Queue a question for generation. Safe to call from any thread.
+
+        Raises:
+            SchedulerBusy: When `max_queue` requests are already waiting.
+            SchedulerClosed: After `close`.
+        """
+        request = GenerationRequest(query, context_chunks)
+        with self._lock:
+            if self._closed:
+                raise SchedulerClosed("The generation scheduler is shut down")
+            if self._waiting >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise SchedulerBusy(f"Generation queue is full ({self.max_queue} waiting)")
+            self._waiting += 1
+            self._counters['submitted'] += 1
+            self._counters['peak_queue_depth'] = max(self._counters['peak_queue_depth'], self._waiting)
+            # Queued under the lock, so `close` can't slip in between and strand the request
+            self._loop.call_soon_threadsafe(self._pending.put_nowait, request)
+        return request
+
+    def generate_stream(self, query: str, context_chunks: list):
+        """Same contract as LocalComplaintGenerator.generate_stream."""
+        yield from self.submit(query, context_chunks)
+
+    def generate_answer(self, query: str, context_chunks: list) -> str:
+        """Same contract as LocalComplaintGenerator.generate_answer."""
+        return self.submit(query, context_chunks).result()
+
+    def metrics(self) -> dict:
+        """Queue depth, batch occupancy and lifetime counters."""
+        with self._lock:
+            metrics = dict(self._counters, queue_depth=self._waiting, active=len(self._rows),
+                           max_batch_size=self.max_batch_size, max_queue=self.max_queue)
+        steps = metrics['decode_steps']
+        metrics['mean_batch_size'] = metrics['decoded_tokens'] / steps if steps else 0.0
+        return metrics
+
+    def close(self):
+        """
+        Stop the scheduling loop; requests still running are cut short and those
+        still waiting fail with SchedulerClosed.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    # ------------------------------------------------------------ scheduling
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._pending = asyncio.Queue()
+        self._task = self._loop.create_task(self._schedule())
+        self._ready.set()
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for seq in self._rows:
+                self._finish(seq, 'cancelled')
+            while not self._pending.empty():
+                request = self._pending.get_nowait()
+                request.error = SchedulerClosed("The generation scheduler shut down before this request ran")
+                with self._lock:
+                    self._waiting -= 1
+                    self._counters['cancelled'] += 1
+                request._events.put(_DONE)
+            self._loop.close()
+
+    async def _schedule(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block only when there is nothing to decode
+            if not self._rows:
+                await self._admit(await self._pending.get())
+            while len(self._rows) < self.max_batch_size and not self._pending.empty():
+                await self._admit(self._pending.get_nowait())
+            if self._rows:
+                try:
+                    await loop.run_in_executor(self._executor, self._decode_step)
+                except Exception as e:
+                    # A failed step poisons the shared cache: fail every active request
+                    logger.error(f"❌ [Scheduler] Decode step failed: {e}",
+                                 extra={'trace_ids': [seq.request.trace_id for seq in self._rows]})
+                    for seq in list(self._rows):
+                        seq.request.error = e
+                        self._finish(seq, 'failed')
+                    self._rows, self._kv, self._mask = [], None, None
+
+    async def _admit(self, request: GenerationRequest):
+        with self._lock:
+            self._waiting -= 1
+            cancelled = request.cancelled
+            if cancelled:
+                self._counters['cancelled'] += 1
+        if cancelled:
+            request._events.put(_DONE)
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._prefill, request)
+        except asyncio.CancelledError:
+            # Closed mid-prefill: the request isn't in the batch yet, so end it here
+            request.error = SchedulerClosed("The generation scheduler shut down before this request ran")
+            with self._lock:
+                self._counters['cancelled'] += 1
+            request._events.put(_DONE)
+            raise
+        except Exception as e:
+            logger.error(f"❌ [Scheduler] Prefill failed: {e}", extra={'trace_id': request.trace_id})
+            request.error = e
+            with self._lock:
+                self._counters['failed'] += 1
+            request._events.put(_DONE)
+
+    # ---------------------------------------------------------- model steps
+
+    def _prefill(self, request: GenerationRequest):
+        """Run the prompt through the model alone and merge its cache into the batch."""
+        import torch
+
+        generator = self.generator
+        generator.load()
+        model = generator.pipe.model
+        with timed('prompt'):
+            inputs = generator._model_inputs(request.query, request.context_chunks)
+        input_ids = inputs['input_ids']
+        past = inputs.get('past_key_values')
+        past_len = past.get_seq_length() if past is not None else 0
+        with torch.no_grad():
+            out = model(input_ids=input_ids[:, past_len:], attention_mask=inputs['attention_mask'],
+                        past_key_values=past, use_cache=True)
+        first_token = int(self._sample(out.logits[:, -1])[0])
+        seq = _Sequence(request, input_ids.shape[1], first_token)
+        self._merge(seq, out.past_key_values)
+        self._emit(seq)
+        if self._is_finished(seq):
+            self._remove([seq])
+
+    def _decode_step(self):
+        """Advance every active sequence by one token with a single batched forward pass."""
+        import torch
+        from transformers import DynamicCache
+
+        cancelled = [seq for seq in self._rows if seq.request.cancelled]
+        if cancelled:
+            self._remove(cancelled, reason='cancelled')
+            if not self._rows:
+                return
+
+        device = self._mask.device
+        input_ids = torch.tensor([[seq.next_token] for seq in self._rows], device=device)
+        position_ids = torch.tensor([[seq.length] for seq in self._rows], device=device)
+        mask = torch.cat([self._mask, torch.ones((len(self._rows), 1), dtype=self._mask.dtype, device=device)], dim=1)
+        with torch.no_grad():
+            out = self.generator.pipe.model(
+                input_ids=input_ids, attention_mask=mask, position_ids=position_ids,
+                past_key_values=DynamicCache.from_legacy_cache(self._kv), use_cache=True)
+        self._kv = out.past_key_values.to_legacy_cache()
+        self._mask = mask
+        next_tokens = self._sample(out.logits[:, -1]).tolist()
+
+        with self._lock:
+            self._counters['decode_steps'] += 1
+            self._counters['decoded_tokens'] += len(self._rows)
+        finished = []
+        for seq, token in zip(self._rows, next_tokens):
+            seq.length += 1
+            seq.next_token = token
+            seq.generated.append(token)
+            self._emit(seq)
+            if self._is_finished(seq):
+                finished.append(seq)
+        if finished:
+            self._remove(finished)
+
+    def _sample(self, logits):
+        """Next token per row, following the generator's sampling settings."""
+        import torch
+
+        kwargs = self.generator.generation_kwargs
+        if not kwargs.get('do_sample'):
+            return torch.argmax(logits, dim=-1)
+        logits = logits.float()
+        if kwargs.get('temperature'):
+            logits = logits / kwargs['temperature']
+        if kwargs.get('top_k'):
+            kth = torch.topk(logits, min(kwargs['top_k'], logits.shape[-1]), dim=-1).values[:, -1:]
+            logits = logits.masked_fill(logits < kth, float('-inf'))
+        if kwargs.get('top_p') and kwargs['top_p'] < 1.0:
+            sorted_logits, order = torch.sort(logits, descending=True, dim=-1)
+            cumulative = torch.softmax(sorted_logits, dim=-1).cumsum(dim=-1)
+            # Drop tokens once the mass before them already exceeds top_p (always keep the best one)
+            drop = cumulative - torch.softmax(sorted_logits, dim=-1) > kwargs['top_p']
+            logits = logits.masked_fill(drop.scatter(1, order, drop), float('-inf'))
+        return torch.multinomial(torch.softmax(logits, dim=-1), num_samples=1).squeeze(-1)
+
+    def _merge(self, seq: _Sequence, cache):
+        """Append a prefilled sequence to the batch, left-padding the shorter side."""
+        import torch
+
+        kv = cache.to_legacy_cache()
+        length = kv[0][0].shape[2]
+        mask = torch.ones((1, length), dtype=torch.long, device=kv[0][0].device)
+        if self._kv is None:
+            self._kv, self._mask, self._rows = kv, mask, [seq]
+        else:
+            width = max(length, self._mask.shape[1])
+            self._kv = tuple(
+                (torch.cat([_left_pad(k, width), _left_pad(new_k, width)]),
+                 torch.cat([_left_pad(v, width), _left_pad(new_v, width)]))
+                for (k, v), (new_k, new_v) in zip(self._kv, kv))
+            self._mask = torch.cat([_left_pad(self._mask, width), _left_pad(mask, width)])
+            self._rows.append(seq)
+        with self._lock:
+            self._counters['peak_batch_size'] = max(self._counters['peak_batch_size'], len(self._rows))
+
+    def _remove(self, finished: list, reason: str = 'completed'):
+        """Drop finished rows from the batch and trim padding nobody needs any more."""
+        import torch
+
+        for seq in finished:
+            self._finish(seq, reason)
+        keep = [i for i, seq in enumerate(self._rows) if seq not in finished]
+        if not keep:
+            self._rows, self._kv, self._mask = [], None, None
+            return
+        index = torch.tensor(keep, device=self._mask.device)
+        mask = self._mask.index_select(0, index)
+        # Columns that are padding in every remaining row can go
+        start = int(torch.argmax((mask.sum(dim=0) > 0).to(torch.int8)))
+        self._mask = mask[:, start:]
+        self._kv = tuple((k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:])
+                         for k, v in self._kv)
+        self._rows = [self._rows[i] for i in keep]
+
+    def _is_finished(self, seq: _Sequence) -> bool:
+        if self._eos_ids is None:
+            self._eos_ids = eos_token_ids(self.generator.pipe.model, self.generator.pipe.tokenizer)
+        max_new = self.generator.generation_kwargs.get('max_new_tokens')
+        return (seq.next_token in self._eos_ids
+                or (max_new is not None and len(seq.generated) >= max_new))
+
+    def _emit(self, seq: _Sequence, final: bool = False):
+        """Send the newly decoded text of `seq` to its caller."""
+        text = self.generator.pipe.tokenizer.decode(seq.generated, skip_special_tokens=True)
+        # Hold back incomplete multi-byte characters until the next token completes them
+        if not final and text.endswith("\ufffd"):
+            return
+        if len(text) > len(seq.emitted):
+            seq.request._events.put(text[len(seq.emitted):])
+            seq.emitted = text
+
+    def _finish(self, seq: _Sequence, reason: str):
+        request = seq.request
+        if reason == 'completed':
+            self._emit(seq, final=True)
+        total = time.perf_counter() - request.submitted_at
+        request.stats = {
+            'prompt_tokens': seq.prompt_tokens,
+            'new_tokens': len(seq.generated),
+            'ttft_s': seq.first_token_at - request.submitted_at,
+            'total_s': total,
+            'tokens_per_s': len(seq.generated) / total if total else 0.0,
+        }
+        if reason == 'completed':
+            observe_stage('ttft', request.stats['ttft_s'])
+            observe_stage('generate', total)
+        GENERATED_TOKENS.inc(len(seq.generated), backend=self.generator.backend)
+        logger.debug(f"✅ [Scheduler] Request {reason}: {len(seq.generated)} tokens in {total:.2f}s",
+                     extra=dict(request.stats, trace_id=request.trace_id, outcome=reason))
+        with self._lock:
+            self._counters[reason] += 1
+        request._events.put(_DONE)
+
+
+def _left_pad(tensor, width: int):
+    """Zero-pad the sequence axis of a mask ([B, T]) or KV tensor ([B, H, T, D]) on the left."""
+    import torch.nn.functional as F
+
+    if tensor.dim() == 2:
+        return F.pad(tensor, (width - tensor.shape[1], 0))
+    return F.pad(tensor, (0, 0, width - tensor.shape[2], 0))
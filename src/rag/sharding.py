@@ -0,0 +1,373 @@
+"""
+Sharded dense search across worker processes.
+
+The main index is split once into N shard indexes, by a hash of the complaint
+id or by product. A `ShardedIndex` starts one worker process per shard; each
+memory-maps its shard, so resident memory follows the pages queries actually
+touch rather than the whole store. A query batch is sent to every worker over
+a pipe, each returns its local top-k, and the coordinator merges them by
+distance. Shards scan in parallel, so latency drops with the number of cores.
+
+    python -m src.rag.sharding vector_store/full_faiss_index.index \\
+        vector_store/full_metadata_store vector_store/full_shards --shards 8
+
+Layout of `<prefix>_shards/`:
+    shard-000.index   FAISS index of the shard's vectors (an emptied clone of the
+                      main index refilled, so IVF/PQ training is shared)
+    shard-000.npy     int64 row id in the main index / metadata store of each vector
+    manifest.json     partitioning, dimension and per-shard counts (written last)
+
+Results carry main-index row ids, so metadata lookups, filters and the delta
+index work unchanged on top of a sharded index.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import traceback
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+
+from .filters import Selection, filtered_search
+from .index_factory import describe_index, enable_reconstruction, search_parameters
+from .metadata_store import MISSING_CODE, load_metadata
+from .telemetry import get_logger
+from .updates import complaint_id, merge_results, reconstruct_rows
+
+logger = get_logger('sharding')
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_NAME = 'faiss-shards'
+FORMAT_VERSION = 1
+PARTITIONS = ('hash', 'product')
+
+
+def is_shard_dir(path: Path) -> bool:
+    return (Path(path) / MANIFEST_NAME).exists()
+
+
+def read_manifest(shard_dir: Path) -> dict:
+    manifest_path = Path(shard_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        raise FileNotFoundError(f"No shard manifest at {manifest_path}")
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    if manifest.get('format') != FORMAT_NAME:
+        raise ValueError(f"{shard_dir} is not a sharded index")
+    if manifest.get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported shard format version {manifest['version']}")
+    return manifest
+
+
+def hash_partition(chunk_ids, n_shards: int) -> np.ndarray:
+    """Shard of each chunk: a stable hash of its complaint id, so a complaint's chunks stay together."""
+    digests = b''.join(hashlib.blake2b(complaint_id(c).encode('utf-8'), digest_size=8).digest()
+                       for c in chunk_ids)
+    return (np.frombuffer(digests, dtype='<u8') % np.uint64(n_shards)).astype(np.int32)
+
+
+def product_partition(codes: np.ndarray, products: list, n_shards: int):
+    """
+    Shard of each chunk by product: whole products are packed largest first onto
+    the emptiest shard, so a product filter only has matches on its own shards.
+
+    Returns:
+        (assignment, products): int32 shard per row, and the product names of each shard.
+    """
+    codes = np.asarray(codes)
+    sizes = np.bincount(np.where(codes == MISSING_CODE, len(products), codes), minlength=len(products) + 1)
+    loads = np.zeros(n_shards, dtype=np.int64)
+    shard_of = np.zeros(len(products) + 1, dtype=np.int32)  # last slot: rows without a product
+    shard_products = [[] for _ in range(n_shards)]
+    for code in np.argsort(-sizes, kind='stable'):
+        shard = int(np.argmin(loads))
+        shard_of[code] = shard
+        loads[shard] += sizes[code]
+        if code < len(products) and sizes[code]:
+            shard_products[shard].append(products[code])
+    return shard_of[np.where(codes == MISSING_CODE, len(products), codes)], shard_products
+
+
+def write_shards(index, metadata, shard_dir: Path, n_shards: int, partition: str = 'hash',
+                 batch_size: int = 65536) -> dict:
+    """
+    Split `index` into `n_shards` shard indexes under `shard_dir`.
+
+    Shards are built one at a time from vectors reconstructed out of `index`
+    (decoded and re-encoded for PQ indexes, which lands on the same codes), so
+    memory use is the source index plus one shard.
+
+    Returns:
+        dict: The manifest written.
+    """
+    import faiss
+
+    if partition not in PARTITIONS:
+        raise ValueError(f"Unknown partition {partition!r}. Choose from {list(PARTITIONS)}")
+    if n_shards < 1:
+        raise ValueError("Need at least one shard")
+    if len(metadata) != index.ntotal:
+        raise ValueError(f"Index has {index.ntotal:,} vectors but the metadata {len(metadata):,} rows")
+    if not enable_reconstruction(index):
+        raise ValueError("Can't reconstruct vectors from this index; load it without memory-mapping")
+
+    shard_products = None
+    if partition == 'hash':
+        assignment = hash_partition((metadata.field(i, 'chunk_id') for i in range(len(metadata))), n_shards)
+    else:
+        assignment, shard_products = product_partition(metadata.codes('product'),
+                                                       metadata.categories['product'], n_shards)
+
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shards = []
+    for shard in range(n_shards):
+        name = f'shard-{shard:03d}'
+        ids = np.flatnonzero(assignment == shard).astype('int64')
+        shard_index = faiss.clone_index(index)
+        shard_index.reset()
+        for start in range(0, len(ids), batch_size):
+            shard_index.add(reconstruct_rows(index, ids[start:start + batch_size]))
+
+        tmp_path = shard_dir / f'{name}.index.tmp'
+        faiss.write_index(shard_index, str(tmp_path))
+        os.replace(tmp_path, shard_dir / f'{name}.index')
+        with open(shard_dir / f'{name}.npy.tmp', 'wb') as f:
+            np.save(f, ids)
+        os.replace(shard_dir / f'{name}.npy.tmp', shard_dir / f'{name}.npy')
+        entry = {'name': name, 'count': len(ids)}
+        if shard_products is not None:
+            entry['products'] = shard_products[shard]
+        shards.append(entry)
+        logger.info(f"🧱 [Sharding] {name}: {len(ids):,} vectors")
+
+    manifest = {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'partition': partition,
+                'dimension': int(index.d), 'ntotal': int(index.ntotal), 'shards': shards}
+    tmp_path = shard_dir / (MANIFEST_NAME + '.tmp')
+    tmp_path.write_text(json.dumps(manifest), encoding='utf-8')
+    os.replace(tmp_path, shard_dir / MANIFEST_NAME)
+    return manifest
+
+
+def read_mmapped_index(path: Path):
+    """Open a FAISS index with its vectors / inverted lists memory-mapped instead of read into RAM."""
+    import faiss
+
+    flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(str(path), flags)
+
+
+def search_shard(index, ids: np.ndarray, queries: np.ndarray, top_k: int, nprobe: int = None,
+                 ef_search: int = None, bitmap: np.ndarray = None, ntotal: int = None):
+    """
+    Top-k of one shard, as main-index row ids.
+
+    Args:
+        bitmap (np.ndarray): Packed selection over all `ntotal` main-index rows
+            (`Selection.bitmap`); only the selected rows of this shard are searched.
+    """
+    if bitmap is None:
+        params = search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+        distances, local = index.search(queries, top_k, params=params)
+    else:
+        mask = np.unpackbits(bitmap, count=ntotal, bitorder='little').view(bool)[ids]
+        selection = Selection(mask)
+        if selection.count == 0:
+            return np.empty((len(queries), 0), dtype='float32'), np.empty((len(queries), 0), dtype='int64')
+        distances, local = filtered_search(index, queries, top_k, selection, nprobe=nprobe, ef_search=ef_search)
+    return distances, np.where(local >= 0, ids[np.maximum(local, 0)], -1)
+
+
+def serve_shard(conn, index_path: str, ids_path: str, count: int, ntotal: int, threads: int):
+    """
+    Worker process main loop: answer ('search', ...) requests on `conn` until
+    it receives None or the coordinator goes away.
+    """
+    import faiss
+
+    try:
+        faiss.omp_set_num_threads(threads)
+        index = read_mmapped_index(index_path)
+        ids = np.load(ids_path, mmap_mode='r') if count else np.empty(0, dtype='int64')
+        if index.ntotal != count or len(ids) != count:
+            raise ValueError(f"{index_path} does not match the shard manifest")
+        conn.send(('ok', describe_index(index)))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        return
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        try:
+            queries, top_k, nprobe, ef_search, bitmap = request
+            conn.send(('ok', search_shard(index, ids, queries, top_k, nprobe, ef_search, bitmap, ntotal)))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+
+class ShardedIndex:
+    """
+    Coordinator of a sharded index: fans each search out to one worker process
+    per shard and merges their top-k.
+
+    It answers `search` with main-index row ids like the unsharded index does,
+    and exposes `d`, `ntotal` and `info` (`describe_index` of the shards plus
+    the shard count). Concurrent searches take turns on the workers; each one
+    already runs on every shard at once.
+    """
+    def __init__(self, shard_dir: Path, threads_per_shard: int = 1, start_method: str = 'spawn'):
+        """
+        Args:
+            shard_dir (Path): Directory written by `write_shards`.
+            threads_per_shard (int): OpenMP threads of each worker.
+            start_method (str): multiprocessing start method. 'spawn' by default,
+                since forking a process that already runs OpenMP threads can hang.
+        """
+        self.shard_dir = Path(shard_dir)
+        self.manifest = read_manifest(self.shard_dir)
+        self.d = self.manifest['dimension']
+        self.ntotal = self.manifest['ntotal']
+        self._lock = threading.Lock()
+        self._workers = []
+
+        context = multiprocessing.get_context(start_method)
+        for shard in self.manifest['shards']:
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=serve_shard, name=f"rag-{shard['name']}", daemon=True,
+                args=(child, str(self.shard_dir / f"{shard['name']}.index"),
+                      str(self.shard_dir / f"{shard['name']}.npy"), shard['count'], self.ntotal, threads_per_shard))
+            process.start()
+            child.close()
+            self._workers.append((process, parent))
+        try:
+            infos = self._gather()
+        except Exception:
+            self.close()
+            raise
+
+        self.info = dict(infos[0], ntotal=self.ntotal, shards=len(self._workers),
+                         partition=self.manifest['partition'])
+        logger.info(f"🧩 [Sharding] {len(self._workers)} shard workers serving {self.ntotal:,} vectors "
+                    f"({self.manifest['partition']} partition)")
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _gather(self, workers: list = None) -> list:
+        """
+        One reply from each of `workers` (default: all), in shard order. Every
+        reply is read before any error is raised, so no pipe is left holding a
+        stale answer.
+        """
+        workers = self._workers if workers is None else workers
+        replies = []
+        for process, conn in workers:
+            try:
+                replies.append(conn.recv())
+            except (EOFError, OSError):
+                replies.append(('error', f"worker {process.name} exited (code {process.exitcode})"))
+        for (process, _), (status, payload) in zip(workers, replies):
+            if status != 'ok':
+                raise RuntimeError(f"Shard worker {process.name} failed:\n{payload}")
+        return [payload for _, payload in replies]
+
+    def shards_for(self, products: list = None) -> list:
+        """
+        Positions of the shards a search limited to `products` has to visit: on a
+        product-partitioned index only the shards holding one of them, otherwise all.
+        """
+        shards = self.manifest['shards']
+        if products is None or self.manifest['partition'] != 'product':
+            return list(range(len(shards)))
+        wanted = set(products)
+        return [i for i, shard in enumerate(shards) if wanted.intersection(shard['products'])]
+
+    def search(self, queries: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None,
+               selection: Selection = None, products: list = None):
+        """
+        Merged top-k over all shards.
+
+        Args:
+            queries (np.ndarray): float32 query embeddings.
+            top_k (int): Results per query.
+            nprobe (int): IVF lists to probe in each shard (IVF indexes only).
+            ef_search (int): HNSW beam width in each shard (HNSW indexes only).
+            selection (Selection): Only search these main-index rows.
+            products (list): Product values `selection` is limited to, if any. A
+                product-partitioned index then skips the shards holding none of them.
+
+        Returns:
+            (distances, ids): At most `top_k` columns, ids -1 where a query had fewer hits.
+        """
+        queries = np.ascontiguousarray(queries, dtype='float32')
+        bitmap = None if selection is None else selection.bitmap
+        with self._lock:
+            if not self._workers:
+                raise RuntimeError("ShardedIndex is closed")
+            workers = [self._workers[i] for i in self.shards_for(products)]
+            if not workers:
+                return np.empty((len(queries), 0), dtype='float32'), np.empty((len(queries), 0), dtype='int64')
+            sent = []
+            for process, conn in workers:
+                try:
+                    conn.send((queries, top_k, nprobe, ef_search, bitmap))
+                except Exception as e:
+                    # Collect the replies already on their way so the next search doesn't read them
+                    try:
+                        self._gather(sent)
+                    except RuntimeError:
+                        pass
+                    raise RuntimeError(f"Could not send the search to shard worker {process.name} "
+                                       f"(code {process.exitcode})") from e
+                sent.append((process, conn))
+            results = self._gather(workers)
+        return reduce(lambda merged, shard: merge_results(*merged, *shard, top_k), results)
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for process, conn in workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+        for process, _ in workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split a FAISS index into shards served by worker processes")
+    parser.add_argument('index', type=Path, help="FAISS index to split")
+    parser.add_argument('metadata', type=Path, help="Its metadata store (or legacy JSON metadata)")
+    parser.add_argument('shard_dir', type=Path, help="Output directory, e.g. vector_store/full_shards")
+    parser.add_argument('--shards', type=int, default=os.cpu_count(), help="Number of shards (default: CPU count)")
+    parser.add_argument('--partition', choices=PARTITIONS, default='hash',
+                        help="Split by a hash of the complaint id, or keep each product on one shard")
+    args = parser.parse_args()
+
+    # Read in full: reconstructing IVF rows needs a direct map, which a mapped index can't hold
+    import faiss
+
+    manifest = write_shards(faiss.read_index(str(args.index)), load_metadata(args.metadata), args.shard_dir,
+                            args.shards, partition=args.partition)
+    print(f"✅ Split {manifest['ntotal']:,} vectors into {len(manifest['shards'])} shards in {args.shard_dir}")
@@ -0,0 +1,146 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_NAME = 'embedding-shards'
+FORMAT_VERSION = 1
+
+
+def _write_atomic(path: Path, write):
+    """Write via `write(file)` to a temp file, fsync it and rename it over `path`."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ShardLog:
+    """
+    Append-only on-disk log of embedding batches, for crash-safe resumable runs.
+
+    Each `append` writes one segment and then republishes the manifest:
+
+        seg-00000.npy    float32 embeddings of the batch
+        seg-00000.jsonl  one metadata dict per embedding, same order
+        manifest.json    committed segments, row count and input offset
+
+    Segment files and the manifest are written to temp files and renamed into
+    place, and a segment only counts once the manifest lists it. A crash at
+    any point therefore leaves the last committed state readable; a half
+    written segment is simply overwritten by the next run. Checkpointing costs
+    one batch of I/O, however long the run has been going.
+    """
+    def __init__(self, shard_dir: Path):
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.shard_dir / MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('format') != FORMAT_NAME:
+                raise ValueError(f"{self.shard_dir} is not an embedding shard directory")
+            if self.manifest.get('version', 0) > FORMAT_VERSION:
+                raise ValueError(f"Unsupported shard format version {self.manifest['version']}")
+        else:
+            self.manifest = {
+                'format': FORMAT_NAME,
+                'version': FORMAT_VERSION,
+                'dimension': None,
+                'count': 0,
+                'input_offset': 0,
+                'segments': [],
+            }
+
+    @property
+    def count(self) -> int:
+        """Embeddings committed so far."""
+        return self.manifest['count']
+
+    @property
+    def input_offset(self) -> int:
+        """Input records consumed so far; resume from this position."""
+        return self.manifest['input_offset']
+
+    @property
+    def dimension(self):
+        return self.manifest['dimension']
+
+    def __len__(self) -> int:
+        return len(self.manifest['segments'])
+
+    def append(self, embeddings: np.ndarray, rows: Sequence[Dict[str, Any]], input_offset: int = None):
+        """
+        Commit one batch.
+
+        Args:
+            embeddings (np.ndarray): (n, d) vectors.
+            rows (Sequence[dict]): n metadata dicts, one per vector.
+            input_offset (int): Input position after this batch (default: advance by n).
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        if len(embeddings) != len(rows):
+            raise ValueError(f"Got {len(embeddings)} embeddings but {len(rows)} metadata rows")
+        if self.dimension is not None and embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Expected dimension {self.dimension}, got {embeddings.shape[1]}")
+
+        name = f"seg-{len(self):05d}"
+        _write_atomic(self.shard_dir / f"{name}.npy", lambda f: np.save(f, embeddings))
+        lines = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode('utf-8')
+        _write_atomic(self.shard_dir / f"{name}.jsonl", lambda f: f.write(lines))
+
+        manifest = dict(self.manifest)
+        manifest['segments'] = self.manifest['segments'] + [{'name': name, 'count': len(rows)}]
+        manifest['count'] = self.count + len(rows)
+        manifest['input_offset'] = self.input_offset + len(rows) if input_offset is None else input_offset
+        manifest['dimension'] = int(embeddings.shape[1])
+        _write_atomic(self.shard_dir / MANIFEST_NAME, lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+        self.manifest = manifest
+
+    def segments(self) -> Iterator[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        """Yield (embeddings, rows) for every committed segment, in order. Embeddings are memory-mapped."""
+        for segment in self.manifest['segments']:
+            embeddings = np.load(self.shard_dir / f"{segment['name']}.npy", mmap_mode='r')
+            with open(self.shard_dir / f"{segment['name']}.jsonl", 'r', encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+            if len(embeddings) != segment['count'] or len(rows) != segment['count']:
+                raise ValueError(f"Segment {segment['name']} does not match the manifest")
+            yield embeddings, rows
+
+    def sample(self, n: int, seed: int = 42) -> np.ndarray:
+        """Uniform random sample of up to `n` committed embeddings (e.g. to train IVF/PQ)."""
+        n = min(n, self.count)
+        picked = np.sort(np.random.default_rng(seed).choice(self.count, size=n, replace=False))
+        out = np.empty((n, self.dimension), dtype='float32')
+        start = filled = 0
+        for segment in self.manifest['segments']:
+            end = start + segment['count']
+            lo, hi = np.searchsorted(picked, [start, end])
+            if hi > lo:
+                embeddings = np.load(self.shard_dir / f"{segment['name']}.npy", mmap_mode='r')
+                out[filled:filled + hi - lo] = embeddings[picked[lo:hi] - start]
+                filled += hi - lo
+            start = end
+        return out
+
+
+def compact(shards: ShardLog, builder, columns: Dict[str, str]) -> dict:
+    """
+    Merge every committed segment into a serving index and metadata store.
+
+    Args:
+        shards (ShardLog): The segments to merge.
+        builder (IndexBuilder): Receives the vectors and metadata; closed when done.
+        columns (dict): Metadata store column -> key in the segment rows.
+
+    Returns:
+        dict: `describe_index` of the finished index.
+    """
+    for embeddings, rows in shards.segments():
+        builder.add_batch(embeddings, **{column: [row.get(key) for row in rows] for column, key in columns.items()})
+    return builder.close()
@@ -0,0 +1,86 @@
+import threading
+import time
+from .telemetry import LOAD_SECONDS, get_logger
+
+logger = get_logger('startup')
+
+
+class LoadStage:
+    """
+    One independently loadable pipeline component (encoder, index, LLM, ...).
+
+    Tracks a readiness state ('pending' -> 'loading' -> 'ready' | 'failed'), how
+    long loading took and, on failure, the exception raised.
+    """
+    PENDING = 'pending'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.state = self.PENDING
+        self.seconds = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == self.READY
+
+    def run(self):
+        self.state = self.LOADING
+        start = time.perf_counter()
+        try:
+            self.loader()
+            self.state = self.READY
+        except Exception as e:
+            self.error = e
+            self.state = self.FAILED
+            logger.error(f"❌ [Startup] {self.name} failed to load: {e}", extra={'component': self.name})
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._done.set()
+        LOAD_SECONDS.set(self.seconds, component=self.name)
+        if self.state == self.READY:
+            logger.info(f"⏱️ [Startup] {self.name} ready in {self.seconds:.2f}s",
+                        extra={'component': self.name, 'seconds': self.seconds})
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the stage has finished (either way); False on timeout."""
+        return self._done.wait(timeout)
+
+    def status(self) -> dict:
+        return {
+            'state': self.state,
+            'seconds': self.seconds,
+            'error': None if self.error is None else str(self.error),
+        }
+
+
+def run_in_background(stages, on_complete=None):
+    """
+    Start every stage on its own daemon thread.
+
+    Args:
+        stages: LoadStage objects to run concurrently.
+        on_complete: Optional callback invoked once after the last stage finishes.
+    """
+    stages = list(stages)
+    remaining = [len(stages)]
+    lock = threading.Lock()
+
+    def _run(stage):
+        stage.run()
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished and on_complete is not None:
+            on_complete()
+
+    threads = [threading.Thread(target=_run, args=(stage,), name=f"load-{stage.name}", daemon=True)
+               for stage in stages]
+    for thread in threads:
+        thread.start()
+    return threads
@@ -0,0 +1,350 @@
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+# Logging is configured from the environment unless `configure_logging` is called
+LOG_LEVEL_ENV = 'RAG_LOG_LEVEL'    # DEBUG, INFO (default), WARNING, ...
+LOG_FORMAT_ENV = 'RAG_LOG_FORMAT'  # 'text' (default) or 'json'
+
+# Prometheus histogram buckets (seconds) and the quantiles reported from recent samples
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+# Observations kept per series for the quantiles
+QUANTILE_WINDOW = 2048
+
+_trace_id = contextvars.ContextVar('rag_trace_id', default=None)
+
+# ------------------------------------------------------------------ tracing
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    """Trace id of the request being handled in this context (None outside one)."""
+    return _trace_id.get()
+
+
+@contextlib.contextmanager
+def trace(trace_id: str = None):
+    """
+    Tag everything logged inside the block with a trace id.
+
+    Reuses the active trace when there is one and no id is given, so nested
+    components (API -> pipeline -> retriever) share the request's id.
+    """
+    trace_id = trace_id or _trace_id.get() or new_trace_id()
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+# ------------------------------------------------------------------ logging
+
+# Attributes every LogRecord has; anything else came from `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'trace_id'}
+
+
+class _TraceFilter(logging.Filter):
+    def filter(self, record):
+        if getattr(record, 'trace_id', None) is None:
+            record.trace_id = _trace_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace id and any `extra` fields."""
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'trace_id': getattr(record, 'trace_id', None),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The message as before, with `[trace_id]` appended inside a traced request."""
+    def format(self, record):
+        message = super().format(record)
+        trace_id = getattr(record, 'trace_id', None)
+        return f"{message} [{trace_id}]" if trace_id else message
+
+
+_configure_lock = threading.Lock()
+_configured = False
+
+
+def configure_logging(level=None, fmt: str = None):
+    """
+    (Re)configure the 'rag' loggers used throughout the package.
+
+    Args:
+        level: Logging level name or number (default: $RAG_LOG_LEVEL or INFO).
+        fmt (str): 'text' for the human-readable messages or 'json' for structured
+            logs (default: $RAG_LOG_FORMAT or 'text').
+    """
+    global _configured
+    level = level or os.environ.get(LOG_LEVEL_ENV, 'INFO')
+    fmt = (fmt or os.environ.get(LOG_FORMAT_ENV, 'text')).lower()
+    if fmt not in ('text', 'json'):
+        raise ValueError(f"Unknown log format {fmt!r}. Supported: ['text', 'json']")
+
+    handler = logging.StreamHandler()
+    handler.addFilter(_TraceFilter())
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter('%(message)s'))
+    with _configure_lock:
+        logger = logging.getLogger('rag')
+        for old in list(logger.handlers):
+            logger.removeHandler(old)
+        logger.addHandler(handler)
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        logger.propagate = False
+        _configured = True
+    return logger
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger 'rag.<name>', configured from the environment on first use."""
+    if not _configured:
+        with _configure_lock:
+            needs_config = not _configured
+        if needs_config:
+            configure_logging()
+    return logging.getLogger(f'rag.{name}')
+
+
+# ------------------------------------------------------------------ metrics
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {list(labelnames)}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames: tuple, key: tuple, extra: dict = None) -> str:
+    pairs = list(zip(labelnames, key)) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name + ('_total' if not self.name.endswith('_total') else ''), key, {}, value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {','.join(key) or '': value for key, value in sorted(self._values.items())}
+
+
+class Gauge(Counter):
+    """Current value per label set."""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, key, {}, value
+
+
+class _Series:
+    def __init__(self, n_buckets: int):
+        self.buckets = [0] * n_buckets
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=QUANTILE_WINDOW)
+
+
+class Histogram:
+    """
+    Cumulative Prometheus buckets plus p50/p95/p99 over the last QUANTILE_WINDOW
+    observations of each label set.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.bounds))
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    series.buckets[i] += 1
+                    break
+            series.count += 1
+            series.sum += value
+            series.recent.append(value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantiles(self, **labels) -> dict:
+        """{'count', 'mean', 'p50', 'p95', 'p99'} for one label set (quantiles over recent samples)."""
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return {'count': 0}
+            recent = sorted(series.recent)
+            summary = {'count': series.count, 'mean': series.sum / series.count}
+        for q in QUANTILES:
+            # Nearest-rank quantile
+            summary[f'p{int(q * 100)}'] = recent[max(0, math.ceil(q * len(recent)) - 1)]
+        return summary
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(s.buckets), s.count, s.sum) for key, s in sorted(self._series.items())]
+        for key, buckets, count, total in items:
+            cumulative = 0
+            for bound, n in zip(self.bounds, buckets):
+                cumulative += n
+                yield f'{self.name}_bucket', key, {'le': _format_value(bound)}, cumulative
+            yield f'{self.name}_sum', key, {}, total
+            yield f'{self.name}_count', key, {}, count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            keys = sorted(self._series)
+        return {','.join(key): self.quantiles(**dict(zip(self.labelnames, key))) for key in keys}
+
+
+class MetricsRegistry:
+    """Named metrics, rendered in the Prometheus text exposition format."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name!r} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, key, extra, value in metric.samples():
+                lines.append(f'{sample_name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """Every metric's current values (histograms as count/mean/p50/p95/p99), for JSON output."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'rag_stage_seconds', 'Latency of each query stage (encode, faiss, lexical, metadata, rerank, context, '
+    'prompt, ttft, generate, query)', ('stage',))
+LOAD_SECONDS = REGISTRY.gauge('rag_load_seconds', 'Seconds each component took to load', ('component',))
+QUERIES = REGISTRY.counter('rag_queries_total', 'Questions answered by the pipeline', ('kind', 'outcome'))
+SEARCHES = REGISTRY.counter('rag_search_queries_total', 'Queries searched by the retriever', ('mode',))
+RESULT_CACHE = REGISTRY.counter('rag_result_cache_total', 'Retriever result-cache lookups', ('result',))
+GENERATED_TOKENS = REGISTRY.counter('rag_generated_tokens_total', 'Tokens generated by the LLM', ('backend',))
+CONTEXT_CHUNKS = REGISTRY.counter('rag_context_chunks_total', 'Retrieved chunks by what the context builder did',
+                                  ('action',))
+
+
+@contextlib.contextmanager
+def timed(stage: str, timings: dict = None):
+    """
+    Time a block as `stage`: observed in rag_stage_seconds and, when given,
+    added to the caller's `timings` dict.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
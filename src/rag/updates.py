@@ -0,0 +1,470 @@
+"""
+Incremental updates on top of the write-once FAISS index.
+
+New and changed chunks go into a small mutable delta index next to the main
+one, and withdrawn chunks are tombstoned instead of removed. Searches run on
+both and merge the results by distance; tombstoned rows of the main index are
+excluded with the same bitmap selector filtered searches use. `compact` folds
+the delta into a freshly built main index in the background, and the retriever
+swaps it in atomically.
+
+Layout of `<prefix>_delta/` (next to the index):
+    seg-*.npy / seg-*.jsonl / manifest.json   added chunks (see shards.ShardLog)
+    tombstones.jsonl                          deleted chunk ids, in order
+
+A tombstone also records how many delta rows existed when it was written, so a
+chunk deleted and then added again stays alive after a restart. Deletes go by
+chunk id (or complaint id), which keeps them valid across compactions and full
+rebuilds that renumber the rows.
+"""
+import json
+import os
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from .filters import DATE_RANGE_KEYS, Selection, active_filters, date_bounds
+from .index_builder import IndexBuilder
+from .lexical import SCORE_DTYPE, bm25_idf, bm25_scores, tokenize
+from .metadata_store import (CATEGORY_COLUMNS, DATE_COLUMNS, INT_COLUMNS, MISSING_DAY, STRING_COLUMNS, from_day,
+                             replace_dir, to_days)
+from .shards import MANIFEST_NAME, ShardLog
+from .telemetry import get_logger
+
+logger = get_logger('updates')
+
+TOMBSTONES_NAME = 'tombstones.jsonl'
+COLUMNS = STRING_COLUMNS + CATEGORY_COLUMNS + DATE_COLUMNS + INT_COLUMNS
+MISSING_DISTANCE = np.finfo('float32').max
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. Waiting writers go first, so a stream of
+    searches can't starve an index swap. Not reentrant.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+def normalize_row(row: dict) -> dict:
+    """A chunk dict reduced to the metadata store's columns, with dates as 'YYYY-MM-DD'."""
+    out = {name: row.get(name) for name in COLUMNS}
+    for name in DATE_COLUMNS:
+        out[name] = from_day(to_days([out[name]])[0])
+    return out
+
+
+def complaint_id(chunk_id: str) -> str:
+    """'12345_2' -> '12345'."""
+    return str(chunk_id).rsplit('_', 1)[0]
+
+
+class DeltaIndex:
+    """
+    The mutable side of an updatable vector store: chunks added since the main
+    index was built, in an `IndexIDMap2` whose ids continue the main index's row
+    ids, plus the tombstones of deleted chunks in either index. Added chunks are
+    also tokenized, so lexical searches can score them next to the BM25 index.
+
+    Every change is written to disk first and then applied in memory under
+    `lock`'s write side; searches hold its read side. Callers run one writer
+    (`add` / `delete` / `clear`) at a time.
+    """
+    def __init__(self, delta_dir: Path, dimension: int, lock: ReadWriteLock = None):
+        import faiss
+
+        self.delta_dir = Path(delta_dir)
+        self.dimension = dimension
+        self.lock = lock or ReadWriteLock()
+        self.version = 0
+        self.base = 0  # rows in the main index; delta row j has id base + j
+        self._main = None
+        self._main_dead = None
+        self._main_ids = None  # chunk id -> main row, built on first write
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        self._vectors = np.empty((0, dimension), dtype='float32')
+        self._rows: List[dict] = []
+        self._terms: List[Counter] = []  # BM25 term frequencies of each row's text
+        self._lengths: List[int] = []
+        self._alive = np.empty(0, dtype=bool)
+        self._latest: Dict[str, int] = {}  # chunk id -> its newest delta row
+        self._tombstones: Dict[str, int] = {}  # chunk id -> delta rows when last deleted
+        self._restricted = {}
+        self._log = None
+
+        if (self.delta_dir / MANIFEST_NAME).exists():
+            self._log = ShardLog(self.delta_dir)
+            if self._log.count and self._log.dimension != dimension:
+                raise ValueError(f"{self.delta_dir} holds {self._log.dimension}-d vectors, expected {dimension}")
+            for embeddings, rows in self._log.segments():
+                self._append(np.asarray(embeddings), rows)
+        tombstones_path = self.delta_dir / TOMBSTONES_NAME
+        if tombstones_path.exists():
+            with open(tombstones_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._tombstones[entry['chunk_id']] = entry['delta_rows']
+        for chunk_id, row in self._latest.items():
+            if self._tombstones.get(chunk_id, 0) > row:
+                self._alive[row] = False
+        # Older copies of a chunk added again are superseded by the newest one
+        superseded = [j for j, row in enumerate(self._rows) if self._latest[row['chunk_id']] != j]
+        self._alive[superseded] = False
+
+    def __len__(self) -> int:
+        """Live delta rows."""
+        return int(self._alive.sum())
+
+    @property
+    def deleted(self) -> int:
+        """Tombstoned rows of the main index."""
+        return 0 if self._main_dead is None else int(self._main_dead.sum())
+
+    def attach(self, metadata):
+        """
+        Bind to the main index's metadata: delta ids start after its rows and
+        tombstoned chunks are looked up in it. Called again after a rebuild,
+        with `lock`'s write side held (or before anyone searches).
+        """
+        self._main = metadata
+        self.base = len(metadata)
+        self._main_ids = None
+        self._main_dead = None
+        if self._tombstones or self._latest:
+            self._mark_main_dead(list(self._tombstones) + list(self._latest))
+        self._reindex()
+
+    @staticmethod
+    def _scan_chunk_ids(metadata) -> Dict[str, int]:
+        logger.info(f"🗂️ [Updates] Indexing {len(metadata):,} chunk ids of the main index...")
+        return {metadata.field(i, 'chunk_id'): i for i in range(len(metadata))}
+
+    def _main_rows(self) -> Dict[str, int]:
+        if self._main_ids is None:
+            self._main_ids = self._scan_chunk_ids(self._main)
+        return self._main_ids
+
+    def _mark_main_dead(self, chunk_ids: Iterable[str]) -> int:
+        rows = self._main_rows()
+        dead = [rows[c] for c in chunk_ids if c in rows]
+        if dead:
+            if self._main_dead is None:
+                self._main_dead = np.zeros(self.base, dtype=bool)
+            self._main_dead[dead] = True
+        return len(dead)
+
+    def _append(self, embeddings: np.ndarray, rows: Sequence[dict]):
+        start = len(self._rows)
+        self._vectors = np.concatenate([self._vectors, np.asarray(embeddings, dtype='float32')])
+        self._rows.extend(rows)
+        for row in rows:
+            tokens = tokenize(row.get('text'))
+            self._terms.append(Counter(tokens))
+            self._lengths.append(len(tokens))
+        self._alive = np.concatenate([self._alive, np.ones(len(rows), dtype=bool)])
+        for j, row in enumerate(rows, start):
+            previous = self._latest.get(row['chunk_id'])
+            if previous is not None:
+                self._alive[previous] = False
+            self._latest[row['chunk_id']] = j
+
+    def _reindex(self):
+        """Rebuild the FAISS delta index with ids after the main index's rows."""
+        self._index.reset()
+        if len(self._vectors):
+            self._index.add_with_ids(self._vectors, self.base + np.arange(len(self._vectors), dtype='int64'))
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._restricted = {}
+
+    def _write_log(self) -> ShardLog:
+        if self._log is None:
+            self._log = ShardLog(self.delta_dir)
+        return self._log
+
+    def add(self, embeddings: np.ndarray, rows: Sequence[dict]) -> int:
+        """
+        Add chunks; a chunk whose id is already in either index replaces it.
+
+        Returns:
+            int: Chunks added.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        rows = [normalize_row(row) for row in rows]
+        if len(embeddings) != len(rows):
+            raise ValueError(f"Got {len(embeddings)} embeddings but {len(rows)} rows")
+        if not rows:
+            return 0
+        self._main_rows()  # outside the write lock: the first call scans the main metadata
+        self._write_log().append(embeddings, rows)
+        with self.lock.write():
+            start = len(self._rows)
+            self._append(embeddings, rows)
+            self._index.add_with_ids(embeddings, self.base + np.arange(start, len(self._rows), dtype='int64'))
+            self._mark_main_dead(row['chunk_id'] for row in rows)
+            self._changed()
+        return len(rows)
+
+    def delete(self, chunk_ids: Iterable[str]) -> int:
+        """
+        Tombstone chunks by id, in the main index and the delta.
+
+        Returns:
+            int: Live chunks that were deleted.
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        self._main_rows()
+        self.delta_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.delta_dir / TOMBSTONES_NAME, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps({'chunk_id': c, 'delta_rows': len(self._rows)}) + '\n' for c in chunk_ids))
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock.write():
+            before = self.deleted - len(self)
+            for chunk_id in chunk_ids:
+                self._tombstones[chunk_id] = len(self._rows)
+                if chunk_id in self._latest:
+                    self._alive[self._latest[chunk_id]] = False
+            self._mark_main_dead(chunk_ids)
+            self._changed()
+            return self.deleted - len(self) - before
+
+    def delete_complaints(self, complaint_ids: Iterable[str]) -> int:
+        """Tombstone every chunk of the given complaints."""
+        wanted = {str(c) for c in complaint_ids}
+        chunk_ids = [c for c in self._main_rows() if complaint_id(c) in wanted]
+        chunk_ids += [c for c in self._latest if complaint_id(c) in wanted]
+        return self.delete(chunk_ids)
+
+    def restrict(self, selection, key) -> Selection:
+        """
+        `selection` of main rows (None = all) minus the tombstoned ones; cached by
+        `key` (the filter) until the next change. Returns `selection` unchanged
+        when nothing in the main index is deleted.
+        """
+        if not self.deleted:
+            return selection
+        restricted = self._restricted.get(key)
+        if restricted is None:
+            mask = ~self._main_dead if selection is None else selection.mask & ~self._main_dead
+            restricted = self._restricted[key] = Selection(mask)
+        return restricted
+
+    def _filter_mask(self, filters: dict) -> np.ndarray:
+        """Delta rows matching `filters`, with the FilterIndex semantics."""
+        mask = self._alive.copy()
+        for name, value in active_filters(filters).items():
+            if name in DATE_RANGE_KEYS:
+                continue
+            needles = [str(v).lower() for v in (value if isinstance(value, (list, tuple)) else [value])]
+            mask &= np.array([any(n in (row.get(name) or '').lower() for n in needles) for row in self._rows],
+                             dtype=bool)
+        filters = active_filters(filters)
+        if 'date_from' in filters or 'date_to' in filters:
+            days = to_days([row.get('date') for row in self._rows])
+            lo, hi = date_bounds(filters.get('date_from'), filters.get('date_to'))
+            mask &= days != MISSING_DAY
+            if lo != MISSING_DAY:
+                mask &= days >= lo
+            if hi != MISSING_DAY:
+                mask &= days <= hi
+        return mask
+
+    def search(self, query_embeddings: np.ndarray, k: int, filters: dict = None):
+        """
+        Top-k live delta rows per query, as (distances, ids) with the ids after the
+        main index's rows; empty slots are -1.
+        """
+        import faiss
+
+        n = len(query_embeddings)
+        distances = np.full((n, k), MISSING_DISTANCE, dtype='float32')
+        ids = np.full((n, k), -1, dtype='int64')
+        if not len(self._rows):
+            return distances, ids
+        mask = self._filter_mask(filters) if active_filters(filters) else self._alive
+        if not mask.any():
+            return distances, ids
+        params = None
+        if not mask.all():
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(self.base + np.flatnonzero(mask)))
+        found_d, found_i = self._index.search(query_embeddings, min(k, int(mask.sum())), params=params)
+        distances[:, :found_d.shape[1]] = found_d
+        ids[:, :found_i.shape[1]] = found_i
+        return distances, ids
+
+    def lexical_search(self, query: str, k: int, lexical, filters: dict = None):
+        """
+        BM25 top-k of the live delta rows, scored with the idf and average length of
+        the main `lexical` index so the scores rank against its own.
+
+        Returns:
+            (ids, scores): ids after the main index's rows, best first.
+        """
+        mask = self._filter_mask(filters) if active_filters(filters) else self._alive
+        terms = sorted(set(tokenize(query)))
+        rows = np.flatnonzero(mask)
+        if not terms or not len(rows) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=SCORE_DTYPE)
+
+        term_ids = [lexical.term_id(term) for term in terms]
+        idf = bm25_idf([0 if t is None else lexical.document_frequency(t) for t in term_ids], len(lexical))
+        lengths = np.asarray(self._lengths, dtype=np.int64)[rows]
+        scores = np.zeros(len(rows), dtype=SCORE_DTYPE)
+        for term, term_idf in zip(terms, idf):
+            tfs = np.asarray([self._terms[j][term] for j in rows], dtype=np.int64)
+            hit = tfs > 0
+            scores[hit] += bm25_scores(tfs[hit], lengths[hit], term_idf, lexical.avgdl, lexical.k1, lexical.b)
+        rows, scores = rows[scores > 0], scores[scores > 0]
+        best = np.lexsort((rows, -scores))[:k]
+        return self.base + rows[best], scores[best]
+
+    def row(self, idx: int) -> dict:
+        """Metadata of delta row id `idx` (>= base)."""
+        return dict(self._rows[idx - self.base])
+
+    def snapshot(self):
+        """(main dead mask or None, live delta vectors, live delta rows) for compaction."""
+        alive = np.flatnonzero(self._alive)
+        dead = None if self._main_dead is None else self._main_dead.copy()
+        return dead, self._vectors[alive].copy(), [self._rows[j] for j in alive]
+
+    def clear(self):
+        """Forget every change, on disk too."""
+        with self.lock.write():
+            shutil.rmtree(self.delta_dir, ignore_errors=True)
+            self._log = None
+            self._vectors = np.empty((0, self.dimension), dtype='float32')
+            self._rows, self._latest, self._tombstones = [], {}, {}
+            self._terms, self._lengths = [], []
+            self._alive = np.empty(0, dtype=bool)
+            self._main_dead = None
+            self._reindex()
+
+
+def merge_results(main_d: np.ndarray, main_i: np.ndarray, delta_d: np.ndarray, delta_i: np.ndarray, k: int):
+    """Per-query top-k of two (distances, ids) result sets, by distance."""
+    distances = np.concatenate([main_d, delta_d], axis=1)
+    ids = np.concatenate([main_i, delta_i], axis=1)
+    distances = np.where(ids < 0, MISSING_DISTANCE, distances)
+    order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def merge_scored(main_ids: np.ndarray, main_scores: np.ndarray, delta_ids: np.ndarray, delta_scores: np.ndarray,
+                 k: int):
+    """Top-k of two (ids, scores) rankings of one query, by descending score (ties by id)."""
+    ids = np.concatenate([main_ids, delta_ids])
+    scores = np.concatenate([main_scores, delta_scores])
+    best = np.lexsort((ids, -scores))[:k]
+    return ids[best], scores[best]
+
+
+def journal_path(vector_store_dir: Path, prefix: str) -> Path:
+    return Path(vector_store_dir) / f'{prefix}_compaction.json'
+
+
+def _move(src: Path, dst: Path):
+    """Replace `dst` (file or directory) with `src`; a no-op when `src` is already gone."""
+    if not src.exists():
+        return
+    if src.is_dir():
+        replace_dir(src, dst)
+    else:
+        os.replace(src, dst)
+
+
+def finish_compaction(vector_store_dir: Path, prefix: str) -> bool:
+    """
+    Complete the file swaps of a compaction whose journal is on disk, e.g. after
+    a crash half way through them. Safe to repeat. Returns True if there was one.
+    """
+    path = journal_path(vector_store_dir, prefix)
+    if not path.exists():
+        return False
+    journal = json.loads(path.read_text(encoding='utf-8'))
+    for src, dst in journal['moves']:
+        _move(Path(src), Path(dst))
+    for directory in journal['clear']:
+        shutil.rmtree(directory, ignore_errors=True)
+    path.unlink()
+    return True
+
+
+def reconstruct_rows(index, ids: np.ndarray) -> np.ndarray:
+    """
+    The stored vectors of rows `ids` (decoded approximations for PQ indexes).
+    IVF indexes need their direct map, built at load time by `enable_reconstruction`.
+    """
+    return index.reconstruct_batch(ids)
+
+
+def build_compacted(index, metadata, delta: DeltaIndex, index_path: Path, store_dir: Path,
+                    batch_size: int = 65536) -> dict:
+    """
+    Write a new main index and metadata store holding the live rows of `index`
+    followed by the live delta rows. The new index is an emptied clone of the
+    old one, so IVF/PQ training is kept and nothing is retrained.
+
+    Returns:
+        dict: 'index' (the new index object), 'info' (`describe_index`) and 'count'.
+    """
+    import faiss
+
+    dead, delta_vectors, delta_rows = delta.snapshot()
+    compacted = faiss.clone_index(index)
+    compacted.reset()
+    builder = IndexBuilder(index_path, store_dir, index.d, index=compacted)
+    for start in range(0, len(metadata), batch_size):
+        ids = np.arange(start, min(start + batch_size, len(metadata)))
+        if dead is not None:
+            ids = ids[~dead[ids]]
+        if not len(ids):
+            continue
+        rows = metadata.rows(ids)
+        builder.add_batch(reconstruct_rows(index, ids), **{name: [r.get(name) for r in rows] for name in COLUMNS})
+    if delta_rows:
+        builder.add_batch(delta_vectors, **{name: [r.get(name) for r in delta_rows] for name in COLUMNS})
+    info = builder.close()
+    return {'index': compacted, 'info': info, 'count': builder.count}
@@ -1,74 +1,173 @@
-import pandas as pd
-import faiss
-import numpy as np
 import json
+import time
 from pathlib import Path
-import os
+import pyarrow as pa
 import pyarrow.parquet as pq
+import numpy as np
+import sys
+import argparse
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.embedding_cache import EmbeddingCache, cache_model_key, text_keys
+from src.rag.index_builder import IndexBuilder
+from src.rag.index_factory import add_index_arguments, build_index_from_args, train_index
 
 # Paths
 RAW_DATA = Path("data/raw/complaint_embeddings.parquet")
 OUTPUT_DIR = Path("vector_store")
+MODEL_NAME = 'all-MiniLM-L6-v2'  # what the parquet's embeddings were computed with
 INDEX_PATH = OUTPUT_DIR / "full_faiss_index.index"
-METADATA_PATH = OUTPUT_DIR / "full_metadata.json"
+METADATA_STORE_DIR = OUTPUT_DIR / "full_metadata_store"
 
-def main():
-    if not OUTPUT_DIR.exists():
-        OUTPUT_DIR.mkdir(parents=True)
-
-    print(f"📂 Loading embeddings from {RAW_DATA}...")
-    
-    # We use pyarrow to read specifically the 'embedding' column for speed and RAM
-    # And 'document' + 'metadata' for our retrieval context
-    
-    pf = pq.ParquetFile(RAW_DATA)
+COLUMNS = ['id', 'document', 'embedding', 'metadata']
+META_FIELDS = ('product', 'company', 'state', 'date_received', 'date')
+
+def embedding_matrix(column: pa.Array) -> np.ndarray:
+    """
+    View a list<float> / fixed_size_list<float> Arrow column as an (n, d) float32 array.
+
+    The child values buffer is reinterpreted in place when it already holds
+    contiguous float32 without nulls; only float64 (or otherwise mistyped)
+    values pay for one cast.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if column.null_count:
+        raise ValueError(f"{column.null_count} rows have no embedding")
+    if pa.types.is_fixed_size_list(column.type):
+        dimension = column.type.list_size
+        values = column.flatten()  # honours the slice offset without copying
+    elif pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+        offsets = column.offsets.to_numpy()
+        lengths = np.diff(offsets)
+        dimension = int(lengths[0]) if len(lengths) else 0
+        if np.any(lengths != dimension):
+            raise ValueError("Embeddings have different lengths")
+        values = column.values.slice(offsets[0], offsets[-1] - offsets[0])
+    else:
+        raise TypeError(f"Unsupported embedding column type: {column.type}")
+    if values.type != pa.float32():
+        values = values.cast(pa.float32())
+    return values.to_numpy(zero_copy_only=values.null_count == 0).reshape(-1, dimension)
+
+def metadata_columns(column: pa.Array) -> dict:
+    """
+    Pull the product/company/state/date fields out of the 'metadata' column.
+
+    Struct columns are read field by field; map, dict or JSON-string columns
+    fall back to per-row Python dicts.
+    """
+    n = len(column)
+    if pa.types.is_struct(column.type):
+        names = {column.type.field(i).name for i in range(column.type.num_fields)}
+        fields = {name: column.field(name).to_pylist() if name in names else [None] * n for name in META_FIELDS}
+    else:
+        metas = []
+        for m in column.to_pylist():
+            if isinstance(m, str):
+                m = json.loads(m)
+            elif isinstance(m, list):  # map<string, ...> comes back as key/value pairs
+                m = dict(m)
+            metas.append(m if isinstance(m, dict) else {})
+        fields = {name: [m.get(name) for m in metas] for name in META_FIELDS}
+    return {
+        'product': fields['product'],
+        'company': fields['company'],
+        'state': fields['state'],
+        'date': [d if d is not None else fallback for d, fallback in zip(fields['date_received'], fields['date'])],
+    }
+
+def sample_embeddings(pf: pq.ParquetFile, size: int, batch_size: int, seed: int = 42) -> np.ndarray:
+    """Uniform random sample of `size` rows, streamed from the embedding column only."""
     total_rows = pf.metadata.num_rows
-    print(f"📊 Total records found: {total_rows:,}")
-
-    embeddings_list = []
-    metadata_list = []
-    
-    # Process in batches to monitor memory
-    batch_size = 100000 
-    
-    print(f"⚡ Processing {total_rows:,} records in batches of {batch_size:,}...")
-    
-    # We'll use a loop to read row groups or batches
-    # For simplicity and given 16GB RAM, we might be able to read columns directly 
-    # but let's be safe and use a generator/batch approach if possible.
-    
-    # Actually, Reading the whole 'embedding' column might take ~2.5GB.
-    # Total RAM 16GB. This should be fine.
-    
-    print("🧠 Extracting embeddings...")
-    df = pd.read_parquet(RAW_DATA, columns=['id', 'document', 'embedding', 'metadata'])
-    
-    print("🏗️ Converting embeddings to numpy array...")
-    # 'embedding' column usually contains lists of floats
-    all_embeddings = np.vstack(df['embedding'].values).astype('float32')
-    
-    print(f"🗄️ Building FAISS index (Size: {all_embeddings.shape})...")
-    dimension = all_embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(all_embeddings)
-    
-    print(f"💾 Saving index to {INDEX_PATH}...")
-    faiss.write_index(index, str(INDEX_PATH))
-    
-    print("📝 Saving metadata...")
-    # Combining metadata column (which is likely a dict) with id and document
-    # We convert to a list of dicts for the retriever
-    metadata_entries = []
-    for i, row in df.iterrows():
-        entry = {
-            'id': row['id'],
-            'text': row['document'],
-            'meta': row['metadata'] # This contains company, product, etc.
-        }
-        metadata_entries.append(entry)
-        
-    with open(METADATA_PATH, 'w', encoding='utf-8') as f:
-        json.dump(metadata_entries, f)
+    size = min(size, total_rows)
+    picked = np.sort(np.random.default_rng(seed).choice(total_rows, size=size, replace=False))
+    out = None
+    start = filled = 0
+    for batch in pf.iter_batches(batch_size=batch_size, columns=['embedding']):
+        end = start + batch.num_rows
+        lo, hi = np.searchsorted(picked, [start, end])
+        if hi > lo:
+            embeddings = embedding_matrix(batch.column(0))
+            if out is None:
+                out = np.empty((size, embeddings.shape[1]), dtype='float32')
+            out[filled:filled + hi - lo] = embeddings[picked[lo:hi] - start]
+            filled += hi - lo
+        start = end
+    return out
+
+def build_from_parquet(parquet_path: Path, index_path: Path, store_dir: Path, args) -> dict:
+    """
+    Stream the parquet file record batch by record batch into the FAISS index
+    and metadata store. Peak memory is one record batch plus the index itself.
+    """
+    pf = pq.ParquetFile(parquet_path)
+    total_rows = pf.metadata.num_rows
+    print(f"📊 Total records found: {total_rows:,} in {pf.metadata.num_row_groups} row groups")
+
+    dimension = pf.schema_arrow.field('embedding').type.list_size \
+        if pa.types.is_fixed_size_list(pf.schema_arrow.field('embedding').type) else None
+    if dimension is None:
+        first = next(pf.iter_batches(batch_size=1, columns=['embedding']))
+        dimension = embedding_matrix(first.column(0)).shape[1]
+
+    index = build_index_from_args(args, dimension)
+    if not index.is_trained:
+        print(f"🎯 Sampling {min(args.train_size, total_rows):,} vectors to train the {args.index_type} index...")
+        sample = sample_embeddings(pf, args.train_size, args.batch_size)
+        train_index(index, sample)
+        del sample
+
+    cache = None
+    if args.embedding_cache is not None:
+        cache = EmbeddingCache(args.embedding_cache, cache_model_key(args.model), dimension)
+        print(f"📦 Seeding the embedding cache {cache.cache_dir} ({len(cache):,} vectors)...")
+
+    builder = IndexBuilder(index_path, store_dir, dimension, index=index)
+    print(f"⚡ Streaming {total_rows:,} records in batches of {args.batch_size:,}...")
+    start = time.perf_counter()
+    done = 0
+    for batch in pf.iter_batches(batch_size=args.batch_size, columns=COLUMNS):
+        embeddings = embedding_matrix(batch.column('embedding'))
+        texts = batch.column('document').to_pylist()
+        builder.add_batch(
+            embeddings,
+            chunk_id=batch.column('id').to_pylist(),
+            text=texts,
+            **metadata_columns(batch.column('metadata')),
+        )
+        if cache is not None:
+            cache.add(text_keys(texts), embeddings)
+        done += batch.num_rows
+        elapsed = time.perf_counter() - start
+        print(f"📈 {done:,}/{total_rows:,} rows ({done / total_rows:.0%}), "
+              f"{done / elapsed:,.0f} rows/s, {elapsed:,.0f}s elapsed")
+
+    info = builder.close()
+    if cache is not None:
+        cache.flush()
+        print(f"📦 Embedding cache: {len(cache):,} vectors")
+    print(f"🧭 Index: {info}")
+    return info
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the full-scale FAISS index and metadata store.")
+    parser.add_argument('--input', type=Path, default=RAW_DATA)
+    parser.add_argument('--batch-size', type=int, default=65536, help="Parquet rows per record batch")
+    parser.add_argument('--embedding-cache', type=Path, default=None,
+                        help="Also store the parquet's embeddings here, so ingest.py only embeds chunks "
+                             "that are not in this dump")
+    parser.add_argument('--model', default=MODEL_NAME, help="Encoder the parquet's embeddings came from")
+    add_index_arguments(parser)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print(f"📂 Streaming embeddings from {args.input}...")
+    build_from_parquet(args.input, INDEX_PATH, METADATA_STORE_DIR, args)
 
     print(f"✅ Full Indexing Complete! index: {INDEX_PATH.stat().st_size / 1024**2:.2f} MB")
 
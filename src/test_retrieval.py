@@ -7,7 +7,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 from src.rag.retriever import ComplaintRetriever
 
 def test_retrieval():
-    vector_store_dir = Path(r"C:\Users\My Device\Desktop\week-7-rag-complaint-chatbot\vector_store")
+    vector_store_dir = Path(__file__).resolve().parent.parent / "vector_store"
     
     try:
         retriever = ComplaintRetriever(vector_store_dir)
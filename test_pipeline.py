@@ -2,22 +2,33 @@ import sys
 from pathlib import Path
 import time
 
-root_dir = Path(".").resolve()
+root_dir = Path(__file__).resolve().parent
 sys.path.append(str(root_dir))
 
 from src.rag.pipeline import RAGPipeline
+from src.rag.telemetry import STAGE_SECONDS
 
 print("🔍 Starting Pipeline Diagnostic...")
 start_time = time.time()
 
 try:
-    rag = RAGPipeline(vector_store_dir="vector_store")
+    rag = RAGPipeline(vector_store_dir=str(root_dir / "vector_store"))
+    print(f"⏳ Constructor returned in {time.time() - start_time:.2f} seconds (models load in the background)")
+    # Time the actual model and index loading, not just the constructor
+    if not rag.wait_until_ready():
+        failed = {name: s['error'] for name, s in rag.status().items() if s['state'] == 'failed'}
+        raise RuntimeError(f"Pipeline stages failed to load: {failed}")
     print(f"✅ Pipeline Loaded in {time.time() - start_time:.2f} seconds")
+    for stage, seconds in rag.load_timings().items():
+        print(f"   {stage:>10}: {seconds:.2f} s")
     
     # Test a small query
     print("Testing a small query...")
     res = rag.query("Test")
     print("✅ Query Successful!")
     print(f"Answer: {res['answer']}")
+    print(f"Trace: {res['trace_id']}")
+    for stage, summary in STAGE_SECONDS.snapshot().items():
+        print(f"   {stage:>10}: {summary['mean'] * 1000:.1f} ms")
 except Exception as e:
     print(f"❌ Diagnostic Failed: {e}")
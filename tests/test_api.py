@@ -0,0 +1,140 @@
+import importlib.util
+import json
+import tempfile
+import threading
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tests.test_rag_pipeline import FakeGenerator
+from tests.test_retriever import FakeEncoder, build_store
+
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@unittest.skipUnless(importlib.util.find_spec('fastapi') and importlib.util.find_spec('httpx'),
+                     "fastapi/httpx not installed")
+class TestQueryAPI(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        build_store(self.root)
+        FakeGenerator.release.clear()
+        for target, fake in [('sentence_transformers.SentenceTransformer', FakeEncoder),
+                             ('src.rag.pipeline.LocalComplaintGenerator', FakeGenerator)]:
+            patcher = mock.patch(target, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        from fastapi.testclient import TestClient
+        from api import create_app
+        from src.rag.pipeline import RAGPipeline
+
+        self.rag = RAGPipeline(self.root)
+        self.client = TestClient(create_app(self.rag, search_workers=2, generate_workers=2))
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    def tearDown(self):
+        FakeGenerator.release.set()
+        self.tmp.cleanup()
+
+    def test_search_endpoints_and_health_before_the_llm(self):
+        self.assertTrue(self.rag.wait_until_ready('encoder', 'index', 'metadata', timeout=10))
+        health = self.client.get('/healthz')
+        self.assertEqual(health.status_code, 200)
+        self.assertFalse(health.json()['generator_ready'])
+
+        hits = self.client.post('/search', json={'query': 'escrow fees', 'top_k': 3}).json()['results']
+        self.assertEqual([h['chunk_id'] for h in hits],
+                         [h['chunk_id'] for h in self.rag.search('escrow fees', top_k=3)])
+
+        batch = self.client.post('/search_batch', json={
+            'queries': ['escrow', 'card fees'], 'top_k': 4, 'filters': [{'state': 'CA'}, None]}).json()['results']
+        self.assertEqual([len(r) for r in batch], [4, 4])
+
+        self.assertEqual(self.client.post('/search', json={'query': 'x', 'mode': 'psychic'}).status_code, 400)
+        self.assertEqual(self.client.post('/search', json={
+            'query': 'x', 'filters': {'date_to': '2021-13-45'}}).status_code, 400)
+        self.assertEqual(self.client.post('/search', json={'query': 'x', 'top_k': 0}).status_code, 422)
+        # The LLM is still loading
+        response = self.client.post('/answer', json={'question': 'escrow'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_index_updates(self):
+        self.assertTrue(self.rag.wait_until_ready('encoder', 'index', 'metadata', timeout=10))
+        response = self.client.post('/index/chunks', json={'chunks': [
+            {'chunk_id': 'new_0', 'text': 'zebra quiz jazz', 'product': 'Student loan'}]})
+        self.assertEqual(response.json(), {'added': 1})
+        hits = self.client.post('/search', json={'query': 'zebra quiz jazz', 'top_k': 1}).json()['results']
+        self.assertEqual(hits[0]['chunk_id'], 'new_0')
+
+        response = self.client.post('/index/delete', json={'chunk_ids': ['new_0'], 'complaint_ids': ['7']})
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(self.client.post('/index/compact').status_code, 202)
+        self.client.app.state.compaction.join()
+        self.assertEqual(self.rag.retriever.index.ntotal, 599)
+
+    def test_answer_and_stream(self):
+        FakeGenerator.release.set()
+        self.assertTrue(self.rag.wait_until_ready(timeout=10))
+
+        answer = self.client.post('/answer', json={'question': 'card fees'}).json()
+        self.assertEqual(answer['answer'], '5 complaints about card fees')
+        self.assertEqual(len(answer['source_documents']), 5)
+
+        with self.client.stream('POST', '/answer/stream', json={'question': 'card fees'}) as response:
+            self.assertEqual(response.headers['content-type'].split(';')[0], 'text/event-stream')
+            events = parse_sse(response.read().decode())
+        self.assertEqual(events[0][0], 'sources')
+        self.assertEqual({name for name, _ in events[1:-1]}, {'token'})
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['answer'], '5 complaints about card fees')
+
+    def test_trace_ids_and_metrics(self):
+        FakeGenerator.release.set()
+        self.assertTrue(self.rag.wait_until_ready(timeout=10))
+
+        response = self.client.post('/answer', json={'question': 'escrow'}, headers={'X-Request-ID': 'job-42'})
+        self.assertEqual(response.headers['X-Trace-Id'], 'job-42')
+        self.assertEqual(response.json()['trace_id'], 'job-42')
+        self.assertEqual(len(self.client.post('/search', json={'query': 'fees'}).headers['X-Trace-Id']), 16)
+
+        text = self.client.get('/metrics').text
+        for stage in ('encode', 'faiss', 'metadata', 'retrieve', 'context', 'query'):
+            self.assertIn(f'rag_stage_seconds_count{{stage="{stage}"}}', text)
+        self.assertIn('rag_http_requests_total{path="/answer",status="200"}', text)
+        self.assertIn('rag_queries_total{kind="query",outcome="ok"}', text)
+
+        summary = self.client.get('/metrics/summary').json()
+        self.assertEqual(set(summary['rag_stage_seconds']['faiss']), {'count', 'mean', 'p50', 'p95', 'p99'})
+
+    def test_requests_share_one_pipeline_concurrently(self):
+        FakeGenerator.release.set()
+        responses = []
+
+        def ask(i):
+            responses.append(self.client.post('/search', json={'query': f'loan {i}'}).status_code)
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        self.assertEqual(responses, [200] * 8)
+        self.assertIs(self.client.app.state.rag, self.rag)
+
+
+if __name__ == '__main__':
+    unittest.main()
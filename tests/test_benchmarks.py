@@ -0,0 +1,77 @@
+import argparse
+import copy
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks import chunking
+from benchmarks.compare import compare
+from benchmarks.corpus import HashingEncoder, SyntheticCorpus, build_vector_store
+from benchmarks.run import run
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+    def test_batches_are_reproducible_and_searchable(self):
+        corpus = SyntheticCorpus(1000, seed=3)
+        first = list(corpus.batches(400))
+        again = corpus.batch(400, 400)
+        np.testing.assert_array_equal(first[1][0], again[0])
+        self.assertEqual(first[1][1]['text'], again[1]['text'])
+        self.assertEqual(sum(len(e) for e, _ in first), 1000)
+
+        # A chunk's own text encodes to (almost) its stored embedding
+        embeddings, columns = first[0]
+        encoded = HashingEncoder().encode(columns['text'][:5])
+        np.testing.assert_allclose(encoded, embeddings[:5], atol=1e-5)
+
+    def test_store_is_reused_when_parameters_match(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertFalse(build_vector_store(Path(tmp), 500)['reused'])
+            self.assertTrue(build_vector_store(Path(tmp), 500)['reused'])
+            self.assertFalse(build_vector_store(Path(tmp), 600)['reused'])
+
+
+class TestBenchmarkRun(unittest.TestCase):
+    def test_report_and_compare(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            args = argparse.Namespace(chunks=2000, index_type='flat', queries=20, seed=1, lexical=False,
+                                      work_dir=tmp)
+            report = run(args)
+
+        results = report['results']
+        self.assertEqual(set(results), {'build', 'startup', 'single', 'batched', 'filtered', 'end_to_end', 'memory'})
+        self.assertEqual(set(results['batched']), {'batch_8', 'batch_64'})
+        self.assertEqual(results['single']['n'], 20)
+        self.assertLessEqual(results['single']['p50_ms'], results['single']['p99_ms'])
+        self.assertGreater(results['startup']['rss_mb'], 0)
+        self.assertIn('retrieve', results['end_to_end']['stages_mean_ms'])
+        self.assertLess(results['filtered']['rare_product']['matching_chunks'],
+                        results['filtered']['common_product']['matching_chunks'])
+
+        slower = copy.deepcopy(report)
+        slower['results']['single']['p95_ms'] *= 2
+        slower['results']['batched']['batch_8']['queries_qps'] *= 2
+        flagged = {metric for metric, *_, regressed in compare(report, slower) if regressed}
+        self.assertEqual(flagged, {'single.p95_ms'})
+        self.assertFalse(any(row[-1] for row in compare(report, report)))
+
+
+class TestChunkingBenchmark(unittest.TestCase):
+    def test_sentence_chunks_fit_and_never_cut_words(self):
+        args = argparse.Namespace(narratives=300, seed=1, workers=2, tokenizer=None, chunk_tokens=200,
+                                  overlap_tokens=32, chunk_size=500, chunk_overlap=50)
+        results = chunking.run(args)['results']
+        self.assertEqual(set(results), {'legacy', 'sentences', 'sentences_parallel'})
+        self.assertLessEqual(results['sentences']['tokens_max'], 202)
+        self.assertEqual(results['sentences']['cut_mid_word_pct'], 0.0)
+        self.assertGreater(results['legacy']['cut_mid_word_pct'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.chunking import SentenceChunker, TextChunker, split_series_parallel
+
+NARRATIVE = ("i was charged a late fee of $35.00 on xx/xx/xxxx. i called the bank twice! "
+             "they said \"we can't help.\" the fee is still on my statement. "
+             "i want a refund of every fee they charged me this year.\n"
+             "please help me get my money back.")
+
+
+class WordTokenizer:
+    """Hugging Face-style callable counting one token per word."""
+    def __call__(self, texts, add_special_tokens=True):
+        return {'input_ids': [t.split() for t in texts]}
+
+
+class TestSentenceChunker(unittest.TestCase):
+    def test_chunks_are_whole_sentences_within_budget(self):
+        chunker = SentenceChunker(chunk_tokens=24, overlap_tokens=12)
+        chunks = chunker.split_series(pd.Series([' '.join([NARRATIVE] * 3)]))
+        self.assertGreater(len(chunks), 3)
+        self.assertLessEqual(chunks['tokens'].max(), 24)
+        np.testing.assert_array_equal(chunks['tokens'], chunker.count_tokens(chunks['text']))
+        for text in chunks['text']:
+            self.assertTrue(text[-1] in '.!?"', text)
+        # "$35.00" is not a sentence end
+        self.assertTrue(chunks['text'][0].startswith('i was charged a late fee of $35.00 on xx/xx/xxxx.'))
+
+    def test_overlap_repeats_trailing_sentences(self):
+        chunks = SentenceChunker(chunk_tokens=24, overlap_tokens=12).split_text(NARRATIVE)
+        overlapping = [(a, b) for a, b in zip(chunks, chunks[1:]) if b.split('. ')[0] in a]
+        self.assertTrue(overlapping)
+        no_overlap = SentenceChunker(chunk_tokens=24, overlap_tokens=0).split_text(NARRATIVE)
+        self.assertEqual(' '.join(no_overlap).split(), NARRATIVE.split())
+
+    def test_long_sentences_are_cut_at_word_boundaries(self):
+        text = ' '.join(f'word{i}' for i in range(100))
+        chunks = SentenceChunker(chunk_tokens=20, overlap_tokens=0, tokenizer=WordTokenizer()).split_text(text)
+        self.assertEqual([len(c.split()) for c in chunks], [20] * 5)
+        self.assertEqual(' '.join(chunks), text)
+
+    def test_batch_matches_single_texts_and_documents(self):
+        chunker = SentenceChunker(chunk_tokens=30, overlap_tokens=10)
+        texts = [NARRATIVE, None, '', 'one short complaint.', NARRATIVE.upper()]
+        chunks = chunker.split_series(pd.Series(texts, index=[10, 11, 12, 13, 14]))
+        for doc, text in enumerate(texts):
+            self.assertEqual(chunks.loc[chunks['doc'] == doc, 'text'].tolist(), chunker.split_text(text))
+        self.assertEqual(chunks.loc[chunks['doc'] == 0, 'chunk_index'].tolist(),
+                         list(range((chunks['doc'] == 0).sum())))
+
+        parallel = split_series_parallel(chunker, pd.Series(texts * 20), workers=2, batch_size=7)
+        serial = chunker.split_series(pd.Series(texts * 20))
+        pd.testing.assert_frame_equal(parallel, serial)
+
+        docs = chunker.split_documents([{'Complaint ID': '7', 'Product': 'Mortgage', 'text': NARRATIVE},
+                                        {'Complaint ID': '8', 'text': None}])
+        self.assertEqual([d['chunk_id'] for d in docs], [f'7_{i}' for i in range(len(docs))])
+        self.assertEqual({d['Product'] for d in docs}, {'Mortgage'})
+        self.assertEqual(set(docs[0]), set(TextChunker().split_documents([{'Complaint ID': '7', 'Product': 'Mortgage', 'text': 'x'}])[0]))
+
+    def test_rejects_overlap_not_smaller_than_chunk(self):
+        with self.assertRaises(ValueError):
+            SentenceChunker(chunk_tokens=10, overlap_tokens=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
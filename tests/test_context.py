@@ -0,0 +1,85 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.chunking import TextChunker
+from src.rag.context import ContextBuilder, join_overlapping, split_chunk_id
+
+NARRATIVE = " ".join(f"On day {i} the servicer added another escrow charge to my mortgage statement." for i in range(12))
+
+
+def results(chunks):
+    """Shape TextChunker output like retriever results."""
+    return [{'text': c['text'], 'chunk_id': c['chunk_id'], 'product': 'Mortgage', 'score': 0.1 * i}
+            for i, c in enumerate(chunks)]
+
+
+class TestContextBuilder(unittest.TestCase):
+    def setUp(self):
+        self.chunks = TextChunker(chunk_size=200, chunk_overlap=50).split_documents(
+            [{'Complaint ID': 'C7', 'text': NARRATIVE}])
+
+    def test_helpers(self):
+        self.assertEqual(split_chunk_id('12345_3'), ('12345', 3))
+        self.assertEqual(split_chunk_id('doc'), ('doc', None))
+        self.assertEqual(join_overlapping("abc def", "def ghi"), "abc def ghi")
+        self.assertEqual(join_overlapping("abc", "xyz"), "abc xyz")
+
+    def test_adjacent_chunks_are_merged_without_the_overlap(self):
+        # Chunks 2, 1 and 3 of one complaint, retrieved out of order, plus a chunk of another complaint
+        other = {'text': 'A debt collector called me at work every day.', 'chunk_id': 'C9_0'}
+        retrieved = results([self.chunks[2], other, self.chunks[1], self.chunks[3]])
+        context, report = ContextBuilder(token_budget=None).build(retrieved)
+
+        self.assertEqual(report['merged'], [['C7_1', 'C7_2', 'C7_3']])
+        self.assertEqual([c['chunk_id'] for c in context], ['C7_1', 'C9_0'])
+        start = NARRATIVE.index(self.chunks[1]['text'])
+        end = NARRATIVE.index(self.chunks[3]['text']) + len(self.chunks[3]['text'])
+        self.assertEqual(context[0]['text'], NARRATIVE[start:end])
+        self.assertEqual(context[0]['merged_chunk_ids'], ['C7_1', 'C7_2', 'C7_3'])
+        # The merged chunk keeps its best member's metadata
+        self.assertEqual(context[0]['score'], 0.0)
+
+    def test_near_duplicates_are_dropped(self):
+        text = "The bank charged me an overdraft fee even though my balance was positive all month."
+        retrieved = [{'text': text, 'chunk_id': '1_0'},
+                     {'text': text.replace('all month', 'all month long'), 'chunk_id': '2_0'},
+                     {'text': 'My card was declined abroad despite a travel notice.', 'chunk_id': '3_0'}]
+        context, report = ContextBuilder(token_budget=None).build(retrieved)
+        self.assertEqual([c['chunk_id'] for c in context], ['1_0', '3_0'])
+        self.assertEqual(report['dropped'], [{'chunk_id': '2_0', 'reason': 'duplicate', 'duplicate_of': '1_0'}])
+
+        context, _ = ContextBuilder(token_budget=None, duplicate_threshold=None).build(retrieved)
+        self.assertEqual(len(context), 3)
+
+    def test_token_budget(self):
+        retrieved = [{'text': ' '.join(f'w{d}x{i}' for i in range(40)), 'chunk_id': f'{d}_0'} for d in range(4)]
+        context, report = ContextBuilder(token_budget=100, min_truncated_tokens=10).build(retrieved)
+
+        # Two whole chunks (2 x 43 tokens), then 11 tokens of the third; the fourth doesn't fit
+        self.assertEqual(report['kept'], ['0_0', '1_0', '2_0'])
+        self.assertEqual(report['truncated'], ['2_0'])
+        self.assertEqual(report['dropped'], [{'chunk_id': '3_0', 'reason': 'budget'}])
+        self.assertEqual(context[2]['tokens'], 11)
+        self.assertTrue(context[2]['text'].endswith(' ...'))
+        self.assertLessEqual(report['tokens'], 100)
+
+    def test_uses_the_model_tokenizer(self):
+        class CharTokenizer:
+            def encode(self, text, add_special_tokens=True):
+                return list(text)
+
+            def decode(self, ids, skip_special_tokens=False):
+                return ''.join(ids)
+
+        retrieved = [{'text': 'x' * 60, 'chunk_id': '1_0'}, {'text': 'y' * 60, 'chunk_id': '2_0'}]
+        context, report = ContextBuilder(token_budget=80, min_truncated_tokens=10).build(retrieved, CharTokenizer())
+        self.assertEqual(report['truncated'], ['2_0'])
+        self.assertEqual(context[1]['text'], 'y' * 14 + ' ...')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dedup import MinHasher, NearDuplicateIndex, lsh_bands
+
+
+def random_texts(n: int, words: int = 60, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f'w{i}' for i in range(5000)])
+    return [' '.join(vocabulary[rng.integers(0, len(vocabulary), size=words)]) for _ in range(n)]
+
+
+class TestMinHasher(unittest.TestCase):
+    def test_signatures_estimate_shingle_jaccard(self):
+        base = random_texts(1, words=200)[0].split()
+        edited = base[:180] + ['changed'] * 20  # shares 178 of its 198 3-word shingles with base
+        hasher = MinHasher(num_perm=256)
+        signatures = hasher.signatures([' '.join(base), ' '.join(edited).upper(), 'unrelated words entirely here'])
+
+        self.assertEqual(signatures.shape, (3, 256))
+        self.assertEqual(signatures.dtype, np.uint32)
+        jaccard = 178 / 218
+        self.assertAlmostEqual(np.mean(signatures[0] == signatures[1]), jaccard, delta=0.1)
+        self.assertLess(np.mean(signatures[0] == signatures[2]), 0.05)
+
+    def test_batches_and_short_texts_do_not_change_signatures(self):
+        texts = random_texts(10, seed=1) + ['two words', '', None]
+        hasher = MinHasher()
+        whole = hasher.signatures(texts)
+        np.testing.assert_array_equal(whole, hasher.signatures(texts, batch_size=3))
+        np.testing.assert_array_equal(whole[10], hasher.signatures(['TWO   words'])[0])
+        self.assertTrue((whole[11] == np.iinfo(np.uint32).max).all())
+        self.assertTrue((whole[12] == whole[11]).all())
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    def test_lsh_bands_match_threshold(self):
+        bands, rows = lsh_bands(64, 0.8)
+        self.assertLessEqual(bands * rows, 64)
+        self.assertAlmostEqual((1 / bands) ** (1 / rows), 0.8, delta=0.05)
+
+    def test_collapses_near_duplicates_across_batches_and_merges(self):
+        texts = random_texts(300, seed=2)
+        copies = [text.replace(text.split()[-1], 'edited') for text in texts[:50]]
+        hasher = MinHasher()
+        index = NearDuplicateIndex()
+        index.MIN_MERGE = 64
+
+        assigned = np.concatenate([index.add_batch(hasher.signatures(batch))
+                                   for batch in (texts[:100], texts[100:] + copies[:25], copies[25:])])
+
+        self.assertEqual(len(index), 300)
+        np.testing.assert_array_equal(assigned[:300], np.arange(300))
+        np.testing.assert_array_equal(assigned[300:], np.arange(50))
+        np.testing.assert_array_equal(index.counts, np.r_[np.full(50, 2), np.ones(250)])
+
+    def test_duplicates_within_one_batch_join_the_first(self):
+        texts = random_texts(3, seed=3)
+        assigned = NearDuplicateIndex().add_batch(MinHasher().signatures([texts[0], texts[1], texts[0], texts[2]]))
+        np.testing.assert_array_equal(assigned, [0, 1, 0, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
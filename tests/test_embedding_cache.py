@@ -0,0 +1,86 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.embedding_cache import EmbeddingCache, cache_model_key, text_keys
+
+
+class CountingEncoder:
+    """Deterministic 4-d 'embeddings' that records what it was asked to encode."""
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.array([[len(t), t.count('a'), t.count('e'), 1.0] for t in texts], dtype='float32')
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_distinct_misses_are_encoded(self):
+        model = CountingEncoder()
+        cache = EmbeddingCache(self.root, 'model')
+        texts = ['late fee charged', 'escrow  shortage', 'late fee charged', 'escrow shortage\n']
+        vectors = cache.encode(model, texts)
+
+        self.assertEqual(model.encoded, ['late fee charged', 'escrow  shortage'])
+        np.testing.assert_array_equal(vectors, model.encode(texts))
+
+        model.encoded = []
+        again = cache.encode(model, ['escrow shortage', 'new text', 'late fee charged'])
+        self.assertEqual(model.encoded, ['new text'])
+        np.testing.assert_array_equal(again[0], vectors[1])
+        self.assertEqual((cache.hits, cache.misses), (2, 5))
+
+    def test_flushed_entries_survive_reopening(self):
+        model = CountingEncoder()
+        cache = EmbeddingCache(self.root, cache_model_key('model', 'int8'))
+        cache.encode(model, ['alpha', 'beta'])
+        cache.flush()
+        cache.encode(model, ['gamma'])  # staged, never flushed
+
+        reopened = EmbeddingCache(self.root, 'model@int8', dimension=4)
+        self.assertEqual(len(reopened), 2)
+        vectors, found = reopened.lookup(text_keys(['beta', 'gamma', 'alpha']))
+        np.testing.assert_array_equal(found, [True, False, True])
+        np.testing.assert_array_equal(vectors[0], model.encode(['beta'])[0])
+
+        with self.assertRaises(ValueError):
+            EmbeddingCache(self.root, 'model@int8', dimension=8)
+
+    def test_rows_past_the_manifest_are_ignored_and_overwritten(self):
+        model = CountingEncoder()
+        cache = EmbeddingCache(self.root, 'model', max_pending=2)
+        cache.encode(model, ['one', 'two'])  # reaching max_pending flushes
+        manifest = json.loads((cache.cache_dir / 'manifest.json').read_text())
+        self.assertEqual(manifest['count'], 2)
+
+        # A flush that died after appending vectors but before the manifest
+        with open(cache.cache_dir / 'vectors.f32', 'ab') as f:
+            np.ones((3, 4), dtype='float32').tofile(f)
+        reopened = EmbeddingCache(self.root, 'model')
+        reopened.encode(model, ['three'])
+        reopened.flush()
+
+        final = EmbeddingCache(self.root, 'model')
+        vectors, found = final.lookup(text_keys(['one', 'two', 'three']))
+        self.assertTrue(found.all())
+        np.testing.assert_array_equal(vectors, model.encode(['one', 'two', 'three']))
+        self.assertEqual((cache.cache_dir / 'vectors.f32').stat().st_size, 3 * 4 * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import torch
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.encoder_report import cosine_agreement, neighbour_recall, run_report
+from src.rag.encoders import ONNX_FILES, load_encoder
+
+
+class FakeSentenceTransformer(torch.nn.Module):
+    """A one-Linear 'encoder' over letter counts, recording how it was constructed."""
+    created = []
+
+    def __init__(self, model_name, **kwargs):
+        super().__init__()
+        FakeSentenceTransformer.created.append((model_name, kwargs))
+        torch.manual_seed(0)
+        self.linear = torch.nn.Linear(26, 16)
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        counts = torch.zeros(len(texts), 26)
+        for row, text in enumerate(texts):
+            for ch in text.lower():
+                if 'a' <= ch <= 'z':
+                    counts[row, ord(ch) - ord('a')] += 1
+        with torch.no_grad():
+            return self.linear(counts).numpy()
+
+
+class TestLoadEncoder(unittest.TestCase):
+    def setUp(self):
+        FakeSentenceTransformer.created = []
+        patcher = mock.patch('sentence_transformers.SentenceTransformer', FakeSentenceTransformer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_torch_is_the_plain_model(self):
+        model = load_encoder('mini', 'torch')
+        self.assertIsInstance(model.linear, torch.nn.Linear)
+        self.assertEqual(FakeSentenceTransformer.created, [('mini', {})])
+
+    def test_int8_quantizes_linear_layers(self):
+        model = load_encoder('mini', 'int8')
+        self.assertIsInstance(model.linear, torch.ao.nn.quantized.dynamic.Linear)
+        self.assertEqual(FakeSentenceTransformer.created[0][1]['device'], 'cpu')
+        reference = FakeSentenceTransformer('mini').encode(['escrow fees'])
+        self.assertGreater(cosine_agreement(reference, model.encode(['escrow fees']))['cosine_min'], 0.99)
+
+    def test_onnx_loads_the_cached_graph(self):
+        load_encoder('mini', 'onnx-int8')
+        _, kwargs = FakeSentenceTransformer.created[0]
+        self.assertEqual(kwargs['backend'], 'onnx')
+        self.assertEqual(kwargs['cache_folder'], 'model_cache')
+        self.assertEqual(kwargs['model_kwargs']['file_name'], ONNX_FILES['onnx-int8'])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            load_encoder('mini', 'tensorrt')
+
+    def test_report_compares_backends_to_fp32(self):
+        words = ['fees', 'escrow', 'collector', 'loan', 'card', 'interest', 'payment', 'fraud']
+        rng = np.random.default_rng(0)
+        texts = [' '.join(rng.choice(words, size=5)) for _ in range(120)]
+        rows = run_report('mini', ['torch', 'int8'], texts[20:], texts[:20], k=5, bench_texts=16,
+                          batch_sizes=[1, 8])
+        self.assertEqual([r['backend'] for r in rows], ['torch', 'int8'])
+        self.assertAlmostEqual(rows[0]['cosine_mean'], 1.0, places=5)
+        self.assertEqual(rows[0]['recall@5'], 1.0)
+        self.assertGreater(rows[1]['cosine_mean'], 0.99)
+        self.assertIn('texts_per_s@8', rows[1])
+
+
+class TestParityMetrics(unittest.TestCase):
+    def test_identical_and_perturbed_encodings(self):
+        rng = np.random.default_rng(1)
+        corpus = rng.standard_normal((300, 8)).astype('float32')
+        queries = rng.standard_normal((20, 8)).astype('float32')
+        self.assertEqual(neighbour_recall(corpus, queries, corpus, queries, k=10), 1.0)
+        self.assertAlmostEqual(cosine_agreement(corpus, corpus * 3)['cosine_min'], 1.0, places=5)
+
+        noisy = corpus + rng.standard_normal(corpus.shape).astype('float32')
+        self.assertLess(neighbour_recall(corpus, queries, noisy, queries, k=10), 1.0)
+        self.assertLess(cosine_agreement(corpus, noisy)['cosine_mean'], 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.evaluation import RetrievalEvaluator, load_ground_truth, mark_pareto, score
+from tests.test_retriever import FakeEncoder, build_store
+
+QUERIES = ['escrow fees', 'card interest', 'collector fraud', 'loan payment', 'fees on my card',
+           'interest on the loan', 'fraud on escrow', 'payment collector']
+
+
+class TestMetrics(unittest.TestCase):
+    def test_score(self):
+        truth = ['a', 'b', 'c']
+        self.assertEqual(score(['a', 'b', 'c'], truth, 3), {'recall_at_k': 1.0, 'mrr': 1.0, 'ndcg_at_k': 1.0})
+        swapped = score(['b', 'a', 'x'], truth, 3)
+        self.assertAlmostEqual(swapped['recall_at_k'], 2 / 3)
+        self.assertEqual(swapped['mrr'], 0.5)
+        self.assertLess(swapped['ndcg_at_k'], 1.0)
+        self.assertEqual(score(['x', 'y', 'z'], truth, 3), {'recall_at_k': 0.0, 'mrr': 0.0, 'ndcg_at_k': 0.0})
+
+    def test_pareto(self):
+        rows = [{'recall_at_k': 1.0, 'p50_ms': 5.0}, {'recall_at_k': 0.9, 'p50_ms': 1.0},
+                {'recall_at_k': 0.8, 'p50_ms': 2.0}]
+        self.assertEqual(mark_pareto(rows), [rows[1], rows[0]])
+        self.assertEqual([r['pareto'] for r in rows], [True, True, False])
+
+
+class TestRetrievalEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        patcher = mock.patch('sentence_transformers.SentenceTransformer', FakeEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _store(self, name: str, index_type: str):
+        from src.rag.retriever import ComplaintRetriever
+
+        (self.root / name).mkdir()
+        build_store(self.root / name, index_type=index_type)
+        return ComplaintRetriever(self.root / name)
+
+    def test_exact_and_approximate_configs(self):
+        flat = self._store('flat', 'flat')
+        ivf = self._store('ivf', 'ivf_flat')
+        cache_dir = self.root / 'cache'
+
+        truth = load_ground_truth(QUERIES, flat.index_path, flat.metadata, FakeEncoder(), k=10, cache_dir=cache_dir)
+        self.assertEqual(len(list(cache_dir.glob('truth-*.npz'))), 1)
+        # Second call reads the cache instead of encoding the queries again
+        encoded = FakeEncoder.encoded
+        cached = load_ground_truth(QUERIES, flat.index_path, flat.metadata, FakeEncoder(), k=10, cache_dir=cache_dir)
+        self.assertEqual(FakeEncoder.encoded, encoded)
+        self.assertEqual(cached.chunk_ids.tolist(), truth.chunk_ids.tolist())
+
+        # Ground truth can also come from an IVF-Flat index, which keeps the full vectors
+        from_ivf = load_ground_truth(QUERIES, ivf.index_path, ivf.metadata, FakeEncoder(), k=10)
+        self.assertTrue((from_ivf.distances == truth.distances).all())
+
+        evaluator = RetrievalEvaluator(QUERIES, truth)
+        exact = evaluator.evaluate(flat, 'flat')
+        self.assertEqual((exact['recall_at_k'], exact['mrr']), (1.0, 1.0))
+        rows = [evaluator.evaluate(ivf, 'ivf', nprobe=nprobe) for nprobe in (1, 8)]
+        self.assertLess(rows[0]['recall_at_k'], rows[1]['recall_at_k'])
+        self.assertEqual(rows[1]['recall_at_k'], 1.0)
+        self.assertLessEqual({'ndcg_at_k', 'p50_ms', 'p95_ms', 'params'}, set(rows[0]))
+
+        with self.assertRaises(ValueError):
+            RetrievalEvaluator(QUERIES[:3], truth)
+
+
+if __name__ == '__main__':
+    unittest.main()
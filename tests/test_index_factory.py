@@ -0,0 +1,55 @@
+import unittest
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.index_factory import build_index, describe_index, index_kind, search_parameters, train_index
+
+
+class TestIndexFactory(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.random((2000, 16), dtype='float32')
+
+    def _round_trip(self, index):
+        return faiss.deserialize_index(faiss.serialize_index(index))
+
+    def test_ivf_keeps_nprobe_and_accepts_per_query_override(self):
+        index = build_index('ivf_flat', 16, nlist=8, nprobe=2)
+        train_index(index, self.vectors)
+        index.add(self.vectors)
+
+        loaded = self._round_trip(index)
+        self.assertEqual(describe_index(loaded), {'kind': 'ivf', 'ntotal': 2000, 'dimension': 16,
+                                                  'nlist': 8, 'nprobe': 2})
+        # Probing every list makes IVF exact
+        params = search_parameters(loaded, nprobe=8)
+        _, found = loaded.search(self.vectors[:5], 1, params=params)
+        self.assertEqual(list(found[:, 0]), [0, 1, 2, 3, 4])
+
+    def test_hnsw_and_flat_detection(self):
+        hnsw = build_index('hnsw', 16, hnsw_m=8, ef_search=20)
+        hnsw.add(self.vectors)
+        self.assertEqual(index_kind(self._round_trip(hnsw)), 'hnsw')
+        self.assertIsInstance(search_parameters(hnsw, ef_search=40), faiss.SearchParametersHNSW)
+
+        flat = build_index('flat', 16)
+        self.assertEqual(index_kind(flat), 'flat')
+        self.assertIsNone(search_parameters(flat, nprobe=4, ef_search=40))
+
+    def test_rejects_bad_configuration(self):
+        with self.assertRaises(ValueError):
+            build_index('ivf_pq', 16, pq_m=5)
+        with self.assertRaises(ValueError):
+            build_index('annoy', 16)
+        with self.assertRaises(ValueError):
+            train_index(build_index('ivf_flat', 16, nlist=64), self.vectors[:10])
+
+
+if __name__ == "__main__":
+    unittest.main()
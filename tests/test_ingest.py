@@ -0,0 +1,175 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+import pandas as pd
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.data_utils import prepare_narratives
+from src.ingest import parse_args, run_ingest
+from src.rag.index_builder import IndexBuilder
+from src.rag.metadata_store import MetadataStore
+
+DIM = 26
+
+
+class LetterEncoder:
+    """Letter-frequency 'embeddings' so tests run without downloading a model."""
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        vectors = np.zeros((len(texts), DIM), dtype='float32')
+        for row, text in enumerate(texts):
+            for ch in text.lower():
+                if 'a' <= ch <= 'z':
+                    vectors[row, ord(ch) - ord('a')] += 1
+        return vectors
+
+
+def write_raw_csv(path: Path, n: int = 300):
+    rng = np.random.default_rng(3)
+    words = ['fees', 'escrow', 'collector', 'loan', 'card', 'interest', 'payment', 'fraud']
+    pd.DataFrame({
+        'Date received': [f'2023-0{1 + i % 9}-1{i % 10}' for i in range(n)],
+        'Product': ['Mortgage' if i % 2 else ('Credit card' if i % 3 else 'Debt collection') for i in range(n)],
+        'Issue': 'Other',
+        'Consumer complaint narrative': [None if i % 7 == 0 else
+                                         ' '.join(rng.choice(words, size=20 + i % 200)).upper() for i in range(n)],
+        'Company': ['Bank A' if i % 5 else 'Lender B' for i in range(n)],
+        'State': ['CA' if i % 3 else 'NY' for i in range(n)],
+        'Complaint ID': [str(1000 + i) for i in range(n)],
+    }).to_csv(path, index=False)
+
+
+class TestPrepareNarratives(unittest.TestCase):
+    def test_filters_products_missing_and_short_narratives(self):
+        df = pd.DataFrame({
+            'Product': ['Mortgage', 'Mortgage', 'Debt collection', 'Mortgage'],
+            'Consumer complaint narrative': ['  A LONG ENOUGH NARRATIVE ' * 4, None, 'x' * 100, 'too short'],
+        })
+        out = prepare_narratives(df, ['Mortgage'])
+        self.assertEqual(len(out), 1)
+        self.assertEqual(out['text'].iloc[0], ('  A LONG ENOUGH NARRATIVE ' * 4).lower().strip())
+
+
+class TestIndexBuilder(unittest.TestCase):
+    def test_trains_on_a_sample_of_the_whole_stream_and_keeps_rows_aligned(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((500, 16)).astype('float32')
+        # Sorted input, like the date/product-ordered export: the second half sits somewhere else
+        vectors[250:] += 20
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            builder = IndexBuilder(root / 'x.index', root / 'x_store', 16, index_type='ivf_flat',
+                                   train_size=200, nlist=2, nprobe=2)
+            for start in range(0, 500, 64):
+                batch = vectors[start:start + 64]
+                builder.add_batch(batch, chunk_id=[f'{i}_0' for i in range(start, start + len(batch))],
+                                  text=['t'] * len(batch), product=['Mortgage'] * len(batch))
+                self.assertFalse(builder.index.is_trained)
+            builder.close()
+            self.assertEqual([p.name for p in root.iterdir() if p.suffix == '.spill'], [])
+
+            index = faiss.read_index(str(root / 'x.index'))
+            store = MetadataStore(root / 'x_store')
+            self.assertEqual(index.ntotal, 500)
+            self.assertEqual(len(store), 500)
+            _, ids = index.search(vectors[[123, 400]], 1)
+            self.assertEqual([store.field(int(i), 'chunk_id') for i in ids[:, 0]], ['123_0', '400_0'])
+            # A prefix of 200 would have put both centroids in the first half
+            centroids = faiss.extract_index_ivf(index).quantizer.reconstruct_n(0, 2).mean(axis=1)
+            self.assertEqual(sorted(np.round(centroids / 20)), [0, 1])
+
+
+class TestIngest(unittest.TestCase):
+    def test_csv_to_index_and_metadata_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            write_raw_csv(root / 'complaints.csv')
+            args = parse_args(['--input', str(root / 'complaints.csv'), '--output-dir', str(root),
+                               '--csv-chunksize', '70', '--task-size', '25', '--workers', '2',
+                               '--embed-batch', '32', '--encode-workers', '2', '--queue-size', '2',
+                               '--no-dedup'])
+            info = run_ingest(args, model=LetterEncoder())
+
+            raw = pd.read_csv(root / 'complaints.csv', dtype=str)
+            expected = prepare_narratives(raw, args.products)
+            store = MetadataStore(root / 'full_metadata_store')
+            index = faiss.read_index(str(root / 'full_faiss_index.index'))
+
+            self.assertEqual(index.ntotal, len(store))
+            self.assertEqual(info['ntotal'], len(store))
+            self.assertGreater(len(store), len(expected))  # long narratives were split into several chunks
+            complaint_ids = {store.field(i, 'chunk_id').rsplit('_', 1)[0] for i in range(len(store))}
+            self.assertEqual(complaint_ids, set(expected['Complaint ID']))
+
+            # Row i of the metadata store describes vector i of the index
+            encoder = LetterEncoder()
+            for i in (0, len(store) // 2, len(store) - 1):
+                vector = index.reconstruct(i)
+                np.testing.assert_allclose(vector, encoder.encode([store.field(i, 'text')])[0])
+            row = store.row(0)
+            self.assertIn(row['product'], args.products)
+            self.assertIsNotNone(row['state'])
+
+    def test_rerun_only_embeds_new_chunks(self):
+        class CountingEncoder(LetterEncoder):
+            encoded = 0
+
+            def encode(self, texts, **kwargs):
+                CountingEncoder.encoded += len(texts)
+                return super().encode(texts, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            write_raw_csv(root / 'complaints.csv', n=100)
+            argv = ['--input', str(root / 'complaints.csv'), '--output-dir', str(root), '--workers', '1',
+                    '--no-dedup']
+            run_ingest(parse_args(argv), model=CountingEncoder())
+            first = CountingEncoder.encoded
+            self.assertGreater(first, 0)
+
+            write_raw_csv(root / 'complaints.csv', n=110)  # the same 100 complaints plus 10 new ones
+            CountingEncoder.encoded = 0
+            run_ingest(parse_args(argv), model=CountingEncoder())
+            store = MetadataStore(root / 'full_metadata_store')
+            new_chunks = sum(int(store.field(i, 'chunk_id').rsplit('_', 1)[0]) >= 1100 for i in range(len(store)))
+            self.assertEqual(CountingEncoder.encoded, new_chunks)
+
+            index = faiss.read_index(str(root / 'full_faiss_index.index'))
+            np.testing.assert_allclose(index.reconstruct(0), LetterEncoder().encode([store.field(0, 'text')])[0])
+
+    def test_near_duplicate_complaints_are_collapsed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            rng = np.random.default_rng(5)
+            vocabulary = [f'word{i}' for i in range(2000)]
+            narratives = [' '.join(rng.choice(vocabulary, size=40)) + '.' for _ in range(20)]
+            # Complaints 1000-1002 are resubmissions of 1000 with a word changed at the end
+            narratives[1:3] = [narratives[0][:-1] + ' again.', narratives[0][:-1] + ' still.']
+            pd.DataFrame({
+                'Date received': '2023-01-01', 'Product': 'Mortgage', 'Issue': 'Other',
+                'Consumer complaint narrative': narratives, 'Company': 'Bank A', 'State': 'CA',
+                'Complaint ID': [str(1000 + i) for i in range(20)],
+            }).to_csv(root / 'complaints.csv', index=False)
+            args = parse_args(['--input', str(root / 'complaints.csv'), '--output-dir', str(root),
+                               '--task-size', '5', '--workers', '2', '--embed-batch', '8'])
+            run_ingest(args, model=LetterEncoder())
+
+            store = MetadataStore(root / 'full_metadata_store')
+            chunk_ids = [store.field(i, 'chunk_id') for i in range(len(store))]
+            self.assertEqual(len(store), 18)
+            self.assertNotIn('1001_0', chunk_ids)
+            self.assertNotIn('1002_0', chunk_ids)
+            self.assertEqual(store.field(chunk_ids.index('1000_0'), 'duplicate_count'), 3)
+            self.assertIsNone(store.field(chunk_ids.index('1003_0'), 'duplicate_count'))
+
+
+if __name__ == '__main__':
+    unittest.main()
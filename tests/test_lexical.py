@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.lexical import (LexicalIndex, LexicalIndexWriter, bm25_idf, bm25_scores,
+                             reciprocal_rank_fusion, tokenize)
+
+
+def brute_force(index: LexicalIndex, query: str, top_k: int, mask=None):
+    """Score every posting of every query term: the reference MaxScore must match."""
+    acc = np.zeros(len(index), dtype='float32')
+    term_ids = sorted({t for t in (index.term_id(tok) for tok in tokenize(query)) if t is not None})
+    idf = bm25_idf([index.document_frequency(t) for t in term_ids], len(index))
+    for term_id, term_idf in zip(term_ids, idf):
+        docs, tfs = index.postings(term_id)
+        docs = docs.astype('int64')
+        acc[docs] += bm25_scores(tfs, index._lengths[docs], term_idf, index.avgdl, index.k1, index.b)
+    if mask is not None:
+        acc[~mask] = 0
+    hits = np.flatnonzero(acc)
+    best = np.lexsort((hits, -acc[hits]))[:top_k]
+    return hits[best], acc[hits][best]
+
+
+class TestLexicalIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        vocab = [f'w{i}' for i in range(400)]
+        weights = 1 / np.arange(1, len(vocab) + 1)
+        cls.texts = [' '.join(rng.choice(vocab, size=rng.integers(5, 60), p=weights / weights.sum()))
+                     for _ in range(3000)]
+        cls.texts[17] += ' The servicer violated RESPA with my escrow account'
+        with LexicalIndexWriter(Path(cls.tmp.name)) as writer:
+            for start in range(0, len(cls.texts), 700):
+                writer.add_batch(cls.texts[start:start + 700])
+        cls.index = LexicalIndex(Path(cls.tmp.name))
+        cls.mask = rng.random(len(cls.texts)) < 0.25
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_tokenize_drops_stopwords_and_punctuation(self):
+        self.assertEqual(tokenize("The FDCPA, and RESPA: acct #XXXX-1234!"),
+                         ['fdcpa', 'respa', 'acct', 'xxxx', '1234'])
+
+    def test_vocabulary_lookup(self):
+        self.assertEqual(len(self.index), 3000)
+        self.assertIsNotNone(self.index.term_id('respa'))
+        self.assertIsNone(self.index.term_id('fdcpa'))
+        docs, tfs = self.index.postings(self.index.term_id('respa'))
+        self.assertEqual(docs.tolist(), [17])
+        self.assertEqual(tfs.tolist(), [1])
+
+    def test_exact_term_ranks_first(self):
+        ids, scores = self.index.search('RESPA escrow violation', top_k=3)
+        self.assertEqual(ids[0], 17)
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_maxscore_matches_exhaustive_scoring(self):
+        for query in ['w0 w1', 'w0 w5 w120 w399', 'w3', 'w250 w251 w2', 'w0 w1 w2 w3 w4 w5 w6 w7']:
+            for top_k in (1, 10, 50):
+                for mask in (None, self.mask):
+                    ids, scores = self.index.search(query, top_k=top_k, mask=mask)
+                    expected_ids, expected_scores = brute_force(self.index, query, top_k, mask)
+                    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+                    np.testing.assert_array_equal(ids, expected_ids)
+                    if mask is not None:
+                        self.assertTrue(mask[ids].all())
+
+    def test_no_known_terms(self):
+        ids, scores = self.index.search('the and of zzz', top_k=5)
+        self.assertEqual(len(ids), 0)
+        self.assertEqual(len(scores), 0)
+
+
+class TestReciprocalRankFusion(unittest.TestCase):
+    def test_fuses_by_rank_and_skips_padding(self):
+        ids, scores = reciprocal_rank_fusion([[5, 3, -1], [3, 9]], top_k=3, k=60)
+        self.assertEqual(ids.tolist(), [3, 5, 9])
+        self.assertAlmostEqual(scores[0], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(scores[1], 1 / 61)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import importlib.util
+import tempfile
+import threading
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.local_generator import PROMPT_PREFIX, LocalComplaintGenerator
+
+GREEDY = dict(do_sample=False, max_new_tokens=12, temperature=None, top_k=None, top_p=None)
+CONTEXT = [{'text': 'my escrow payment went up without notice'}, {'text': 'late fees on my card'}]
+
+
+def build_tiny_model(model_dir: Path):
+    """A 2-layer randomly initialised Qwen2 with a character-level tokenizer, saved locally."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+
+    symbols = ['[UNK]', '<eos>'] + [chr(c) for c in range(32, 127)] + ['\n']
+    tokenizer = Tokenizer(models.WordLevel({s: i for i, s in enumerate(symbols)}, unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split('', 'isolated')
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token='[UNK]', eos_token='<eos>', pad_token='<eos>',
+                            model_input_names=['input_ids', 'attention_mask']).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    config = Qwen2Config(vocab_size=128, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=2048,
+                         eos_token_id=1, pad_token_id=1)
+    Qwen2ForCausalLM(config).save_pretrained(model_dir)
+
+
+class TestLocalComplaintGenerator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.model_dir = str(Path(cls.tmp.name) / 'tiny')
+        build_tiny_model(Path(cls.model_dir))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _generator(self, **kwargs):
+        kwargs.setdefault('backend', 'fp32')
+        return LocalComplaintGenerator(self.model_dir, generation_kwargs=GREEDY, **kwargs)
+
+    def test_prompt_starts_with_the_cached_prefix(self):
+        prompt = LocalComplaintGenerator(defer_loading=True).build_prompt('Why?', CONTEXT)
+        self.assertTrue(prompt.startswith(PROMPT_PREFIX + '- my escrow payment'))
+        self.assertTrue(prompt.endswith('Question: Why?\n\nAnswer:'))
+
+    def test_prefix_cache_does_not_change_the_answer(self):
+        cached = self._generator(prefix_cache=True)
+        uncached = self._generator(prefix_cache=False)
+        answer = cached.generate_answer('Why did my payment rise?', CONTEXT)
+        self.assertEqual(answer, uncached.generate_answer('Why did my payment rise?', CONTEXT))
+        # The cached prefix is copied per request, so a second request is unaffected by the first
+        self.assertEqual(answer, cached.generate_answer('Why did my payment rise?', CONTEXT))
+
+        stats = cached.last_stats
+        self.assertTrue(stats['prefix_cache'])
+        self.assertFalse(uncached.last_stats['prefix_cache'])
+        self.assertEqual(stats['new_tokens'], 12)
+        self.assertGreater(stats['tokens_per_s'], 0)
+        self.assertIsNotNone(stats['ttft_s'])
+
+    def test_int8_backend_streams(self):
+        generator = self._generator(backend='int8', num_threads=2)
+        import torch
+        self.assertEqual(torch.get_num_threads(), 2)
+        self.assertIsInstance(generator.pipe.model.model.layers[0].mlp.up_proj,
+                              torch.ao.nn.quantized.dynamic.Linear)
+        pieces = list(generator.generate_stream('Why?', CONTEXT))
+        self.assertEqual(generator.last_stats['backend'], 'int8')
+        self.assertEqual(''.join(pieces).strip(), generator.generate_answer('Why?', CONTEXT))
+
+    @unittest.skipUnless(importlib.util.find_spec('torchao'), "torchao not installed")
+    def test_int4_backend(self):
+        generator = self._generator(backend='int4')
+        generator.generate_answer('Why?', CONTEXT)
+        self.assertEqual(generator.last_stats['new_tokens'], 12)
+
+    def test_generation_errors_are_raised_not_hung_on(self):
+        generator = self._generator()
+        failure = RuntimeError("out of memory")
+        outcome = {}
+
+        def answer():
+            try:
+                generator.generate_answer('Why?', CONTEXT)
+            except Exception as e:
+                outcome['error'] = e
+
+        with mock.patch.object(generator.pipe.model, 'generate', side_effect=failure):
+            thread = threading.Thread(target=answer, daemon=True)
+            thread.start()
+            thread.join(timeout=20)
+        self.assertFalse(thread.is_alive())
+        self.assertIs(outcome.get('error'), failure)
+
+    def test_closing_the_stream_stops_generation(self):
+        generator = LocalComplaintGenerator(self.model_dir, backend='fp32',
+                                            generation_kwargs=dict(GREEDY, max_new_tokens=2000))
+        stream = generator.generate_stream('Why?', CONTEXT)
+        next(stream)
+        stream.close()
+        self.assertNotIn('generate-answer', [t.name for t in threading.enumerate()])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            LocalComplaintGenerator(defer_loading=True, backend='gguf')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.metadata_store import (
+    JsonMetadata,
+    MetadataStore,
+    MetadataWriter,
+    convert_json_metadata,
+    is_metadata_store,
+    load_metadata,
+    update_int_column,
+)
+
+
+class TestMetadataStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        store_dir = self.root / 'store'
+        with MetadataWriter(store_dir) as writer:
+            writer.append_batch(
+                chunk_id=['1_0', '1_1'],
+                text=['late fees on my card', 'escrow shortage – ünïcode'],
+                product=['Credit card', 'Mortgage'],
+            )
+            writer.append({'chunk_id': '2_0', 'text': '', 'product': 'Credit card', 'company': 'ACME',
+                           'state': 'TX', 'date': '2023-04-05T00:00:00'})
+
+        self.assertTrue(is_metadata_store(store_dir))
+        store = MetadataStore(store_dir)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store[1]['text'], 'escrow shortage – ünïcode')
+        self.assertEqual(store.field(0, 'product'), 'Credit card')
+        self.assertIsNone(store.field(0, 'company'))
+        self.assertEqual(store.row(2), {'chunk_id': '2_0', 'text': '', 'product': 'Credit card', 'company': 'ACME',
+                                        'state': 'TX', 'date': '2023-04-05'})
+        self.assertEqual(store.categories['product'], ['Credit card', 'Mortgage'])
+        self.assertEqual(list(store.codes('product')), [0, 1, 0])
+
+        offsets, ids = store.postings('product')
+        self.assertEqual(list(ids[offsets[0]:offsets[1]]), [0, 2])
+        self.assertEqual(list(ids[offsets[1]:offsets[2]]), [1])
+        sorted_days, order = store.date_order('date')
+        self.assertEqual(list(order), [2])
+
+    def test_int_columns_can_be_patched_in_place(self):
+        store_dir = self.root / 'store'
+        with MetadataWriter(store_dir) as writer:
+            writer.append_batch(chunk_id=['a', 'b', 'c'], text=['x', 'y', 'z'], duplicate_count=[None, 2, None])
+        store = MetadataStore(store_dir)
+        self.assertNotIn('duplicate_count', store.row(0))
+        self.assertEqual(store.row(1)['duplicate_count'], 2)
+
+        update_int_column(store_dir, 'duplicate_count', [0, 2], [5, 3])
+        self.assertEqual([MetadataStore(store_dir).field(i, 'duplicate_count') for i in range(3)], [5, 2, 3])
+        with self.assertRaises(ValueError):
+            update_int_column(store_dir, 'chunk_id', [0], [1])
+
+    def test_incomplete_store_is_ignored(self):
+        store_dir = self.root / 'partial'
+        writer = MetadataWriter(store_dir)
+        writer.append_batch(chunk_id=['1_0'], text=['x'])
+        self.assertFalse(is_metadata_store(store_dir))
+        writer.close()
+        self.assertTrue(is_metadata_store(store_dir))
+
+    def test_rewriting_a_store_leaves_open_readers_intact(self):
+        store_dir = self.root / 'store'
+        with MetadataWriter(store_dir) as writer:
+            writer.append_batch(chunk_id=['a', 'b'], text=['old one', 'old two'], product=['Mortgage', 'Credit card'])
+        old = MetadataStore(store_dir)
+
+        writer = MetadataWriter(store_dir)
+        writer.append_batch(chunk_id=['c'], text=['new'], product=['Student loan'])
+        self.assertTrue(is_metadata_store(store_dir))  # the previous store is served until close
+        self.assertEqual(old.row(1)['text'], 'old two')
+        writer.close()
+
+        self.assertEqual(old.row(1), {'chunk_id': 'b', 'text': 'old two', 'product': 'Credit card', 'company': None,
+                                      'state': None, 'date': None})
+        offsets, ids = old.postings('product')
+        self.assertEqual(list(ids[offsets[1]:offsets[2]]), [1])
+        self.assertEqual(MetadataStore(store_dir).row(0)['text'], 'new')
+        self.assertEqual([p.name for p in self.root.iterdir()], ['store'])
+
+        # A write that fails part way leaves the published store alone
+        with self.assertRaises(RuntimeError):
+            with MetadataWriter(store_dir) as writer:
+                writer.append_batch(chunk_id=['d'], text=['never published'])
+                raise RuntimeError("ingest failed")
+        self.assertEqual(MetadataStore(store_dir).row(0)['text'], 'new')
+        self.assertEqual([p.name for p in self.root.iterdir()], ['store'])
+
+    def test_legacy_json_layouts(self):
+        full_json = self.root / 'full_metadata.json'
+        full_json.write_text(json.dumps([
+            {'id': 'a_0', 'text': 'hello', 'meta': {'product': 'Mortgage', 'company': 'Bank',
+                                                    'state': 'CA', 'date_received': '2022-01-31'}},
+        ]))
+        medium_json = self.root / 'medium_metadata.json'
+        medium_json.write_text(json.dumps([
+            {'chunk_id': 'b_0', 'text': 'world', 'product': 'Student loan', 'original_id': 'b'},
+        ]))
+
+        self.assertIsInstance(load_metadata(full_json), JsonMetadata)
+        self.assertEqual(load_metadata(full_json)[0]['chunk_id'], 'a_0')
+        self.assertEqual(load_metadata(medium_json).field(0, 'product'), 'Student loan')
+
+        store_dir = self.root / 'converted'
+        self.assertEqual(convert_json_metadata(full_json, store_dir), 1)
+        self.assertEqual(load_metadata(store_dir)[0], {
+            'chunk_id': 'a_0', 'text': 'hello', 'product': 'Mortgage', 'company': 'Bank',
+            'state': 'CA', 'date': '2022-01-31',
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import tempfile
+import threading
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tests.test_reranker import FakeCrossEncoder
+from tests.test_retriever import FakeEncoder, build_store
+
+
+class FakeGenerator:
+    """Stands in for the local LLM; `load` blocks until the test releases it."""
+    release = threading.Event()
+
+    def __init__(self, *args, **kwargs):
+        self.loaded = False
+
+    def load(self):
+        FakeGenerator.release.wait(10)
+        self.loaded = True
+
+    def generate_answer(self, query, context_chunks):
+        self.load()
+        return f"{len(context_chunks)} complaints about {query}"
+
+    def generate_stream(self, query, context_chunks):
+        self.load()
+        for word in self.generate_answer(query, context_chunks).split():
+            yield word + " "
+
+
+class TestRAGPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        build_store(self.root)
+        FakeGenerator.release.clear()
+        FakeCrossEncoder.delay = 0.0
+        for target, fake in [('sentence_transformers.SentenceTransformer', FakeEncoder),
+                             ('sentence_transformers.CrossEncoder', FakeCrossEncoder),
+                             ('src.rag.pipeline.LocalComplaintGenerator', FakeGenerator)]:
+            patcher = mock.patch(target, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        FakeGenerator.release.set()
+        self.tmp.cleanup()
+
+    def test_retrieval_works_before_llm_is_ready(self):
+        from src.rag.pipeline import RAGPipeline
+        rag = RAGPipeline(self.root)
+
+        self.assertEqual(len(rag.search('escrow fees', top_k=3)), 3)
+        self.assertTrue(rag.wait_until_ready('encoder', 'index', 'metadata', timeout=10))
+        self.assertTrue(rag.retrieval_ready)
+        self.assertFalse(rag.is_ready('generator'))
+        self.assertEqual(rag.status()['generator']['state'], 'loading')
+
+        FakeGenerator.release.set()
+        self.assertTrue(rag.wait_until_ready(timeout=10))
+        self.assertEqual(set(rag.load_timings()), {'encoder', 'index', 'metadata', 'generator'})
+
+    def test_query_stream_yields_sources_then_tokens(self):
+        from src.rag.pipeline import RAGPipeline
+        FakeGenerator.release.set()
+        rag = RAGPipeline(self.root, background_load=False)
+
+        events = list(rag.query_stream('card fees'))
+        self.assertEqual(events[0]['type'], 'sources')
+        self.assertEqual(len(events[0]['source_documents']), 5)
+        self.assertTrue(all(e['type'] == 'token' for e in events[1:-1]))
+        self.assertEqual(events[-1]['type'], 'done')
+        self.assertEqual(events[-1]['answer'], '5 complaints about card fees')
+        self.assertEqual(set(events[-1]['timings']), {'retrieve', 'context', 'generate'})
+        self.assertEqual(events[-1]['context_report']['kept'], [d['chunk_id'] for d in events[0]['source_documents']])
+        self.assertEqual(rag.query('card fees')['answer'], '5 complaints about card fees')
+
+    def test_rerank_stage_picks_context_and_records_timings(self):
+        from src.rag.pipeline import RAGPipeline
+        FakeGenerator.release.set()
+        rag = RAGPipeline(self.root, background_load=False, rerank=True, rerank_candidates=30)
+
+        dense = rag.retriever.search('escrow', top_k=30)
+        result = rag.query('escrow')
+        best = max(dense, key=lambda r: r['text'].split().count('escrow'))
+        self.assertEqual(len(result['source_documents']), 5)
+        self.assertEqual(result['source_documents'][0]['rerank_score'], best['text'].split().count('escrow'))
+        self.assertEqual(set(result['timings']), {'retrieve', 'rerank', 'rerank_timed_out', 'context', 'generate'})
+        self.assertFalse(result['timings']['rerank_timed_out'])
+
+        # Over budget: the dense top 5 go to the LLM unchanged
+        rag.reranker.time_budget = 0.0
+        rag.reranker.batch_size = 5
+        FakeCrossEncoder.delay = 0.01
+        result = rag.query('escrow')
+        self.assertTrue(result['timings']['rerank_timed_out'])
+        self.assertEqual([r['chunk_id'] for r in result['source_documents']],
+                         [r['chunk_id'] for r in dense[:5]])
+
+    def test_batch_generation_routes_answers_through_the_scheduler(self):
+        from src.rag.pipeline import RAGPipeline
+        FakeGenerator.release.set()
+
+        class FakeScheduler:
+            def __init__(self, generator, max_batch_size, max_queue):
+                self.generator, self.max_batch_size, self.asked = generator, max_batch_size, []
+
+            def generate_answer(self, query, context_chunks):
+                self.asked.append(query)
+                return self.generator.generate_answer(query, context_chunks)
+
+            def generate_stream(self, query, context_chunks):
+                self.asked.append(query)
+                yield from self.generator.generate_stream(query, context_chunks)
+
+        with mock.patch('src.rag.pipeline.ContinuousBatchScheduler', FakeScheduler):
+            rag = RAGPipeline(self.root, background_load=False, batch_generation=True, max_batch_size=3)
+        self.assertIs(rag.scheduler.generator, rag.generator)
+        self.assertEqual(rag.scheduler.max_batch_size, 3)
+        self.assertEqual(rag.query('card fees')['answer'], '5 complaints about card fees')
+        self.assertEqual(list(rag.query_stream('escrow'))[-1]['answer'], '5 complaints about escrow')
+        self.assertEqual(rag.scheduler.asked, ['card fees', 'escrow'])
+
+    def test_import_is_cheap(self):
+        import subprocess
+        code = ("import sys, src.rag, src.rag.pipeline; "
+                "print(sorted(m for m in ('faiss', 'torch', 'transformers') if m in sys.modules))")
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                             cwd=Path(__file__).parent.parent, check=True).stdout
+        self.assertEqual(out.strip(), '[]')
+
+
+if __name__ == "__main__":
+    unittest.main()
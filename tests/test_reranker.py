@@ -0,0 +1,74 @@
+import time
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.reranker import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how often the chunk repeats the question's words."""
+    delay = 0.0
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        FakeCrossEncoder.calls += 1
+        time.sleep(FakeCrossEncoder.delay)
+        return [sum(text.split().count(word) for word in query.split()) for query, text in pairs]
+
+
+def candidates(texts):
+    return [{'text': text, 'chunk_id': f'{i}_0', 'product': 'Mortgage', 'score': 1.0 / (i + 1)}
+            for i, text in enumerate(texts)]
+
+
+class TestCrossEncoderReranker(unittest.TestCase):
+    def setUp(self):
+        FakeCrossEncoder.delay = 0.0
+        FakeCrossEncoder.calls = 0
+        patcher = mock.patch('sentence_transformers.CrossEncoder', FakeCrossEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reorders_and_keeps_top_k(self):
+        reranker = CrossEncoderReranker(batch_size=2)
+        docs = candidates(['card fees', 'escrow', 'escrow escrow escrow', 'escrow escrow', 'loan'])
+        results, info = reranker.rerank('escrow', docs, top_k=3)
+
+        self.assertEqual([r['chunk_id'] for r in results], ['2_0', '3_0', '1_0'])
+        self.assertEqual([r['rerank_score'] for r in results], [3, 2, 1])
+        self.assertEqual(results[0]['score'], docs[2]['score'])  # retriever score is kept
+        self.assertEqual(info['scored'], 5)
+        self.assertTrue(info['reranked'])
+        self.assertEqual(FakeCrossEncoder.calls, 3)
+
+    def test_budget_exceeded_falls_back_to_dense_order(self):
+        reranker = CrossEncoderReranker(batch_size=2, time_budget=0.01)
+        FakeCrossEncoder.delay = 0.02
+        docs = candidates(['card fees', 'escrow', 'escrow escrow escrow', 'escrow escrow', 'loan'])
+        results, info = reranker.rerank('escrow', docs, top_k=3)
+
+        self.assertEqual(results, docs[:3])
+        self.assertTrue(info['timed_out'])
+        self.assertEqual(info['scored'], 2)  # stopped after the first batch
+
+        results, info = reranker.rerank('escrow', docs, top_k=3, time_budget=10.0)
+        self.assertTrue(info['reranked'])
+        self.assertEqual(results[0]['chunk_id'], '2_0')
+
+    def test_loads_lazily(self):
+        reranker = CrossEncoderReranker(defer_loading=True)
+        self.assertFalse(reranker.is_loaded)
+        reranker.rerank('escrow', candidates(['escrow']), top_k=1)
+        self.assertTrue(reranker.is_loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import faiss
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.index_factory import build_index, train_index
+from src.rag.lexical import build_lexical_index
+from src.rag.metadata_store import MetadataStore, MetadataWriter
+
+DIM = 26
+
+
+class FakeEncoder:
+    """Letter-frequency 'embeddings' so tests run without downloading a model."""
+    encoded = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        FakeEncoder.encoded += len(texts)
+        vectors = np.zeros((len(texts), DIM), dtype='float32')
+        for row, text in enumerate(texts):
+            for ch in text.lower():
+                if 'a' <= ch <= 'z':
+                    vectors[row, ord(ch) - ord('a')] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-6)
+
+
+def build_store(store_dir: Path, n: int = 600, index_type: str = 'flat'):
+    """Write a synthetic vector store: one rare product, many common ones."""
+    rng = np.random.default_rng(1)
+    words = ['fees', 'escrow', 'collector', 'loan', 'card', 'interest', 'payment', 'fraud']
+    texts = [' '.join(rng.choice(words, size=6)) for _ in range(n)]
+    products = ['Vehicle loan or lease' if i % 100 == 0 else ('Credit card' if i % 2 else 'Mortgage')
+                for i in range(n)]
+    dates = [f'20{20 + i % 4}-0{1 + i % 9}-15' for i in range(n)]
+    states = ['CA' if i % 3 == 0 else 'NY' for i in range(n)]
+
+    vectors = FakeEncoder().encode(texts)
+    index = build_index(index_type, DIM, nlist=8, nprobe=1)
+    train_index(index, vectors)
+    index.add(vectors)
+    faiss.write_index(index, str(store_dir / 'medium_faiss_index.index'))
+
+    with MetadataWriter(store_dir / 'medium_metadata_store') as writer:
+        writer.append_batch(
+            chunk_id=[f'{i}_0' for i in range(n)],
+            text=texts,
+            product=products,
+            company=['Bank A' if i % 5 else 'Lender B' for i in range(n)],
+            state=states,
+            date=dates,
+        )
+    return texts, products, states, dates
+
+
+class TestComplaintRetriever(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        patcher = mock.patch('sentence_transformers.SentenceTransformer', FakeEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _retriever(self, **kwargs):
+        from src.rag.retriever import ComplaintRetriever
+        return ComplaintRetriever(self.root, **kwargs)
+
+    def test_unfiltered_search_matches_exact_neighbours(self):
+        texts, *_ = build_store(self.root)
+        retriever = self._retriever()
+        results = retriever.search(texts[7], top_k=3)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['text'], texts[7])
+        self.assertAlmostEqual(results[0]['score'], 1.0, places=4)
+
+    def test_rare_product_filter_returns_full_results(self):
+        _, products, _, _ = build_store(self.root)
+        retriever = self._retriever()
+        results = retriever.search('card fees', top_k=5, product_filter='vehicle loan')
+        # 6 rows carry the rare product; over-fetching 25 neighbours used to miss most of them
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r['product'] == 'Vehicle loan or lease' for r in results))
+
+    def test_combined_filters(self):
+        _, products, states, dates = build_store(self.root)
+        retriever = self._retriever()
+        results = retriever.search('escrow payment', top_k=50, filters={
+            'product': 'Mortgage', 'state': 'CA', 'date_from': '2021-01-01', 'date_to': '2021-12-31',
+        })
+        expected = {f'{i}_0' for i in range(len(products))
+                    if products[i] == 'Mortgage' and states[i] == 'CA' and dates[i].startswith('2021')}
+        self.assertEqual({r['chunk_id'] for r in results}, expected)
+
+        self.assertEqual(retriever.search('escrow', filters={'product': 'Payday loan'}), [])
+        with self.assertRaises(ValueError):
+            retriever.search('escrow', filters={'zip': '90210'})
+        with self.assertRaises(ValueError):  # not silently read as an open-ended range
+            retriever.search('escrow', filters={'date_from': 'last spring'})
+
+    def test_search_batch_matches_single_queries(self):
+        texts, *_ = build_store(self.root)
+        retriever = self._retriever()
+        queries = [texts[3], 'escrow escrow', 'collector fraud', texts[3]]
+        filters = [None, {'product': 'Mortgage'}, {'state': 'CA'}, {'product': 'vehicle'}]
+
+        batch = retriever.search_batch(queries, top_k=4, filters=filters)
+        self.assertEqual(len(batch), len(queries))
+        for query, query_filters, results in zip(queries, filters, batch):
+            self.assertEqual(results, retriever.search(query, top_k=4, filters=query_filters))
+        self.assertEqual(retriever.search_batch([]), [])
+
+    def test_filter_cache_is_safe_across_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from src.rag.filters import FilterIndex
+
+        build_store(self.root)
+        filter_index = FilterIndex(MetadataStore(self.root / 'medium_metadata_store'), cache_size=2)
+        filters = [{'product': product, 'state': state} for product in ('Mortgage', 'Credit card', 'vehicle')
+                   for state in ('CA', 'NY')]
+        expected = [filter_index.select(f).count for f in filters]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            counts = list(pool.map(lambda i: filter_index.select(filters[i % len(filters)]).count, range(2000)))
+        self.assertEqual(counts, [expected[i % len(filters)] for i in range(2000)])
+
+    def test_query_and_result_caches(self):
+        texts, *_ = build_store(self.root)
+        retriever = self._retriever()
+        FakeEncoder.encoded = 0
+
+        first = retriever.search('Escrow  payment fees', top_k=3)
+        first[0]['text'] = 'mutated by caller'
+        second = retriever.search('escrow payment FEES', top_k=3)
+        self.assertEqual(FakeEncoder.encoded, 1)
+        self.assertNotEqual(second[0]['text'], 'mutated by caller')
+        stats = retriever.cache_stats()
+        self.assertEqual((stats['embedding']['hits'], stats['result']['hits']), (1, 1))
+
+        # A different top_k or filter is a different result entry but the same embedding
+        retriever.search('escrow payment fees', top_k=3, product_filter='Mortgage')
+        self.assertEqual(FakeEncoder.encoded, 1)
+        self.assertEqual(retriever.cache_stats()['result']['misses'], 2)
+
+    def test_index_rebuild_invalidates_results(self):
+        texts, *_ = build_store(self.root)
+        retriever = self._retriever()
+        retriever.search(texts[0], top_k=1)
+        retriever.search(texts[1], top_k=1)
+        self.assertEqual(retriever.cache_stats()['result']['size'], 2)
+
+        # Rebuild the store with different content; the next search must see it
+        build_store(self.root, n=50)
+        retriever.search(texts[0], top_k=1)
+        self.assertEqual(len(retriever.metadata), 50)
+        self.assertEqual(retriever.cache_stats()['result']['size'], 1)
+
+    def test_caching_can_be_disabled(self):
+        build_store(self.root)
+        retriever = self._retriever(cache_size=0)
+        FakeEncoder.encoded = 0
+        retriever.search('fraud', top_k=2)
+        retriever.search('fraud', top_k=2)
+        self.assertEqual(FakeEncoder.encoded, 2)
+
+    def test_filtered_search_on_ivf_is_complete(self):
+        build_store(self.root, n=2000, index_type='ivf_flat')
+        retriever = self._retriever()
+        self.assertEqual(retriever.index_type, 'ivf')
+        # Force the selector path rather than the exact small-subset path
+        retriever.EXACT_FILTER_LIMIT = 0
+        results = retriever.search('fraud', top_k=10, product_filter='Credit card', nprobe=1)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(r['product'] == 'Credit card' for r in results))
+
+    def test_ivf_direct_map_is_built_at_load_not_during_search(self):
+        build_store(self.root, n=2000, index_type='ivf_flat')
+        retriever = self._retriever()
+        ivf = faiss.extract_index_ivf(retriever.index)
+        self.assertNotEqual(ivf.direct_map.type, faiss.DirectMap.NoMap)
+        with mock.patch.object(faiss.IndexIVF, 'make_direct_map', side_effect=AssertionError("built on search")):
+            results = retriever.search('fraud', top_k=3, product_filter='Vehicle loan')
+        self.assertEqual(len(results), 3)
+
+    def test_lexical_and_hybrid_modes(self):
+        texts, products, *_ = build_store(self.root)
+        retriever = self._retriever()
+        with self.assertRaises(FileNotFoundError):
+            retriever.search('escrow', mode='hybrid')
+        with self.assertRaises(ValueError):
+            retriever.search('escrow', mode='sparse')
+
+        build_lexical_index(MetadataStore(self.root / 'medium_metadata_store'), self.root / 'medium_lexical_index')
+        FakeEncoder.encoded = 0
+        lexical = retriever.search('escrow', top_k=5, mode='lexical', product_filter='Mortgage')
+        self.assertEqual(FakeEncoder.encoded, 0)  # BM25 needs no query embedding
+        self.assertEqual(len(lexical), 5)
+        self.assertTrue(all('escrow' in r['text'] and r['product'] == 'Mortgage' for r in lexical))
+
+        dense = retriever.search(texts[7], top_k=retriever.HYBRID_DEPTH)
+        hybrid = retriever.search(texts[7], top_k=5, mode='hybrid')
+        self.assertEqual(len(hybrid), 5)
+        # Row 7 tops the dense ranking and shares every term with the query
+        self.assertEqual(hybrid[0]['chunk_id'], '7_0')
+        lexical_ids = {r['chunk_id'] for r in retriever.search(texts[7], top_k=retriever.HYBRID_DEPTH, mode='lexical')}
+        dense_ids = {r['chunk_id'] for r in dense}
+        self.assertTrue({r['chunk_id'] for r in hybrid} <= lexical_ids | dense_ids)
+        self.assertTrue(all(a['score'] >= b['score'] for a, b in zip(hybrid, hybrid[1:])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.local_generator import LocalComplaintGenerator
+from src.rag.scheduler import ContinuousBatchScheduler, SchedulerBusy, SchedulerClosed
+from tests.test_local_generator import CONTEXT, GREEDY, build_tiny_model
+
+QUESTIONS = [f"Question {i} about {'late fees ' * i}?" for i in range(6)]
+
+
+class TestContinuousBatchScheduler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.model_dir = model_dir = Path(cls.tmp.name) / 'tiny'
+        build_tiny_model(model_dir)
+        cls.generator = LocalComplaintGenerator(str(model_dir), backend='fp32',
+                                                generation_kwargs=dict(GREEDY, max_new_tokens=16))
+        # Prompts of different lengths, so the batch needs padding
+        cls.contexts = [CONTEXT[:1 + i % 2] for i in range(len(QUESTIONS))]
+        cls.expected = [cls.generator.generate_answer(q, c) for q, c in zip(QUESTIONS, cls.contexts)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.scheduler = ContinuousBatchScheduler(self.generator, max_batch_size=4)
+        self.addCleanup(self.scheduler.close)
+
+    def test_concurrent_answers_match_sequential_generation(self):
+        answers = [None] * len(QUESTIONS)
+
+        def ask(i):
+            answers[i] = self.scheduler.generate_answer(QUESTIONS[i], self.contexts[i])
+
+        threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(QUESTIONS))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        self.assertEqual(answers, self.expected)
+
+        metrics = self.scheduler.metrics()
+        self.assertEqual(metrics['completed'], len(QUESTIONS))
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['active'], 0)
+        self.assertLessEqual(metrics['peak_batch_size'], 4)
+        self.assertGreater(metrics['mean_batch_size'], 1.0)
+
+    def test_async_stream(self):
+        async def collect():
+            request = self.scheduler.submit(QUESTIONS[1], self.contexts[1])
+            return "".join([text async for text in request]).strip(), request.stats
+
+        answer, stats = asyncio.run(collect())
+        self.assertEqual(answer, self.expected[1])
+        self.assertEqual(stats['new_tokens'], 16)
+        self.assertGreater(stats['tokens_per_s'], 0)
+
+    def test_abandoned_stream_frees_its_slot(self):
+        stream = self.scheduler.generate_stream(QUESTIONS[0], self.contexts[0])
+        next(stream)
+        stream.close()
+        deadline = time.monotonic() + 10
+        while self.scheduler.metrics()['cancelled'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.scheduler.metrics()['cancelled'], 1)
+        self.assertEqual(self.scheduler.generate_answer(QUESTIONS[2], self.contexts[2]), self.expected[2])
+
+    def test_admission_control(self):
+        full = ContinuousBatchScheduler(self.generator, max_queue=0)
+        self.addCleanup(full.close)
+        with self.assertRaises(SchedulerBusy):
+            full.submit(QUESTIONS[0], CONTEXT)
+        self.assertEqual(full.metrics()['rejected'], 1)
+
+    def test_close_ends_every_request(self):
+        scheduler = ContinuousBatchScheduler(self.generator, max_batch_size=1)
+        requests = [scheduler.submit(q, c) for q, c in zip(QUESTIONS[:4], self.contexts)]
+        scheduler.close()
+        outcomes = []
+
+        def consume(request):
+            try:
+                outcomes.append(request.result())
+            except SchedulerClosed as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=consume, args=(r,), daemon=True) for r in requests]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(len(outcomes), len(requests))  # nobody is left waiting for tokens
+        self.assertTrue(any(isinstance(outcome, SchedulerClosed) for outcome in outcomes))
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics['cancelled'] + metrics['completed'], len(requests))
+        self.assertEqual(metrics['queue_depth'], 0)
+        with self.assertRaises(SchedulerClosed):
+            scheduler.submit(QUESTIONS[0], CONTEXT)
+
+    def test_stops_on_any_eos_token_of_the_generation_config(self):
+        generator = LocalComplaintGenerator(str(self.model_dir), backend='fp32',
+                                            generation_kwargs=dict(GREEDY, max_new_tokens=16))
+        # Like Qwen2.5's <|im_end|> / <|endoftext|>: a second end token the tokenizer doesn't know about
+        stop = generator.pipe.tokenizer.convert_tokens_to_ids(self.expected[0][4])
+        generator.pipe.model.generation_config.eos_token_id = [1, stop]
+        expected = generator.generate_answer(QUESTIONS[0], self.contexts[0])
+        self.assertLess(len(expected), len(self.expected[0]))
+
+        scheduler = ContinuousBatchScheduler(generator)
+        self.addCleanup(scheduler.close)
+        self.assertEqual(scheduler.generate_answer(QUESTIONS[0], self.contexts[0]), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
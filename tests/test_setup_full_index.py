@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.metadata_store import MetadataStore
+from src.setup_full_index import build_from_parquet, embedding_matrix, metadata_columns, parse_args
+
+DIM = 16
+
+
+def write_parquet(path: Path, n: int, fixed_size: bool, row_group_size: int = 100):
+    vectors = np.random.default_rng(5).standard_normal((n, DIM)).astype('float32')
+    flat = pa.array(vectors.ravel(), type=pa.float32())
+    embedding = (pa.FixedSizeListArray.from_arrays(flat, DIM) if fixed_size
+                 else pa.ListArray.from_arrays(pa.array(np.arange(0, n * DIM + 1, DIM, dtype='int32')), flat))
+    metadata = pa.array([{'product': 'Mortgage' if i % 2 else 'Credit card', 'company': 'Bank A',
+                          'state': 'CA', 'date_received': f'2023-01-{1 + i % 28:02d}'} for i in range(n)])
+    table = pa.table({
+        'id': [f'{i}_0' for i in range(n)],
+        'document': [f'complaint {i}' for i in range(n)],
+        'embedding': embedding,
+        'metadata': metadata,
+    })
+    pq.write_table(table, path, row_group_size=row_group_size)
+    return vectors
+
+
+class TestEmbeddingMatrix(unittest.TestCase):
+    def test_fixed_size_list_is_zero_copy(self):
+        vectors = np.arange(40, dtype='float32').reshape(10, 4)
+        column = pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), 4)
+        out = embedding_matrix(column.slice(3, 5))
+        np.testing.assert_array_equal(out, vectors[3:8])
+        self.assertFalse(out.flags.owndata)
+
+    def test_variable_list_and_float64_values(self):
+        vectors = np.arange(12, dtype='float64').reshape(4, 3)
+        column = pa.array(vectors.tolist())
+        out = embedding_matrix(column.slice(1))
+        self.assertEqual(out.dtype, np.float32)
+        np.testing.assert_array_equal(out, vectors[1:])
+
+    def test_ragged_embeddings_are_rejected(self):
+        with self.assertRaises(ValueError):
+            embedding_matrix(pa.array([[1.0, 2.0], [3.0]]))
+
+    def test_metadata_from_struct_and_json(self):
+        struct = pa.array([{'product': 'Mortgage', 'date': '2023-01-02'}])
+        self.assertEqual(metadata_columns(struct),
+                         {'product': ['Mortgage'], 'company': [None], 'state': [None], 'date': ['2023-01-02']})
+        strings = pa.array(['{"product": "Mortgage", "date_received": "2023-05-06"}', None])
+        self.assertEqual(metadata_columns(strings)['date'], ['2023-05-06', None])
+
+
+class TestBuildFromParquet(unittest.TestCase):
+    def _build(self, fixed_size: bool, *argv):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            vectors = write_parquet(root / 'emb.parquet', 500, fixed_size)
+            args = parse_args(['--batch-size', '64', *argv])
+            info = build_from_parquet(root / 'emb.parquet', root / 'full.index', root / 'full_store', args)
+            index = faiss.read_index(str(root / 'full.index'))
+            store = MetadataStore(root / 'full_store')
+            return vectors, info, index, store
+
+    def test_flat_index_from_fixed_size_lists(self):
+        vectors, info, index, store = self._build(True)
+        self.assertEqual(info['ntotal'], 500)
+        self.assertEqual(len(store), 500)
+        np.testing.assert_array_equal(index.reconstruct(321), vectors[321])
+        self.assertEqual(store.row(321)['chunk_id'], '321_0')
+        self.assertEqual(store.row(321)['product'], 'Mortgage')
+        self.assertEqual(store.row(321)['date'], '2023-01-14')
+
+    def test_ivf_index_from_variable_lists(self):
+        vectors, info, index, store = self._build(False, '--index-type', 'ivf_flat', '--nlist', '8',
+                                                  '--nprobe', '8', '--train-size', '300')
+        self.assertEqual(info['kind'], 'ivf')
+        self.assertEqual(index.ntotal, 500)
+        _, ids = index.search(vectors[[42]], 1)
+        self.assertEqual(store.field(int(ids[0, 0]), 'chunk_id'), '42_0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import faiss
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.filters import FilterIndex
+from src.rag.metadata_store import MetadataStore
+from src.rag.sharding import ShardedIndex, product_partition, write_shards
+from tests.test_retriever import FakeEncoder, build_store
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        patcher = mock.patch('sentence_transformers.SentenceTransformer', FakeEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.texts, self.products, _, _ = build_store(self.root)
+        self.index = faiss.read_index(str(self.root / 'medium_faiss_index.index'))
+        self.metadata = MetadataStore(self.root / 'medium_metadata_store')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_product_partition_keeps_each_product_on_one_shard(self):
+        codes = np.array([0] * 50 + [1] * 30 + [2] * 15 + [3] * 5 + [-1] * 3)
+        assignment, shard_products = product_partition(codes, ['a', 'b', 'c', 'd'], 2)
+        for code in range(4):
+            self.assertEqual(len(set(assignment[codes == code])), 1)
+        self.assertEqual(sorted(sum(shard_products, [])), ['a', 'b', 'c', 'd'])
+        self.assertEqual(sorted(np.bincount(assignment)), [50, 53])  # largest first onto the emptiest shard
+
+    def test_sharded_search_matches_the_single_index(self):
+        manifest = write_shards(self.index, self.metadata, self.root / 'medium_shards', 3)
+        self.assertEqual(sum(shard['count'] for shard in manifest['shards']), len(self.metadata))
+        rows = np.concatenate([np.load(self.root / 'medium_shards' / f"{shard['name']}.npy")
+                               for shard in manifest['shards']])
+        np.testing.assert_array_equal(np.sort(rows), np.arange(len(self.metadata)))
+
+        queries = FakeEncoder().encode(['escrow fees', 'card fraud', 'collector loan payment'])
+        selection = FilterIndex(self.metadata).select({'product': 'Vehicle loan'})
+        with ShardedIndex(self.root / 'medium_shards') as sharded:
+            self.assertEqual(sharded.info['shards'], 3)
+            distances, ids = sharded.search(queries, 10)
+            expected_d, _ = self.index.search(queries, 10)
+            np.testing.assert_allclose(distances, expected_d, rtol=1e-5)
+            nearest = self.index.reconstruct_batch(ids[:, 0])
+            np.testing.assert_allclose(distances[:, 0], ((nearest - queries) ** 2).sum(axis=1), rtol=1e-5, atol=1e-6)
+
+            _, ids = sharded.search(queries, 10, selection=selection)
+            self.assertEqual(ids.shape, (3, selection.count))  # only 6 rows match
+            for row in ids:
+                self.assertEqual(set(row), set(selection.ids))
+
+    def test_product_filters_skip_other_shards_and_failed_sends_are_drained(self):
+        manifest = write_shards(self.index, self.metadata, self.root / 'medium_shards', 2, partition='product')
+        owned = manifest['shards'][0]['products']
+        filter_index = FilterIndex(self.metadata)
+        selection = filter_index.select({'product': owned})
+        queries = FakeEncoder().encode(['escrow fees', 'card fraud'])
+        expected_d, expected_i = self.index.search(queries, 5, params=faiss.SearchParameters(sel=selection.selector()))
+        with ShardedIndex(self.root / 'medium_shards') as sharded:
+            self.assertEqual(sharded.shards_for(owned), [0])
+            self.assertEqual(sharded.shards_for(['No such product']), [])
+            self.assertEqual(sharded.shards_for(None), [0, 1])
+
+            process, _ = sharded._workers[1]
+            process.kill()
+            process.join()
+            # The dead shard holds none of the selected products, so it isn't asked
+            distances, ids = sharded.search(queries, 5, selection=selection, products=owned)
+            np.testing.assert_array_equal(ids, expected_i)
+            np.testing.assert_allclose(distances, expected_d, rtol=1e-5)
+
+            with self.assertRaises(RuntimeError):
+                sharded.search(FakeEncoder().encode(['collector loan payment']), 5)
+            # Shard 0 answered the failed search too; that reply must not be taken for this one
+            _, ids = sharded.search(queries, 5, selection=selection, products=owned)
+            np.testing.assert_array_equal(ids, expected_i)
+
+    def test_retriever_on_a_product_partitioned_index(self):
+        from src.rag.retriever import ComplaintRetriever
+
+        write_shards(self.index, self.metadata, self.root / 'medium_shards', 2, partition='product')
+        manifest = json.loads((self.root / 'medium_shards' / 'manifest.json').read_text())
+        self.assertEqual(sorted(sum((shard['products'] for shard in manifest['shards']), [])),
+                         sorted(set(self.products)))
+
+        single = ComplaintRetriever(self.root)
+        sharded = ComplaintRetriever(self.root, sharded=True)
+        self.addCleanup(sharded.close)
+        self.assertEqual(sharded.index_info['shards'], 2)
+        for query, filters in [('escrow fees', None), ('card fraud interest', {'product': 'Credit card'}),
+                               ('loan payment', {'product': 'Vehicle loan', 'date_from': '2021-01-01'})]:
+            expected = single.search(query, top_k=5, filters=filters)
+            results = sharded.search(query, top_k=5, filters=filters)
+            self.assertEqual([r['score'] for r in results], [r['score'] for r in expected])
+
+        # Incremental updates sit on top of the shards
+        sharded.add_chunks([{'chunk_id': 'new_0', 'text': 'zebra quiz jazz', 'product': 'Mortgage'}])
+        self.assertEqual(sharded.search('zebra quiz jazz', top_k=1)[0]['chunk_id'], 'new_0')
+        top = sharded.search('escrow fees', top_k=1)[0]['chunk_id']
+        sharded.delete_chunks([top])
+        self.assertNotIn(top, [r['chunk_id'] for r in sharded.search('escrow fees', top_k=10)])
+        with self.assertRaises(ValueError):
+            sharded.compact()
+
+
+if __name__ == '__main__':
+    unittest.main()
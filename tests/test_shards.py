@@ -0,0 +1,97 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.index_builder import IndexBuilder
+from src.rag.metadata_store import MetadataStore
+from src.rag.shards import ShardLog, compact
+
+
+def make_batch(start: int, n: int, dim: int = 8):
+    vectors = np.random.default_rng(start).standard_normal((n, dim)).astype('float32')
+    rows = [{'chunk_id': f'{i}_0', 'text': f'complaint {i}', 'product': 'Mortgage'} for i in range(start, start + n)]
+    return vectors, rows
+
+
+class TestShardLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume_reads_offset_from_manifest(self):
+        log = ShardLog(self.root / 'shards')
+        log.append(*make_batch(0, 10))
+        log.append(*make_batch(10, 5))
+
+        resumed = ShardLog(self.root / 'shards')
+        self.assertEqual(resumed.count, 15)
+        self.assertEqual(resumed.input_offset, 15)
+        self.assertEqual(len(resumed), 2)
+        self.assertEqual(resumed.dimension, 8)
+
+    def test_uncommitted_segment_is_ignored_and_overwritten(self):
+        log = ShardLog(self.root / 'shards')
+        log.append(*make_batch(0, 10))
+        # Simulate a crash after the segment files were written but before the manifest was
+        np.save(self.root / 'shards' / 'seg-00001.npy', np.zeros((3, 8), dtype='float32'))
+        (self.root / 'shards' / 'seg-00001.jsonl').write_text('{"chunk_id": "junk"}\n')
+
+        resumed = ShardLog(self.root / 'shards')
+        self.assertEqual(resumed.count, 10)
+        resumed.append(*make_batch(10, 4))
+        segments = list(ShardLog(self.root / 'shards').segments())
+        self.assertEqual([len(rows) for _, rows in segments], [10, 4])
+        self.assertEqual(segments[1][1][0]['chunk_id'], '10_0')
+
+    def test_rejects_mismatched_batches(self):
+        log = ShardLog(self.root / 'shards')
+        vectors, rows = make_batch(0, 4)
+        with self.assertRaises(ValueError):
+            log.append(vectors, rows[:3])
+        log.append(vectors, rows)
+        with self.assertRaises(ValueError):
+            log.append(np.zeros((2, 4), dtype='float32'), rows[:2])
+
+    def test_sample_draws_from_all_segments(self):
+        log = ShardLog(self.root / 'shards')
+        batches = [make_batch(start, 20) for start in (0, 20, 40)]
+        for vectors, rows in batches:
+            log.append(vectors, rows)
+        sample = log.sample(30)
+        everything = np.concatenate([vectors for vectors, _ in batches])
+        self.assertEqual(sample.shape, (30, 8))
+        for row in sample:
+            self.assertTrue(np.any(np.all(everything == row, axis=1)))
+        self.assertEqual(len(log.sample(1000)), 60)
+
+    def test_compact_into_serving_index(self):
+        log = ShardLog(self.root / 'shards')
+        batches = [make_batch(start, 25) for start in (0, 25, 50)]
+        for vectors, rows in batches:
+            log.append(vectors, rows)
+
+        builder = IndexBuilder(self.root / 'x.index', self.root / 'x_store', 8)
+        info = compact(log, builder, {'chunk_id': 'chunk_id', 'text': 'text', 'product': 'product'})
+
+        self.assertEqual(info['ntotal'], 75)
+        index = faiss.read_index(str(self.root / 'x.index'))
+        store = MetadataStore(self.root / 'x_store')
+        np.testing.assert_array_equal(index.reconstruct(30), batches[1][0][5])
+        self.assertEqual(store.field(30, 'chunk_id'), '30_0')
+        with open(self.root / 'shards' / 'manifest.json') as f:
+            self.assertEqual(json.load(f)['count'], 75)
+
+
+if __name__ == '__main__':
+    unittest.main()
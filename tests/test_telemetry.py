@@ -0,0 +1,112 @@
+import io
+import json
+import logging
+import threading
+import unittest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.telemetry import (MetricsRegistry, configure_logging, current_trace_id, get_logger, timed, trace,
+                               STAGE_SECONDS)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_histogram_quantiles_and_buckets(self):
+        hist = self.registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.01, 0.1, 1.0))
+        for ms in range(1, 101):
+            hist.observe(ms / 1000, stage='faiss')
+        summary = hist.quantiles(stage='faiss')
+        self.assertEqual(summary['count'], 100)
+        self.assertAlmostEqual(summary['mean'], 0.0505)
+        self.assertEqual((summary['p50'], summary['p95'], summary['p99']), (0.05, 0.095, 0.099))
+        self.assertEqual(hist.quantiles(stage='encode'), {'count': 0})
+
+        text = self.registry.render_prometheus()
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{stage="faiss",le="0.01"} 10', text)
+        self.assertIn('latency_seconds_bucket{stage="faiss",le="0.1"} 100', text)
+        self.assertIn('latency_seconds_bucket{stage="faiss",le="+Inf"} 100', text)
+        self.assertIn('latency_seconds_count{stage="faiss"} 100', text)
+
+    def test_counters_gauges_and_labels(self):
+        counter = self.registry.counter('rag_things_total', 'Things', ('kind',))
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        self.assertEqual(counter.value(kind='a'), 3)
+        with self.assertRaises(ValueError):
+            counter.inc(colour='red')
+        self.assertIs(self.registry.counter('rag_things_total', 'Things', ('kind',)), counter)
+        with self.assertRaises(ValueError):
+            self.registry.gauge('rag_things_total', 'Things')
+
+        self.registry.gauge('queue_depth', 'Depth').set(4)
+        text = self.registry.render_prometheus()
+        self.assertIn('rag_things_total{kind="a"} 3', text)
+        self.assertIn('queue_depth 4', text)
+        self.assertEqual(self.registry.snapshot()['queue_depth'], {'': 4})
+
+    def test_timed_records_the_stage(self):
+        before = STAGE_SECONDS.quantiles(stage='unit_test').get('count', 0)
+        timings = {}
+        with timed('unit_test', timings):
+            pass
+        self.assertEqual(STAGE_SECONDS.quantiles(stage='unit_test')['count'], before + 1)
+        self.assertIn('unit_test', timings)
+
+
+class TestLoggingAndTracing(unittest.TestCase):
+    def tearDown(self):
+        configure_logging('INFO', 'text')
+
+    def _capture(self, fmt):
+        logger = configure_logging('DEBUG', fmt)
+        stream = io.StringIO()
+        logger.handlers[0].setStream(stream)
+        return stream
+
+    def test_trace_ids_nest_and_stay_per_thread(self):
+        self.assertIsNone(current_trace_id())
+        with trace() as outer:
+            with trace() as inner:
+                self.assertEqual(inner, outer)
+            seen = []
+            thread = threading.Thread(target=lambda: seen.append(current_trace_id()))
+            thread.start()
+            thread.join()
+            self.assertEqual(seen, [None])
+        with trace('req-1') as explicit:
+            self.assertEqual(explicit, 'req-1')
+
+    def test_json_logs_carry_trace_id_and_fields(self):
+        stream = self._capture('json')
+        with trace('abc123'):
+            get_logger('test').info("⏱️ [Test] done", extra={'stage': 'faiss', 'seconds': 0.5})
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry['message'], "⏱️ [Test] done")
+        self.assertEqual(entry['logger'], 'rag.test')
+        self.assertEqual(entry['trace_id'], 'abc123')
+        self.assertEqual((entry['stage'], entry['seconds']), ('faiss', 0.5))
+
+    def test_text_logs_and_levels(self):
+        stream = self._capture('text')
+        get_logger('test').info("plain")
+        with trace('t1'):
+            get_logger('test').info("traced")
+        self.assertEqual(stream.getvalue().splitlines(), ["plain", "traced [t1]"])
+
+        configure_logging('WARNING', 'text').handlers[0].setStream(stream)
+        get_logger('test').info("hidden")
+        self.assertNotIn("hidden", stream.getvalue())
+        with self.assertRaises(ValueError):
+            configure_logging('INFO', 'xml')
+        self.assertEqual(logging.getLogger('rag').level, logging.WARNING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import json
+import tempfile
+import threading
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+import faiss
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.rag.lexical import build_lexical_index
+from src.rag.metadata_store import MetadataStore
+from src.rag.updates import finish_compaction, journal_path
+from tests.test_retriever import FakeEncoder, build_store
+
+
+class TestIncrementalUpdates(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        patcher = mock.patch('sentence_transformers.SentenceTransformer', FakeEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.texts, self.products, _, _ = build_store(self.root, index_type='hnsw')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _retriever(self, **kwargs):
+        from src.rag.retriever import ComplaintRetriever
+        return ComplaintRetriever(self.root, **kwargs)
+
+    def test_added_chunks_are_searchable_and_replace_older_copies(self):
+        retriever = self._retriever()
+        retriever.search('zebra quiz', top_k=3)  # cached before the add
+        retriever.add_chunks([
+            {'chunk_id': 'new_0', 'text': 'zebra quiz jazz', 'product': 'Student loan', 'date': '2024-05-01'},
+            {'chunk_id': '5_0', 'text': 'zebra quiz jazz fuzz', 'product': 'Mortgage'},
+        ])
+
+        results = retriever.search('zebra quiz jazz', top_k=3)
+        self.assertEqual(results[0]['chunk_id'], 'new_0')
+        self.assertEqual(results[1]['chunk_id'], '5_0')
+        self.assertEqual(results[1]['text'], 'zebra quiz jazz fuzz')  # the delta copy, not the original
+        chunk_ids = [r['chunk_id'] for r in retriever.search(self.texts[5], top_k=20)]
+        self.assertEqual(chunk_ids.count('5_0'), 0)
+
+        filtered = retriever.search('zebra quiz jazz', top_k=2, filters={'product': 'student'})
+        self.assertEqual([r['chunk_id'] for r in filtered], ['new_0'])
+        dated = retriever.search('zebra quiz jazz', top_k=1, filters={'date_from': '2024-01-01'})
+        self.assertEqual(dated[0]['chunk_id'], 'new_0')
+
+        # The delta is persisted and picked up by the next retriever
+        reopened = self._retriever()
+        self.assertEqual(reopened.search('zebra quiz jazz', top_k=1)[0]['chunk_id'], 'new_0')
+
+    def test_added_chunks_are_found_by_lexical_and_hybrid_search(self):
+        build_lexical_index(MetadataStore(self.root / 'medium_metadata_store'), self.root / 'medium_lexical_index')
+        retriever = self._retriever()
+        retriever.add_chunks([{'chunk_id': 'new_0', 'text': 'escrow zebra', 'product': 'Student loan'},
+                              {'chunk_id': 'new_1', 'text': 'zebra zebra zebra', 'product': 'Mortgage'}])
+
+        lexical = retriever.search('zebra', top_k=3, mode='lexical')
+        self.assertEqual([r['chunk_id'] for r in lexical], ['new_1', 'new_0'])
+        filtered = retriever.search('zebra', top_k=3, mode='lexical', filters={'product': 'student'})
+        self.assertEqual([r['chunk_id'] for r in filtered], ['new_0'])
+        hybrid = retriever.search('zebra', top_k=3, mode='hybrid')
+        self.assertIn('new_1', [r['chunk_id'] for r in hybrid])
+
+        retriever.delete_chunks(['new_1'])
+        self.assertEqual([r['chunk_id'] for r in retriever.search('zebra', top_k=3, mode='lexical')], ['new_0'])
+
+    def test_deleted_chunks_disappear_from_every_mode(self):
+        build_lexical_index(MetadataStore(self.root / 'medium_metadata_store'), self.root / 'medium_lexical_index')
+        retriever = self._retriever()
+        top = retriever.search(self.texts[7], top_k=1)[0]['chunk_id']
+        self.assertEqual(retriever.delete_chunks([top, 'missing_0']), 1)
+
+        for mode in ('dense', 'lexical', 'hybrid'):
+            chunk_ids = [r['chunk_id'] for r in retriever.search(self.texts[7], top_k=10, mode=mode)]
+            self.assertNotIn(top, chunk_ids)
+            self.assertEqual(len(chunk_ids), 10)
+        filtered = retriever.search(self.texts[7], top_k=5, filters={'product': self.products[int(top[:-2])]})
+        self.assertNotIn(top, [r['chunk_id'] for r in filtered])
+
+        # Deleting, then adding again, survives a restart in that order
+        retriever.add_chunks([{'chunk_id': top, 'text': 'zebra quiz jazz'}])
+        self.assertEqual(self._retriever().search('zebra quiz jazz', top_k=1)[0]['chunk_id'], top)
+        self.assertEqual(retriever.delete_complaints(['1', '2']), 2)
+        self.assertNotIn('1_0', [r['chunk_id'] for r in self._retriever().search(self.texts[1], top_k=10)])
+
+    def test_compaction_folds_the_delta_into_the_main_index(self):
+        build_lexical_index(MetadataStore(self.root / 'medium_metadata_store'), self.root / 'medium_lexical_index')
+        retriever = self._retriever()
+        retriever.delete_chunks(['3_0', '4_0'])
+        retriever.add_chunks([{'chunk_id': 'new_0', 'text': 'zebra quiz jazz', 'product': 'Student loan'}])
+
+        # Searches keep being answered while the compaction runs
+        stop = threading.Event()
+        errors = []
+
+        def search_loop():
+            while not stop.is_set():
+                try:
+                    if retriever.search('zebra quiz jazz', top_k=1)[0]['chunk_id'] != 'new_0':
+                        errors.append('wrong result')
+                except Exception as e:
+                    errors.append(e)
+
+        searcher = threading.Thread(target=search_loop)
+        searcher.start()
+        retriever.compact().join()
+        stop.set()
+        searcher.join()
+        self.assertEqual(errors, [])
+
+        self.assertEqual(len(retriever.metadata), 599)
+        self.assertEqual(retriever.index.ntotal, 599)
+        self.assertEqual(retriever.index_info['kind'], 'hnsw')
+        self.assertEqual((len(retriever.delta), retriever.delta.deleted), (0, 0))
+        self.assertFalse(retriever.delta_path.exists())
+        self.assertIsNone(retriever.compact(background=False))  # nothing left to fold
+
+        reopened = self._retriever()
+        self.assertEqual(reopened.index.ntotal, 599)
+        for mode in ('dense', 'hybrid', 'lexical'):
+            self.assertEqual(reopened.search('zebra quiz jazz', top_k=1, mode=mode)[0]['chunk_id'], 'new_0')
+        self.assertEqual(reopened.search('zebra', top_k=1, filters={'product': 'student'})[0]['chunk_id'], 'new_0')
+        chunk_ids = {reopened.metadata.field(i, 'chunk_id') for i in range(len(reopened.metadata))}
+        self.assertNotIn('3_0', chunk_ids)
+
+    def test_interrupted_swap_is_rolled_forward(self):
+        retriever = self._retriever()
+        retriever.add_chunks([{'chunk_id': 'new_0', 'text': 'zebra quiz jazz'}])
+        index_path = self.root / 'medium_faiss_index.index'
+        staged = index_path.with_name(index_path.name + '.compacting')
+        index = faiss.read_index(str(index_path))
+        index.add(FakeEncoder().encode(['zebra quiz jazz']))
+        faiss.write_index(index, str(staged))
+        journal_path(self.root, 'medium').write_text(json.dumps({
+            'moves': [[str(staged), str(index_path)]], 'clear': [str(retriever.delta_path)]}))
+
+        self.assertEqual(self._retriever().index.ntotal, 601)
+        self.assertFalse(journal_path(self.root, 'medium').exists())
+        self.assertFalse(retriever.delta_path.exists())
+        self.assertFalse(finish_compaction(self.root, 'medium'))
+
+
+if __name__ == '__main__':
+    unittest.main()